@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Index images stored before the near-duplicate index existed (or while
+SIMILARITY_INDEX was off): compute their perceptual hashes and write their
+band rows (common.similarity).
+
+The images table is scanned in parallel segments for items without a phash.
+Downloading and hashing run in a process pool, --batch images per task, so
+each worker decodes a batch and hashes it in one NumPy pass; the parent
+writes the results. Use --workers 0 to hash inline. Safe to rerun: indexed
+images are skipped.
+
+Usage:
+  AWS_ENDPOINT_URL=http://localhost:4566 python scripts/backfill_phash.py --workers 4
+  python scripts/backfill_phash.py --dry-run
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common import phash, similarity  # noqa: E402
+from common.aws_clients import ddb_table, reset_clients  # noqa: E402
+from common.renditions import read_original  # noqa: E402
+
+
+def _scan_segment(images_table: str, segment: int, total: int):
+    tbl = ddb_table(images_table)
+    kwargs = {
+        "Segment": segment,
+        "TotalSegments": total,
+        "ProjectionExpression": "image_id, user_id, s3_bucket, s3_key, #st, phash",
+        "ExpressionAttributeNames": {"#st": "status"},
+    }
+    while True:
+        resp = tbl.scan(**kwargs)
+        for item in resp.get("Items", []):
+            if item.get("status") != "pending" and not item.get("phash"):
+                yield item
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _hash_batch(items):
+    originals, errors = [], {}
+    for item in items:
+        try:
+            originals.append(read_original(item))
+        except Exception as e:
+            originals.append(b"")
+            errors[item["image_id"]] = str(e)
+    hashes = phash.compute_many(originals)
+    return [(item, h, errors.get(item["image_id"]) or (None if h else "not a decodable image"))
+            for item, h in zip(items, hashes)]
+
+
+def backfill(images_table: str, segments: int = 4, workers: int = 4, batch: int = 16, dry_run: bool = False):
+    with ThreadPoolExecutor(max_workers=segments) as scan_pool:
+        items = [it for seg in scan_pool.map(
+            lambda s: list(_scan_segment(images_table, s, segments)), range(segments)) for it in seg]
+
+    stats = {"unindexed": len(items), "indexed": 0, "deleted": 0, "failed": 0}
+    if dry_run or not items:
+        return stats
+    batches = [items[i:i + batch] for i in range(0, len(items), batch)]
+    if workers:
+        # forked children must not reuse the parent's pooled connections
+        with ProcessPoolExecutor(max_workers=workers, initializer=reset_clients) as pool:
+            results = [r for part in pool.map(_hash_batch, batches) for r in part]
+    else:
+        results = [r for b in batches for r in _hash_batch(b)]
+    for item, hashes, error in results:
+        if not error:
+            try:
+                stats["indexed" if similarity.index(item, hashes) else "deleted"] += 1
+                continue
+            except Exception as e:
+                error = str(e)
+        stats["failed"] += 1
+        print(f"{item['image_id']}: {error}", file=sys.stderr)
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images-table", default=os.getenv("IMAGES_TABLE_NAME", "images"))
+    ap.add_argument("--segments", type=int, default=4, help="parallel Scan segments")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="hashing processes (0 = inline)")
+    ap.add_argument("--batch", type=int, default=16, help="images per hashing task")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    stats = backfill(args.images_table, args.segments, args.workers, args.batch, args.dry_run)
+    print(("[dry-run] " if args.dry_run else "") + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
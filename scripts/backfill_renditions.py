@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Render missing variants for images stored before renditions existed (or after
+RENDITION_VARIANTS gained a new entry).
+
+The images table is scanned in parallel segments; decoding and resizing is
+CPU bound, so rendering runs in a process pool (one client registry per
+worker process). Use --workers 0 to render inline.
+
+Usage:
+  AWS_ENDPOINT_URL=http://localhost:4566 python scripts/backfill_renditions.py --workers 4
+  python scripts/backfill_renditions.py --variants thumb_128,thumb_256 --dry-run
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common.aws_clients import ddb_table, reset_clients  # noqa: E402
+from common.renditions import generate, variant_specs  # noqa: E402
+
+
+def _scan_segment(images_table: str, segment: int, total: int, wanted):
+    tbl = ddb_table(images_table)
+    kwargs = {
+        "Segment": segment,
+        "TotalSegments": total,
+        "ProjectionExpression": "image_id, s3_bucket, s3_key, #st, variants",
+        "ExpressionAttributeNames": {"#st": "status"},
+    }
+    while True:
+        resp = tbl.scan(**kwargs)
+        for item in resp.get("Items", []):
+            if item.get("status") == "pending":
+                continue
+            missing = sorted(set(wanted) - set(item.get("variants") or ()))
+            if missing:
+                yield item, missing
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _render_one(job):
+    item, missing = job
+    try:
+        return item["image_id"], generate(item, missing), None
+    except Exception as e:
+        return item["image_id"], [], str(e)
+
+
+def backfill(images_table: str, variants=None, segments: int = 4, workers: int = 4, dry_run: bool = False):
+    wanted = list(variants or variant_specs())
+    unknown = set(wanted) - set(variant_specs())
+    if unknown:
+        raise ValueError(f"Unknown variants: {', '.join(sorted(unknown))}")
+
+    with ThreadPoolExecutor(max_workers=segments) as scan_pool:
+        jobs = [job for seg in scan_pool.map(
+            lambda s: list(_scan_segment(images_table, s, segments, wanted)), range(segments)) for job in seg]
+
+    stats = {"missing": len(jobs), "rendered": 0, "failed": 0}
+    if dry_run or not jobs:
+        return stats
+    if workers:
+        # forked children must not reuse the parent's pooled connections
+        with ProcessPoolExecutor(max_workers=workers, initializer=reset_clients) as pool:
+            results = list(pool.map(_render_one, jobs, chunksize=4))
+    else:
+        results = [_render_one(job) for job in jobs]
+    for image_id, done, error in results:
+        if error:
+            stats["failed"] += 1
+            print(f"{image_id}: {error}", file=sys.stderr)
+        else:
+            stats["rendered"] += 1
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images-table", default=os.getenv("IMAGES_TABLE_NAME", "images"))
+    ap.add_argument("--variants", help="comma-separated subset (default: all configured)")
+    ap.add_argument("--segments", type=int, default=4, help="parallel Scan segments")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="render processes (0 = inline)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    variants = [v.strip() for v in args.variants.split(",")] if args.variants else None
+    stats = backfill(args.images_table, variants, args.segments, args.workers, args.dry_run)
+    print(("[dry-run] " if args.dry_run else "") + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Build (or repair) the tag dictionary used by GET /tags: recount every tag in
+image_tags with a parallel segmented Scan and overwrite image_tag_dictionary.
+Needed once for tags written before the dictionary existed, and afterwards
+whenever the best-effort counts have drifted. See src/common/tag_dictionary.py.
+
+Usage:
+  AWS_ENDPOINT_URL=http://localhost:4566 python scripts/backfill_tag_dictionary.py --dry-run
+  python scripts/backfill_tag_dictionary.py --segments 8
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common.tag_dictionary import rebuild  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tags-table", default=os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags"))
+    ap.add_argument("--segments", type=int, default=4, help="parallel Scan segments (TotalSegments)")
+    ap.add_argument("--dry-run", action="store_true", help="print the counts without writing them")
+    args = ap.parse_args()
+
+    counts = rebuild(args.tags_table, segments=args.segments, dry_run=args.dry_run)
+    print(json.dumps({"tags": len(counts), "dry_run": args.dry_run,
+                      "top": sorted(counts.items(), key=lambda c: (-c[1], c[0]))[:20]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Backfill `user_tag` on existing image_tags rows so they show up in the
+`user_tag-index` GSI used by combined user_id + tag listings.
+
+Rows written before the index existed lack `user_tag` (and very old rows may
+lack `user_id`/`created_at`); those values are taken from the row itself or,
+failing that, from the owning `images` item. Rows whose image no longer
+exists are reported and left alone.
+
+Usage:
+  AWS_ENDPOINT_URL=http://localhost:4566 python scripts/backfill_user_tag.py --create-index
+  python scripts/backfill_user_tag.py --segments 8 --dry-run
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common.aws_clients import ddb_client, ddb_table  # noqa: E402
+from common.dynamo import batch_get_items  # noqa: E402
+from common.tags import USER_TAG_INDEX, row_image_id, split_shard_key, user_tag_key  # noqa: E402
+
+
+def ensure_index(tags_table: str) -> bool:
+    """Create user_tag-index on an existing table. Returns True if it was created."""
+    client = ddb_client()
+    desc = client.describe_table(TableName=tags_table)["Table"]
+    if any(g["IndexName"] == USER_TAG_INDEX for g in desc.get("GlobalSecondaryIndexes", [])):
+        return False
+    update = {
+        "TableName": tags_table,
+        "AttributeDefinitions": [
+            {"AttributeName": "user_tag", "AttributeType": "S"},
+            {"AttributeName": "created_at", "AttributeType": "S"},
+        ],
+        "GlobalSecondaryIndexUpdates": [{"Create": {
+            "IndexName": USER_TAG_INDEX,
+            "KeySchema": [
+                {"AttributeName": "user_tag", "KeyType": "HASH"},
+                {"AttributeName": "created_at", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "KEYS_ONLY"},
+        }}],
+    }
+    if desc.get("BillingModeSummary", {}).get("BillingMode") != "PAY_PER_REQUEST":
+        update["GlobalSecondaryIndexUpdates"][0]["Create"]["ProvisionedThroughput"] = {
+            "ReadCapacityUnits": 5, "WriteCapacityUnits": 5}
+    client.update_table(**update)
+    return True
+
+
+def _scan_segment(tags_table: str, segment: int, total: int):
+    tbl = ddb_table(tags_table)
+    kwargs = {
+        "Segment": segment,
+        "TotalSegments": total,
+        "ProjectionExpression": "#t, image_id, user_id, created_at, user_tag",
+        "ExpressionAttributeNames": {"#t": "tag"},
+    }
+    while True:
+        resp = tbl.scan(**kwargs)
+        for row in resp.get("Items", []):
+            if "user_tag" not in row or "created_at" not in row:
+                yield row
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _fix_rows(rows, images_table: str, tags_table: str, dry_run: bool):
+    stats = {"scanned_missing": len(rows), "updated": 0, "orphaned": 0}
+    need_lookup = [row_image_id(r["image_id"]) for r in rows if "user_id" not in r or "created_at" not in r]
+    images = {it["image_id"]: it for it in batch_get_items(
+        images_table, "image_id", need_lookup, fields=["user_id", "created_at"])}
+    tbl = ddb_table(tags_table)
+    for r in rows:
+        src = images.get(row_image_id(r["image_id"]), {})
+        user_id = r.get("user_id") or src.get("user_id")
+        created_at = r.get("created_at") or src.get("created_at")
+        if not user_id or not created_at:
+            stats["orphaned"] += 1
+            continue
+        if not dry_run:
+            tbl.update_item(
+                Key={"tag": r["tag"], "image_id": r["image_id"]},
+                UpdateExpression="SET user_tag = :ut, user_id = :u, created_at = :c",
+                ConditionExpression="attribute_exists(image_id)",
+                ExpressionAttributeValues={":ut": user_tag_key(user_id, split_shard_key(r["tag"])[0]), ":u": user_id, ":c": created_at},
+            )
+        stats["updated"] += 1
+    return stats
+
+
+def backfill(images_table: str, tags_table: str, segments: int = 4, dry_run: bool = False):
+    def run_segment(seg):
+        return _fix_rows(list(_scan_segment(tags_table, seg, segments)), images_table, tags_table, dry_run)
+
+    total = {"scanned_missing": 0, "updated": 0, "orphaned": 0}
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        for stats in pool.map(run_segment, range(segments)):
+            for k, v in stats.items():
+                total[k] += v
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images-table", default=os.getenv("IMAGES_TABLE_NAME", "images"))
+    ap.add_argument("--tags-table", default=os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags"))
+    ap.add_argument("--segments", type=int, default=4, help="parallel Scan segments")
+    ap.add_argument("--create-index", action="store_true", help=f"create {USER_TAG_INDEX} if missing")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    if args.create_index and ensure_index(args.tags_table):
+        print(f"created {USER_TAG_INDEX} on {args.tags_table}")
+    stats = backfill(args.images_table, args.tags_table, args.segments, args.dry_run)
+    print(("[dry-run] " if args.dry_run else "") + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint latency, sync vs. async execution mode (ASYNC_HANDLERS), for the
+handlers written over common.aio: upload, list (tag listing with BatchGetItem
+hydration) and delete.
+
+Runs in-process under moto. Moto answers in microseconds and holds the GIL,
+so --latency-ms adds a simulated per-call network delay (a sleep in
+botocore's before-call hook, which releases the GIL like a socket wait) to
+make overlapping I/O visible.
+
+Usage: python scripts/bench_async_handlers.py [--iterations 30] [--latency-ms 10] [--page 250]
+"""
+import argparse
+import json
+import os
+import time
+
+from benchlib import moto_env, upload_event, timed, summarize, print_table
+from common.aws_clients import ddb_client, ddb_resource, s3_client
+from handlers import delete_handler, list_handler, upload_handler
+
+MODES = {"sync": "0", "async": "1"}
+
+
+def _add_latency(latency_ms: float):
+    for client in (s3_client(), ddb_client(), ddb_resource().meta.client):
+        client.meta.events.register("before-call.*.*", lambda **kw: time.sleep(latency_ms / 1000.0))
+
+
+def _upload(tag: str) -> str:
+    r = upload_handler.handler(upload_event(tags=(tag,)), None)
+    assert r["statusCode"] == 201, r
+    return json.loads(r["body"])["image_id"]
+
+
+def run(iterations: int, latency_ms: float, page: int):
+    rows = []
+    with moto_env():
+        for _ in range(page):
+            _upload("page")
+        if latency_ms:
+            _add_latency(latency_ms)
+        list_event = {"queryStringParameters": {"tag": "page", "limit": str(page)}}
+        for mode, flag in MODES.items():
+            os.environ["ASYNC_HANDLERS"] = flag
+            uploads, lists, deletes, ids = [], [], [], []
+            for _ in range(iterations):
+                r, ms = timed(upload_handler.handler, upload_event(tags=(f"bench-{mode}",)), None)
+                assert r["statusCode"] == 201, r
+                ids.append(json.loads(r["body"])["image_id"])
+                uploads.append(ms)
+                r, ms = timed(list_handler.handler, list_event, None)
+                assert len(json.loads(r["body"])["items"]) == page
+                lists.append(ms)
+            for iid in ids:
+                r, ms = timed(delete_handler.handler, {"pathParameters": {"image_id": iid}}, None)
+                assert r["statusCode"] == 204, r
+                deletes.append(ms)
+            for endpoint, samples in (("POST /images", uploads), (f"GET /images?tag (page {page})", lists),
+                                      ("DELETE /images/{id}", deletes)):
+                stats = summarize(samples)
+                rows.append({"endpoint": endpoint, "mode": mode, "p50_ms": stats["p50_ms"],
+                             "p95_ms": stats["p95_ms"], "mean_ms": stats["mean_ms"]})
+        os.environ.pop("ASYNC_HANDLERS", None)
+    rows.sort(key=lambda r: (r["endpoint"], r["mode"]))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=30)
+    ap.add_argument("--latency-ms", type=float, default=10.0)
+    ap.add_argument("--page", type=int, default=250, help="tag listing page size (100 keys per BatchGetItem)")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    rows = run(args.iterations, args.latency_ms, args.page)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, ["endpoint", "mode", "p50_ms", "p95_ms", "mean_ms"])
+
+
+if __name__ == "__main__":
+    main()
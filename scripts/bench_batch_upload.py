@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Ingestion throughput: one POST /images invocation per image vs.
+POST /images:batch at several batch sizes.
+
+Reports images/sec and AWS round trips per image under moto. Moto has no
+network latency, so --latency-ms adds a simulated per-call delay (S3 and
+DynamoDB) to make the concurrency and batching savings visible.
+
+Usage: python scripts/bench_batch_upload.py [--images 200] [--sizes 1 10 25 100] [--latency-ms 10]
+"""
+import argparse
+import base64
+import json
+import os
+import time
+
+from benchlib import CallCounter, moto_env, print_table
+from common.aws_clients import ddb_resource, s3_client
+from handlers import batch_upload_handler, upload_handler
+
+
+def _entries(n, payload_bytes):
+    data = base64.b64encode(b"\x89PNG\r\n\x1a\n" + os.urandom(payload_bytes)).decode()
+    return [{"user_id": "bench", "title": f"t{i}", "tags": ["bench", f"g{i % 5}"], "content_type": "image/png",
+             "image_base64": data} for i in range(n)]
+
+
+def run(images, sizes, latency_ms, payload_bytes):
+    rows = []
+    with moto_env():
+        clients = (s3_client(), ddb_resource().meta.client)
+        counter = CallCounter(*clients)
+        if latency_ms:
+            for c in clients:
+                c.meta.events.register("before-call.*.*", lambda **kw: time.sleep(latency_ms / 1000.0))
+        for size in sizes:
+            entries = _entries(images, payload_bytes)
+            counter.reset()
+            t0 = time.perf_counter()
+            if size == 1:
+                for e in entries:
+                    assert upload_handler.handler({"body": json.dumps(e)}, None)["statusCode"] == 201
+            else:
+                for i in range(0, images, size):
+                    body = json.loads(batch_upload_handler.handler(
+                        {"body": json.dumps({"items": entries[i:i + size]})}, None)["body"])
+                    assert body["failed"] == 0, body
+            elapsed = time.perf_counter() - t0
+            rows.append({"mode": "POST /images" if size == 1 else f"batch x{size}",
+                         "images_per_sec": round(images / elapsed, 1),
+                         "calls_per_image": round(counter.total / images, 2)})
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images", type=int, default=200)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 25, 100])
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--payload-bytes", type=int, default=4096)
+    args = ap.parse_args()
+    print_table(run(args.images, args.sizes, args.latency_ms, args.payload_bytes),
+                ["mode", "images_per_sec", "calls_per_image"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Account purge: one DELETE /images/{image_id} invocation per image vs.
+POST /images:bulk-delete {"user_id"} repeated while `more` is true.
+
+Reports images/sec and AWS round trips per image under moto. --latency-ms
+adds a simulated per-call delay (S3 and DynamoDB) so the savings from
+DeleteObjects, BatchWriteItem and the parallel S3/DynamoDB legs show up.
+
+Usage: python scripts/bench_bulk_delete.py [--images 300] [--latency-ms 10]
+"""
+import argparse
+import json
+import time
+
+from benchlib import CallCounter, moto_env, print_table, upload_event
+from common.aws_clients import ddb_resource, s3_client
+from handlers import bulk_delete_handler, delete_handler, upload_handler
+
+
+def _seed(images):
+    ids = []
+    for i in range(images):
+        resp = upload_handler.handler(upload_event(user_id="purge", tags=("bench", f"g{i % 5}")), None)
+        ids.append(json.loads(resp["body"])["image_id"])
+    return ids
+
+
+def run(images, latency_ms):
+    rows = []
+    with moto_env():
+        clients = (s3_client(), ddb_resource().meta.client)
+        counter = CallCounter(*clients)
+        delay = {"ms": 0.0}
+        for c in clients:
+            c.meta.events.register("before-call.*.*", lambda **kw: time.sleep(delay["ms"] / 1000.0))
+
+        for mode in ("per-image DELETE", "bulk-delete"):
+            delay["ms"] = 0.0
+            ids = _seed(images)
+            delay["ms"] = latency_ms
+            counter.reset()
+            t0 = time.perf_counter()
+            if mode == "bulk-delete":
+                more = True
+                while more:
+                    body = json.loads(bulk_delete_handler.handler(
+                        {"body": json.dumps({"user_id": "purge"})}, None)["body"])
+                    assert body["failed"] == 0, body
+                    more = body["more"]
+            else:
+                for iid in ids:
+                    assert delete_handler.handler({"pathParameters": {"image_id": iid}}, None)["statusCode"] == 204
+            elapsed = time.perf_counter() - t0
+            rows.append({"mode": mode, "images_per_sec": round(images / elapsed, 1),
+                         "calls_per_image": round(counter.total / images, 2)})
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images", type=int, default=300)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+    print_table(run(args.images, args.latency_ms), ["mode", "images_per_sec", "calls_per_image"])
+
+
+if __name__ == "__main__":
+    main()
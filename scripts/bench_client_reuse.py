@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Per-invocation overhead of client construction, cold vs. warm, before vs. after
+the process-wide client registry in common.aws_clients.
+
+  before: every invocation builds its clients (simulated with reset_clients())
+  after:  clients/tables are built on the first (cold) invocation and reused
+
+Usage: python scripts/bench_client_reuse.py [--iterations 200]
+"""
+import argparse
+import json
+
+from benchlib import moto_env, upload_event, timed, summarize, print_table
+from common.aws_clients import reset_clients
+from handlers import get_handler, upload_handler
+
+
+def run(iterations: int):
+    rows = []
+    with moto_env():
+        iid = json.loads(upload_handler.handler(upload_event(), None)["body"])["image_id"]
+        ev = {"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}
+
+        for mode in ("before", "after"):
+            reset_clients()
+            _, cold = timed(get_handler.handler, ev, None)
+            warm = []
+            for _ in range(iterations):
+                if mode == "before":
+                    reset_clients()
+                r, ms = timed(get_handler.handler, ev, None)
+                assert r["statusCode"] == 200, r
+                warm.append(ms)
+            row = {"mode": mode, "cold_ms": round(cold, 3)}
+            row.update({f"warm_{k}": v for k, v in summarize(warm).items() if k != "n"})
+            rows.append(row)
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=200)
+    ap.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = ap.parse_args()
+    rows = run(args.iterations)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, ["mode", "cold_ms", "warm_mean_ms", "warm_p50_ms", "warm_p95_ms", "warm_max_ms"])
+
+
+if __name__ == "__main__":
+    main()
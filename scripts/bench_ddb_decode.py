@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Item decode cost: boto3's TypeDeserializer (Decimal numbers, what the
+resource API does on every item), the plain-number deserializer the shared
+resource uses (common.ddb_codec.PlainNumberDeserializer) and the hand-rolled
+codec of the low-level fast path (common.ddb_codec.decode_item).
+
+Part 1 decodes the same wire-format `images` items in a loop and reports
+microseconds per item. Part 2 times a whole `user_id` list page through the
+handler under moto, resource API (DDB_FAST_PATH=0) vs. client (=1).
+
+Usage: python scripts/bench_ddb_decode.py [--items 1000] [--page 100] [--repeats 5]
+"""
+import argparse
+import json
+import os
+import time
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from benchlib import moto_env, print_table
+from common.aws_clients import ddb_table
+from common.ddb_codec import PlainNumberDeserializer, decode_item, encode_item
+from common.utils import gen_id, now_iso
+
+
+def _item(i):
+    iid = gen_id()
+    return {
+        "image_id": iid, "user_id": "bench", "title": f"title {i}", "description": "d" * 64,
+        "tags": ["bench", f"t{i % 10}", "holiday"], "content_type": "image/jpeg", "s3_bucket": "b",
+        "s3_key": f"images/{iid}", "size": 1024 + i, "checksum": "0" * 64, "created_at": now_iso(),
+        "variants": {"thumb_128", "medium_512"},
+    }
+
+
+def _best_of(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def decode_rows(n, repeats):
+    raw = [encode_item(_item(i)) for i in range(n)]
+    boto, plain = TypeDeserializer(), PlainNumberDeserializer()
+    strategies = (
+        ("TypeDeserializer (resource default)", lambda: [{k: boto.deserialize(v) for k, v in it.items()} for it in raw]),
+        ("PlainNumberDeserializer (resource)", lambda: [{k: plain.deserialize(v) for k, v in it.items()} for it in raw]),
+        ("decode_item (fast path)", lambda: [decode_item(it) for it in raw]),
+    )
+    rows = []
+    for name, fn in strategies:
+        secs = _best_of(fn, repeats)
+        rows.append({"decoder": name, "items": n, "us_per_item": round(secs / n * 1e6, 2)})
+    return rows
+
+
+def page_rows(page, repeats):
+    from src.handlers import list_handler
+    rows = []
+    with moto_env():
+        with ddb_table("images").batch_writer() as batch:
+            for i in range(page):
+                batch.put_item(Item=_item(i))
+        event = {"queryStringParameters": {"user_id": "bench", "limit": str(page)}}
+        for mode in ("0", "1"):
+            os.environ["DDB_FAST_PATH"] = mode
+            assert len(json.loads(list_handler.handler(event, None)["body"])["items"]) == page
+            secs = _best_of(lambda: list_handler.handler(event, None), repeats)
+            rows.append({"path": "client + decode_item" if mode == "1" else "resource", "page": page,
+                         "page_ms": round(secs * 1000, 2)})
+        os.environ.pop("DDB_FAST_PATH")
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--items", type=int, default=1000)
+    ap.add_argument("--page", type=int, default=100)
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    decode, pages = decode_rows(args.items, args.repeats), page_rows(args.page, args.repeats)
+    if args.json:
+        print(json.dumps({"decode": decode, "list_page": pages}, indent=2))
+    else:
+        print_table(decode, ["decoder", "items", "us_per_item"])
+        print()
+        print_table(pages, ["path", "page", "page_ms"])
+
+
+if __name__ == "__main__":
+    main()
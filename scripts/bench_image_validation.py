@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Upload validation cost for large images: common.image_probe (magic bytes +
+header only) vs. a full decode (Image.open + load), the naive way to check
+that bytes are an image and read its size.
+
+"header_kb" is how much of the image the probe needed to read. Decoded
+memory is the size of the decoded frame (w x h x bands), as Pillow
+allocates pixel buffers outside the Python allocator.
+
+Usage: python scripts/bench_image_validation.py [--megapixels 12 24 48] [--repeat 5]
+"""
+import argparse
+import io
+
+from benchlib import print_table, summarize, timed
+from common import image_probe
+
+MB = 1024 * 1024
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+def _image(fmt, megapixels):
+    from PIL import Image
+
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    img = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+    out = io.BytesIO()
+    img.save(out, format=fmt, **({"quality": 90} if fmt == "JPEG" else {"compress_level": 1}))
+    return out.getvalue()
+
+
+def full_decode(data, content_type):
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    if img.format != image_probe.format_for(content_type):
+        raise ValueError("format mismatch")
+    return {"width": img.width, "height": img.height, "frame_mb": img.width * img.height * len(img.getbands()) / MB}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--megapixels", type=float, nargs="+", default=[12, 24, 48])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rows = []
+    for fmt, content_type in CONTENT_TYPES.items():
+        for mp in args.megapixels:
+            data = _image(fmt, mp)
+            reads = []
+            image_probe.probe(lambda n: reads.append(n) or data[:n], content_type)
+            frame_mb = full_decode(data, content_type)["frame_mb"]
+            for name, fn, header_kb, decoded in (
+                    ("full decode", full_decode, len(data) // 1024, frame_mb),
+                    ("header probe", image_probe.probe_bytes, min(max(reads), len(data)) // 1024, 0)):
+                stats = summarize([timed(fn, data, content_type)[1] for _ in range(args.repeat)])
+                rows.append({"format": fmt, "megapixels": mp, "file_mb": round(len(data) / MB, 1), "path": name,
+                             "header_kb": header_kb, "decoded_frame_mb": round(decoded, 1),
+                             "p50_ms": stats["p50_ms"], "max_ms": stats["max_ms"]})
+    print_table(rows, ["format", "megapixels", "file_mb", "path", "header_kb", "decoded_frame_mb", "p50_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Cold-start import cost per handler, from `python -X importtime`.
+
+Each handler module is imported in a fresh interpreter (best of --repeats).
+Reported per handler:
+  import_ms    cumulative import time of handlers.<name> (clients not built)
+  over_boto3   what our own code and its extra dependencies add: boto3 is
+               imported first in the same interpreter, then the self times
+               of every non-AWS-SDK module the handler import loads are
+               summed. Both come from one process, so the number does not
+               swing with the noise between two separate measurements.
+  init_ms      wall time of the import with PREWARM_CLIENTS=1, i.e. the
+               Lambda init phase including the clients built at import
+  modules      number of modules loaded
+Reported as well is whether a module that handler must not load at import time (BUDGETS) was
+loaded anyway: list_handler never touches S3 code, and get_handler's metadata
+path does not load URL signing or rendering.
+
+Modules load from bytecode, as they do from the pycs shipped in the bundles
+(scripts/build_bundles.py): every handler is imported once up front with a
+private PYTHONPYCACHEPREFIX to fill it, so compiling source never counts, even
+where PYTHONDONTWRITEBYTECODE is set.
+
+With --check the script exits 1 when a handler is over --max-over-boto3-ms or
+loads a forbidden module (`make importtime` runs it that way).
+
+Usage: python scripts/bench_import_time.py [--repeats 5] [--check] [--max-over-boto3-ms 40] [handler ...]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchlib import print_table  # noqa: E402
+from build_bundles import handlers  # noqa: E402
+
+HEAVY = ["PIL", "numpy"]
+# the AWS SDK and its dependencies: what every handler pays anyway
+SDK_PACKAGES = {"boto3", "botocore", "s3transfer", "jmespath", "dateutil", "urllib3", "six"}
+# common.aio imports asyncio only when ASYNC_HANDLERS=1
+ASYNC = ["asyncio"]
+# modules a handler must not load when it is imported
+BUDGETS = {
+    "list_handler": HEAVY + ASYNC + ["common.presign", "common.renditions", "common.uploads", "common.blobs"],
+    "get_handler": HEAVY + ASYNC + ["common.presign", "common.renditions"],
+}
+DEFAULT_FORBIDDEN = HEAVY + ASYNC
+DEFAULT_MAX_OVER_BOTO3_MS = 40.0
+
+_PROBE = """
+import sys, time, json
+{preload}
+sys.stderr.write("{marker}\\n")
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(json.dumps({{"wall": elapsed, "modules": sorted(sys.modules)}}))
+"""
+_MARKER = "-- preloaded --"
+_PYCACHE = os.path.join(tempfile.gettempdir(), "bench-import-time-pycache")
+
+
+def _env(prewarm: bool):
+    env = dict(os.environ, PYTHONPATH=SRC, PYTHONPYCACHEPREFIX=_PYCACHE, PREWARM_CLIENTS="1" if prewarm else "0")
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    # clients are built offline; never let credential lookup reach for instance metadata
+    env.setdefault("AWS_REGION", "us-east-1")
+    env.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    return env
+
+
+def _compile(modules):
+    # fills _PYCACHE for everything the probes import; stale entries are rewritten
+    subprocess.run([sys.executable, "-c", "import " + ", ".join(modules)], env=_env(prewarm=True), check=True)
+
+
+def _probe(module: str, prewarm: bool = False, preload: str = ""):
+    """(cumulative ms of `module`, ms of non-SDK modules it loaded, wall ms, modules) in one fresh interpreter."""
+    script = _PROBE.format(module=module, preload=preload, marker=_MARKER)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                          capture_output=True, text=True, env=_env(prewarm), check=True)
+    cumulative, own, started = None, 0.0, False
+    for line in proc.stderr.splitlines():
+        if line == _MARKER:
+            started = True
+        if not started or not line.startswith("import time:") or "|" not in line:
+            continue
+        head, cum, name = line.split("|")
+        name = name.strip()
+        if name == module:
+            cumulative = int(cum) / 1000.0
+        if name.split(".")[0] not in SDK_PACKAGES:
+            own += int(head.rsplit(":", 1)[1]) / 1000.0
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    return cumulative, own, out["wall"] * 1000.0, out["modules"]
+
+
+def measure(names, repeats):
+    _compile(["boto3"] + [f"handlers.{name}" for name in names])
+    boto3_ms = min(_probe("boto3")[0] for _ in range(repeats))
+    rows = []
+    for name in names:
+        module = f"handlers.{name}"
+        runs = [_probe(module) for _ in range(repeats)]
+        import_ms = min(r[0] for r in runs)
+        own_ms = min(_probe(module, preload="import boto3")[1] for _ in range(repeats))
+        init_ms = min(_probe(module, prewarm=True)[2] for _ in range(repeats))
+        loaded = set(runs[0][3])
+        forbidden = [m for m in BUDGETS.get(name, DEFAULT_FORBIDDEN)
+                     if m in loaded or any(x.startswith(m + ".") for x in loaded)]
+        rows.append({"handler": name, "import_ms": round(import_ms, 1),
+                     "over_boto3": round(own_ms, 1), "init_ms": round(init_ms, 1),
+                     "modules": len(loaded), "forbidden": ",".join(forbidden) or "-"})
+    return boto3_ms, rows
+
+
+def violations(rows, max_over_boto3_ms):
+    out = []
+    for r in rows:
+        if r["over_boto3"] > max_over_boto3_ms:
+            out.append(f"{r['handler']}: {r['over_boto3']} ms over boto3 (budget {max_over_boto3_ms} ms)")
+        if r["forbidden"] != "-":
+            out.append(f"{r['handler']}: loads {r['forbidden']} at import")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("handlers", nargs="*", help="handler modules (default: all)")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--max-over-boto3-ms", type=float,
+                    default=float(os.getenv("IMPORT_BUDGET_MS", DEFAULT_MAX_OVER_BOTO3_MS)))
+    ap.add_argument("--check", action="store_true", help="exit 1 when a handler is over budget")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    boto3_ms, rows = measure(args.handlers or handlers(), args.repeats)
+    if args.json:
+        print(json.dumps({"boto3_ms": round(boto3_ms, 1), "handlers": rows}, indent=2))
+    else:
+        print(f"bare `import boto3`: {boto3_ms:.1f} ms")
+        print_table(rows, ["handler", "import_ms", "over_boto3", "init_ms", "modules", "forbidden"])
+    problems = violations(rows, args.max_over_boto3_ms)
+    for p in problems:
+        print(f"OVER BUDGET {p}", file=sys.stderr)
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Overhead of common.metrics per request: handlers with instrumentation off
+(METRICS_ENABLED=0), on without ReturnConsumedCapacity, and fully on. EMF
+lines go to a null sink, so only the recording and encoding cost is measured.
+
+Usage: python scripts/bench_instrumentation.py [--iterations 300]
+"""
+import argparse
+import json
+import os
+
+from benchlib import moto_env, upload_event, timed, summarize, print_table
+from common import metrics
+from handlers import get_handler, list_handler, upload_handler
+
+CONFIGS = {
+    "off": {"METRICS_ENABLED": "0"},
+    "on, no capacity": {"METRICS_ENABLED": "1", "METRICS_CONSUMED_CAPACITY": "0"},
+    "on": {"METRICS_ENABLED": "1", "METRICS_CONSUMED_CAPACITY": "1"},
+}
+
+
+def run(iterations: int):
+    rows = []
+    metrics.set_sink(lambda line: None)
+    with moto_env():
+        for _ in range(20):
+            r = upload_handler.handler(upload_event(tags=("bench",)), None)
+        iid = json.loads(r["body"])["image_id"]
+        events = {
+            "get (cache bypass)": (get_handler.handler, {"pathParameters": {"image_id": iid},
+                                                         "rawPath": f"/images/{iid}",
+                                                         "queryStringParameters": {"cache": "bypass"}}),
+            "list by tag": (list_handler.handler, {"queryStringParameters": {"tag": "bench"}}),
+        }
+        baseline = {}
+        for config, env in CONFIGS.items():
+            os.environ.update(env)
+            for endpoint, (handler, event) in events.items():
+                handler(event, None)  # warm
+                samples = [timed(handler, event, None)[1] for _ in range(iterations)]
+                stats = summarize(samples)
+                baseline.setdefault(endpoint, stats["mean_ms"])
+                rows.append({"endpoint": endpoint, "config": config, "mean_ms": stats["mean_ms"],
+                             "p50_ms": stats["p50_ms"], "p95_ms": stats["p95_ms"],
+                             "overhead_us": round((stats["mean_ms"] - baseline[endpoint]) * 1000, 1)})
+    for env in CONFIGS.values():
+        for k in env:
+            os.environ.pop(k, None)
+    metrics.set_sink()
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=300)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    rows = run(args.iterations)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, ["endpoint", "config", "mean_ms", "p50_ms", "p95_ms", "overhead_us"])
+
+
+if __name__ == "__main__":
+    main()
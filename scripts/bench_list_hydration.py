@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tag-listing hydration: per-id GetItem loop (old) vs. chunked parallel
+BatchGetItem (common.dynamo.batch_get_items), at several page sizes.
+
+Reports DynamoDB round trips and wall time per page under moto. Moto has no
+network latency, so --latency-ms adds a simulated per-call delay to make the
+round-trip savings visible.
+
+Usage: python scripts/bench_list_hydration.py [--sizes 20 100 500] [--latency-ms 5]
+"""
+import argparse
+import json
+import time
+
+from benchlib import moto_env, timed, print_table, CallCounter
+from common.aws_clients import ddb_resource, ddb_table
+from common.dynamo import batch_get_items
+from common.utils import gen_id, now_iso
+
+
+def _seed(n):
+    images = ddb_table("images")
+    ids = []
+    with images.batch_writer() as batch:
+        for i in range(n):
+            iid = gen_id()
+            ids.append(iid)
+            batch.put_item(Item={
+                "image_id": iid, "user_id": "bench", "title": f"t{i}", "description": "d" * 64,
+                "tags": ["bench"], "content_type": "image/png", "s3_bucket": "b",
+                "s3_key": f"images/{iid}", "size": 1024, "checksum": "0" * 64, "created_at": now_iso(),
+            })
+    return ids
+
+
+def _get_item_loop(ids):
+    images = ddb_table("images")
+    out = []
+    for iid in ids:
+        r = images.get_item(Key={"image_id": iid})
+        if "Item" in r:
+            out.append(r["Item"])
+    return out
+
+
+def run(sizes, latency_ms, fields):
+    rows = []
+    with moto_env():
+        client = ddb_resource().meta.client
+        counter = CallCounter(client)
+        if latency_ms:
+            client.meta.events.register("before-call.dynamodb.*", lambda **kw: time.sleep(latency_ms / 1000.0))
+        all_ids = _seed(max(sizes))
+        for n in sizes:
+            ids = all_ids[:n]
+            for name, fn in (("get_item loop", lambda: _get_item_loop(ids)),
+                             ("batch_get", lambda: batch_get_items("images", "image_id", ids)),
+                             ("batch_get+fields", lambda: batch_get_items("images", "image_id", ids, fields=fields))):
+                counter.reset()
+                items, ms = timed(fn)
+                assert len(items) == n
+                rows.append({"page": n, "strategy": name, "round_trips": counter.total,
+                             "wall_ms": round(ms, 2), "bytes": len(json.dumps(items, default=str))})
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500])
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--fields", default="title,size,created_at")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    rows = run(args.sizes, args.latency_ms, args.fields.split(","))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, ["page", "strategy", "round_trips", "wall_ms", "bytes"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Hot-image metadata reads through get_handler: no cache vs. in-process LRU
+vs. shared backend only (SQLite stand-in), with a Zipf-ish access pattern
+over a small set of images.
+
+Reports GetItem round trips, p50/p95 latency and the cache counters. Moto has
+no network latency, so --latency-ms adds a simulated per-call delay.
+
+Usage: python scripts/bench_metadata_cache.py [--requests 2000] [--images 50] [--latency-ms 3]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from benchlib import CallCounter, moto_env, print_table, summarize, timed, upload_event
+from common import cache
+from common.aws_clients import ddb_resource
+from handlers import get_handler, upload_handler
+
+CONFIGS = (
+    ("no cache", {"METADATA_CACHE_TTL_SECONDS": "0", "METADATA_CACHE_BACKEND": ""}),
+    ("local lru", {"METADATA_CACHE_TTL_SECONDS": "30", "METADATA_CACHE_BACKEND": ""}),
+    ("shared only", {"METADATA_CACHE_TTL_SECONDS": "0", "METADATA_CACHE_BACKEND": "sqlite:"}),
+)
+
+
+def run(requests, images, latency_ms, seed=7):
+    rows = []
+    with moto_env():
+        client = ddb_resource().meta.client
+        counter = CallCounter(client)
+        if latency_ms:
+            client.meta.events.register("before-call.dynamodb.*", lambda **kw: time.sleep(latency_ms / 1000.0))
+        ids = [json.loads(upload_handler.handler(upload_event(), None)["body"])["image_id"] for _ in range(images)]
+        weights = [1.0 / (i + 1) for i in range(images)]
+        pattern = random.Random(seed).choices(ids, weights=weights, k=requests)
+        for name, env in CONFIGS:
+            os.environ.update(env)
+            cache.reset_metadata_cache()
+            counter.reset()
+            samples = []
+            for iid in pattern:
+                resp, ms = timed(get_handler.handler, {"pathParameters": {"image_id": iid},
+                                                       "rawPath": f"/images/{iid}"}, None)
+                assert resp["statusCode"] == 200
+                samples.append(ms)
+            stats = summarize(samples)
+            counts = cache.metadata_cache().stats.snapshot()
+            rows.append({"config": name, "get_item_calls": counter.calls.get("GetItem", 0),
+                         "p50_ms": stats["p50_ms"], "p95_ms": stats["p95_ms"],
+                         "hits": counts["hits"], "shared_hits": counts["shared_hits"], "misses": counts["misses"]})
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--images", type=int, default=50)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+    rows = run(args.requests, args.images, args.latency_ms)
+    print_table(rows, ["config", "get_item_calls", "p50_ms", "p95_ms", "hits", "shared_hits", "misses"])
+
+
+if __name__ == "__main__":
+    main()
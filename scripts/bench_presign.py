@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Download-URL signing cost: a fresh generate_presigned_url per request (old)
+vs. time-bucketed, memoized URLs (common.presign.presigned_get).
+
+Reports signing calls, distinct URLs handed out (each one is a separate
+cache entry for browsers/CDNs) and per-request latency.
+
+Usage: python scripts/bench_presign.py [--requests 5000] [--images 20]
+"""
+import argparse
+import random
+
+from benchlib import moto_env, print_table, summarize, timed
+from common import presign
+from common.aws_clients import s3_client
+
+
+def run(requests, images, seed=7):
+    rows = []
+    with moto_env():
+        s3 = s3_client()
+        keys = [f"images/bench-{i}" for i in range(images)]
+        pattern = random.Random(seed).choices(keys, k=requests)
+
+        def per_request(key):
+            return s3.generate_presigned_url(ClientMethod="get_object",
+                                             Params={"Bucket": "test-bucket", "Key": key}, ExpiresIn=3600)
+
+        def bucketed(key):
+            return presign.presigned_get(s3, {"Bucket": "test-bucket", "Key": key})[0]
+
+        for name, fn in (("per request", per_request), ("bucketed", bucketed)):
+            presign.reset_memo()
+            signs = []
+            s3.meta.events.register("before-sign.s3.GetObject", lambda **kw: signs.append(1),
+                                    unique_id=f"bench-{name}")
+            urls, samples = set(), []
+            for key in pattern:
+                url, ms = timed(fn, key)
+                urls.add(url)
+                samples.append(ms)
+            s3.meta.events.unregister("before-sign.s3.GetObject", unique_id=f"bench-{name}")
+            stats = summarize(samples)
+            rows.append({"strategy": name, "sign_calls": len(signs), "distinct_urls": len(urls),
+                         "mean_ms": stats["mean_ms"], "p95_ms": stats["p95_ms"]})
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--images", type=int, default=20)
+    args = ap.parse_args()
+    print_table(run(args.requests, args.images), ["strategy", "sign_calls", "distinct_urls", "mean_ms", "p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Rendition cost for large originals: naive full decode + per-variant resize
+vs. common.renditions.render (JPEG draft decode, reduce(), cascading
+thumbnails).
+
+Pillow allocates pixel buffers outside the Python allocator, so decoded
+memory is reported as the size of the decoded frame (w x h x bands) rather
+than via tracemalloc.
+
+Usage: python scripts/bench_renditions.py [--megapixels 3 12 24] [--repeat 5]
+"""
+import argparse
+import io
+
+from benchlib import print_table, summarize, timed
+from common.renditions import _encode, _open_reduced, render, variant_specs
+
+MB = 1024 * 1024
+
+
+def _jpeg(megapixels):
+    from PIL import Image
+
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    img = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def naive(data, specs):
+    from PIL import Image
+
+    out = {}
+    for spec in specs:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        img.thumbnail((spec.max_px, spec.max_px))
+        out[spec.name] = _encode(img, spec.fmt)
+    return out
+
+
+def _frame_mb(img):
+    return round(img.width * img.height * len(img.getbands()) / MB, 1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--megapixels", type=float, nargs="+", default=[3, 12, 24])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    from PIL import Image
+
+    specs = list(variant_specs().values())
+    largest = max(s.max_px for s in specs)
+    rows = []
+    for mp in args.megapixels:
+        data = _jpeg(mp)
+        full = Image.open(io.BytesIO(data))
+        full.load()
+        reduced = _open_reduced(data, largest)
+        for name, fn, frame in (("naive", naive, full), ("draft+cascade", render, reduced)):
+            samples = [timed(fn, data, specs)[1] for _ in range(args.repeat)]
+            stats = summarize(samples)
+            rows.append({"megapixels": mp, "path": name, "decoded_frame_mb": _frame_mb(frame),
+                         "p50_ms": stats["p50_ms"], "max_ms": stats["max_ms"]})
+    print_table(rows, ["megapixels", "path", "decoded_frame_mb", "p50_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
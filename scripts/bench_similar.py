@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate lookup (GET /images/{image_id}/similar): recall and latency of
+the banded phash index (common.similarity) against edited copies, next to a
+brute-force Scan of every stored hash.
+
+A corpus of distinct synthetic pictures is indexed, then for --queries of
+them an edited copy is stored and indexed per transform, and the copy's
+/similar lookup must return its original. Per transform:
+
+  mean_d / max_d   phash distance between copy and original
+  within           copies at most --max-distance from their original (what
+                   an exhaustive search at that threshold finds)
+  recall           of those, the share the index returned
+  rows_read        band rows a lookup read (mean)
+  scan_rows        images a Scan reads (all of them)
+  p50_ms / p95_ms  /similar handler latency
+  scan_p50_ms      Scan of all hashes + popcount, the index-free way
+
+rows_read against the corpus size is the number to go by. moto evaluates a
+Query by walking the whole table, so here lookup latency grows with the
+corpus, while DynamoDB only reads the queried partition.
+
+Usage: python scripts/bench_similar.py [--images 300] [--queries 10] [--max-distance 8]
+"""
+import argparse
+import io
+import json
+import random
+from contextlib import contextmanager
+
+from benchlib import moto_env, print_table, summarize, timed
+from common import phash, similarity
+from common.aws_clients import ddb_table
+from common.dynamo import batch_write
+from common.utils import gen_id, now_iso
+from handlers import similar_handler
+
+
+def _picture(seed):
+    from PIL import Image
+
+    rnd = random.Random(seed)
+    small = Image.new("RGB", (8, 6))
+    small.putdata([tuple(rnd.randrange(256) for _ in range(3)) for _ in range(48)])
+    return small.resize((640, 480), Image.Resampling.BICUBIC)
+
+
+def _jpeg(img, quality=90):
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def _transforms():
+    from PIL import ImageEnhance
+
+    return {
+        "resize 50%": lambda im: _jpeg(im.resize((320, 240)), 80),
+        "jpeg q30": lambda im: _jpeg(im, 30),
+        "crop 4%": lambda im: _jpeg(im.crop((13, 10, 627, 470)), 85),
+        "brightness +15%": lambda im: _jpeg(ImageEnhance.Brightness(im).enhance(1.15), 85),
+        "unrelated": None,
+    }
+
+
+def _store(hashes_list):
+    items = [{"image_id": gen_id(), "user_id": "bench", "title": "t", "tags": ["bench"],
+              "s3_bucket": "test-bucket", "s3_key": "images/x", "created_at": now_iso()} for _ in hashes_list]
+    batch_write([("images", {"PutRequest": {"Item": it}}) for it in items])
+    for item, hashes in zip(items, hashes_list):
+        similarity.index(item, hashes)
+    return [it["image_id"] for it in items]
+
+
+@contextmanager
+def _count_rows(counter):
+    original = similarity._candidates
+
+    def counting(band):
+        rows = original(band)
+        counter.append(len(rows))
+        return rows
+
+    similarity._candidates = counting
+    try:
+        yield
+    finally:
+        similarity._candidates = original
+
+
+def _scan_nearest(query_hash, max_distance):
+    tbl, kwargs, out = ddb_table("images"), {"ProjectionExpression": "image_id, phash"}, []
+    while True:
+        resp = tbl.scan(**kwargs)
+        out += [it["image_id"] for it in resp["Items"]
+                if it.get("phash") and similarity.distance(query_hash, it["phash"]) <= max_distance]
+        if "LastEvaluatedKey" not in resp:
+            return out
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", type=int, default=300)
+    ap.add_argument("--queries", type=int, default=10)
+    ap.add_argument("--max-distance", type=int, default=similarity.DEFAULT_MAX_DISTANCE)
+    args = ap.parse_args()
+
+    with moto_env():
+        corpus = [_jpeg(_picture(n)) for n in range(args.images)]
+        corpus_hashes = phash.compute_many(corpus)
+        ids = _store(corpus_hashes)
+        stored, rows = len(ids), []
+        for name, transform in _transforms().items():
+            distances, found, within, lat, scan, read = [], 0, 0, [], [], []
+            for q in range(args.queries):
+                data = _jpeg(_picture(10 ** 6 + q)) if transform is None else transform(_picture(q))
+                h = phash.compute(data)
+                copy_id, = _store([h])
+                stored += 1
+                d = similarity.distance(h["phash"], corpus_hashes[q]["phash"])
+                distances.append(d)
+                event = {"pathParameters": {"image_id": copy_id},
+                         "queryStringParameters": {"max_distance": str(args.max_distance), "limit": "100"}}
+                with _count_rows(read):
+                    resp, ms = timed(similar_handler.handler, event, None)
+                lat.append(ms)
+                returned = {it["image_id"] for it in json.loads(resp["body"])["items"]}
+                if d <= args.max_distance:
+                    within += 1
+                    found += ids[q] in returned
+                if q < 5:
+                    scan.append(timed(_scan_nearest, h["phash"], args.max_distance)[1])
+            stats, scan_stats = summarize(lat), summarize(scan)
+            rows.append({"transform": name, "mean_d": round(sum(distances) / len(distances), 1),
+                         "max_d": max(distances), "within": f"{within}/{len(distances)}",
+                         "recall": f"{100 * found / within:.0f}%" if within else "-",
+                         "rows_read": round(sum(read) / args.queries, 1), "scan_rows": stored,
+                         "p50_ms": stats["p50_ms"], "p95_ms": stats["p95_ms"], "scan_p50_ms": scan_stats["p50_ms"]})
+    print_table(rows, ["transform", "mean_d", "max_d", "within", "recall", "rows_read", "scan_rows",
+                       "p50_ms", "p95_ms", "scan_p50_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Memory/latency of the upload data path: one-shot decode + sha256 + put_object
+vs. streaming decode into a parallel multipart upload (common.streaming).
+
+Peak memory is measured with tracemalloc around the data path only (the base64
+input string is allocated beforehand, as it already is in the Lambda event).
+By default S3 is a sink that discards bytes after a simulated transfer delay,
+so moto's own in-memory object storage does not pollute the numbers; use
+--backend moto to run against moto instead.
+
+Usage: python scripts/bench_streaming_upload.py [--sizes-mb 1 5 10 25 50] [--mbps 200]
+"""
+import argparse
+import base64
+import json
+import os
+import time
+import tracemalloc
+
+from benchlib import moto_env, print_table
+from common.aws_clients import s3_client
+from common.streaming import stream_b64_to_s3
+from common.utils import decode_b64, sha256_hex
+
+MB = 1024 * 1024
+
+
+class SinkS3:
+    """Accepts uploads, keeps nothing, sleeps len/throughput per request."""
+
+    def __init__(self, mbps):
+        self.delay_per_byte = 1.0 / (mbps * MB) if mbps else 0.0
+
+    def _transfer(self, body):
+        time.sleep(len(body) * self.delay_per_byte)
+
+    def put_object(self, Body, **kw):
+        self._transfer(Body)
+        return {"ETag": '"x"'}
+
+    def create_multipart_upload(self, **kw):
+        return {"UploadId": "u"}
+
+    def upload_part(self, Body, PartNumber, **kw):
+        self._transfer(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, **kw):
+        return {}
+
+    def abort_multipart_upload(self, **kw):
+        return {}
+
+
+def _one_shot(s3, data):
+    body = decode_b64(data)
+    checksum = sha256_hex(body)
+    s3.put_object(Bucket="test-bucket", Key="images/bench", Body=body, ContentType="image/png")
+    return len(body), checksum
+
+
+def _streaming(s3, data, part_size, concurrency):
+    return stream_b64_to_s3(s3, "test-bucket", "images/bench", data, "image/png",
+                            part_size=part_size, concurrency=concurrency)
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    ms = (time.perf_counter() - t0) * 1000.0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ms, peak / MB
+
+
+def run(sizes_mb, s3, part_size, concurrency):
+    rows = []
+    for n in sizes_mb:
+        data = base64.b64encode(os.urandom(int(n * MB))).decode()
+        for name, fn in (("one-shot put_object", lambda: _one_shot(s3, data)),
+                         (f"multipart {part_size // MB}MBx{concurrency}",
+                          lambda: _streaming(s3, data, part_size, concurrency))):
+            ms, peak = _measure(fn)
+            rows.append({"size_mb": n, "path": name, "wall_ms": round(ms, 1), "peak_mb": round(peak, 1)})
+        del data
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 5, 10, 25, 50])
+    ap.add_argument("--part-size-mb", type=int, default=8)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--mbps", type=float, default=200.0, help="simulated S3 throughput per request (sink backend)")
+    ap.add_argument("--backend", choices=["sink", "moto"], default="sink")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    part_size = args.part_size_mb * MB
+
+    if args.backend == "moto":
+        with moto_env():
+            rows = run(args.sizes_mb, s3_client(), part_size, args.concurrency)
+    else:
+        rows = run(args.sizes_mb, SinkS3(args.mbps), part_size, args.concurrency)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, ["size_mb", "path", "wall_ms", "peak_mb"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Hot-tag load test: uploads and listings that all carry one tag, run
+concurrently against DynamoDB with per-partition throughput limits, with
+tag write sharding off and on (see src/common/tag_shards.py).
+
+moto has no throughput limits, so PartitionThrottle stands in for them. It
+keeps a token bucket per image_tags partition (DynamoDB allows ~1000 WCU and
+3000 RCU per partition per second; the defaults here are scaled down to what
+an in-process moto run can push). A request that would overdraw a partition
+gets ProvisionedThroughputExceededException, which the clients retry
+with backoff (AWS_RETRY_MODE / AWS_MAX_ATTEMPTS), exactly as against
+DynamoDB. Requests still failing after the last attempt are errors.
+It wraps moto's request dispatch rather than registering a botocore hook
+(botocore runs every before-send handler, so moto would still serve a
+throttled request). moto's DynamoDB backend is not thread-safe either
+(TransactWriteItems deep-copies the tables), so admitted requests are
+served one at a time, like a single local node.
+
+Usage: python scripts/bench_tag_sharding.py [--requests 200] [--concurrency 8] [--shards 8]
+                                            [--partition-wcu 10] [--partition-rcu 10]
+"""
+import argparse
+import io
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchlib import TAGS_TABLE, moto_env, print_table, summarize, timed, upload_event
+from botocore.awsrequest import AWSResponse
+from common import tag_shards
+from common.tags import split_shard_key
+from handlers import list_handler, upload_handler
+from moto.core.models import BotocoreStubber
+
+HOT_TAG = "sunset"
+# write units per item: transactional writes cost double
+WRITE_COST = {"PutItem": 1, "DeleteItem": 1, "UpdateItem": 1, "BatchWriteItem": 1, "TransactWriteItems": 2}
+
+
+class _Raw(io.BytesIO):
+    def stream(self, **kwargs):
+        yield self.read()
+
+
+class PartitionThrottle:
+    """Per-partition token buckets on `table` (keyed by `key_attr`), enforced in front of moto while entered."""
+
+    def __init__(self, table: str, key_attr: str, wcu: float, rcu: float):
+        self.table, self.key_attr = table, key_attr
+        self.rates = {"w": wcu, "r": rcu}
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.serial = threading.Lock()
+        self.throttled = Counter()
+        self.units = Counter()
+
+    def __enter__(self):
+        self._dispatch = BotocoreStubber.__call__
+        throttle = self
+
+        def dispatch(stubber, event_name, request, **kwargs):
+            return throttle._before_send(stubber, event_name, request, **kwargs)
+        BotocoreStubber.__call__ = dispatch
+        return self
+
+    def __exit__(self, *exc):
+        BotocoreStubber.__call__ = self._dispatch
+
+    def _partitions(self, op: str, body: dict):
+        """(kind, partition, units) charged by one request on self.table."""
+        if op == "Query" and body.get("TableName") == self.table and not body.get("IndexName"):
+            values = body.get("ExpressionAttributeValues", {})
+            if ":k" in values:  # common.dynamo.query_page's key condition
+                yield "r", values[":k"]["S"], 1
+        elif op in ("PutItem", "DeleteItem", "UpdateItem") and body.get("TableName") == self.table:
+            yield "w", (body.get("Item") or body.get("Key"))[self.key_attr]["S"], WRITE_COST[op]
+        elif op == "TransactWriteItems":
+            for action in body.get("TransactItems", []):
+                for spec in action.values():
+                    if spec.get("TableName") == self.table:
+                        yield "w", (spec.get("Item") or spec.get("Key"))[self.key_attr]["S"], WRITE_COST[op]
+        elif op == "BatchWriteItem":
+            for req in body.get("RequestItems", {}).get(self.table, []):
+                row = req.get("PutRequest", {}).get("Item") or req.get("DeleteRequest", {}).get("Key")
+                yield "w", row[self.key_attr]["S"], WRITE_COST[op]
+
+    def _take(self, charges) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            wanted = Counter()
+            for kind, partition, units in charges:
+                wanted[(kind, partition)] += units
+            levels = {}
+            for (kind, partition), units in wanted.items():
+                rate = self.rates[kind]
+                level, last = self.buckets.get((kind, partition), (rate, now))
+                level = min(rate, level + (now - last) * rate)  # one second of burst
+                if level < units:
+                    self.throttled[partition] += 1
+                    return False
+                levels[(kind, partition)] = level - units
+            for key, level in levels.items():
+                self.buckets[key] = (level, now)
+                self.units[key[1]] += wanted[key]
+            return True
+
+    def _before_send(self, stubber, event_name, request, **kwargs):
+        if not event_name.startswith("before-send.dynamodb."):
+            return self._dispatch(stubber, event_name, request, **kwargs)
+        target = request.headers.get("X-Amz-Target") or b""
+        op = (target.decode() if isinstance(target, bytes) else target).rpartition(".")[2]
+        body = request.body
+        charges = list(self._partitions(op, json.loads(body))) if body and (op in WRITE_COST or op == "Query") else []
+        if not charges or self._take(charges):
+            with self.serial:
+                return self._dispatch(stubber, event_name, request, **kwargs)
+        error = json.dumps({"__type": "com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException",
+                            "message": "The level of configured provisioned throughput for the table was exceeded."})
+        return AWSResponse(request.url, 400, {"Content-Type": "application/x-amz-json-1.0"}, _Raw(error.encode()))
+
+
+def _workload(requests: int, list_every: int):
+    for i in range(requests):
+        if i % list_every == list_every - 1:
+            yield "list", list_handler.handler, {"queryStringParameters": {"tag": HOT_TAG, "limit": "20"}}
+        else:
+            yield "upload", upload_handler.handler, upload_event(tags=(HOT_TAG, f"t{i % 50}"))
+
+
+def run(requests: int, concurrency: int, shards: int, wcu: float, rcu: float, list_every: int):
+    rows = []
+    for config in ("unsharded", f"{shards} shards"):
+        sharded = config != "unsharded"
+        os.environ["TAG_SHARDING"] = "1" if sharded else "0"
+        tag_shards.reset_shard_cache()
+        with moto_env(), PartitionThrottle(TAGS_TABLE, "tag", wcu, rcu) as throttle:
+            if sharded:
+                tag_shards.set_shards(HOT_TAG, shards)
+            samples, statuses = {"upload": [], "list": []}, Counter()
+
+            def one(work):
+                endpoint, handler, event = work
+                resp, ms = timed(handler, event, None)
+                return endpoint, resp["statusCode"], ms
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for endpoint, status, ms in pool.map(one, _workload(requests, list_every)):
+                    samples[endpoint].append(ms)
+                    statuses[(endpoint, status >= 500)] += 1
+            wall = time.perf_counter() - t0
+            hot = {p: n for p, n in throttle.units.items() if split_shard_key(p)[0] == HOT_TAG}
+            for endpoint, ms in samples.items():
+                stats = summarize(ms)
+                rows.append({"config": config, "endpoint": endpoint, "n": stats["n"],
+                             "errors": statuses[(endpoint, True)], "per_sec": round(stats["n"] / wall, 1),
+                             "p50_ms": stats["p50_ms"], "p95_ms": stats["p95_ms"], "p99_ms": stats["p99_ms"],
+                             "throttled": sum(n for p, n in throttle.throttled.items()
+                                              if split_shard_key(p)[0] == HOT_TAG),
+                             "partitions": len(hot),
+                             "hottest_share": round(max(hot.values()) / sum(hot.values()), 2) if hot else 0})
+    os.environ.pop("TAG_SHARDING", None)
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--shards", type=int, default=8)
+    ap.add_argument("--partition-wcu", type=float, default=10.0)
+    ap.add_argument("--partition-rcu", type=float, default=10.0)
+    ap.add_argument("--list-every", type=int, default=4, help="every Nth request lists the hot tag")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    rows = run(args.requests, args.concurrency, args.shards, args.partition_wcu, args.partition_rcu, args.list_every)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, ["config", "endpoint", "n", "errors", "per_sec", "p50_ms", "p95_ms", "p99_ms",
+                           "throttled", "partitions", "hottest_share"])
+
+
+if __name__ == "__main__":
+    main()
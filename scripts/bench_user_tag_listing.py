@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Combined user_id + tag listing: old in-memory intersection of one tag page and
+one user page vs. a single Query on the user_tag-index GSI.
+
+For each user library size, 5% of the user's images carry the searched tag and
+other users share that tag too. Reports page latency and how many of the
+expected `limit` matches each strategy actually returned.
+
+Usage: python scripts/bench_user_tag_listing.py [--sizes 100 1000 5000] [--limit 20]
+"""
+import argparse
+import json
+
+from benchlib import moto_env, timed, summarize, print_table
+from boto3.dynamodb.conditions import Key
+from common.aws_clients import ddb_table
+from common.tags import tag_row
+from common.utils import gen_id, now_iso
+from handlers import list_handler
+
+
+def _seed(user_id, n, tag, every=20, noise_users=3):
+    images, tags = ddb_table("images"), ddb_table("image_tags")
+    with images.batch_writer() as ib, tags.batch_writer() as tb:
+        for owner, count in [(user_id, n)] + [(f"other{i}", n // 4) for i in range(noise_users)]:
+            for i in range(count):
+                iid, created = gen_id(), now_iso()
+                t = [tag] if i % every == 0 else ["misc"]
+                ib.put_item(Item={"image_id": iid, "user_id": owner, "title": "t", "tags": t, "created_at": created})
+                for tg in t:
+                    tb.put_item(Item=tag_row(tg, iid, owner, created))
+
+
+def _old_intersection(user_id, tag, limit):
+    resp = ddb_table("image_tags").query(KeyConditionExpression=Key("tag").eq(tag), Limit=limit)
+    tag_ids = {r["image_id"] for r in resp.get("Items", [])}
+    user_q = ddb_table("images").query(IndexName="user_id-index",
+                                       KeyConditionExpression=Key("user_id").eq(user_id), Limit=limit)
+    return [it for it in user_q.get("Items", []) if it["image_id"] in tag_ids]
+
+
+def _index_query(user_id, tag, limit):
+    r = list_handler.handler({"queryStringParameters": {"user_id": user_id, "tag": tag, "limit": str(limit)}}, None)
+    return json.loads(r["body"])["items"]
+
+
+def run(sizes, limit, repeat):
+    rows = []
+    for n in sizes:
+        with moto_env():
+            user = f"user{n}"
+            _seed(user, n, "rare")
+            expected = min(limit, len(range(0, n, 20)))
+            for name, fn in (("intersection (old)", _old_intersection), ("user_tag-index", _index_query)):
+                samples, got = [], 0
+                for _ in range(repeat):
+                    items, ms = timed(fn, user, "rare", limit)
+                    samples.append(ms)
+                    got = len(items)
+                s = summarize(samples)
+                rows.append({"library": n, "strategy": name, "returned": got, "expected": expected,
+                             "p50_ms": s["p50_ms"], "p95_ms": s["p95_ms"]})
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    ap.add_argument("--limit", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    rows = run(args.sizes, args.limit, args.repeat)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, ["library", "strategy", "returned", "expected", "p50_ms", "p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
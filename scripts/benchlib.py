@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# Shared helpers for the scripts/bench_*.py micro-benchmarks.
+# Sets up an in-process moto environment mirroring tests/conftest.py so the
+# handlers can be exercised without LocalStack.
+import os
+import sys
+import json
+import time
+import base64
+import statistics
+from contextlib import contextmanager
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for p in (ROOT, os.path.join(ROOT, "src")):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+# tests/conftest.py owns the table/bucket definitions; reuse them so the
+# benchmarks always run against the same schema as the unit tests.
+from tests.conftest import (BUCKET_NAME, IMAGES_TABLE, TAGS_TABLE, BLOBS_TABLE, IDEMPOTENCY_TABLE,  # noqa: E402
+                            TAG_DICTIONARY_TABLE, PHASH_BANDS_TABLE, _create_s3_bucket, _create_tables)
+
+os.environ["S3_BUCKET_NAME"] = BUCKET_NAME
+os.environ["IMAGES_TABLE_NAME"] = IMAGES_TABLE
+os.environ["IMAGE_TAGS_TABLE_NAME"] = TAGS_TABLE
+os.environ["IMAGE_BLOBS_TABLE_NAME"] = BLOBS_TABLE
+os.environ["IDEMPOTENCY_TABLE_NAME"] = IDEMPOTENCY_TABLE
+os.environ["TAG_DICTIONARY_TABLE_NAME"] = TAG_DICTIONARY_TABLE
+os.environ["PHASH_BANDS_TABLE_NAME"] = PHASH_BANDS_TABLE
+
+from moto import mock_aws  # noqa: E402
+
+from common.aws_clients import reset_clients  # noqa: E402
+
+
+def create_resources():
+    _create_s3_bucket()
+    _create_tables()
+
+
+@contextmanager
+def moto_env():
+    m = mock_aws()
+    m.start()
+    reset_clients()
+    try:
+        create_resources()
+        yield
+    finally:
+        m.stop()
+        reset_clients()
+
+
+def upload_event(user_id="bench", tags=("bench",), payload=b"\x89PNG\r\n\x1a\n" + b"0" * 64, title="t"):
+    return {"body": json.dumps({
+        "user_id": user_id,
+        "title": title,
+        "tags": list(tags),
+        "content_type": "image/png",
+        "image_base64": base64.b64encode(payload).decode(),
+    })}
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def summarize(samples_ms):
+    s = sorted(samples_ms)
+    pick = lambda q: s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+    return {
+        "n": len(s),
+        "mean_ms": round(statistics.fmean(s), 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "max_ms": round(s[-1], 3),
+    }
+
+
+class CallCounter:
+    """Counts botocore API calls per operation via the 'before-call' event."""
+
+    def __init__(self, *clients):
+        self.calls = {}
+        for c in clients:
+            c.meta.events.register("before-call.*.*", self._on_call)
+
+    def _on_call(self, model, **kwargs):
+        self.calls[model.name] = self.calls.get(model.name, 0) + 1
+
+    def reset(self):
+        self.calls.clear()
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(c)), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(str(r.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
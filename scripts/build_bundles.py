@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Build one slim Lambda zip per handler instead of a single lambda.zip of the
+whole src/ tree.
+
+dist/<handler>.zip holds the handler module plus the src/common modules it
+imports, followed transitively (imports inside functions included, so lazily
+imported modules are still packaged). boto3/botocore come from the Lambda
+runtime. A third-party package vendored into src/ (e.g. Pillow for the
+rendition path) goes, whole, only into the bundles that import it. Entries
+carry a fixed timestamp, so an unchanged bundle is byte-identical and Lambda
+sees the same CodeSha256.
+
+Every module also goes in precompiled (__pycache__/*.pyc, unchecked-hash
+pycs, so they are used whatever mtime the files get on extraction). /var/task
+is read-only, so without them each cold start compiles every module from
+source, several times the cost of loading the bytecode. A pyc is only used by
+the Python version that wrote it, so the build refuses to run when the
+--python interpreter (default: this one) is not the --runtime's version.
+
+Usage: python scripts/build_bundles.py [--out dist] [--python python3.9] [--runtime python3.9] [handler ...]
+"""
+import argparse
+import ast
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+from typing import List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+LOCAL_PACKAGES = ("common", "handlers")
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+TASK_ROOT = "/var/task"
+DEFAULT_RUNTIME = "python3.9"
+
+
+def _module_file(name: str) -> Optional[str]:
+    base = os.path.join(SRC, *name.split("."))
+    for path in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _imported_modules(path: str) -> List[str]:
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(a.name for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+            # `from common import blobs` imports a submodule
+            names.extend(f"{node.module}.{a.name}" for a in node.names)
+    return [n for n in names if _module_file(n)]
+
+
+def _package_files(top: str) -> List[str]:
+    path = os.path.join(SRC, top)
+    if not os.path.isdir(path):
+        return [os.path.relpath(_module_file(top), SRC)]
+    out = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+        out.extend(os.path.relpath(os.path.join(dirpath, f), SRC) for f in filenames)
+    return out
+
+
+def bundle_files(handler: str) -> List[str]:
+    """src-relative paths of every file the handler module needs, sorted."""
+    todo, seen, vendored = [f"handlers.{handler}"], set(), set()
+    while todo:
+        name = todo.pop()
+        if name.split(".")[0] not in LOCAL_PACKAGES:
+            vendored.add(name.split(".")[0])
+            continue
+        if name in seen:
+            continue
+        seen.add(name)
+        parts = name.split(".")
+        # importing a.b runs a/__init__.py first
+        todo.extend(".".join(parts[:i]) for i in range(1, len(parts)))
+        todo.extend(_imported_modules(_module_file(name)))
+    files = {os.path.relpath(_module_file(n), SRC) for n in seen}
+    for top in vendored:
+        files.update(_package_files(top))
+    return sorted(files)
+
+
+def handlers() -> List[str]:
+    return sorted(f[:-3] for f in os.listdir(os.path.join(SRC, "handlers"))
+                  if f.endswith("_handler.py"))
+
+
+def _compiled(files: List[str], python: str, tmp: str) -> List[str]:
+    """Write unchecked-hash pycs of `files` (src-relative) under `tmp`; their tmp-relative paths."""
+    for rel in files:
+        os.makedirs(os.path.dirname(os.path.join(tmp, rel)), exist_ok=True)
+        shutil.copyfile(os.path.join(SRC, rel), os.path.join(tmp, rel))
+    env = {k: v for k, v in os.environ.items() if k not in ("PYTHONPYCACHEPREFIX", "PYTHONDONTWRITEBYTECODE")}
+    subprocess.run([python, "-m", "compileall", "-q", "--invalidation-mode", "unchecked-hash", "-d", TASK_ROOT, "."],
+                   cwd=tmp, env=env, check=True, stdout=subprocess.DEVNULL)
+    out = []
+    for dirpath, _, filenames in os.walk(tmp):
+        out.extend(os.path.relpath(os.path.join(dirpath, f), tmp) for f in filenames if f.endswith(".pyc"))
+    return out
+
+
+def interpreter_runtime(python: str) -> str:
+    """Lambda runtime name ("python3.9") matching the interpreter `python`."""
+    out = subprocess.run([python, "-c", "import sys; print('python%d.%d' % sys.version_info[:2])"],
+                         check=True, capture_output=True, text=True)
+    return out.stdout.strip()
+
+
+def build(handler: str, out_dir: str, python: Optional[str] = None) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    target = os.path.join(out_dir, f"{handler}.zip")
+    files = bundle_files(handler)
+    with tempfile.TemporaryDirectory() as tmp:
+        entries = [(rel, os.path.join(SRC, rel)) for rel in files]
+        entries += [(rel, os.path.join(tmp, rel))
+                    for rel in _compiled([f for f in files if f.endswith(".py")], python or sys.executable, tmp)]
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zf:
+            for rel, path in sorted(entries):
+                info = zipfile.ZipInfo(rel.replace(os.sep, "/"), ZIP_DATE)
+                info.external_attr = 0o644 << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(path, "rb") as f:
+                    zf.writestr(info, f.read())
+    return target
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("handlers", nargs="*", help="handler modules (default: all src/handlers/*_handler.py)")
+    ap.add_argument("--out", default=os.path.join(ROOT, "dist"))
+    ap.add_argument("--python", default=os.getenv("LAMBDA_PYTHON", sys.executable),
+                    help="interpreter of the Lambda runtime, which compiles the bundled pycs")
+    ap.add_argument("--runtime", default=os.getenv("LAMBDA_RUNTIME", DEFAULT_RUNTIME),
+                    help="Lambda runtime the bundles are deployed to")
+    args = ap.parse_args()
+    try:
+        found = interpreter_runtime(args.python)
+    except (OSError, subprocess.CalledProcessError) as e:
+        sys.exit(f"cannot run {args.python}: {e}")
+    if found != args.runtime:
+        sys.exit(f"{args.python} is {found}, but the bundles are for {args.runtime}: its pycs would be ignored "
+                 f"(pass --python/LAMBDA_PYTHON with a {args.runtime} interpreter)")
+    for name in args.handlers or handlers():
+        if not _module_file(f"handlers.{name}"):
+            sys.exit(f"unknown handler: {name}")
+        path = build(name, args.out, args.python)
+        print(f"{os.path.relpath(path, ROOT)}: {len(bundle_files(name))} files, {os.path.getsize(path)} bytes")
+
+
+if __name__ == "__main__":
+    main()
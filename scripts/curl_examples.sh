@@ -25,16 +25,23 @@ JSON
     curl -s "${BASE}/images?user_id=${USER}" ;;
   list_tag)
     TAG=${2}
-    curl -s "${BASE}/images?tag=${TAG}" ;;
+    MATCH=${3:-all}
+    curl -s "${BASE}/images?tag=${TAG}&match=${MATCH}" ;;
+  tags)
+    PREFIX=${2}
+    curl -s "${BASE}/tags?prefix=${PREFIX}" ;;
   get)
     ID=${2}
     curl -s "${BASE}/images/${ID}" ;;
   download)
     ID=${2}
     curl -s "${BASE}/images/${ID}/download" ;;
+  similar)
+    ID=${2}
+    curl -s "${BASE}/images/${ID}/similar" ;;
   delete)
     ID=${2}
     curl -s -X DELETE "${BASE}/images/${ID}" ;;
   *)
-    echo "Usage: $0 [upload <img_path>|list_user <user>|list_tag <tag>|get <id>|download <id>|delete <id>]" ;;
+    echo "Usage: $0 [upload <img_path>|list_user <user>|list_tag <tag[,tag...]> [all|any]|tags <prefix>|get <id>|download <id>|similar <id>|delete <id>]" ;;
  esac
@@ -7,6 +7,18 @@ ACCOUNT_ID=000000000000
 BUCKET=image-service-bucket
 IMAGES_TABLE=images
 TAGS_TABLE=image_tags
+BLOBS_TABLE=image_blobs
+IDEMPOTENCY_TABLE=image_idempotency
+TAG_DICTIONARY_TABLE=image_tag_dictionary
+PHASH_BANDS_TABLE=image_phash_bands
+DEDUP_ENABLED=${DEDUP_ENABLED:-0}
+IMAGE_VALIDATION=${IMAGE_VALIDATION:-1}
+SIMILARITY_INDEX=${SIMILARITY_INDEX:-1}
+RENDITION_FUNCTION=images-rendition
+PAGINATION_SECRET=${PAGINATION_SECRET:-$(openssl rand -hex 32)}
+LAMBDA_RUNTIME=python3.9
+# compiles the bundled pycs, so it must be a ${LAMBDA_RUNTIME} interpreter
+LAMBDA_PYTHON=${LAMBDA_PYTHON:-python3.9}
 API_NAME=images-api
 STAGE=dev
 
@@ -30,12 +42,47 @@ awslocal dynamodb create-table \
   --billing-mode PAY_PER_REQUEST \
   --global-secondary-indexes 'IndexName=user_id-index,KeySchema=[{AttributeName=user_id,KeyType=HASH},{AttributeName=created_at,KeyType=RANGE}],Projection={ProjectionType=ALL}' || true
 
+awslocal dynamodb create-table \
+  --table-name ${BLOBS_TABLE} \
+  --attribute-definitions AttributeName=checksum,AttributeType=S \
+  --key-schema AttributeName=checksum,KeyType=HASH \
+  --billing-mode PAY_PER_REQUEST || true
+
+awslocal dynamodb create-table \
+  --table-name ${IDEMPOTENCY_TABLE} \
+  --attribute-definitions AttributeName=idempotency_key,AttributeType=S \
+  --key-schema AttributeName=idempotency_key,KeyType=HASH \
+  --billing-mode PAY_PER_REQUEST || true
+awslocal dynamodb update-time-to-live --table-name ${IDEMPOTENCY_TABLE} \
+  --time-to-live-specification Enabled=true,AttributeName=expires_at >/dev/null || true
+
+# pending direct-to-S3 uploads expire through TTL
+awslocal dynamodb update-time-to-live --table-name ${IMAGES_TABLE} \
+  --time-to-live-specification Enabled=true,AttributeName=expires_at >/dev/null || true
+
 awslocal dynamodb create-table \
   --table-name ${TAGS_TABLE} \
   --attribute-definitions \
     AttributeName=tag,AttributeType=S \
     AttributeName=image_id,AttributeType=S \
+    AttributeName=user_tag,AttributeType=S \
+    AttributeName=created_at,AttributeType=S \
   --key-schema AttributeName=tag,KeyType=HASH AttributeName=image_id,KeyType=RANGE \
+  --billing-mode PAY_PER_REQUEST \
+  --global-secondary-indexes 'IndexName=user_tag-index,KeySchema=[{AttributeName=user_tag,KeyType=HASH},{AttributeName=created_at,KeyType=RANGE}],Projection={ProjectionType=KEYS_ONLY}' || true
+
+# tag autocomplete: bucket = first character of the tag, one row per tag with its image count
+awslocal dynamodb create-table \
+  --table-name ${TAG_DICTIONARY_TABLE} \
+  --attribute-definitions AttributeName=bucket,AttributeType=S AttributeName=tag,AttributeType=S \
+  --key-schema AttributeName=bucket,KeyType=HASH AttributeName=tag,KeyType=RANGE \
+  --billing-mode PAY_PER_REQUEST || true
+
+# near-duplicate lookup: one row per 16-bit band of an image's perceptual hash
+awslocal dynamodb create-table \
+  --table-name ${PHASH_BANDS_TABLE} \
+  --attribute-definitions AttributeName=band,AttributeType=S AttributeName=image_id,AttributeType=S \
+  --key-schema AttributeName=band,KeyType=HASH AttributeName=image_id,KeyType=RANGE \
   --billing-mode PAY_PER_REQUEST || true
 
 # --- IAM role & inline policy for Lambda ---
@@ -48,30 +95,62 @@ POLICY_DOC='{
   "Statement": [
     {"Effect":"Allow","Action":["logs:CreateLogGroup","logs:CreateLogStream","logs:PutLogEvents"],"Resource":"*"},
     {"Effect":"Allow","Action":["dynamodb:*"],"Resource":"*"},
-    {"Effect":"Allow","Action":["s3:*"],"Resource":"*"}
+    {"Effect":"Allow","Action":["s3:*"],"Resource":"*"},
+    {"Effect":"Allow","Action":["lambda:InvokeFunction"],"Resource":"*"}
   ]
 }'
 awslocal iam put-role-policy --role-name ${ROLE_NAME} --policy-name lambda-inline --policy-document "${POLICY_DOC}" || true
 
-# --- Build lambda zip (if not already) ---
-[ -f lambda.zip ] || (cd src && zip -r ../lambda.zip . >/dev/null)
+# --- Build per-handler bundles (always, so a stale dist/ is never deployed) ---
+# renditions (and phash indexing) need Pillow and NumPy; vendor them next to the sources (or attach them as layers)
+rm -rf dist
+python3 scripts/build_bundles.py --out dist --python "${LAMBDA_PYTHON}" --runtime "${LAMBDA_RUNTIME}"
 
 # --- Create Lambda functions ---
 create_lambda() {
-  local NAME=$1 HANDLER=$2
+  local NAME=$1 HANDLER=$2 TIMEOUT=${3:-30}
+  # handlers.list_handler.handler -> dist/list_handler.zip
+  local BUNDLE=dist/$(echo ${HANDLER} | cut -d. -f2).zip
   awslocal lambda create-function \
     --function-name ${NAME} \
-    --runtime python3.9 \
+    --runtime ${LAMBDA_RUNTIME} \
     --role arn:aws:iam::${ACCOUNT_ID}:role/${ROLE_NAME} \
     --handler ${HANDLER} \
-    --zip-file fileb://lambda.zip \
-    --timeout 30 \
-    --environment "Variables={S3_BUCKET_NAME=${BUCKET},IMAGES_TABLE_NAME=${IMAGES_TABLE},IMAGE_TAGS_TABLE_NAME=${TAGS_TABLE},AWS_REGION=${REGION},AWS_ENDPOINT_URL=http://localstack:4566}" || true
+    --zip-file fileb://${BUNDLE} \
+    --timeout ${TIMEOUT} \
+    --environment "Variables={S3_BUCKET_NAME=${BUCKET},IMAGES_TABLE_NAME=${IMAGES_TABLE},IMAGE_TAGS_TABLE_NAME=${TAGS_TABLE},IMAGE_BLOBS_TABLE_NAME=${BLOBS_TABLE},IDEMPOTENCY_TABLE_NAME=${IDEMPOTENCY_TABLE},TAG_DICTIONARY_TABLE_NAME=${TAG_DICTIONARY_TABLE},PHASH_BANDS_TABLE_NAME=${PHASH_BANDS_TABLE},DEDUP_ENABLED=${DEDUP_ENABLED},IMAGE_VALIDATION=${IMAGE_VALIDATION},SIMILARITY_INDEX=${SIMILARITY_INDEX},RENDITION_FUNCTION_NAME=${RENDITION_FUNCTION},PAGINATION_SECRET=${PAGINATION_SECRET},AWS_REGION=${REGION},AWS_ENDPOINT_URL=http://localstack:4566}" || true
 }
 create_lambda images-upload handlers.upload_handler.handler
 create_lambda images-list   handlers.list_handler.handler
 create_lambda images-get    handlers.get_handler.handler
 create_lambda images-delete handlers.delete_handler.handler
+create_lambda images-upload-session handlers.upload_session_handler.handler
+create_lambda images-batch-upload handlers.batch_upload_handler.handler
+create_lambda images-bulk-delete handlers.bulk_delete_handler.handler
+create_lambda images-tags   handlers.tags_handler.handler
+create_lambda images-similar handlers.similar_handler.handler
+# invoked asynchronously by the upload paths to render thumbnails/variants
+create_lambda ${RENDITION_FUNCTION} handlers.rendition_handler.handler
+# nightly orphan reconciliation (dry run unless RECONCILE_DELETE=1 is set on the function);
+# resumes from its checkpoint when a sweep does not fit in one invocation
+create_lambda images-reconcile handlers.reconcile_handler.handler 900
+awslocal events put-rule --name images-reconcile-nightly --schedule-expression "cron(0 3 * * ? *)" >/dev/null || true
+awslocal lambda add-permission --function-name images-reconcile --statement-id events-nightly \
+  --action lambda:InvokeFunction --principal events.amazonaws.com \
+  --source-arn arn:aws:events:${REGION}:${ACCOUNT_ID}:rule/images-reconcile-nightly || true
+awslocal events put-targets --rule images-reconcile-nightly \
+  --targets "Id=reconcile,Arn=arn:aws:lambda:${REGION}:${ACCOUNT_ID}:function:images-reconcile" >/dev/null || true
+
+# S3 ObjectCreated -> finalize direct uploads even if the client never calls /complete
+awslocal lambda add-permission --function-name images-upload-session --statement-id s3-object-created \
+  --action lambda:InvokeFunction --principal s3.amazonaws.com --source-arn arn:aws:s3:::${BUCKET} || true
+awslocal s3api put-bucket-notification-configuration --bucket ${BUCKET} --notification-configuration "{
+  \"LambdaFunctionConfigurations\": [{
+    \"LambdaFunctionArn\": \"arn:aws:lambda:${REGION}:${ACCOUNT_ID}:function:images-upload-session\",
+    \"Events\": [\"s3:ObjectCreated:Post\", \"s3:ObjectCreated:Put\"],
+    \"Filter\": {\"Key\": {\"FilterRules\": [{\"Name\": \"prefix\", \"Value\": \"images/\"}]}}
+  }]
+}" || true
 
 # --- API Gateway v1 (REST API) ---
 API_ID=$(awslocal apigateway create-rest-api --name ${API_NAME} --query 'id' --output text || true)
@@ -79,11 +158,15 @@ if [ -z "${API_ID}" ]; then
   API_ID=$(awslocal apigateway get-rest-apis --query "items[?name=='${API_NAME}'].id" --output text || true)
 fi
 echo "API_ID=${API_ID}"
+# compressed (base64) Lambda bodies are decoded back to bytes for any content type; this also
+# base64-encodes every request body (isBase64Encoded), which handlers decode with utils.json_body
+awslocal apigateway update-rest-api --rest-api-id ${API_ID} \
+  --patch-operations op=add,path=/binaryMediaTypes/*~1* >/dev/null || true
 
 # Root resource
 ROOT_ID=$(awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/'].id" --output text)
 
-# Create resource tree: /images, /images/{image_id}, /images/{image_id}/download
+# Create resource tree: /images, /images/{image_id}, /images/{image_id}/download, /images/{image_id}/similar
 IMAGES_ID=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${ROOT_ID} --path-part images --query 'id' --output text || \
             awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/images'].id" --output text)
 
@@ -93,6 +176,31 @@ IMAGE_ID_RES=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --par
 DOWNLOAD_ID=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${IMAGE_ID_RES} --path-part "download" --query 'id' --output text || \
               awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/images/{image_id}/download'].id" --output text)
 
+SIMILAR_ID=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${IMAGE_ID_RES} --path-part "similar" --query 'id' --output text || \
+             awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/images/{image_id}/similar'].id" --output text)
+
+# /images:batch
+BATCH_ID=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${ROOT_ID} --path-part "images:batch" --query 'id' --output text || \
+           awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/images:batch'].id" --output text)
+
+# /images:bulk-delete
+BULK_DELETE_ID=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${ROOT_ID} --path-part "images:bulk-delete" --query 'id' --output text || \
+                 awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/images:bulk-delete'].id" --output text)
+
+# /tags
+TAGS_ID=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${ROOT_ID} --path-part tags --query 'id' --output text || \
+          awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/tags'].id" --output text)
+
+# /images/uploads, /images/uploads/{image_id}/complete
+UPLOADS_ID=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${IMAGES_ID} --path-part uploads --query 'id' --output text || \
+             awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/images/uploads'].id" --output text)
+
+UPLOAD_ID_RES=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${UPLOADS_ID} --path-part "{image_id}" --query 'id' --output text || \
+                awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/images/uploads/{image_id}'].id" --output text)
+
+COMPLETE_ID=$(awslocal apigateway create-resource --rest-api-id ${API_ID} --parent-id ${UPLOAD_ID_RES} --path-part complete --query 'id' --output text || \
+              awslocal apigateway get-resources --rest-api-id ${API_ID} --query "items[?path=='/images/uploads/{image_id}/complete'].id" --output text)
+
 # --- Lambda proxy integration helper (Option A: unique statement-ids per route) ---
 # Args:
 #   $1 = RESOURCE_ID
@@ -139,9 +247,27 @@ put_lambda_proxy ${IMAGE_ID_RES}  GET    images-get     "get-images-metadata"
 # GET /images/{image_id}/download -> images-get (presigned URL)
 put_lambda_proxy ${DOWNLOAD_ID}   GET    images-get     "get-images-download"   "/images/*/download"
 
+# GET /images/{image_id}/similar -> images-similar (near-duplicates)
+put_lambda_proxy ${SIMILAR_ID}    GET    images-similar "get-images-similar"    "/images/*/similar"
+
 # DELETE /images/{image_id} -> images-delete
 put_lambda_proxy ${IMAGE_ID_RES}  DELETE images-delete  "delete-images"         "/*"
 
+# POST /images/uploads -> images-upload-session (presigned POST)
+put_lambda_proxy ${UPLOADS_ID}    POST   images-upload-session "post-uploads"   "/images/uploads"
+
+# POST /images/uploads/{image_id}/complete -> images-upload-session (finalize)
+put_lambda_proxy ${COMPLETE_ID}   POST   images-upload-session "post-complete"  "/images/uploads/*/complete"
+
+# POST /images:batch -> images-batch-upload (many inline uploads / completions per request)
+put_lambda_proxy ${BATCH_ID}      POST   images-batch-upload "post-batch"       "/images:batch"
+
+# POST /images:bulk-delete -> images-bulk-delete (many ids, or a whole user, per request)
+put_lambda_proxy ${BULK_DELETE_ID} POST  images-bulk-delete "post-bulk-delete"  "/images:bulk-delete"
+
+# GET /tags -> images-tags (tag autocomplete with counts)
+put_lambda_proxy ${TAGS_ID}       GET    images-tags    "get-tags"              "/tags"
+
 # --- Deploy & stage ---
 awslocal apigateway create-deployment --rest-api-id ${API_ID} --stage-name ${STAGE} >/dev/null || true
 
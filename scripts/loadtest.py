@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Load test / regression benchmark for the upload, list, get and delete handlers.
+
+Targets:
+  in-process (default): handlers are called directly under moto (benchlib).
+      DynamoDB/S3 calls per request and RSS are measured here.
+  --http BASE: the same events go to a deployed REST API, e.g. LocalStack's
+      http://localhost:4566/restapis/<api_id>/dev/_user_request_
+
+Workloads:
+  synthetic: a seeded mix of endpoints (--mix upload=2,list=4,get=8,...) over a
+      library of --library images uploaded first (unmeasured warmup).
+  recorded: --replay events.jsonl. Each line is {"endpoint", "event"} and
+      optionally "image_ref": k, meaning "the image created by the k-th upload
+      of this stream", which is resolved at replay time, and "warmup": true.
+      --record writes the synthetic stream in this format.
+
+The report lists, per endpoint: requests, errors (5xx or exceptions), p50/p95/p99
+latency, requests/sec achieved in the mix, DynamoDB and S3 calls per request
+(in-process with --concurrency 1 only), and peak RSS sampled after its requests.
+--out writes it as JSON. --compare BASELINE.json exits 1 when p95 or calls per
+request got worse by more than --tolerance, so two commits can be diffed.
+
+Usage:
+  python scripts/loadtest.py --requests 500 --out /tmp/after.json --compare /tmp/before.json
+  python scripts/loadtest.py --record /tmp/mix.jsonl && python scripts/loadtest.py --replay /tmp/mix.jsonl
+  python scripts/loadtest.py --http http://localhost:4566/restapis/$API_ID/dev/_user_request_ --concurrency 8
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchlib import ROOT, moto_env, summarize, upload_event, print_table  # noqa: E402
+
+# endpoint -> (handler module, method, path)
+ENDPOINTS = {
+    "upload": ("upload_handler", "POST", "/images"),
+    "list": ("list_handler", "GET", "/images"),
+    "get": ("get_handler", "GET", "/images/{image_id}"),
+    "download": ("get_handler", "GET", "/images/{image_id}/download"),
+    "delete": ("delete_handler", "DELETE", "/images/{image_id}"),
+}
+DEFAULT_MIX = "upload=2,list=4,get=8,download=2,delete=1"
+TAGS = ["beach", "city", "food", "pets", "sunset", "travel"]
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_DELTA_MS = 2.0
+
+
+def parse_mix(raw: str) -> Dict[str, int]:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint {name!r} (one of {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def path_event(endpoint: str, image_id: str) -> Dict:
+    path = ENDPOINTS[endpoint][2].format(image_id=image_id)
+    return {"pathParameters": {"image_id": image_id}, "rawPath": path}
+
+
+def with_image_id(endpoint: str, event: Dict, image_id: str) -> Dict:
+    return dict(event, **path_event(endpoint, image_id))
+
+
+class Workload:
+    """
+    Event stream plus the state needed to resolve it: ids created by the
+    stream's uploads, in order (image_ref k is the k-th upload's id).
+    Thread-safe: workers take events with next() and report with observe().
+    """
+
+    def __init__(self, lines: Iterator[Dict]):
+        self.lines = lines
+        self.uploaded: Dict[int, str] = {}
+        self.uploads_sent = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def next(self) -> Optional[Tuple[Dict, Dict, Optional[int]]]:
+        """(line, event to send, upload ordinal or None), or None when the stream ends."""
+        with self.lock:
+            for line in self.lines:
+                event = line["event"]
+                if "image_ref" in line:
+                    image_id = self.uploaded.get(line["image_ref"])
+                    if image_id is None:  # its upload failed or is still in flight
+                        self.skipped += 1
+                        continue
+                    event = with_image_id(line["endpoint"], event, image_id)
+                ordinal = None
+                if line["endpoint"] == "upload":
+                    ordinal, self.uploads_sent = self.uploads_sent, self.uploads_sent + 1
+                return line, event, ordinal
+            return None
+
+    def observe(self, ordinal: Optional[int], status: int, body: Optional[str]):
+        if ordinal is None or status != 201:
+            return
+        with self.lock:
+            self.uploaded[ordinal] = json.loads(body)["image_id"]
+
+
+def synthetic(mix: Dict[str, int], requests: int, library: int, seed: int, users: int = 10,
+              payload_bytes: int = 2048) -> Iterator[Dict]:
+    """Seeded synthetic stream: `library` warmup uploads, then `requests` events drawn from `mix`."""
+    rng = random.Random(seed)
+    live: List[int] = []  # image_refs not deleted yet
+    uploads = 0
+    names, weights = list(mix), list(mix.values())
+
+    def upload(warmup: bool) -> Dict:
+        nonlocal uploads
+        live.append(uploads)
+        uploads += 1
+        event = upload_event(user_id=f"user-{rng.randrange(users)}", tags=rng.sample(TAGS, rng.randint(1, 3)),
+                             payload=b"\x89PNG\r\n\x1a\n" + rng.randbytes(payload_bytes))
+        return {"endpoint": "upload", "event": event, "warmup": warmup}
+
+    for _ in range(library):
+        yield upload(True)
+    for _ in range(requests):
+        endpoint = rng.choices(names, weights)[0]
+        if endpoint == "upload" or (endpoint in ("get", "download", "delete") and not live):
+            yield upload(False)
+        elif endpoint == "list":
+            kind = rng.random()
+            params = {"limit": "20"}
+            if kind < 0.5 or kind >= 0.8:
+                params["user_id"] = f"user-{rng.randrange(users)}"
+            if kind >= 0.5:
+                params["tag"] = rng.choice(TAGS)
+            yield {"endpoint": "list", "event": {"queryStringParameters": params}, "warmup": False}
+        else:
+            ref = live.pop(rng.randrange(len(live))) if endpoint == "delete" else rng.choice(live)
+            yield {"endpoint": endpoint, "image_ref": ref, "event": path_event(endpoint, "-"), "warmup": False}
+
+
+def replay(path: str) -> Iterator[Dict]:
+    with open(path) as f:
+        for raw in f:
+            if raw.strip():
+                line = json.loads(raw)
+                if line.get("endpoint") not in ENDPOINTS or "event" not in line:
+                    raise ValueError(f"bad replay line: {raw.strip()[:200]}")
+                yield line
+
+
+def recording(lines: Iterator[Dict], path: str) -> Iterator[Dict]:
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+            yield line
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), else the process peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+class InProcess:
+    """Calls the handlers directly; counts DynamoDB/S3 API calls through botocore's before-call event."""
+
+    name = "in-process"
+    measures_calls = True
+
+    def __init__(self):
+        import importlib
+        from common.aws_clients import ddb_client, ddb_resource, s3_client
+        self.handlers = {e: importlib.import_module(f"handlers.{m}").handler for e, (m, _, _) in ENDPOINTS.items()}
+        self.calls: Counter = Counter()
+        self.lock = threading.Lock()
+        for client in (s3_client(), ddb_client(), ddb_resource().meta.client):
+            client.meta.events.register("before-call.*.*", self._on_call)
+
+    def _on_call(self, model, **kwargs):
+        with self.lock:
+            self.calls[model.service_model.service_name] += 1
+
+    def snapshot(self) -> Counter:
+        with self.lock:
+            return Counter(self.calls)
+
+    def send(self, endpoint: str, event: Dict) -> Tuple[int, Optional[str]]:
+        resp = self.handlers[endpoint](event, None)
+        return resp["statusCode"], resp.get("body")
+
+
+class Http:
+    """Sends each event as the HTTP request API Gateway would have turned into it."""
+
+    name = "http"
+    measures_calls = False
+
+    def __init__(self, base: str, timeout: float = 30.0):
+        self.base = base.rstrip("/")
+        self.timeout = timeout
+
+    def send(self, endpoint: str, event: Dict) -> Tuple[int, Optional[str]]:
+        _, method, path = ENDPOINTS[endpoint]
+        image_id = (event.get("pathParameters") or {}).get("image_id")
+        url = self.base + path.format(image_id=urllib.parse.quote(image_id or "", safe=""))
+        if event.get("queryStringParameters"):
+            url += "?" + urllib.parse.urlencode(event["queryStringParameters"])
+        body = event.get("body")
+        req = urllib.request.Request(url, method=method, data=body.encode() if body else None,
+                                     headers=dict(event.get("headers") or {}, **({"Content-Type": "application/json"}
+                                                                                  if body else {})))
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(target, lines: Iterator[Dict], concurrency: int = 1) -> Dict:
+    """Send every event (warmup ones unmeasured) and build the report."""
+    workload = Workload(lines)
+    count_calls = target.measures_calls and concurrency == 1
+    samples: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    calls: Dict[str, Counter] = defaultdict(Counter)
+    rss: Dict[str, float] = defaultdict(float)
+    lock = threading.Lock()
+    started = [None]
+
+    def worker():
+        while True:
+            taken = workload.next()
+            if taken is None:
+                return
+            line, event, ordinal = taken
+            endpoint, warmup = line["endpoint"], line.get("warmup", False)
+            if not warmup and started[0] is None:
+                with lock:
+                    started[0] = started[0] or time.perf_counter()
+            before = target.snapshot() if count_calls else None
+            t0 = time.perf_counter()
+            try:
+                status, body = target.send(endpoint, event)
+            except Exception:
+                status, body = 599, None
+            ms = (time.perf_counter() - t0) * 1000.0
+            workload.observe(ordinal, status, body)
+            if warmup:
+                continue
+            with lock:
+                samples[endpoint].append(ms)
+                statuses[endpoint][str(status)] += 1
+                if count_calls:
+                    calls[endpoint].update(target.snapshot() - before)
+                if target.measures_calls:
+                    rss[endpoint] = max(rss[endpoint], rss_mb())
+
+    if concurrency == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - (started[0] or time.perf_counter())
+
+    endpoints = {}
+    for endpoint in sorted(samples):
+        n = len(samples[endpoint])
+        row = dict(summarize(samples[endpoint]), endpoint=endpoint, rps=round(n / wall, 2) if wall else None,
+                   errors=sum(c for s, c in statuses[endpoint].items() if int(s) >= 500),
+                   statuses=dict(statuses[endpoint]))
+        if count_calls:
+            row["ddb_calls"] = round(calls[endpoint]["dynamodb"] / n, 3)
+            row["s3_calls"] = round(calls[endpoint]["s3"] / n, 3)
+        if target.measures_calls:
+            row["rss_peak_mb"] = round(rss[endpoint], 1)
+        endpoints[endpoint] = row
+    total = sum(len(s) for s in samples.values())
+    return {
+        "meta": {"commit": _git_commit(), "target": target.name, "concurrency": concurrency,
+                 "python": platform.python_version(), "async_handlers": os.getenv("ASYNC_HANDLERS", "0")},
+        "overall": {"requests": total, "skipped": workload.skipped, "wall_s": round(wall, 3),
+                    "rps": round(total / wall, 2) if wall else None,
+                    "errors": sum(r["errors"] for r in endpoints.values())},
+        "endpoints": endpoints,
+    }
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float = DEFAULT_TOLERANCE,
+            min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[str]:
+    """Regressions of `current` against `baseline`, as messages (empty: none)."""
+    found = []
+    for endpoint, base in baseline["endpoints"].items():
+        cur = current["endpoints"].get(endpoint)
+        if cur is None:
+            continue
+        if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance) and cur["p95_ms"] - base["p95_ms"] > min_delta_ms:
+            found.append(f"{endpoint}: p95 {base['p95_ms']} -> {cur['p95_ms']} ms")
+        for key in ("ddb_calls", "s3_calls"):
+            # call counts are deterministic for the same stream; any increase is real
+            if key in base and key in cur and cur[key] > base[key] + 0.01:
+                found.append(f"{endpoint}: {key}/request {base[key]} -> {cur[key]}")
+        if cur["errors"] > base["errors"]:
+            found.append(f"{endpoint}: errors {base['errors']} -> {cur['errors']}")
+    base_rps, cur_rps = baseline["overall"].get("rps"), current["overall"].get("rps")
+    if base_rps and cur_rps and cur_rps < base_rps * (1 - tolerance):
+        found.append(f"overall: rps {base_rps} -> {cur_rps}")
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--http", metavar="BASE", help="send requests to a deployed API instead of in-process")
+    ap.add_argument("--replay", metavar="JSONL", help="replay a recorded event stream")
+    ap.add_argument("--record", metavar="JSONL", help="write the synthetic event stream to a file")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights (default: %(default)s)")
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--library", type=int, default=100, help="images uploaded before measuring")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--out", metavar="JSON", help="write the report here")
+    ap.add_argument("--compare", metavar="JSON", help="baseline report; exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed p95/rps change (fraction)")
+    ap.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS, help="ignore smaller p95 changes")
+    args = ap.parse_args()
+
+    if args.replay:
+        lines = replay(args.replay)
+    else:
+        lines = synthetic(parse_mix(args.mix), args.requests, args.library, args.seed)
+        if args.record:
+            lines = recording(lines, args.record)
+
+    if args.http:
+        report = run(Http(args.http), lines, args.concurrency)
+    else:
+        with moto_env():
+            report = run(InProcess(), lines, args.concurrency)
+    report["meta"].update(seed=None if args.replay else args.seed, mix=None if args.replay else args.mix,
+                          replay=args.replay)
+
+    print_table(list(report["endpoints"].values()),
+                ["endpoint", "n", "errors", "p50_ms", "p95_ms", "p99_ms", "rps", "ddb_calls", "s3_calls",
+                 "rss_peak_mb"])
+    print(json.dumps(report["overall"]))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance, args.min_delta_ms)
+        for r in regressions:
+            print(f"REGRESSION {r}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
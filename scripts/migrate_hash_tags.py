@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Move image_tags rows of tags containing "#" to their escaped partition key.
+
+Tags may contain "#"; image_tags stores it doubled ("a#b" is the partition
+"a##b", see src/common/tags.py) so a single "#" always starts a shard
+suffix. Rows written before that are still under the raw tag, where reads and
+deletes no longer look and where `split_shard_key` takes "v#2" for tag "v",
+shard 2. This rewrites them: for every committed image with such a tag, the
+row at the raw key is copied to the escaped key and deleted, both in one
+transaction. Run it before scripts/backfill_tag_dictionary.py, whose counts
+read partition keys.
+
+Legacy rows are always unsharded (a "#" tag was never sharded before), and
+a raw key that is also the shard key of another tag of the same image (tag
+"v" in shard 2 next to tag "v#2") is left alone. Re-running is harmless.
+
+Usage:
+  AWS_ENDPOINT_URL=http://localhost:4566 python scripts/migrate_hash_tags.py --dry-run
+  python scripts/migrate_hash_tags.py --segments 8
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common.aws_clients import ddb_table  # noqa: E402
+from common.dynamo import TransactionConflict, transact_write  # noqa: E402
+from common.tags import SHARD_SEPARATOR, shard_key, sort_id  # noqa: E402
+
+
+def _scan_segment(images_table: str, segment: int, total: int):
+    tbl = ddb_table(images_table)
+    kwargs = {
+        "Segment": segment,
+        "TotalSegments": total,
+        "ProjectionExpression": "image_id, created_at, tags, tag_shards, #s",
+        "ExpressionAttributeNames": {"#s": "status"},
+    }
+    while True:
+        resp = tbl.scan(**kwargs)
+        for item in resp.get("Items", []):
+            # pending uploads have no tag rows yet
+            if item.get("status") != "pending" and any(SHARD_SEPARATOR in t for t in item.get("tags") or ()):
+                yield item
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _legacy_keys(item):
+    """Raw keys of the item's "#" tags that no other of its tags uses as a shard key."""
+    shards = item.get("tag_shards") or {}
+    taken = {shard_key(t, int(shards.get(t, 0))) for t in item["tags"]}
+    return [t for t in item["tags"] if SHARD_SEPARATOR in t and not shards.get(t) and t not in taken]
+
+
+def _migrate(item, tags_table: str, dry_run: bool):
+    stats = {"images": 1, "moved": 0, "missing": 0}
+    tbl = ddb_table(tags_table)
+    # a random-id image's rows may be under either sort key (scripts/migrate_legacy_tag_rows.py)
+    keys = dict.fromkeys([sort_id(item["image_id"], item.get("created_at")), item["image_id"]])
+    for tag in _legacy_keys(item):
+        row = next(filter(None, (tbl.get_item(Key={"tag": tag, "image_id": k}, ConsistentRead=True).get("Item")
+                                 for k in keys)), None)
+        if not row:
+            stats["missing"] += 1  # already moved, or written escaped
+            continue
+        if not dry_run:
+            try:
+                transact_write([
+                    {"Put": {"TableName": tags_table, "Item": dict(row, tag=shard_key(tag))}},
+                    {"Delete": {"TableName": tags_table, "Key": {"tag": tag, "image_id": row["image_id"]},
+                                "ConditionExpression": "attribute_exists(image_id)"}},
+                ])
+            except TransactionConflict:
+                stats["missing"] += 1  # deleted concurrently
+                continue
+        stats["moved"] += 1
+    return stats
+
+
+def migrate(images_table: str, tags_table: str, segments: int = 4, dry_run: bool = False):
+    def run_segment(seg):
+        total = {"images": 0, "moved": 0, "missing": 0}
+        for item in _scan_segment(images_table, seg, segments):
+            for k, v in _migrate(item, tags_table, dry_run).items():
+                total[k] += v
+        return total
+
+    total = {"images": 0, "moved": 0, "missing": 0}
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        for stats in pool.map(run_segment, range(segments)):
+            for k, v in stats.items():
+                total[k] += v
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images-table", default=os.getenv("IMAGES_TABLE_NAME", "images"))
+    ap.add_argument("--tags-table", default=os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags"))
+    ap.add_argument("--segments", type=int, default=4, help="parallel Scan segments")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    stats = migrate(args.images_table, args.tags_table, args.segments, args.dry_run)
+    print(("[dry-run] " if args.dry_run else "") + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
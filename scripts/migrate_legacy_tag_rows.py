@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Re-key image_tags rows of images with random (pre-UUIDv7) ids so they sort
+by upload time.
+
+image_tags is sorted by image id, which is time-ordered for gen_id() ids.
+Rows of older images, stored under their bare random id, have no place in
+that order: newest-first and since/until tag listings skip them while
+ascending ones return them. Their sort key is now "<time id>#<image id>"
+(common.tags.sort_id, the time id taken from the image's created_at). This
+moves every row still under a bare random id to that key (Put + conditional
+Delete in one transaction), so all tag listings return the same images.
+Rows whose image no longer exists are counted and left to scripts/reconcile.py.
+Re-running is harmless.
+
+Usage:
+  AWS_ENDPOINT_URL=http://localhost:4566 python scripts/migrate_legacy_tag_rows.py --dry-run
+  python scripts/migrate_legacy_tag_rows.py --segments 8
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common.aws_clients import ddb_table  # noqa: E402
+from common.dynamo import TransactionConflict, batch_get_items, transact_write  # noqa: E402
+from common.tags import sort_id, time_ordered_key  # noqa: E402
+
+
+def _scan_segment(tags_table: str, segment: int, total: int):
+    tbl = ddb_table(tags_table)
+    kwargs = {"Segment": segment, "TotalSegments": total}
+    while True:
+        resp = tbl.scan(**kwargs)
+        yield [row for row in resp.get("Items", []) if not time_ordered_key(row["image_id"])]
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _move_rows(rows, images_table: str, tags_table: str, dry_run: bool):
+    stats = {"legacy_rows": len(rows), "moved": 0, "orphaned": 0}
+    images = {it["image_id"]: it for it in batch_get_items(
+        images_table, "image_id", list({r["image_id"] for r in rows}), fields=["created_at"])}
+    for row in rows:
+        image = images.get(row["image_id"])
+        if not image:
+            stats["orphaned"] += 1
+            continue
+        key = sort_id(row["image_id"], image.get("created_at"))
+        if not dry_run:
+            try:
+                transact_write([
+                    {"Put": {"TableName": tags_table, "Item": dict(row, image_id=key)}},
+                    {"Delete": {"TableName": tags_table, "Key": {"tag": row["tag"], "image_id": row["image_id"]},
+                                "ConditionExpression": "attribute_exists(image_id)"}},
+                ])
+            except TransactionConflict:
+                continue  # deleted meanwhile
+        stats["moved"] += 1
+    return stats
+
+
+def migrate(images_table: str, tags_table: str, segments: int = 4, dry_run: bool = False):
+    def run_segment(seg):
+        total = {"legacy_rows": 0, "moved": 0, "orphaned": 0}
+        for rows in _scan_segment(tags_table, seg, segments):
+            if rows:
+                for k, v in _move_rows(rows, images_table, tags_table, dry_run).items():
+                    total[k] += v
+        return total
+
+    total = {"legacy_rows": 0, "moved": 0, "orphaned": 0}
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        for stats in pool.map(run_segment, range(segments)):
+            for k, v in stats.items():
+                total[k] += v
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images-table", default=os.getenv("IMAGES_TABLE_NAME", "images"))
+    ap.add_argument("--tags-table", default=os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags"))
+    ap.add_argument("--segments", type=int, default=4, help="parallel Scan segments")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    stats = migrate(args.images_table, args.tags_table, args.segments, args.dry_run)
+    print(("[dry-run] " if args.dry_run else "") + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Find (and with --delete, remove) orphans: S3 objects under images/ and
+renditions/ without an `images` row, and `image_tags` rows pointing at
+deleted images. Dry run by default. See src/common/reconcile.py.
+
+With --checkpoint, progress is saved after every page and an interrupted run
+resumes from it (the file is removed once a sweep completes).
+
+Usage:
+  AWS_ENDPOINT_URL=http://localhost:4566 python scripts/reconcile.py --segments 8
+  python scripts/reconcile.py --delete --checkpoint /tmp/reconcile.json --min-age 7200
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common.reconcile import DEFAULT_MIN_AGE_SECONDS, Checkpoint, reconcile  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--bucket", default=os.getenv("S3_BUCKET_NAME", "image-service-bucket"))
+    ap.add_argument("--images-table", default=os.getenv("IMAGES_TABLE_NAME", "images"))
+    ap.add_argument("--tags-table", default=os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags"))
+    ap.add_argument("--segments", type=int, default=4, help="parallel Scan segments (TotalSegments)")
+    ap.add_argument("--workers", type=int, default=8, help="threads for S3 shards + tag segments")
+    ap.add_argument("--min-age", type=int, default=DEFAULT_MIN_AGE_SECONDS,
+                    help="ignore objects/rows younger than this many seconds")
+    ap.add_argument("--expected-items", type=int, help="Bloom filter capacity (default: from DescribeTable)")
+    ap.add_argument("--checkpoint", help="progress file or s3://bucket/key to resume from")
+    ap.add_argument("--reset", action="store_true", help="discard the checkpoint and start over")
+    ap.add_argument("--delete", action="store_true", help="delete orphans (default: report only)")
+    args = ap.parse_args()
+
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.reset:
+        checkpoint.clear()
+    report = reconcile(args.images_table, args.tags_table, args.bucket, segments=args.segments,
+                       workers=args.workers, dry_run=not args.delete, min_age_seconds=args.min_age,
+                       checkpoint=checkpoint, capacity=args.expected_items)
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Inspect and change the write sharding of tags in image_tags (see
+src/common/tag_shards.py). Sharding itself is switched on with
+TAG_SHARDING=1 on the Lambdas.
+
+  show TAG...        shard count and rows per shard
+  set TAG N          raise TAG to N shards (new rows spread; existing rows stay in shard 0)
+  reshard TAG N      move TAG's existing rows to the shards N assigns them
+
+Migrating a hot tag: `set` it (or let TAG_SHARD_ROWS raise it), then
+`reshard` it to spread the rows written before. Switching sharding off:
+`reshard TAG 1` for every sharded tag, wait TAG_SHARD_CACHE_TTL_SECONDS,
+re-run it to pick up stragglers, then set TAG_SHARDING=0.
+
+Usage:
+  AWS_ENDPOINT_URL=http://localhost:4566 python scripts/tag_shards.py show sunset beach
+  python scripts/tag_shards.py reshard sunset 8
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common import tag_shards  # noqa: E402
+from common.aws_clients import ddb_table  # noqa: E402
+from common.tags import normalize_tag, shard_key  # noqa: E402
+
+
+def _rows(tags_table: str, key: str) -> int:
+    kwargs = {"KeyConditionExpression": "#t = :t", "ExpressionAttributeNames": {"#t": "tag"},
+              "ExpressionAttributeValues": {":t": key}, "Select": "COUNT"}
+    total = 0
+    while True:
+        resp = ddb_table(tags_table).query(**kwargs)
+        total += resp["Count"]
+        if not resp.get("LastEvaluatedKey"):
+            return total
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def show(tags_table: str, tag: str) -> dict:
+    tag_shards.reset_shard_cache()
+    rows = [_rows(tags_table, shard_key(tag, n)) for n in range(tag_shards.max_shards())]
+    while len(rows) > 1 and not rows[-1]:
+        rows.pop()
+    return {"tag": tag, "shards": tag_shards.counts([tag])[tag], "rows_per_shard": rows}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tags-table", default=os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags"))
+    ap.add_argument("--images-table", default=os.getenv("IMAGES_TABLE_NAME", "images"))
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("show").add_argument("tags", nargs="+")
+    for name in ("set", "reshard"):
+        p = sub.add_parser(name)
+        p.add_argument("tag")
+        p.add_argument("shards", type=int)
+    args = ap.parse_args()
+
+    if args.command == "show":
+        out = [show(args.tags_table, normalize_tag(t)) for t in args.tags]
+    elif args.command == "set":
+        tag = normalize_tag(args.tag)
+        out = {"tag": tag, "shards": args.shards, "raised": tag_shards.set_shards(tag, args.shards)}
+    else:
+        out = tag_shards.reshard(args.tags_table, args.images_table, normalize_tag(args.tag), args.shards)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
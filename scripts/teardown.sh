@@ -16,15 +16,22 @@ if [ -n "${API_ID}" ]; then
   awslocal apigateway delete-rest-api --rest-api-id ${API_ID} || true
 fi
 
-for FN in images-upload images-list images-get images-delete; do
+for FN in images-upload images-list images-get images-delete images-upload-session images-rendition images-batch-upload images-bulk-delete images-reconcile images-tags images-similar; do
   awslocal lambda delete-function --function-name "$FN" || true
 done
 
+awslocal events remove-targets --rule images-reconcile-nightly --ids reconcile >/dev/null 2>&1 || true
+awslocal events delete-rule --name images-reconcile-nightly || true
+
 awslocal iam delete-role-policy --role-name lambda-exec --policy-name lambda-inline || true
 awslocal iam delete-role --role-name lambda-exec || true
 
 awslocal dynamodb delete-table --table-name images || true
 awslocal dynamodb delete-table --table-name image_tags || true
+awslocal dynamodb delete-table --table-name image_blobs || true
+awslocal dynamodb delete-table --table-name image_idempotency || true
+awslocal dynamodb delete-table --table-name image_tag_dictionary || true
+awslocal dynamodb delete-table --table-name image_phash_bands || true
 
 awslocal s3 rb s3://image-service-bucket --force || true
 
@@ -0,0 +1,155 @@
+# src/common/aio.py
+"""
+One coroutine per handler, two ways to run it.
+
+Handlers with fan-out I/O (list, upload, delete) are written as
+`async def handle(event, context)` over this module; the Lambda entry point
+stays the sync `handler(event, context)`, which calls run().
+
+  - sync mode (default): run() drives the coroutine without an event loop.
+    Every `await call(...)` runs inline and gather()/map() fan out on a
+    short-lived thread pool, exactly like the thread-pool helpers elsewhere.
+  - async mode (ASYNC_HANDLERS=1): run() runs the coroutine on a per-thread
+    event loop kept across warm invocations. Each call goes to a shared
+    executor (ASYNC_MAX_CONCURRENCY workers) and gather()/map() schedule
+    calls concurrently on the loop, bounded by a semaphore.
+
+AWS calls are awaited through wrap(), an awaitable view of the shared boto3
+clients and Table handles (`await wrap(s3_client()).put_object(...)`).
+botocore has no asyncio transport and aiobotocore is not a dependency, so the
+blocking call runs on a worker thread; the interface is aiobotocore's, which
+keeps a swap local to this module. asyncio is imported only in async mode, so
+sync-mode cold starts do not pay for it.
+"""
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, List, Optional
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+_local = threading.local()
+_executor_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_size = 0
+
+
+def enabled() -> bool:
+    return os.getenv("ASYNC_HANDLERS", "0") == "1"
+
+
+def max_concurrency() -> int:
+    return max(1, int(os.getenv("ASYNC_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)))
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    # kept across warm invocations; rebuilt only if the configured size changes
+    global _executor, _executor_size
+    size = max_concurrency()
+    with _executor_lock:
+        if _executor is None or _executor_size != size:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor, _executor_size = ThreadPoolExecutor(max_workers=size, thread_name_prefix="aio"), size
+        return _executor
+
+
+def _inline(fn: Callable):
+    # sync helpers called from here (batch_get_items() on a worker thread, or
+    # on the loop's thread) run inline instead of starting or yielding to a loop
+    _local.inline = getattr(_local, "inline", 0) + 1
+    try:
+        return fn()
+    finally:
+        _local.inline -= 1
+
+
+def _running_loop():
+    if getattr(_local, "inline", 0):
+        return None
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return None
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class Call:
+    """A blocking call, run when awaited: inline without an event loop, on the shared executor with one."""
+
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable, *args, **kwargs):
+        self.fn = partial(fn, *args, **kwargs)
+
+    def __await__(self):
+        loop = _running_loop()
+        if loop is None:
+            return self.fn()
+        return (yield from loop.run_in_executor(_shared_executor(), _inline, self.fn).__await__())
+
+
+def call(fn: Callable, *args, **kwargs) -> Call:
+    return Call(fn, *args, **kwargs)
+
+
+class _Awaitable:
+    """Awaitable view of a boto3 client or Table: every method returns a Call."""
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        return partial(Call, attr) if callable(attr) else attr
+
+
+def wrap(target) -> Any:
+    return _Awaitable(target)
+
+
+async def gather(*calls: Call, limit: Optional[int] = None) -> List:
+    """Run calls concurrently (at most `limit` at a time); results in order, first error raised."""
+    if not calls:
+        return []
+    limit = min(limit or max_concurrency(), len(calls))
+    if _running_loop() is None:
+        if limit == 1:
+            return [c.fn() for c in calls]
+        with ThreadPoolExecutor(max_workers=limit) as pool:
+            return list(pool.map(lambda c: _inline(c.fn), calls))
+
+    import asyncio
+    sem = asyncio.Semaphore(limit)
+
+    async def one(c: Call):
+        async with sem:
+            return await c
+
+    return list(await asyncio.gather(*(one(c) for c in calls)))
+
+
+async def map(fn: Callable, items: Iterable, limit: Optional[int] = None) -> List:  # noqa: A001
+    return await gather(*(Call(fn, i) for i in items), limit=limit)
+
+
+def run(coro):
+    """Sync entry point: the coroutine's result, in whichever mode is configured."""
+    if enabled() and not getattr(_local, "inline", 0) and _running_loop() is None:
+        loop = getattr(_local, "loop", None)
+        if loop is None or loop.is_closed():
+            import asyncio
+            loop = _local.loop = asyncio.new_event_loop()
+        return loop.run_until_complete(coro)
+    try:
+        _inline(partial(coro.send, None))
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError("coroutine awaited something other than aio calls outside an event loop")
@@ -1,29 +1,192 @@
-
 # src/common/aws_clients.py
+"""
+Process-wide registry of boto3 clients, resources and DynamoDB Table handles.
+
+Lambda keeps the Python process alive between invocations, so building a
+session, loading service models and opening TLS connections once per process
+(instead of once per request) removes that cost from every warm invocation.
+Everything is created lazily on first use and cached by (region, endpoint).
+
+Tuning (all optional):
+  AWS_MAX_POOL_CONNECTIONS  urllib3 pool size per client (default 32)
+  AWS_CONNECT_TIMEOUT       seconds (default 2)
+  AWS_READ_TIMEOUT          seconds (default 10)
+  AWS_RETRY_MODE            standard | adaptive | legacy (default adaptive)
+  AWS_MAX_ATTEMPTS          total attempts incl. the first one (default 3)
+  AWS_TCP_KEEPALIVE         1/0 (default 1)
+  PREWARM_CLIENTS           1/0 (default 1), see prewarm()
+
+Every client gets common.metrics' timing hooks (metrics.attach).
+
+Tests running under moto should call reset_clients() between mocks.
+"""
 import os
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
 import boto3
 from botocore.config import Config
 
+from common import metrics
+from common.ddb_codec import install_plain_numbers, plain_numbers_enabled
+
 REGION = os.getenv("AWS_REGION", "us-east-1")
 ENDPOINT = os.getenv("AWS_ENDPOINT_URL")
 
+_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_clients: Dict[Tuple, object] = {}
+_resources: Dict[Tuple, object] = {}
+_tables: Dict[Tuple, object] = {}
+logger = logging.getLogger(__name__)
+
+
+def _region() -> str:
+    return os.getenv("AWS_REGION", REGION)
+
+
+def _endpoint() -> Optional[str]:
+    return os.getenv("AWS_ENDPOINT_URL") or None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def client_config(s3_path_style: bool = False, signature_version: Optional[str] = None) -> Config:
+    """botocore Config shared by every client, tuned for long-lived Lambda processes."""
+    kwargs = {
+        "max_pool_connections": _env_int("AWS_MAX_POOL_CONNECTIONS", 32),
+        "connect_timeout": _env_float("AWS_CONNECT_TIMEOUT", 2),
+        "read_timeout": _env_float("AWS_READ_TIMEOUT", 10),
+        "retries": {
+            "mode": os.getenv("AWS_RETRY_MODE", "adaptive"),
+            "total_max_attempts": _env_int("AWS_MAX_ATTEMPTS", 3),
+        },
+        "tcp_keepalive": os.getenv("AWS_TCP_KEEPALIVE", "1") == "1",
+    }
+    if s3_path_style:
+        kwargs["s3"] = {"addressing_style": "path"}
+    if signature_version:
+        kwargs["signature_version"] = signature_version
+    return Config(**kwargs)
+
+
+def _get_session() -> boto3.session.Session:
+    # boto3.client() shares the default session but is not thread-safe;
+    # a dedicated session created once is.
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def _build_client(service: str, region: str, endpoint: Optional[str]):
+    # Path-style only when talking to a custom endpoint (e.g., LocalStack).
+    # S3 presigned URLs default to SigV2 in us-east-1; always presign with SigV4
+    cfg = client_config(s3_path_style=bool(endpoint) and service == "s3",
+                        signature_version="s3v4" if service == "s3" else None)
+    kwargs = {"region_name": region, "config": cfg}
+    if endpoint:
+        kwargs["endpoint_url"] = endpoint
+    with metrics.phase("client_init"):
+        return metrics.attach(_get_session().client(service, **kwargs))
+
+
+def _cached_client(service: str):
+    key = (service, _region(), _endpoint())
+    c = _clients.get(key)
+    if c is None:
+        with _lock:
+            c = _clients.get(key)
+            if c is None:
+                c = _build_client(service, key[1], key[2])
+                _clients[key] = c
+    return c
+
+
 def s3_client():
     """
-    Use path-style ONLY when talking to a custom endpoint (e.g., LocalStack).
-    Under moto (endpoint is None), use default config to avoid unexpected validation issues.
+    Path-style addressing is used ONLY when talking to a custom endpoint (e.g., LocalStack).
+    Under moto (endpoint is None), virtual-host style is kept to avoid unexpected validation issues.
     """
-    if ENDPOINT:
-        cfg = Config(s3={"addressing_style": "path"})
-        return boto3.client("s3", region_name=REGION, endpoint_url=ENDPOINT, config=cfg)
-    return boto3.client("s3", region_name=REGION)
+    return _cached_client("s3")
+
+
+def ddb_client():
+    return _cached_client("dynamodb")
+
+
+def lambda_client():
+    return _cached_client("lambda")
+
 
 def ddb_resource():
     # Endpoint is only needed for LocalStack. Under moto, leave it None.
-    if ENDPOINT:
-        return boto3.resource("dynamodb", region_name=REGION, endpoint_url=ENDPOINT)
-    return boto3.resource("dynamodb", region_name=REGION)
+    key = ("dynamodb", _region(), _endpoint())
+    r = _resources.get(key)
+    if r is None:
+        with _lock:
+            r = _resources.get(key)
+            if r is None:
+                kwargs = {"region_name": key[1], "config": client_config()}
+                if key[2]:
+                    kwargs["endpoint_url"] = key[2]
+                with metrics.phase("client_init"):
+                    r = _get_session().resource("dynamodb", **kwargs)
+                metrics.attach(r.meta.client)
+                if plain_numbers_enabled():
+                    install_plain_numbers(r)
+                _resources[key] = r
+    return r
 
-def ddb_client():
-    if ENDPOINT:
-        return boto3.client("dynamodb", region_name=REGION, endpoint_url=ENDPOINT)
-    return boto3.client("dynamodb", region_name=REGION)
+
+def ddb_table(name: str):
+    """Cached DynamoDB Table handle; resource.Table() builds a new class on every call."""
+    key = (_region(), _endpoint(), name)
+    t = _tables.get(key)
+    if t is None:
+        t = ddb_resource().Table(name)
+        with _lock:
+            t = _tables.setdefault(key, t)
+    return t
+
+
+def prewarm(*services: str, tables: Iterable[str] = ()):
+    """
+    Build the clients and Table handles a handler needs when its module is
+    imported, i.e. during the Lambda init phase, which runs before the first
+    request (with a full CPU burst) instead of inside it. Loading a service
+    model is the expensive part: each handler names only what it uses.
+    Never raises; PREWARM_CLIENTS=0 turns it off.
+    """
+    if os.getenv("PREWARM_CLIENTS", "1") != "1":
+        return
+    try:
+        for service in services:
+            _cached_client(service)
+        for name in tables:
+            ddb_table(name)
+    except Exception:
+        logger.debug("client prewarm failed; clients will be built on first use", exc_info=True)
+
+
+def reset_clients():
+    """Drop every cached client/resource/table (used by tests between moto mocks)."""
+    global _session
+    with _lock:
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
+        _session = None
@@ -0,0 +1,145 @@
+# src/common/blobs.py
+"""
+Content-addressed, reference-counted image blobs (opt-in via DEDUP_ENABLED=1).
+
+Bytes are stored once under blobs/sha256/<hex>; the `image_blobs` table
+(PK checksum) tracks how many images point at each blob:
+
+  checksum | s3_key | ref_count | blob_state (stored | deleting) | deleting_since | size
+
+Concurrency rules (all enforced with conditional writes):
+  - acquire() atomically ADDs 1 to ref_count unless the blob is being deleted.
+    If the blob is not yet `stored`, the caller uploads it; two concurrent
+    first uploads write identical bytes to the same key, which is harmless.
+  - release() atomically decrements; whoever takes it to 0 flips the row to
+    `deleting` (only if still at 0), deletes the object, then drops the row.
+    acquire() refuses to resurrect a `deleting` blob and retries until the
+    row is gone, so an object is never deleted after a new reference's PUT.
+  - A releaser that dies midway leaves the row `deleting`. The flip records
+    `deleting_since` (epoch seconds); once that is older than
+    DEDUP_DELETING_TIMEOUT_SECONDS (far beyond any Lambda's lifetime),
+    acquire() takes the row over as a fresh, unstored blob and re-uploads.
+"""
+import os
+import time
+from typing import Tuple
+
+from common.aws_clients import ddb_table, s3_client
+
+BLOB_PREFIX = "blobs/sha256/"
+STORED = "stored"
+DELETING = "deleting"
+ACQUIRE_ATTEMPTS = 5
+ACQUIRE_BASE_DELAY = 0.05
+DEFAULT_DELETING_TIMEOUT_SECONDS = 3600
+
+
+def dedup_enabled() -> bool:
+    return os.getenv("DEDUP_ENABLED", "0") == "1"
+
+
+def deleting_timeout() -> int:
+    return int(os.getenv("DEDUP_DELETING_TIMEOUT_SECONDS", DEFAULT_DELETING_TIMEOUT_SECONDS))
+
+
+def blobs_table_name() -> str:
+    return os.getenv("IMAGE_BLOBS_TABLE_NAME", "image_blobs")
+
+
+def blob_key(checksum: str) -> str:
+    return f"{BLOB_PREFIX}{checksum}"
+
+
+def is_blob_key(s3_key: str) -> bool:
+    return s3_key.startswith(BLOB_PREFIX)
+
+
+def _ccf(tbl):
+    return tbl.meta.client.exceptions.ConditionalCheckFailedException
+
+
+def acquire(checksum: str, size: int) -> Tuple[str, bool]:
+    """Add a reference to the blob. Returns (s3_key, needs_upload)."""
+    tbl = ddb_table(blobs_table_name())
+    key = blob_key(checksum)
+    for attempt in range(ACQUIRE_ATTEMPTS):
+        try:
+            attrs = tbl.update_item(
+                Key={"checksum": checksum},
+                UpdateExpression="ADD ref_count :one SET s3_key = if_not_exists(s3_key, :k), #sz = if_not_exists(#sz, :sz)",
+                ConditionExpression="attribute_not_exists(blob_state) OR blob_state <> :deleting",
+                ExpressionAttributeNames={"#sz": "size"},
+                ExpressionAttributeValues={":one": 1, ":k": key, ":sz": size, ":deleting": DELETING},
+                ReturnValues="ALL_NEW",
+            )["Attributes"]
+            return attrs["s3_key"], attrs.get("blob_state") != STORED
+        except _ccf(tbl):
+            if _reclaim(tbl, checksum, key, size):
+                return key, True
+            time.sleep(ACQUIRE_BASE_DELAY * (2 ** attempt))
+    raise RuntimeError(f"blob {checksum} is being deleted; retry the upload")
+
+
+def _reclaim(tbl, checksum: str, key: str, size: int) -> bool:
+    """Take over a row left `deleting` past the timeout, with this call's reference. False if it is not stale."""
+    # rows flipped before deleting_since was recorded count as stale
+    try:
+        tbl.update_item(
+            Key={"checksum": checksum},
+            UpdateExpression="SET ref_count = :one, s3_key = :k, #sz = :sz REMOVE blob_state, deleting_since",
+            ConditionExpression="blob_state = :deleting AND "
+                                "(attribute_not_exists(deleting_since) OR deleting_since < :cutoff)",
+            ExpressionAttributeNames={"#sz": "size"},
+            ExpressionAttributeValues={":one": 1, ":k": key, ":sz": size, ":deleting": DELETING,
+                                       ":cutoff": int(time.time()) - deleting_timeout()},
+        )
+        return True
+    except _ccf(tbl):
+        return False
+
+
+def mark_stored(checksum: str):
+    tbl = ddb_table(blobs_table_name())
+    tbl.update_item(
+        Key={"checksum": checksum},
+        UpdateExpression="SET blob_state = :stored",
+        ConditionExpression="attribute_exists(checksum) AND ref_count > :zero",
+        ExpressionAttributeValues={":stored": STORED, ":zero": 0},
+    )
+
+
+def release(checksum: str, bucket: str) -> bool:
+    """Drop a reference; deletes the S3 object with the last one. Returns True if deleted."""
+    tbl = ddb_table(blobs_table_name())
+    try:
+        attrs = tbl.update_item(
+            Key={"checksum": checksum},
+            UpdateExpression="ADD ref_count :neg",
+            ConditionExpression="ref_count > :zero",
+            ExpressionAttributeValues={":neg": -1, ":zero": 0},
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except _ccf(tbl):
+        return False
+    if attrs["ref_count"] > 0:
+        return False
+    since = int(time.time())
+    try:
+        tbl.update_item(
+            Key={"checksum": checksum},
+            UpdateExpression="SET blob_state = :deleting, deleting_since = :since",
+            ConditionExpression="ref_count = :zero AND (attribute_not_exists(blob_state) OR blob_state <> :deleting)",
+            ExpressionAttributeValues={":deleting": DELETING, ":zero": 0, ":since": since},
+        )
+    except _ccf(tbl):
+        return False  # re-referenced (or another releaser won) in between
+    s3_client().delete_object(Bucket=bucket, Key=attrs["s3_key"])
+    try:
+        tbl.delete_item(
+            Key={"checksum": checksum},
+            ConditionExpression="blob_state = :deleting AND deleting_since = :since",
+            ExpressionAttributeValues={":deleting": DELETING, ":since": since},
+        )
+    except _ccf(tbl):
+        pass  # took longer than the timeout and the row was reclaimed; it is no longer ours
+    return True
@@ -0,0 +1,279 @@
+# src/common/cache.py
+"""
+Read-through cache for `images` metadata.
+
+Two tiers, both optional:
+  - an in-process LRU with TTL, shared by warm invocations of one Lambda
+    process (METADATA_CACHE_TTL_SECONDS, METADATA_CACHE_MAX_ENTRIES);
+  - a shared backend implementing CacheBackend (Redis, Memcached, ...),
+    selected with METADATA_CACHE_BACKEND. `sqlite:<path>` (or `sqlite:` for an
+    in-memory database) is a local stand-in with the same semantics.
+
+Writers call invalidate(), which drops the entry from this process's LRU and
+from the shared backend. Other processes' LRUs cannot be reached, so the local
+TTL is the staleness bound across Lambdas and is kept short by default.
+Missing and pending items are never cached.
+"""
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from decimal import Decimal
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_TTL_SECONDS = 5.0
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_SHARED_TTL_SECONDS = 60
+logger = logging.getLogger(__name__)
+
+HIT = "hit"
+SHARED_HIT = "shared-hit"
+MISS = "miss"
+BYPASS = "bypass"
+
+
+class CacheStats:
+    """Thread-safe counters: hits, shared_hits, misses, bypasses, evictions, expirations, invalidations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self._counts[name] += n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {k: self._counts.get(k, 0) for k in
+                    ("hits", "shared_hits", "misses", "bypasses", "evictions", "expirations", "invalidations")}
+
+
+class LRUCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, stats: CacheStats = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = stats or CacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, object]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires <= self._clock():
+                del self._data[key]
+                self.stats.incr("expirations")
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.incr("evictions")
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheBackend:
+    """Shared cache interface. Values are opaque bytes; TTL is enforced by the backend."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl_seconds: int):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class SQLiteBackend(CacheBackend):
+    """Single-node stand-in for a shared cache (tests, local runs)."""
+
+    def __init__(self, path: str = ":memory:", clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, v BLOB, expires REAL)")
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT v, expires FROM cache WHERE k = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= self._clock():
+                self._conn.execute("DELETE FROM cache WHERE k = ?", (key,))
+                return None
+            return row[0]
+
+    def set(self, key, value, ttl_seconds):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO cache (k, v, expires) VALUES (?, ?, ?)",
+                               (key, value, self._clock() + ttl_seconds))
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE k = ?", (key,))
+
+
+def _tag(o):
+    # DynamoDB types that JSON cannot carry: numbers (Decimal) and sets
+    if isinstance(o, Decimal):
+        return {"__d": str(o)}
+    if isinstance(o, (set, frozenset)):
+        return {"__s": sorted(o)}
+    if isinstance(o, (bytes, bytearray)):
+        return {"__b": base64.b64encode(o).decode()}
+    raise TypeError(f"Object of type {type(o).__name__} is not cacheable")
+
+
+def _untag(d):
+    if len(d) == 1:
+        if "__d" in d:
+            return Decimal(d["__d"])
+        if "__s" in d:
+            return set(d["__s"])
+        if "__b" in d:
+            return base64.b64decode(d["__b"])
+    return d
+
+
+def encode_item(item: dict) -> bytes:
+    return json.dumps(item, default=_tag, separators=(",", ":")).encode()
+
+
+def decode_item(raw: bytes) -> dict:
+    return json.loads(raw, object_hook=_untag)
+
+
+class MetadataCache:
+    def __init__(self, local: Optional[LRUCache] = None, shared: Optional[CacheBackend] = None,
+                 shared_ttl_seconds: int = DEFAULT_SHARED_TTL_SECONDS, stats: CacheStats = None):
+        self.stats = stats or (local.stats if local is not None else CacheStats())
+        self.local = local
+        self.shared = shared
+        self.shared_ttl_seconds = shared_ttl_seconds
+
+    @staticmethod
+    def _key(image_id: str) -> str:
+        return f"image:{image_id}"
+
+    def _store(self, image_id: str, item: dict):
+        if self.local is not None:
+            self.local.set(image_id, item)
+        if self.shared is not None:
+            self.shared.set(self._key(image_id), encode_item(item), self.shared_ttl_seconds)
+
+    def get(self, image_id: str, loader: Callable[[str], Optional[dict]],
+            bypass: bool = False) -> Tuple[Optional[dict], str]:
+        """
+        Return (item, source) where source is hit, shared-hit, miss or bypass.
+        A bypass reads through to `loader` and refreshes the cache.
+        Cached items are shared between callers and must not be mutated.
+        """
+        if bypass:
+            self.stats.incr("bypasses")
+        else:
+            if self.local is not None:
+                found, item = self.local.get(image_id)
+                if found:
+                    self.stats.incr("hits")
+                    return item, HIT
+            if self.shared is not None:
+                raw = self.shared.get(self._key(image_id))
+                if raw is not None:
+                    item = decode_item(raw)
+                    if self.local is not None:
+                        self.local.set(image_id, item)
+                    self.stats.incr("shared_hits")
+                    return item, SHARED_HIT
+            self.stats.incr("misses")
+        item = loader(image_id)
+        if item and item.get("status") != "pending":
+            self._store(image_id, item)
+        return item, (BYPASS if bypass else MISS)
+
+    def invalidate(self, image_id: str):
+        self.stats.incr("invalidations")
+        if self.local is not None:
+            self.local.delete(image_id)
+        if self.shared is not None:
+            self.shared.delete(self._key(image_id))
+
+    def clear(self):
+        if self.local is not None:
+            self.local.clear()
+
+
+def _backend_from_env() -> Optional[CacheBackend]:
+    spec = os.getenv("METADATA_CACHE_BACKEND", "")
+    if not spec:
+        return None
+    kind, _, arg = spec.partition(":")
+    if kind == "sqlite":
+        return SQLiteBackend(arg or ":memory:")
+    raise ValueError(f"Unknown METADATA_CACHE_BACKEND: {spec}")
+
+
+_cache: Optional[MetadataCache] = None
+_cache_lock = threading.Lock()
+
+
+def metadata_cache() -> MetadataCache:
+    """Process-wide cache, configured from the environment on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                ttl = float(os.getenv("METADATA_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+                max_entries = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+                local = LRUCache(max_entries, ttl) if ttl > 0 and max_entries > 0 else None
+                _cache = MetadataCache(
+                    local=local,
+                    shared=_backend_from_env(),
+                    shared_ttl_seconds=int(os.getenv("METADATA_CACHE_SHARED_TTL_SECONDS",
+                                                     DEFAULT_SHARED_TTL_SECONDS)),
+                )
+    return _cache
+
+
+def set_shared_backend(backend: Optional[CacheBackend]):
+    """Plug in a shared backend (e.g. a Redis client wrapper) at import time."""
+    metadata_cache().shared = backend
+
+
+def invalidate(image_id: str):
+    try:
+        metadata_cache().invalidate(image_id)
+    except Exception:
+        # an unreachable shared cache must not fail the write; the TTL bounds staleness
+        logger.warning("could not invalidate cached metadata for %s", image_id, exc_info=True)
+
+
+def reset_metadata_cache():
+    """Drop the process-wide cache (tests, config changes)."""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,165 @@
+# src/common/ddb_codec.py
+"""
+DynamoDB <-> Python value conversion for the shared DynamoDB resource.
+
+boto3 turns every DynamoDB number into a Decimal, which then has to go
+through a Python-level `default=` hook on every json.dumps (e.g. `size` on
+each of 100 listed items). Numbers are converted once instead, when a
+response is deserialized: integral values become int and others float.
+Floats are accepted on the way back in, so items read through the resource
+can be written again unchanged.
+
+Our numbers are sizes, counters and epoch seconds, all well inside float and
+int precision. Set DDB_PLAIN_NUMBERS=0 to keep boto3's Decimals.
+
+decode_item()/encode_item() are a hand-rolled codec for the low-level client
+(common.dynamo's fast path, DDB_FAST_PATH=1). Attributes of our own schema
+(IMAGE_ATTRIBUTES) are decoded with one dict lookup each and never go
+through Decimal; anything else falls back to a generic walk.
+"""
+import os
+from decimal import Decimal
+
+from typing import Dict
+
+from boto3.dynamodb.transform import TransformationInjector
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+_MISSING = object()
+
+
+def plain_number(n: Decimal):
+    return int(n) if n == n.to_integral_value() else float(n)
+
+
+class PlainNumberDeserializer(TypeDeserializer):
+    def _deserialize_n(self, value):
+        return plain_number(super()._deserialize_n(value))
+
+
+class PlainNumberSerializer(TypeSerializer):
+    def _is_number(self, value):
+        return isinstance(value, float) or super()._is_number(value)
+
+    def _serialize_n(self, value):
+        if isinstance(value, float):
+            value = Decimal(repr(value))
+        return super()._serialize_n(value)
+
+
+def plain_numbers_enabled() -> bool:
+    return os.getenv("DDB_PLAIN_NUMBERS", "1") == "1"
+
+
+def install_plain_numbers(resource):
+    """Swap the resource's (de)serialization hooks for the plain-number ones."""
+    events = resource.meta.client.meta.events
+    injector = TransformationInjector(serializer=PlainNumberSerializer(), deserializer=PlainNumberDeserializer())
+    events.unregister("before-parameter-build.dynamodb", unique_id="dynamodb-attr-value-input")
+    events.unregister("after-call.dynamodb", unique_id="dynamodb-attr-value-output")
+    events.register("before-parameter-build.dynamodb", injector.inject_attribute_value_input,
+                    unique_id="dynamodb-attr-value-input")
+    events.register("after-call.dynamodb", injector.inject_attribute_value_output,
+                    unique_id="dynamodb-attr-value-output")
+    return resource
+
+
+def parse_number(text: str):
+    """DynamoDB N string -> int, or float when it is not integral (same as plain_number)."""
+    try:
+        return int(text)
+    except ValueError:
+        f = float(text)
+        return int(f) if f.is_integer() else f
+
+
+def _string_list(values):
+    return [v["S"] if "S" in v else decode_value(v) for v in values]
+
+
+# images / image_tags attributes: name -> (DynamoDB type, converter or None)
+IMAGE_ATTRIBUTES = {
+    "image_id": ("S", None),
+    "user_id": ("S", None),
+    "title": ("S", None),
+    "description": ("S", None),
+    "content_type": ("S", None),
+    "s3_bucket": ("S", None),
+    "s3_key": ("S", None),
+    "checksum": ("S", None),
+    "created_at": ("S", None),
+    "status": ("S", None),
+    "tag": ("S", None),
+    "user_tag": ("S", None),
+    "size": ("N", parse_number),
+    "expires_at": ("N", parse_number),
+    "width": ("N", parse_number),
+    "height": ("N", parse_number),
+    "orientation": ("N", parse_number),
+    "color_mode": ("S", None),
+    "phash": ("S", None),
+    "dhash": ("S", None),
+    "tags": ("L", _string_list),
+    "variants": ("SS", set),
+}
+
+
+def decode_value(av: Dict):
+    (kind, value), = av.items()
+    if kind == "S" or kind == "BOOL" or kind == "B":
+        return value
+    if kind == "N":
+        return parse_number(value)
+    if kind == "L":
+        return [decode_value(v) for v in value]
+    if kind == "M":
+        return decode_item(value)
+    if kind == "SS" or kind == "BS":
+        return set(value)
+    if kind == "NS":
+        return {parse_number(v) for v in value}
+    if kind == "NULL":
+        return None
+    raise ValueError(f"Unsupported DynamoDB type {kind!r}")
+
+
+def decode_item(raw: Dict) -> Dict:
+    """Low-level client item ({"size": {"N": "12"}, ...}) -> plain Python dict."""
+    item = {}
+    for name, av in raw.items():
+        known = IMAGE_ATTRIBUTES.get(name)
+        if known is not None:
+            value = av.get(known[0], _MISSING)
+            if value is not _MISSING:
+                item[name] = value if known[1] is None else known[1](value)
+                continue
+        item[name] = decode_value(av)
+    return item
+
+
+def encode_value(value) -> Dict:
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float, Decimal)):
+        return {"N": repr(value) if isinstance(value, float) else str(value)}
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, (bytes, bytearray)):
+        return {"B": bytes(value)}
+    if isinstance(value, (list, tuple)):
+        return {"L": [encode_value(v) for v in value]}
+    if isinstance(value, dict):
+        return {"M": encode_item(value)}
+    if isinstance(value, (set, frozenset)) and value:
+        if all(isinstance(v, str) for v in value):
+            return {"SS": sorted(value)}
+        if all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in value):
+            return {"NS": [encode_value(v)["N"] for v in value]}
+    raise TypeError(f"Cannot encode {type(value).__name__} for DynamoDB")
+
+
+def encode_item(item: Dict) -> Dict:
+    """Plain Python dict (keys, ExclusiveStartKey, ...) -> low-level client attribute values."""
+    return {name: encode_value(v) for name, v in item.items()}
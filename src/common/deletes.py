@@ -0,0 +1,74 @@
+# src/common/deletes.py
+"""
+Shared pieces of the delete path, used by DELETE /images/{image_id} and
+POST /images:bulk-delete.
+
+  - transact_delete() removes an image row, its tag rows and its
+    near-duplicate band rows (common.similarity) in a single
+    TransactWriteItems, conditional on the image row still existing, so a
+    failure never leaves orphaned tag rows and two racing deletes of the
+    same image cannot both "win" (which would release a dedup blob twice).
+  - delete_objects() removes S3 keys with DeleteObjects, 1000 keys per call,
+    chunks in parallel, and reports the keys S3 refused.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from common import blobs, similarity, tag_dictionary
+from common.dynamo import TRANSACT_MAX_ITEMS, TransactionConflict, batch_write, transact_write
+from common.renditions import rendition_key
+from common.tags import tag_keys
+
+S3_DELETE_MAX_KEYS = 1000
+
+
+def object_keys(item: Dict) -> List[str]:
+    """S3 keys owned by this image alone (a shared dedup blob is released separately)."""
+    keys = [] if blobs.is_blob_key(item["s3_key"]) else [item["s3_key"]]
+    return keys + [rendition_key(item["image_id"], v) for v in sorted(item.get("variants") or ())]
+
+
+def transact_delete(images_table: str, tags_table: str, item: Dict):
+    """
+    Delete the image row, its tag rows and its band rows atomically. Raises
+    LookupError if the image row is already gone (someone else deleted it
+    first). A transaction holds at most 100 items; tag rows beyond that are
+    removed with BatchWriteItem after the transaction committed.
+    """
+    image_id = item["image_id"]
+    bands = similarity.band_keys(item)
+    keys = tag_keys(item)
+    room = TRANSACT_MAX_ITEMS - 1 - len(bands)
+    head, rest = keys[:room], keys[room:]
+    actions = [{"Delete": {"TableName": images_table, "Key": {"image_id": image_id},
+                           "ConditionExpression": "attribute_exists(image_id)"}}]
+    actions += [{"Delete": {"TableName": similarity.table_name(), "Key": k}} for k in bands]
+    actions += [{"Delete": {"TableName": tags_table, "Key": k}} for k in head]
+    try:
+        transact_write(actions)
+    except TransactionConflict:
+        raise LookupError("Not found")
+    tag_dictionary.record([item], -1)
+    if rest:
+        left = batch_write([(tags_table, {"DeleteRequest": {"Key": k}}) for k in rest])
+        if left:
+            raise RuntimeError(f"{len(left)} tag rows of {image_id} were not deleted")
+
+
+def delete_objects(s3, bucket: str, keys: Sequence[str], max_workers: Optional[int] = None) -> List[str]:
+    """Delete keys in 1000-key DeleteObjects calls. Returns the keys that failed."""
+    unique = list(dict.fromkeys(keys))
+    chunks = [unique[i:i + S3_DELETE_MAX_KEYS] for i in range(0, len(unique), S3_DELETE_MAX_KEYS)]
+    if not chunks:
+        return []
+
+    def one(chunk):
+        resp = s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True})
+        return [err["Key"] for err in resp.get("Errors", [])]
+
+    if len(chunks) == 1:
+        return one(chunks[0])
+    workers = max_workers or int(os.getenv("BULK_DELETE_S3_CONCURRENCY", "4"))
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        return [k for part in pool.map(one, chunks) for k in part]
@@ -0,0 +1,252 @@
+# src/common/dynamo.py
+"""
+DynamoDB access helpers shared by the handlers.
+
+The read helpers (get_item, query_page, batch_get_items) take `fast=True` to
+go through the low-level client with common.ddb_codec's hand-rolled item
+codec instead of the resource's TypeDeserializer. Handlers pass
+fast_path_enabled() (DDB_FAST_PATH=1).
+"""
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from common import aio
+from common.aws_clients import ddb_client, ddb_resource, ddb_table, prewarm
+from common.ddb_codec import decode_item, encode_item
+
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_ATTEMPTS = 6
+BATCH_GET_BASE_DELAY = 0.05
+BATCH_WRITE_MAX_ITEMS = 25
+BATCH_WRITE_MAX_ATTEMPTS = 8
+BATCH_WRITE_BASE_DELAY = 0.05
+TRANSACT_MAX_ITEMS = 100
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(base: float, attempt: int) -> float:
+    """Full-jitter exponential backoff, so parallel chunks throttled together do not retry in lockstep."""
+    return random.uniform(0, base * (2 ** attempt))
+
+
+class TransactionConflict(Exception):
+    """A TransactWriteItems was cancelled by condition checks; `failed` holds their action indexes."""
+
+    def __init__(self, failed: List[int]):
+        super().__init__(f"condition check failed for transaction actions {failed}")
+        self.failed = failed
+
+
+def fast_path_enabled() -> bool:
+    return os.getenv("DDB_FAST_PATH", "0") == "1"
+
+
+def prewarm_reads(*table_names: str):
+    """aws_clients.prewarm() for whichever read path (client or Table handles) is switched on."""
+    if fast_path_enabled():
+        prewarm("dynamodb")
+    else:
+        prewarm(tables=table_names)
+
+
+def projection(fields: Optional[Iterable[str]], required: Sequence[str] = ()) -> Dict:
+    """
+    Build ProjectionExpression kwargs for a list of attribute names.
+    Names go through ExpressionAttributeNames since several of ours
+    (e.g. 'size') are DynamoDB reserved words.
+    """
+    if not fields:
+        return {}
+    names: List[str] = []
+    for f in list(required) + [f.strip() for f in fields]:
+        if f and f not in names:
+            names.append(f)
+    placeholders = {f"#p{i}": n for i, n in enumerate(names)}
+    return {
+        "ProjectionExpression": ", ".join(placeholders),
+        "ExpressionAttributeNames": placeholders,
+    }
+
+
+def parse_fields(raw: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated `fields=` query parameter."""
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    return fields or None
+
+
+def _chunks(seq: List, n: int):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+def _batch_get_chunk(client, table_name: str, keys: List[Dict], proj: Dict) -> List[Dict]:
+    # The resource's client carries boto3's type (de)serialization hooks,
+    # so keys and items are plain Python values. Clients are thread-safe.
+    request = {table_name: dict({"Keys": keys}, **proj)}
+    out: List[Dict] = []
+    for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+        resp = client.batch_get_item(RequestItems=request)
+        out.extend(resp.get("Responses", {}).get(table_name, []))
+        request = resp.get("UnprocessedKeys") or {}
+        if not request.get(table_name, {}).get("Keys"):
+            return out
+        time.sleep(backoff_delay(BATCH_GET_BASE_DELAY, attempt))
+    raise RuntimeError(f"batch_get_item left {len(request[table_name]['Keys'])} keys unprocessed")
+
+
+async def batch_get_items_async(table_name: str, key_attr: str, ids: Sequence[str],
+                                fields: Optional[Iterable[str]] = None,
+                                max_workers: Optional[int] = None, fast: bool = False) -> List[Dict]:
+    """
+    Fetch items by primary key with BatchGetItem, returning them in the order
+    of `ids` (missing items are dropped, duplicates collapsed). Keys are sent in
+    100-key chunks which are fetched concurrently (see common.aio).
+    """
+    unique = list(dict.fromkeys(ids))
+    if not unique:
+        return []
+    proj = projection(fields, required=[key_attr])
+    if fast:
+        client = ddb_client()
+        chunks = [[{key_attr: {"S": i}} for i in c] for c in _chunks(unique, BATCH_GET_MAX_KEYS)]
+    else:
+        client = ddb_resource().meta.client
+        chunks = [[{key_attr: i} for i in c] for c in _chunks(unique, BATCH_GET_MAX_KEYS)]
+
+    workers = max_workers or int(os.getenv("BATCH_GET_CONCURRENCY", "4"))
+    results = await aio.map(lambda c: _batch_get_chunk(client, table_name, c, proj), chunks, limit=workers)
+
+    if fast:
+        results = [[decode_item(it) for it in part] for part in results]
+    by_id = {it[key_attr]: it for part in results for it in part}
+    return [by_id[i] for i in unique if i in by_id]
+
+
+def batch_get_items(table_name: str, key_attr: str, ids: Sequence[str],
+                    fields: Optional[Iterable[str]] = None,
+                    max_workers: Optional[int] = None, fast: bool = False) -> List[Dict]:
+    """batch_get_items_async() for sync callers (chunks fetched on a thread pool)."""
+    return aio.run(batch_get_items_async(table_name, key_attr, ids, fields, max_workers, fast))
+
+
+def get_item(table_name: str, key: Dict, fast: bool = False) -> Optional[Dict]:
+    """GetItem by primary key; None when the item does not exist."""
+    if not fast:
+        return ddb_table(table_name).get_item(Key=key).get("Item")
+    raw = ddb_client().get_item(TableName=table_name, Key=encode_item(key)).get("Item")
+    return decode_item(raw) if raw is not None else None
+
+
+def query_page(table_name: str, key_attr: str, value, index: Optional[str] = None,
+               forward: bool = True, limit: Optional[int] = None, start: Optional[Dict] = None,
+               fields: Optional[Iterable[str]] = None, required: Sequence[str] = (),
+               range_key: Optional[Tuple[str, str, object]] = None, filter_eq: Optional[Dict] = None,
+               fast: bool = False) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    One Query page on `key_attr = value` (table or `index`), optionally
+    narrowed by `range_key` = (sort key, comparison operator, value; for
+    "between" a (low, high) pair) and filtered on `filter_eq` attribute values. Returns the items and the
+    LastEvaluatedKey, both as plain Python values.
+    """
+    kwargs = {"KeyConditionExpression": "#k = :k", "ScanIndexForward": forward}
+    names = {"#k": key_attr}
+    values = {":k": value}
+    if range_key:
+        attr, op, bound = range_key
+        names["#r"] = attr
+        if op == "between":
+            kwargs["KeyConditionExpression"] += " AND #r BETWEEN :r AND :r2"
+            values[":r"], values[":r2"] = bound
+        elif op in ("=", "<", "<=", ">", ">="):
+            kwargs["KeyConditionExpression"] += f" AND #r {op} :r"
+            values[":r"] = bound
+        else:
+            raise ValueError(f"Unsupported sort key operator {op!r}")
+    if filter_eq:
+        clauses = []
+        for i, (attr, v) in enumerate(filter_eq.items()):
+            names[f"#f{i}"], values[f":f{i}"] = attr, v
+            clauses.append(f"#f{i} = :f{i}")
+        kwargs["FilterExpression"] = " AND ".join(clauses)
+    proj = projection(fields, required=required)
+    if proj:
+        kwargs["ProjectionExpression"] = proj["ProjectionExpression"]
+        names.update(proj["ExpressionAttributeNames"])
+    kwargs["ExpressionAttributeNames"] = names
+    if index:
+        kwargs["IndexName"] = index
+    if limit:
+        kwargs["Limit"] = limit
+
+    if not fast:
+        kwargs["ExpressionAttributeValues"] = values
+        if start:
+            kwargs["ExclusiveStartKey"] = start
+        resp = ddb_table(table_name).query(**kwargs)
+        return resp.get("Items", []), resp.get("LastEvaluatedKey")
+
+    kwargs["ExpressionAttributeValues"] = encode_item(values)
+    if start:
+        kwargs["ExclusiveStartKey"] = encode_item(start)
+    resp = ddb_client().query(TableName=table_name, **kwargs)
+    last = resp.get("LastEvaluatedKey")
+    return [decode_item(it) for it in resp.get("Items", [])], decode_item(last) if last else None
+
+
+def _batch_write_chunk(client, chunk: List[Tuple[str, Dict]]) -> List[Tuple[str, Dict]]:
+    request: Dict[str, List[Dict]] = {}
+    for table_name, req in chunk:
+        request.setdefault(table_name, []).append(req)
+    try:
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            resp = client.batch_write_item(RequestItems=request)
+            request = {t: reqs for t, reqs in (resp.get("UnprocessedItems") or {}).items() if reqs}
+            if not request:
+                return []
+            time.sleep(backoff_delay(BATCH_WRITE_BASE_DELAY, attempt))
+    except Exception:
+        logger.warning("batch_write_item failed for %d requests", sum(map(len, request.values())), exc_info=True)
+    return [(t, req) for t, reqs in request.items() for req in reqs]
+
+
+def batch_write(requests: Sequence[Tuple[str, Dict]], max_workers: Optional[int] = None) -> List[Tuple[str, Dict]]:
+    """
+    Send (table_name, WriteRequest) pairs through BatchWriteItem, 25 per call
+    (tables mixed freely), retrying UnprocessedItems with jittered exponential backoff.
+    Chunks are written in parallel. Returns the pairs that were still not
+    written after the last attempt (or whose call failed); empty on success.
+    A single call must not carry two requests for the same key.
+    """
+    if not requests:
+        return []
+    client = ddb_resource().meta.client
+    chunks = list(_chunks(list(requests), BATCH_WRITE_MAX_ITEMS))
+    if len(chunks) == 1:
+        return _batch_write_chunk(client, chunks[0])
+    workers = max_workers or int(os.getenv("BATCH_WRITE_CONCURRENCY", "4"))
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        return [pair for part in pool.map(lambda c: _batch_write_chunk(client, c), chunks) for pair in part]
+
+
+def transact_write(actions: Sequence[Dict]):
+    """
+    Run TransactWriteItems (at most TRANSACT_MAX_ITEMS actions, plain Python
+    values). Raises TransactionConflict when condition checks cancelled it;
+    other cancellations (e.g. transaction conflicts) propagate unchanged.
+    """
+    client = ddb_resource().meta.client
+    try:
+        client.transact_write_items(TransactItems=list(actions))
+    except client.exceptions.TransactionCanceledException as e:
+        reasons = e.response.get("CancellationReasons") or []
+        failed = [i for i, r in enumerate(reasons) if r.get("Code") == "ConditionalCheckFailed"]
+        if failed:
+            raise TransactionConflict(failed) from e
+        raise
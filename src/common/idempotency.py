@@ -0,0 +1,130 @@
+# src/common/idempotency.py
+"""
+Idempotency-Key support for POST /images.
+
+A client that times out and retries with the same `Idempotency-Key` header
+gets the original result instead of a second image. Records live in the
+`image_idempotency` table (PK idempotency_key, expires via the `expires_at`
+TTL):
+
+  idempotency_key | image_id | fingerprint | state (pending | committed) | response | expires_at
+
+  - reserve() claims the key (conditional put) and fixes the image_id
+    before any bytes are written. A retry of a request that died midway
+    gets the same image_id, so it overwrites the same S3 key instead of
+    leaving a second object behind.
+  - commit_action() is the TransactWriteItems action that flips the record
+    to `committed` (storing the response) in the same transaction as the
+    image and tag rows, so "committed" and "metadata written" cannot diverge.
+  - The fingerprint (sha256 of the request body, with the image bytes
+    hashed in slices instead of serialized) makes reuse of a key for
+    a different request an error instead of a silent replay. Identical
+    retries racing each other write identical bytes to the same key; one
+    transaction wins and the other replays its result.
+
+Keys are scoped per user_id.
+"""
+import os
+import json
+import time
+import hashlib
+from collections import namedtuple
+from typing import Dict, Optional
+
+from common.aws_clients import ddb_table
+from common.utils import gen_id
+
+PENDING = "pending"
+COMMITTED = "committed"
+HEADER = "idempotency-key"
+MAX_KEY_CHARS = 255
+DEFAULT_TTL_SECONDS = 24 * 3600
+BLOB_FIELD = "image_base64"
+FINGERPRINT_CHUNK = 1024 * 1024
+
+# response is the stored result for a committed key (a replay), else None
+Reservation = namedtuple("Reservation", ["key", "image_id", "response"])
+
+
+class IdempotencyMismatch(Exception):
+    """The key was already used for a different request."""
+
+
+def table_name() -> str:
+    return os.getenv("IDEMPOTENCY_TABLE_NAME", "image_idempotency")
+
+
+def request_key(event: dict) -> Optional[str]:
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    raw = (headers.get(HEADER) or "").strip()
+    if not raw:
+        return None
+    if len(raw) > MAX_KEY_CHARS:
+        raise ValueError(f"Idempotency-Key must be at most {MAX_KEY_CHARS} characters")
+    return raw
+
+
+def fingerprint(payload: Dict) -> str:
+    # the base64 image is most of the body; feed it to the hash directly
+    # rather than copying it through json.dumps and encode()
+    data = payload.get(BLOB_FIELD)
+    rest = {k: v for k, v in payload.items() if k != BLOB_FIELD or not isinstance(data, str)}
+    digest = hashlib.sha256(json.dumps(rest, sort_keys=True, separators=(",", ":")).encode())
+    if isinstance(data, str):
+        digest.update(b"\0")
+        for i in range(0, len(data), FINGERPRINT_CHUNK):
+            digest.update(data[i:i + FINGERPRINT_CHUNK].encode())
+    return digest.hexdigest()
+
+
+def _record_key(user_id: str, key: str) -> str:
+    return hashlib.sha256(f"{user_id}\0{key}".encode()).hexdigest()
+
+
+def reserve(key: str, user_id: str, request_fingerprint: str) -> Reservation:
+    """Claim `key` for this request, or find the attempt that claimed it earlier."""
+    tbl = ddb_table(table_name())
+    now = int(time.time())
+    record = {
+        "idempotency_key": _record_key(user_id, key),
+        "image_id": gen_id(),
+        "fingerprint": request_fingerprint,
+        "state": PENDING,
+        "expires_at": now + int(os.getenv("IDEMPOTENCY_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+    }
+    try:
+        # TTL deletion lags; an expired record counts as absent
+        tbl.put_item(Item=record,
+                     ConditionExpression="attribute_not_exists(idempotency_key) OR expires_at < :now",
+                     ExpressionAttributeValues={":now": now})
+        return Reservation(record["idempotency_key"], record["image_id"], None)
+    except tbl.meta.client.exceptions.ConditionalCheckFailedException:
+        existing = tbl.get_item(Key={"idempotency_key": record["idempotency_key"]}, ConsistentRead=True)["Item"]
+    if existing["fingerprint"] != request_fingerprint:
+        raise IdempotencyMismatch("Idempotency-Key was already used with a different request")
+    if existing["state"] == COMMITTED:
+        return Reservation(existing["idempotency_key"], existing["image_id"], json.loads(existing["response"]))
+    # an earlier attempt died before committing (or is still running): redo it under its image_id
+    return Reservation(existing["idempotency_key"], existing["image_id"], None)
+
+
+def commit_action(reservation: Reservation, response: str) -> Dict:
+    """TransactWriteItems action marking the reservation committed with its JSON `response`."""
+    return {"Update": {
+        "TableName": table_name(),
+        "Key": {"idempotency_key": reservation.key},
+        "UpdateExpression": "SET #st = :committed, #resp = :resp",
+        "ConditionExpression": "image_id = :image_id",
+        "ExpressionAttributeNames": {"#st": "state", "#resp": "response"},
+        "ExpressionAttributeValues": {":committed": COMMITTED, ":resp": response,
+                                      ":image_id": reservation.image_id},
+    }}
+
+
+def replay(reservation: Reservation) -> Optional[Dict]:
+    """The committed response for this reservation, re-read after losing a commit race."""
+    record = ddb_table(table_name()).get_item(Key={"idempotency_key": reservation.key},
+                                              ConsistentRead=True).get("Item")
+    if record and record.get("state") == COMMITTED:
+        return json.loads(record["response"])
+    return None
@@ -0,0 +1,191 @@
+# src/common/image_probe.py
+"""
+Server-side validation of uploaded image bytes, without decoding pixels
+(opt-in, IMAGE_VALIDATION=1).
+
+The first bytes are matched against the magic numbers of the accepted
+formats and must agree with the declared content_type. Then only the header
+is parsed, for the dimensions, color mode and EXIF orientation. Pillow's
+Image.open is lazy: it reads the header and stops before the pixel data.
+WebP is the exception, since Pillow hands the whole file to libwebp on open,
+so its RIFF header is read here directly. The results are stored on the
+images item (width/height as displayed, i.e. after EXIF rotation, plus
+orientation and color_mode).
+
+Only a prefix of the image is needed. Callers that stream (large base64
+payloads, direct uploads in S3) pass a reader for the first n bytes.
+HEADER_BYTES is tried first and grown up to MAX_HEADER_BYTES when metadata
+such as EXIF or ICC segments pushes the frame header further in.
+
+Limits: IMAGE_MAX_BYTES, IMAGE_MAX_DIMENSION (either side) and
+IMAGE_MAX_PIXELS. Every failure is an InvalidImage (a ValueError, so
+handlers answer 400).
+"""
+import io
+import os
+import struct
+from typing import Callable, Dict, Optional
+
+HEADER_BYTES = 64 * 1024
+MAX_HEADER_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_MAX_DIMENSION = 20000
+DEFAULT_MAX_PIXELS = 100_000_000
+EXIF_ORIENTATION = 0x0112
+
+# content_type -> format (Pillow's name)
+CONTENT_TYPES = {
+    "image/jpeg": "JPEG", "image/jpg": "JPEG", "image/pjpeg": "JPEG",
+    "image/png": "PNG",
+    "image/gif": "GIF",
+    "image/webp": "WEBP",
+    "image/tiff": "TIFF",
+    "image/bmp": "BMP", "image/x-ms-bmp": "BMP",
+}
+SIGNATURES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+    (b"BM", "BMP"),
+]
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+class _Truncated(Exception):
+    pass
+
+
+def enabled() -> bool:
+    return os.getenv("IMAGE_VALIDATION", "0") == "1"
+
+
+def max_bytes() -> int:
+    return int(os.getenv("IMAGE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """Format named by the magic number at the start of `head`, or None."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for magic, fmt in SIGNATURES:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def format_for(content_type: str) -> str:
+    """Format an accepted content_type names (InvalidImage for anything else)."""
+    fmt = CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if fmt is None:
+        raise InvalidImage(f"Unsupported content_type {content_type!r}")
+    return fmt
+
+
+def check_size(size: int):
+    limit = max_bytes()
+    if size > limit:
+        raise InvalidImage(f"Image exceeds the maximum of {limit} bytes")
+
+
+def _webp(head: bytes) -> Dict:
+    # RIFF size WEBP, then the first chunk: VP8X (extended), VP8L (lossless) or VP8 (lossy)
+    if len(head) < 30:
+        raise _Truncated()
+    chunk = head[12:16]
+    if chunk == b"VP8X":
+        flags = head[20]
+        width = 1 + int.from_bytes(head[24:27], "little")
+        height = 1 + int.from_bytes(head[27:30], "little")
+        return {"width": width, "height": height, "color_mode": "RGBA" if flags & 0x10 else "RGB"}
+    if chunk == b"VP8L" and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], "little")
+        return {"width": 1 + (bits & 0x3FFF), "height": 1 + ((bits >> 14) & 0x3FFF),
+                "color_mode": "RGBA" if bits >> 28 & 1 else "RGB"}
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return {"width": width & 0x3FFF, "height": height & 0x3FFF, "color_mode": "RGB"}
+    raise InvalidImage("Unreadable WEBP header")
+
+
+def _orientation(img) -> int:
+    # only metadata Pillow already read with the header: getexif() on a PNG
+    # without an eXIf chunk up front would decode the whole image looking for one
+    from PIL import Image
+
+    if img.format == "TIFF":
+        value = img.getexif().get(EXIF_ORIENTATION)
+    elif img.info.get("exif"):
+        exif = Image.Exif()
+        exif.load(img.info["exif"])
+        value = exif.get(EXIF_ORIENTATION)
+    else:
+        value = None
+    return value if isinstance(value, int) and 1 <= value <= 8 else 1
+
+
+def _pillow(head: bytes, fmt: str) -> Dict:
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(head), formats=[fmt]) as img:
+            return {"width": img.width, "height": img.height, "color_mode": img.mode,
+                    "orientation": _orientation(img)}
+    except Image.DecompressionBombError:
+        raise InvalidImage("Image has too many pixels")
+    except Exception:
+        raise _Truncated()
+
+
+def _header(head: bytes, fmt: str) -> Dict:
+    info = _webp(head) if fmt == "WEBP" else _pillow(head, fmt)
+    info.setdefault("orientation", 1)
+    return info
+
+
+def probe(read: Callable[[int], bytes], content_type: str) -> Dict:
+    """
+    Validate an image from its first bytes and return the fields stored on
+    the images item. `read(n)` returns the first n bytes (fewer at the end of
+    the image; more means all of them: nothing further to read).
+    """
+    fmt = format_for(content_type)
+    n = HEADER_BYTES
+    while True:
+        head = read(n)
+        found = sniff(head[:16])
+        if found is None:
+            raise InvalidImage("Uploaded bytes are not a supported image")
+        if found != fmt:
+            raise InvalidImage(f"Uploaded bytes are {found}, not {content_type}")
+        try:
+            info = _header(head, fmt)
+            break
+        except _Truncated:
+            if len(head) != n or n >= MAX_HEADER_BYTES:
+                raise InvalidImage(f"Unreadable {fmt} header")
+            n = min(n * 4, MAX_HEADER_BYTES)
+
+    width, height = info["width"], info["height"]
+    max_side = int(os.getenv("IMAGE_MAX_DIMENSION", DEFAULT_MAX_DIMENSION))
+    max_pixels = int(os.getenv("IMAGE_MAX_PIXELS", DEFAULT_MAX_PIXELS))
+    if width < 1 or height < 1:
+        raise InvalidImage("Image has no pixels")
+    if max(width, height) > max_side:
+        raise InvalidImage(f"Image dimensions {width}x{height} exceed the maximum of {max_side} px per side")
+    if width * height > max_pixels:
+        raise InvalidImage(f"Image has more than {max_pixels} pixels")
+    if info["orientation"] >= 5:
+        width, height = height, width  # stored rotated by 90 degrees
+    return {"width": width, "height": height, "orientation": info["orientation"], "color_mode": info["color_mode"]}
+
+
+def probe_bytes(data: bytes, content_type: str) -> Dict:
+    """probe() over bytes already in memory."""
+    check_size(len(data))
+    return probe(lambda n: data, content_type)
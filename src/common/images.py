@@ -0,0 +1,72 @@
+# src/common/images.py
+"""
+Shared pieces of the image write path (validation, item shape, tag rows),
+used by every handler that creates image metadata.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from common import similarity, tag_shards
+from common.tags import check_tags, check_user_id, normalize_tag, tag_keys, tag_rows
+
+METADATA_FIELDS = ["user_id", "title", "tags", "content_type"]
+
+
+def validate_metadata(payload: dict, extra_required: Iterable[str] = ()):
+    required = METADATA_FIELDS + list(extra_required)
+    missing = [k for k in required if k not in payload]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    check_user_id(payload["user_id"])
+    if not isinstance(payload.get("tags"), list) or not payload["tags"]:
+        raise ValueError("'tags' must be a non-empty list")
+    # a tag with a comma could never be searched for (tag=a,b lists two tags)
+    check_tags(payload["tags"])
+
+
+def normalize_tags(raw: Iterable) -> List[str]:
+    # "Sunset" and "sunset" are the same tag row; keep the first occurrence only
+    return list(dict.fromkeys(normalize_tag(t) for t in raw if t and isinstance(t, str)))
+
+
+def image_item(image_id: str, payload: dict, bucket: str, s3_key: str,
+               size: int, checksum: str, created_at: str, info: Optional[Dict] = None) -> Dict:
+    tags = normalize_tags(payload["tags"])
+    item = {
+        "image_id": image_id,
+        "user_id": payload["user_id"],
+        "title": payload["title"],
+        "description": payload.get("description", ""),
+        "tags": tags,
+        "content_type": payload["content_type"],
+        "s3_bucket": bucket,
+        "s3_key": s3_key,
+        "size": size,
+        "checksum": checksum,
+        "created_at": created_at,
+    }
+    item.update(info or {})  # width, height, orientation, color_mode (common.image_probe)
+    shards = tag_shards.assign(image_id, tags)
+    if shards:
+        item["tag_shards"] = shards
+    return item
+
+
+def tag_write_requests(tags_table: str, item: Dict) -> List[Tuple[str, Dict]]:
+    """BatchWriteItem requests for an image's tag rows (see common.dynamo.batch_write)."""
+    return [(tags_table, {"PutRequest": {"Item": row}}) for row in tag_rows(item)]
+
+
+def write_requests(images_table: str, tags_table: str, item: Dict) -> List[Tuple[str, Dict]]:
+    """BatchWriteItem requests for an image row and its tag rows."""
+    return [(images_table, {"PutRequest": {"Item": item}})] + tag_write_requests(tags_table, item)
+
+
+def index_delete_requests(tags_table: str, item: Dict) -> List[Tuple[str, Dict]]:
+    """BatchWriteItem requests removing an image's tag rows and its band rows (common.similarity)."""
+    return [(tags_table, {"DeleteRequest": {"Key": k}}) for k in tag_keys(item)] + similarity.delete_requests(item)
+
+
+def delete_requests(images_table: str, tags_table: str, item: Dict) -> List[Tuple[str, Dict]]:
+    """BatchWriteItem requests removing an image row, its tag rows and its band rows."""
+    return [(images_table, {"DeleteRequest": {"Key": {"image_id": item["image_id"]}}})] + index_delete_requests(
+        tags_table, item)
@@ -0,0 +1,388 @@
+# src/common/metrics.py
+"""
+Per-request performance instrumentation.
+
+Every handler is wrapped with @instrument. While a request runs:
+
+  - botocore hooks that attach() registers on each client (common.aws_clients
+    calls it as clients are built) time every AWS call, retries included. They
+    also record the items returned, request and response bytes, and the
+    consumed read/write capacity. DynamoDB calls are sent with
+    ReturnConsumedCapacity=TOTAL unless METRICS_CONSUMED_CAPACITY=0.
+  - phase() times named steps that are not AWS calls: "serialize" (response
+    bodies) and "client_init" (building clients and resources).
+  - count() adds to a named event counter (e.g. "TagCountFailures"), emitted
+    as a metric of its own.
+
+At the end of the request one CloudWatch Embedded Metric Format line is
+written to stdout (Lambda ships it to CloudWatch Logs, which extracts the
+metrics). Its dimension is the handler. It carries totals as metrics and a
+per-operation breakdown ("dynamodb.Query": count, ms, ...), the phases, cold
+or warm status and the request id as properties, which Logs Insights can
+query. With METRICS_OTEL=1 and the optional opentelemetry-api package, the
+same request also goes out as a handler span with one child span per AWS call.
+
+METRICS_ENABLED=0 switches all of it off; the hooks then return immediately.
+scripts/bench_instrumentation.py measures the overhead either way.
+
+Lambda runs one invocation per process at a time, so the request being
+recorded is process-wide: calls made on worker threads (parallel chunks,
+common.aio) are attributed to it.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_NAMESPACE = "ImageService"
+# operations whose input accepts ReturnConsumedCapacity
+CAPACITY_OPERATIONS = frozenset({
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan", "BatchGetItem",
+    "BatchWriteItem", "TransactGetItems", "TransactWriteItems",
+})
+READ_OPERATIONS = frozenset({"GetItem", "Query", "Scan", "BatchGetItem", "TransactGetItems"})
+_T0 = "metrics_t0"
+
+_lock = threading.Lock()
+_current: Optional["Recorder"] = None
+_cold = True
+_sink: Optional[Callable[[str], None]] = None
+
+
+def enabled() -> bool:
+    return os.getenv("METRICS_ENABLED", "1") == "1"
+
+
+class Recorder:
+    """Everything measured during one request."""
+
+    def __init__(self, handler: str, request_id: Optional[str], cold: bool):
+        self.handler = handler
+        self.request_id = request_id
+        self.cold = cold
+        self.start = time.time()
+        self.start_ns = time.time_ns()
+        self.t0 = time.perf_counter()
+        self.end_ns = 0
+        self.duration_ms = 0.0
+        self.status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.calls: List[Dict] = []
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add_call(self, call: Dict):
+        with self.lock:
+            self.calls.append(call)
+
+    def add_phase(self, name: str, ms: float):
+        with self.lock:
+            self.phases[name] += ms
+
+    def add_count(self, name: str, n: int):
+        with self.lock:
+            self.counters[name] += n
+
+    def finish(self, response):
+        self.duration_ms = (time.perf_counter() - self.t0) * 1000.0
+        self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+        if isinstance(response, dict):
+            self.status = response.get("statusCode")
+            if isinstance(self.status, int) and self.status >= 500 and not response.get("isBase64Encoded"):
+                try:
+                    self.error = json.loads(response.get("body") or "{}").get("error")
+                except (ValueError, AttributeError):
+                    pass
+
+    def operations(self) -> Dict[str, Dict]:
+        ops: Dict[str, Dict] = {}
+        for c in self.calls:
+            op = ops.setdefault(f"{c['service']}.{c['operation']}",
+                                {"count": 0, "ms": 0.0, "max_ms": 0.0, "items": 0, "rcu": 0.0, "wcu": 0.0,
+                                 "request_bytes": 0, "response_bytes": 0, "errors": 0})
+            op["count"] += 1
+            op["ms"] += c["ms"]
+            op["max_ms"] = max(op["max_ms"], c["ms"])
+            for k in ("items", "rcu", "wcu", "request_bytes", "response_bytes"):
+                op[k] += c[k]
+            op["errors"] += 1 if c["error"] else 0
+        for op in ops.values():
+            op["ms"], op["max_ms"] = round(op["ms"], 3), round(op["max_ms"], 3)
+        return ops
+
+    def emf(self, namespace: Optional[str] = None) -> Dict:
+        """The request as one Embedded Metric Format document."""
+        totals = {
+            "Duration": (round(self.duration_ms, 3), "Milliseconds"),
+            "AwsCalls": (len(self.calls), "Count"),
+            "AwsTime": (round(sum(c["ms"] for c in self.calls), 3), "Milliseconds"),
+            "ReadCapacity": (round(sum(c["rcu"] for c in self.calls), 3), "Count"),
+            "WriteCapacity": (round(sum(c["wcu"] for c in self.calls), 3), "Count"),
+            "ItemCount": (sum(c["items"] for c in self.calls), "Count"),
+            "RequestBytes": (sum(c["request_bytes"] for c in self.calls), "Bytes"),
+            "ResponseBytes": (sum(c["response_bytes"] for c in self.calls), "Bytes"),
+            "SerializeTime": (round(self.phases.get("serialize", 0.0), 3), "Milliseconds"),
+            "ClientInitTime": (round(self.phases.get("client_init", 0.0), 3), "Milliseconds"),
+            "ColdStart": (int(self.cold), "Count"),
+            "Errors": (int(bool(self.status and self.status >= 500) or self.error is not None), "Count"),
+        }
+        totals.update({name: (n, "Count") for name, n in self.counters.items()})
+        doc = {
+            "_aws": {
+                "Timestamp": int(self.start * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace or os.getenv("METRICS_NAMESPACE", DEFAULT_NAMESPACE),
+                    "Dimensions": [["Handler"]],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in totals.items()],
+                }],
+            },
+            "Handler": self.handler,
+            "requestId": self.request_id,
+            "statusCode": self.status,
+            "coldStart": self.cold,
+            "operations": self.operations(),
+            "phases": {k: round(v, 3) for k, v in self.phases.items()},
+        }
+        doc.update({name: value for name, (value, _) in totals.items()})
+        if self.error:
+            doc["error"] = self.error
+        return doc
+
+    def spans(self) -> List[Dict]:
+        """OpenTelemetry-shaped spans: the handler, then one child per AWS call."""
+        root = {"name": f"handler {self.handler}", "parent": None, "start_ns": self.start_ns, "end_ns": self.end_ns,
+                "attributes": {"faas.coldstart": self.cold, "faas.invocation_id": self.request_id or "",
+                               "http.status_code": self.status or 0}}
+        out = [root]
+        for c in self.calls:
+            attributes = {"rpc.system": "aws-api", "rpc.service": c["service"], "rpc.method": c["operation"],
+                          "aws.items": c["items"], "aws.request_bytes": c["request_bytes"],
+                          "aws.response_bytes": c["response_bytes"]}
+            if c["service"] == "dynamodb":
+                attributes.update({"aws.dynamodb.consumed_read_capacity": c["rcu"],
+                                   "aws.dynamodb.consumed_write_capacity": c["wcu"]})
+            if c["error"]:
+                attributes["error.type"] = c["error"]
+            out.append({"name": f"{c['service']}.{c['operation']}", "parent": root["name"],
+                        "start_ns": c["start_ns"], "end_ns": c["start_ns"] + int(c["ms"] * 1e6),
+                        "attributes": attributes})
+        return out
+
+
+def current() -> Optional[Recorder]:
+    return _current
+
+
+def set_sink(sink: Optional[Callable[[str], None]] = None):
+    """Where EMF lines go (default: stdout)."""
+    global _sink
+    _sink = sink
+
+
+def _emit(line: str):
+    if _sink is not None:
+        _sink(line)
+    else:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def count(name: str, n: int = 1):
+    """Add `n` to the current request's `name` counter (no-op outside one)."""
+    rec = _current
+    if rec is not None:
+        rec.add_count(name, n)
+
+
+@contextmanager
+def phase(name: str):
+    """Time a non-AWS step of the current request (no-op outside one)."""
+    rec = _current
+    if rec is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        rec.add_phase(name, (time.perf_counter() - t0) * 1000.0)
+
+
+# --- botocore hooks -----------------------------------------------------------
+
+def _provide_capacity(params, model, **kwargs):
+    if (_current is not None and model.name in CAPACITY_OPERATIONS and "ReturnConsumedCapacity" not in params
+            and os.getenv("METRICS_CONSUMED_CAPACITY", "1") == "1"):
+        params["ReturnConsumedCapacity"] = "TOTAL"
+
+
+def _before_call(params, model, context, **kwargs):
+    if _current is not None:
+        context[_T0] = (time.perf_counter(), time.time_ns(), _body_bytes(params), model)
+
+
+def _after_call(http_response, parsed, context, **kwargs):
+    _record(context, parsed, http_response, None)
+
+
+def _after_call_error(exception, context, **kwargs):
+    # botocore passes no model here (the request never got a response)
+    _record(context, None, None, type(exception).__name__)
+
+
+def _body_bytes(params) -> int:
+    body = params.get("body") if isinstance(params, dict) else None
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    if hasattr(body, "seekable") and body.seekable():
+        # streamed uploads (S3 PutObject/UploadPart): size without reading
+        pos = body.tell()
+        size = body.seek(0, 2) - pos
+        body.seek(pos)
+        return size
+    return 0
+
+
+def _response_bytes(http_response, model) -> int:
+    if http_response is None:
+        return 0
+    length = http_response.headers.get("content-length")
+    if length and length.isdigit():
+        return int(length)
+    # already read and parsed, unless the body is a stream left to the caller
+    return 0 if model.has_streaming_output else len(http_response.content or b"")
+
+
+def _capacity(parsed, read: bool) -> tuple:
+    rcu = wcu = 0.0
+    consumed = parsed.get("ConsumedCapacity")
+    for c in consumed if isinstance(consumed, list) else [consumed] if consumed else []:
+        r, w = c.get("ReadCapacityUnits"), c.get("WriteCapacityUnits")
+        if r is None and w is None:
+            # often only the total is reported; it is of the operation's kind
+            units = float(c.get("CapacityUnits") or 0)
+            rcu, wcu = (rcu + units, wcu) if read else (rcu, wcu + units)
+        else:
+            rcu, wcu = rcu + float(r or 0), wcu + float(w or 0)
+    return rcu, wcu
+
+
+def _items(parsed) -> int:
+    if "Items" in parsed:
+        return len(parsed["Items"])
+    if "Responses" in parsed:
+        responses = parsed["Responses"]
+        if isinstance(responses, dict):
+            return sum(len(v) for v in responses.values())
+        return len(responses)
+    if "Contents" in parsed:
+        return len(parsed["Contents"])
+    if parsed.get("Item"):
+        return 1
+    return 0
+
+
+def _record(context, parsed, http_response, error: Optional[str]):
+    rec = _current
+    started = context.pop(_T0, None) if isinstance(context, dict) else None
+    if rec is None or started is None:
+        return
+    t0, start_ns, request_bytes, model = started
+    ms = (time.perf_counter() - t0) * 1000.0
+    try:
+        parsed = parsed or {}
+        code = (parsed.get("Error") or {}).get("Code")
+        rcu, wcu = _capacity(parsed, model.name in READ_OPERATIONS)
+        rec.add_call({
+            "service": model.service_model.endpoint_prefix, "operation": model.name,
+            "ms": ms, "start_ns": start_ns, "items": _items(parsed), "rcu": rcu, "wcu": wcu,
+            "request_bytes": request_bytes, "response_bytes": _response_bytes(http_response, model),
+            "error": error or code,
+        })
+    except Exception:  # metrics never fail a call
+        pass
+
+
+def attach(client):
+    """Register the timing hooks on a boto3 client (idempotent: the handlers have unique ids)."""
+    events = client.meta.events
+    events.register("provide-client-params.dynamodb.*", _provide_capacity, unique_id="metrics-capacity")
+    events.register("before-call.*.*", _before_call, unique_id="metrics-before")
+    events.register("after-call.*.*", _after_call, unique_id="metrics-after")
+    events.register("after-call-error.*.*", _after_call_error, unique_id="metrics-error")
+    return client
+
+
+# --- tracing ------------------------------------------------------------------
+
+_tracer = None
+
+
+def _otel_tracer():
+    global _tracer
+    if _tracer is None and os.getenv("METRICS_OTEL", "0") == "1":
+        try:
+            from opentelemetry import trace
+        except ImportError:  # optional dependency
+            _tracer = False
+        else:
+            _tracer = trace.get_tracer("imagestore")
+    return _tracer or None
+
+
+def _export_spans(rec: Recorder):
+    tracer = _otel_tracer()
+    if tracer is None:
+        return
+    from opentelemetry import trace
+    spans = rec.spans()
+    root = tracer.start_span(spans[0]["name"], start_time=spans[0]["start_ns"], attributes=spans[0]["attributes"])
+    ctx = trace.set_span_in_context(root)
+    for s in spans[1:]:
+        tracer.start_span(s["name"], context=ctx, start_time=s["start_ns"],
+                          attributes=s["attributes"]).end(end_time=s["end_ns"])
+    root.end(end_time=spans[0]["end_ns"])
+
+
+# --- handler decorator --------------------------------------------------------
+
+def instrument(handler: Callable) -> Callable:
+    """Record and emit metrics for every call of a Lambda `handler(event, context)`."""
+    name = handler.__module__.rsplit(".", 1)[-1]
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _current, _cold
+        if not enabled():
+            return handler(event, context)
+        with _lock:
+            rec = Recorder(name, getattr(context, "aws_request_id", None), _cold)
+            _cold = False
+            previous, _current = _current, rec
+        response = None
+        try:
+            response = handler(event, context)
+            return response
+        except Exception as e:
+            rec.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            rec.finish(response)
+            with _lock:
+                # Overlapping calls (tests, load runs on threads) may finish
+                # out of order: never hand the slot back to a finished request.
+                if _current is rec:
+                    _current = previous if previous is not None and not previous.end_ns else None
+            try:
+                _emit(json.dumps(rec.emf(), separators=(",", ":"), default=str))
+                _export_spans(rec)
+            except Exception:  # metrics never fail a request
+                pass
+
+    return wrapper
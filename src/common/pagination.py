@@ -0,0 +1,140 @@
+# src/common/pagination.py
+"""
+Opaque, signed pagination cursors for the list endpoints.
+
+A cursor is base64url (unpadded) over:
+
+  version (1 byte) | HMAC-SHA256 truncated to 16 bytes | payload
+
+where the payload is the compact JSON array
+[mode, index fingerprint, sort, [key values]]. The index is recorded as a
+short hash of its name and key values are stored positionally in the order of
+the query's key attributes, so neither index nor attribute names reach the
+client and the token stays small. Cursors minted against an index that has
+since been replaced are rejected instead of resuming at a wrong key.
+
+The HMAC key comes from PAGINATION_SECRET; a comma-separated list signs with
+the first entry and verifies against all of them (rotation). There is no
+built-in key: without one, cursors are neither minted nor accepted
+(RuntimeError, so the request fails with a 500 instead of falling back to a
+well-known key).
+
+A cursor only resumes the query it came from: mode, index and sort must match,
+and the filter values embedded in the key (user_id, tag, ...) must match the
+request's. Anything else is rejected with ValueError.
+
+`since=`/`until=` bound a listing in time (parse_time_range); the handler
+checks that a cursor's key lies inside the requested range.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from common.utils import EPOCH, parse_time
+
+CURSOR_VERSION = 1
+MAC_BYTES = 16
+MAX_CURSOR_CHARS = 512
+
+SORT_ASC = "created_at_asc"
+SORT_DESC = "created_at_desc"
+SORT_OPTIONS = (SORT_ASC, SORT_DESC)
+_SORT_CODES = {SORT_ASC: "a", SORT_DESC: "d"}
+# an open-ended `until` reaches this far past now (clock skew between writers)
+OPEN_UNTIL_SLACK = timedelta(days=1)
+
+# mode: short name of the list branch; index: GSI name or None for the base
+# table; key_attrs: attributes of that index's LastEvaluatedKey, in order
+QuerySpec = namedtuple("QuerySpec", ["mode", "index", "key_attrs"])
+
+
+def _secrets() -> List[bytes]:
+    secrets = [s.strip().encode() for s in os.getenv("PAGINATION_SECRET", "").split(",") if s.strip()]
+    if not secrets:
+        raise RuntimeError("PAGINATION_SECRET is not set")
+    return secrets
+
+
+def _mac(secret: bytes, body: bytes) -> bytes:
+    return hmac.new(secret, body, hashlib.sha256).digest()[:MAC_BYTES]
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else str(value)
+    return value
+
+
+def _index_tag(index: Optional[str]) -> str:
+    return hashlib.sha256((index or "").encode()).hexdigest()[:8]
+
+
+def parse_sort(raw: Optional[str]) -> str:
+    if not raw:
+        return SORT_ASC
+    if raw not in SORT_OPTIONS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_OPTIONS)}")
+    return raw
+
+
+def scan_forward(sort: str) -> bool:
+    return sort != SORT_DESC
+
+
+def parse_time_range(since: Optional[str], until: Optional[str]) -> Tuple[datetime, datetime]:
+    """Inclusive (since, until) in UTC; a missing end is left open."""
+    low = parse_time(since) if since else EPOCH
+    high = parse_time(until) if until else datetime.now(timezone.utc) + OPEN_UNTIL_SLACK
+    if low > high:
+        raise ValueError("since must not be after until")
+    return low, high
+
+
+def encode_cursor(spec: QuerySpec, last_key: Optional[Dict], sort: str = SORT_ASC) -> Optional[str]:
+    """Turn a LastEvaluatedKey into a cursor (None when there is no next page)."""
+    if not last_key:
+        return None
+    values = [_plain(last_key[a]) for a in spec.key_attrs]
+    payload = json.dumps([spec.mode, _index_tag(spec.index), _SORT_CODES[sort], values], separators=(",", ":")).encode()
+    version = bytes([CURSOR_VERSION])
+    token = version + _mac(_secrets()[0], version + payload) + payload
+    return base64.urlsafe_b64encode(token).rstrip(b"=").decode()
+
+
+def decode_cursor(token: Optional[str], spec: QuerySpec, sort: str = SORT_ASC,
+                  expect: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Verify a cursor and return the ExclusiveStartKey for `spec`.
+    `expect` pins key attributes to the request's filter values.
+    """
+    if not token:
+        return None
+    if len(token) > MAX_CURSOR_CHARS:
+        raise ValueError("Invalid pagination token")
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination token")
+    if len(raw) <= 1 + MAC_BYTES or raw[0] != CURSOR_VERSION:
+        raise ValueError("Invalid pagination token")
+    version, mac, payload = raw[:1], raw[1:1 + MAC_BYTES], raw[1 + MAC_BYTES:]
+    if not any(hmac.compare_digest(mac, _mac(s, version + payload)) for s in _secrets()):
+        raise ValueError("Invalid pagination token")
+    try:
+        mode, index, token_sort, values = json.loads(payload)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination token")
+    if (mode, index, token_sort) != (spec.mode, _index_tag(spec.index), _SORT_CODES[sort]) \
+            or len(values) != len(spec.key_attrs):
+        raise ValueError("Pagination token does not match this query")
+    key = dict(zip(spec.key_attrs, values))
+    for attr, value in (expect or {}).items():
+        if key.get(attr) != value:
+            raise ValueError("Pagination token does not match this query")
+    return key
@@ -0,0 +1,113 @@
+# src/common/phash.py
+"""
+Perceptual hashes of an image's pixels, the input of the near-duplicate
+index (common.similarity).
+
+Two 64-bit hashes are taken from small grayscale samples of the picture:
+
+  dhash  9x8 samples, one bit per horizontally adjacent pair (is the right
+         one brighter?). Survives re-encoding and resizing.
+  phash  32x32 samples, 2-D DCT, one bit per coefficient of the 8x8 lowest
+         frequencies (above their median?). Also survives small crops and
+         brightness/contrast changes.
+
+Re-encoded, resized or lightly edited copies of a picture land a few bits
+apart (Hamming distance); unrelated pictures about 32 bits apart. Hashes are
+stored as 16 hex digits, since a 64-bit integer does not survive every JSON
+client.
+
+EXIF orientation is applied first, so a copy rotated through metadata hashes
+like the upright one. JPEGs decode in draft mode (libjpeg DCT scaling, as in
+common.renditions) and other formats are shrunk with reduce() before the
+final resample. Hashing itself is NumPy over a stack of samples: the DCT is
+two matrix products with a precomputed basis and bits are packed with
+packbits, so compute_many() hashes a whole batch in one pass.
+
+Pillow and NumPy are imported lazily; only the paths that hash need them.
+"""
+import io
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+HASH_BITS = 64
+HASH_SIZE = 8  # bits per side of either hash
+PHASH_SAMPLE = 32  # DCT input, per side
+
+
+@lru_cache(maxsize=1)
+def _dct_basis():
+    # rows of the orthonormal DCT-II basis for the HASH_SIZE lowest frequencies
+    import numpy as np
+
+    k = np.arange(HASH_SIZE)[:, None]
+    x = np.arange(PHASH_SAMPLE)[None, :]
+    basis = np.cos(np.pi * (2 * x + 1) * k / (2 * PHASH_SAMPLE)) * np.sqrt(2 / PHASH_SAMPLE)
+    basis[0] /= np.sqrt(2)
+    return basis
+
+
+def samples(data: bytes) -> Tuple:
+    """Grayscale (8x9 dhash, 32x32 phash) float samples of an encoded image."""
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(data))
+    if img.format == "JPEG":
+        img.draft("L", (PHASH_SAMPLE * 2, PHASH_SAMPLE * 2))
+    img = ImageOps.exif_transpose(img).convert("L")
+    factor = min(img.width, img.height) // (PHASH_SAMPLE * 2)
+    if factor >= 2:
+        img = img.reduce(factor)
+    d = img.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    p = img.resize((PHASH_SAMPLE, PHASH_SAMPLE), Image.Resampling.LANCZOS)
+    return np.asarray(d, dtype=np.float32), np.asarray(p, dtype=np.float64)
+
+
+def _hex(bits) -> List[str]:
+    import numpy as np
+
+    packed = np.packbits(bits.reshape(len(bits), HASH_BITS), axis=1)
+    return [row.tobytes().hex() for row in packed]
+
+
+def dhash_samples(stack) -> List[str]:
+    """dhash of each 8x9 sample in an (n, 8, 9) stack."""
+    return _hex(stack[:, :, 1:] > stack[:, :, :-1])
+
+
+def phash_samples(stack) -> List[str]:
+    """phash of each 32x32 sample in an (n, 32, 32) stack."""
+    import numpy as np
+
+    basis = _dct_basis()
+    low = basis @ stack @ basis.T  # (n, 8, 8)
+    median = np.median(low.reshape(len(low), -1), axis=1)
+    return _hex(low > median[:, None, None])
+
+
+def compute_many(images: Sequence[bytes]) -> List[Optional[Dict[str, str]]]:
+    """
+    {"phash", "dhash"} of each encoded image, in order; None for bytes
+    Pillow cannot decode.
+    """
+    import numpy as np
+
+    decoded, out = [], [None] * len(images)
+    for i, data in enumerate(images):
+        try:
+            decoded.append((i,) + samples(data))
+        except Exception:
+            continue
+    if decoded:
+        at, d, p = zip(*decoded)
+        for i, dh, ph in zip(at, dhash_samples(np.stack(d)), phash_samples(np.stack(p))):
+            out[i] = {"phash": ph, "dhash": dh}
+    return out
+
+
+def compute(data: bytes) -> Dict[str, str]:
+    """{"phash", "dhash"} of one encoded image (ValueError if it does not decode)."""
+    hashes = compute_many([data])[0]
+    if hashes is None:
+        raise ValueError("Image could not be decoded for hashing")
+    return hashes
@@ -0,0 +1,118 @@
+# src/common/presign.py
+"""
+Cache-friendly presigned download URLs.
+
+A SigV4 presigned URL embeds its signing time, so signing on every request
+yields a new URL each time and defeats browser/CDN caching of the bytes.
+Here the signing time is pinned to the start of a fixed time bucket
+(DOWNLOAD_URL_BUCKET_SECONDS) and the expiry is stretched by one bucket, so:
+
+  - every request for the same object and parameters inside a bucket gets the
+    identical URL (across processes too, as long as they sign with the same
+    credentials), which downstream caches can key on;
+  - a URL handed out at any point of its bucket stays valid for at least
+    DOWNLOAD_URL_TTL_SECONDS;
+  - URLs are memoized per process, so a warm Lambda signs each object once
+    per bucket.
+
+Pinning works by overriding the clock botocore's signers read
+(botocore.auth.get_current_datetime, see the botocore pin in requirements.txt)
+only while a URL is being signed: the override is installed when the first
+concurrent signing starts, answers with the pinned time on the signing
+thread only, and is removed when the last one ends. Botocore releases without
+that hook fall back to the wall clock; URLs are then still memoized per
+process, just not identical across processes.
+"""
+import datetime
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+import botocore.auth
+
+from common.cache import LRUCache
+
+DEFAULT_BUCKET_SECONDS = 900
+DEFAULT_TTL_SECONDS = 3600
+MAX_PRESIGN_SECONDS = 7 * 24 * 3600  # SigV4 limit
+MEMO_MAX_ENTRIES = 4096
+
+_pinned = threading.local()
+_clock_lock = threading.Lock()
+_clock_users = 0
+_wall_clock = None
+
+
+def _signing_datetime(*args, **kwargs):
+    pinned = getattr(_pinned, "value", None)
+    if pinned is not None:
+        return pinned
+    return _wall_clock(*args, **kwargs)
+
+
+@contextmanager
+def _signing_clock(when: datetime.datetime):
+    """botocore's signers on this thread read `when` as the current time."""
+    global _clock_users, _wall_clock
+    with _clock_lock:
+        if _clock_users == 0:
+            _wall_clock = getattr(botocore.auth, "get_current_datetime", None)
+            if _wall_clock is not None:
+                botocore.auth.get_current_datetime = _signing_datetime
+        _clock_users += 1
+    _pinned.value = when
+    try:
+        yield
+    finally:
+        _pinned.value = None
+        with _clock_lock:
+            _clock_users -= 1
+            if _clock_users == 0 and _wall_clock is not None:
+                botocore.auth.get_current_datetime = _wall_clock
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def url_settings() -> Tuple[int, int]:
+    """(bucket_seconds, ttl_seconds) from the environment."""
+    bucket = max(1, int(os.getenv("DOWNLOAD_URL_BUCKET_SECONDS", DEFAULT_BUCKET_SECONDS)))
+    ttl = int(os.getenv("DOWNLOAD_URL_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    return bucket, max(1, min(ttl, MAX_PRESIGN_SECONDS - bucket))
+
+
+def _memo_cache(bucket_seconds: int) -> LRUCache:
+    global _memo
+    with _memo_lock:
+        if _memo is None or _memo.ttl_seconds != bucket_seconds:
+            _memo = LRUCache(MEMO_MAX_ENTRIES, bucket_seconds)
+        return _memo
+
+
+def reset_memo():
+    global _memo
+    with _memo_lock:
+        _memo = None
+
+
+def presigned_get(s3, params: Dict, now: float = None) -> Tuple[str, int]:
+    """
+    Presigned get_object URL for `params`, stable within the current time
+    bucket. Returns (url, seconds until the bucket ends), the latter being
+    how long a response carrying the URL may be cached.
+    """
+    bucket_seconds, ttl = url_settings()
+    now = time.time() if now is None else now
+    start = int(now // bucket_seconds) * bucket_seconds
+    remaining = max(1, start + bucket_seconds - int(now))
+    memo = _memo_cache(bucket_seconds)
+    key = (s3.meta.endpoint_url, start, tuple(sorted(params.items())))
+    found, url = memo.get(key)
+    if not found:
+        with _signing_clock(datetime.datetime.fromtimestamp(start, datetime.timezone.utc).replace(tzinfo=None)):
+            url = s3.generate_presigned_url(ClientMethod="get_object", Params=params,
+                                            ExpiresIn=ttl + bucket_seconds)
+        memo.set(key, url)
+    return url, remaining
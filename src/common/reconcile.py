@@ -0,0 +1,304 @@
+# src/common/reconcile.py
+"""
+Orphan reconciliation / garbage collection.
+
+Finds, and optionally deletes:
+  - S3 objects under images/ and renditions/ whose image_id has no row in
+    the `images` table (pending direct uploads have a row, so they are kept);
+  - `image_tags` rows pointing at an image_id with no `images` row.
+
+Object keys are listed in parallel shards of id prefixes (object_shards()),
+which together cover every hex id. Random (v4) ids are split on their first
+hex digit. Time-ordered gen_id() ids all start with "01" for decades, so
+that range is split on the next two digits, about 50 days of uploads each.
+
+Memory stays bounded regardless of bucket size. The `images` table is read
+once with a parallel segmented Scan into a Bloom filter of image ids (about
+1.8 bytes per image at the default 0.1% error rate). Then S3 listings (one
+per id prefix shard, in parallel) and a parallel segmented Scan of
+`image_tags` are streamed page by page against it. A Bloom "absent" is
+certain, but every candidate is still confirmed with BatchGetItem before it
+is reported or deleted, because rows created after the index was built are
+not in the filter. A false positive only means an orphan survives until the
+next run. Objects and tag rows younger than `min_age_seconds` are skipped,
+so in-flight uploads are never touched.
+
+Progress (the last key per S3 shard, LastEvaluatedKey per tag segment, running
+totals) is checkpointed after every page to a local file or an s3:// URI, so
+an interrupted run (or a Lambda that hit its time budget) resumes where it
+stopped. The Bloom filter is rebuilt on every run since the table keeps
+changing.
+"""
+import os
+import json
+import math
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from common.aws_clients import ddb_client, ddb_table, s3_client
+from common.deletes import delete_objects
+from common.dynamo import batch_get_items, batch_write
+from common.tags import row_image_id
+
+OBJECT_PREFIXES = ("images/", "renditions/")
+HEX_SHARDS = "0123456789abcdef"
+LIST_PAGE_SIZE = 1000
+DEFAULT_MIN_AGE_SECONDS = 3600
+DEFAULT_ERROR_RATE = 0.001
+CHECKPOINT_VERSION = 2
+DONE = "done"
+
+
+def object_shards() -> List[str]:
+    """Key prefixes listed in parallel: every hex id starts with exactly one of them."""
+    ids = [h for h in HEX_SHARDS if h != "0"] + ["0" + h for h in HEX_SHARDS if h != "1"]
+    ids += ["01" + a + b for a in HEX_SHARDS for b in HEX_SHARDS]
+    return [p + i for p in OBJECT_PREFIXES for i in ids]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, value: str):
+        d = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, value: str):
+        positions = self._positions(value)
+        with self._lock:  # read-modify-write of shared bytes from several scan threads
+            for p in positions:
+                self._array[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._array[p >> 3] & (1 << (p & 7)) for p in self._positions(value))
+
+
+class Checkpoint:
+    """JSON progress state in a local file or at s3://bucket/key. No location = no checkpointing."""
+
+    def __init__(self, location: Optional[str] = None):
+        self.location = location
+        self._lock = threading.Lock()
+
+    def _s3(self):
+        u = urlparse(self.location)
+        return u.netloc, u.path.lstrip("/")
+
+    def load(self) -> Optional[Dict]:
+        if not self.location:
+            return None
+        try:
+            if self.location.startswith("s3://"):
+                bucket, key = self._s3()
+                s3 = s3_client()
+                try:
+                    return json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+                except s3.exceptions.NoSuchKey:
+                    return None
+            with open(self.location) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state: Dict):
+        if not self.location:
+            return
+        with self._lock:
+            data = json.dumps(state, sort_keys=True)
+            if self.location.startswith("s3://"):
+                bucket, key = self._s3()
+                s3_client().put_object(Bucket=bucket, Key=key, Body=data.encode(), ContentType="application/json")
+            else:
+                tmp = f"{self.location}.tmp"
+                with open(tmp, "w") as f:
+                    f.write(data)
+                os.replace(tmp, self.location)
+
+    def clear(self):
+        if not self.location:
+            return
+        if self.location.startswith("s3://"):
+            bucket, key = self._s3()
+            s3_client().delete_object(Bucket=bucket, Key=key)
+        elif os.path.exists(self.location):
+            os.remove(self.location)
+
+
+def object_image_id(key: str) -> Optional[str]:
+    """images/<id> and renditions/<id>/<variant> -> <id>; anything else -> None."""
+    if key.startswith("images/"):
+        rest = key[len("images/"):]
+        return rest if rest and "/" not in rest else None
+    if key.startswith("renditions/"):
+        parts = key.split("/")
+        return parts[1] if len(parts) == 3 and parts[1] else None
+    return None
+
+
+def _expected_items(images_table: str) -> int:
+    # ItemCount is refreshed about every 6 hours; leave room for growth
+    count = ddb_client().describe_table(TableName=images_table)["Table"].get("ItemCount", 0)
+    return max(10_000, int(count * 1.5))
+
+
+def build_index(images_table: str, segments: int, capacity: Optional[int] = None,
+                error_rate: float = DEFAULT_ERROR_RATE) -> Tuple[BloomFilter, int]:
+    """Bloom filter of every image_id in the table (parallel segmented Scan). Returns (filter, count)."""
+    bloom = BloomFilter(capacity or _expected_items(images_table), error_rate)
+
+    def scan(segment: int) -> int:
+        tbl = ddb_table(images_table)
+        kwargs = {"Segment": segment, "TotalSegments": segments, "ProjectionExpression": "image_id"}
+        n = 0
+        while True:
+            resp = tbl.scan(**kwargs)
+            for item in resp.get("Items", []):
+                bloom.add(item["image_id"])
+                n += 1
+            if "LastEvaluatedKey" not in resp:
+                return n
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        return bloom, sum(pool.map(scan, range(segments)))
+
+
+def _missing_ids(images_table: str, ids: List[str]) -> set:
+    found = batch_get_items(images_table, "image_id", ids, fields=["image_id"])
+    return set(ids) - {it["image_id"] for it in found}
+
+
+class _Run:
+    """Shared state of one reconcile() call: id index, stats, samples, checkpoint and stop flag."""
+
+    def __init__(self, bloom: BloomFilter, state: Dict, checkpoint: Checkpoint,
+                 deadline: Optional[Callable[[], bool]], sample: int):
+        self.bloom = bloom
+        self.state = state
+        self.checkpoint = checkpoint
+        self.deadline = deadline
+        self.sample = sample
+        self.samples = {"objects": [], "tag_rows": []}
+        self.stopped = False
+        self._lock = threading.Lock()
+
+    def out_of_time(self) -> bool:
+        if not self.stopped and self.deadline and self.deadline():
+            self.stopped = True
+        return self.stopped
+
+    def record(self, section: str, position, counts: Dict[str, int], found: List = ()):
+        with self._lock:
+            self.state[section[0]][section[1]] = position
+            for k, v in counts.items():
+                self.state["stats"][k] = self.state["stats"].get(k, 0) + v
+            bucket = self.samples["objects" if section[0] == "objects" else "tag_rows"]
+            bucket.extend(found[:max(0, self.sample - len(bucket))])
+            self.checkpoint.save(self.state)
+
+
+def _sweep_objects(run: _Run, shard: str, bucket: str, images_table: str, cutoff: datetime, dry_run: bool):
+    s3 = s3_client()
+    start_after = run.state["objects"].get(shard)
+    while start_after != DONE and not run.out_of_time():
+        kwargs = {"Bucket": bucket, "Prefix": shard, "MaxKeys": LIST_PAGE_SIZE}
+        if start_after:
+            kwargs["StartAfter"] = start_after
+        resp = s3.list_objects_v2(**kwargs)
+        contents = resp.get("Contents", [])
+        candidates, recent = {}, 0
+        for obj in contents:
+            image_id = object_image_id(obj["Key"])
+            if image_id is None or image_id in run.bloom:
+                continue
+            if obj["LastModified"] > cutoff:
+                recent += 1
+            else:
+                candidates[obj["Key"]] = image_id
+        missing = _missing_ids(images_table, list(set(candidates.values()))) if candidates else set()
+        orphans = [k for k, i in candidates.items() if i in missing]
+        failed = delete_objects(s3, bucket, orphans) if orphans and not dry_run else []
+        start_after = contents[-1]["Key"] if resp.get("IsTruncated") and contents else DONE
+        run.record(("objects", shard), start_after, {
+            "objects_scanned": len(contents), "orphan_objects": len(orphans), "skipped_recent": recent,
+            "deleted_objects": 0 if dry_run else len(orphans) - len(failed), "failed": len(failed)}, orphans)
+
+
+def _sweep_tags(run: _Run, segment: int, segments: int, tags_table: str, images_table: str,
+                cutoff: str, dry_run: bool):
+    tbl = ddb_table(tags_table)
+    position = run.state["tags"].get(str(segment))
+    while position != DONE and not run.out_of_time():
+        kwargs = {"Segment": segment, "TotalSegments": segments, "Limit": LIST_PAGE_SIZE,
+                  "ProjectionExpression": "#t, image_id, created_at", "ExpressionAttributeNames": {"#t": "tag"}}
+        if position:
+            kwargs["ExclusiveStartKey"] = position
+        resp = tbl.scan(**kwargs)
+        rows = resp.get("Items", [])
+        candidates, recent = [], 0
+        for row in rows:
+            if row_image_id(row["image_id"]) in run.bloom:
+                continue
+            if row.get("created_at", "") > cutoff:
+                recent += 1  # e.g. rows of an image committed after the id scan
+            else:
+                candidates.append(row)
+        ids = list({row_image_id(r["image_id"]) for r in candidates})
+        missing = _missing_ids(images_table, ids) if candidates else set()
+        orphans = [{"tag": r["tag"], "image_id": r["image_id"]} for r in candidates
+                   if row_image_id(r["image_id"]) in missing]
+        failed = []
+        if orphans and not dry_run:
+            failed = batch_write([(tags_table, {"DeleteRequest": {"Key": k}}) for k in orphans])
+        position = resp.get("LastEvaluatedKey") or DONE
+        run.record(("tags", str(segment)), position, {
+            "tag_rows_scanned": len(rows), "orphan_tag_rows": len(orphans), "skipped_recent": recent,
+            "deleted_tag_rows": 0 if dry_run else len(orphans) - len(failed), "failed": len(failed)}, orphans)
+
+
+def reconcile(images_table: str, tags_table: str, bucket: str, segments: int = 4, workers: int = 8,
+              dry_run: bool = True, min_age_seconds: int = DEFAULT_MIN_AGE_SECONDS,
+              checkpoint: Optional[Checkpoint] = None, deadline: Optional[Callable[[], bool]] = None,
+              capacity: Optional[int] = None, sample: int = 20, now: Optional[datetime] = None) -> Dict:
+    """
+    Find (and unless dry_run, delete) orphaned objects and tag rows.
+    `deadline()` returning True stops the run after the current pages; the
+    report then has complete=False and the checkpoint holds the position.
+    """
+    checkpoint = checkpoint or Checkpoint()
+    settings = {"segments": segments, "dry_run": dry_run}
+    state = checkpoint.load()
+    if not state or state.get("version") != CHECKPOINT_VERSION or state.get("settings") != settings:
+        state = {"version": CHECKPOINT_VERSION, "settings": settings, "objects": {}, "tags": {}, "stats": {}}
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=min_age_seconds)
+    bloom, indexed = build_index(images_table, segments, capacity)
+    run = _Run(bloom, state, checkpoint, deadline, sample)
+
+    shards = object_shards()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        jobs = [pool.submit(_sweep_objects, run, s, bucket, images_table, cutoff, dry_run) for s in shards]
+        jobs += [pool.submit(_sweep_tags, run, seg, segments, tags_table, images_table, cutoff.isoformat(), dry_run)
+                 for seg in range(segments)]
+        for j in jobs:
+            j.result()
+
+    complete = (all(state["objects"].get(s) == DONE for s in shards)
+                and all(state["tags"].get(str(seg)) == DONE for seg in range(segments)))
+    if complete:
+        checkpoint.clear()
+    return {"complete": complete, "dry_run": dry_run, "images_indexed": indexed,
+            "stats": dict(state["stats"]), "samples": run.samples}
@@ -0,0 +1,134 @@
+# src/common/renditions.py
+"""
+Resized renditions (thumbnails etc.) of stored originals.
+
+Variants are configured with RENDITION_VARIANTS as comma-separated
+`name:max_px:FORMAT` entries and stored at renditions/{image_id}/{name}.
+Generated variant names are recorded in the `variants` string set on the
+images item.
+
+Decoding is kept cheap for large originals: JPEGs are opened in draft mode
+(libjpeg DCT scaling decodes straight to roughly the largest target size),
+other formats are shrunk with Image.reduce() before the final resample, and
+smaller variants are derived from the previous, larger result.
+"""
+import io
+import json
+import logging
+import os
+from collections import namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+from common.aws_clients import ddb_table, lambda_client, s3_client
+from common.cache import invalidate
+
+RenditionSpec = namedtuple("RenditionSpec", ["name", "max_px", "fmt"])
+
+DEFAULT_VARIANTS = "thumb_128:128:WEBP,thumb_256:256:WEBP,medium_512:512:JPEG,large_1024:1024:JPEG"
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+def variant_specs() -> Dict[str, RenditionSpec]:
+    specs = {}
+    for entry in os.getenv("RENDITION_VARIANTS", DEFAULT_VARIANTS).split(","):
+        name, max_px, fmt = entry.strip().split(":")
+        specs[name] = RenditionSpec(name, int(max_px), fmt.upper())
+    return specs
+
+
+def rendition_key(image_id: str, variant: str) -> str:
+    return f"renditions/{image_id}/{variant}"
+
+
+def _open_reduced(data: bytes, target_px: int):
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(data))
+    if img.format == "JPEG":
+        # decode at 1/2, 1/4 or 1/8 scale directly, never below the target
+        img.draft("RGB", (target_px, target_px))
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("PA", "RGBa") else "RGB")
+    factor = min(img.width, img.height) // (target_px * 2)
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img
+
+
+def _encode(img, fmt: str) -> bytes:
+    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    out = io.BytesIO()
+    kwargs = {"quality": 82} if fmt in ("JPEG", "WEBP") else {}
+    img.save(out, format=fmt, **kwargs)
+    return out.getvalue()
+
+
+def render(data: bytes, specs: Iterable[RenditionSpec]) -> Dict[str, Tuple[bytes, str]]:
+    """Render every spec from the original bytes. Returns {name: (bytes, content_type)}."""
+    ordered: List[RenditionSpec] = sorted(specs, key=lambda s: s.max_px, reverse=True)
+    if not ordered:
+        return {}
+    img = _open_reduced(data, ordered[0].max_px)
+    out = {}
+    for spec in ordered:
+        if max(img.size) > spec.max_px:
+            img = img.copy()
+            img.thumbnail((spec.max_px, spec.max_px), reducing_gap=2.0)
+        out[spec.name] = (_encode(img, spec.fmt), CONTENT_TYPES.get(spec.fmt, "application/octet-stream"))
+    return out
+
+
+def read_original(item: dict) -> bytes:
+    return s3_client().get_object(Bucket=item["s3_bucket"], Key=item["s3_key"])["Body"].read()
+
+
+def generate(item: dict, names: Iterable[str] = None, original: bytes = None) -> List[str]:
+    """
+    Render the requested variants (default: all configured) of an images item,
+    upload them and record them on the item. Returns the generated names.
+    `original` saves the download when the caller already holds the bytes.
+    """
+    specs = variant_specs()
+    wanted = [specs[n] for n in (names or specs)]
+    s3 = s3_client()
+    if original is None:
+        original = read_original(item)
+    rendered = render(original, wanted)
+    del original
+    for name, (body, content_type) in rendered.items():
+        s3.put_object(Bucket=item["s3_bucket"], Key=rendition_key(item["image_id"], name),
+                      Body=body, ContentType=content_type, CacheControl="public, max-age=31536000, immutable")
+    ddb_table(os.getenv("IMAGES_TABLE_NAME", "images")).update_item(
+        Key={"image_id": item["image_id"]},
+        UpdateExpression="ADD variants :v",
+        ConditionExpression="attribute_exists(image_id)",
+        ExpressionAttributeValues={":v": set(rendered)},
+    )
+    invalidate(item["image_id"])
+    return sorted(rendered)
+
+
+def schedule(image_id: str):
+    """
+    Ask the rendition function to render an image asynchronously, if one is
+    configured (RENDITION_FUNCTION_NAME). Without it variants are rendered
+    lazily on first request.
+    """
+    schedule_many([image_id])
+
+
+def schedule_many(image_ids: List[str]):
+    """schedule() for several images with a single async invoke."""
+    fn = os.getenv("RENDITION_FUNCTION_NAME")
+    if not fn or not image_ids:
+        return
+    try:
+        lambda_client().invoke(FunctionName=fn, InvocationType="Event",
+                               Payload=json.dumps({"image_ids": list(image_ids)}).encode())
+    except Exception:
+        # never fail an upload over this; the variant is rendered on first request instead
+        logger.warning("could not schedule renditions for %s", ", ".join(image_ids), exc_info=True)
@@ -1,16 +1,115 @@
 
 # src/common/response.py
+"""
+API Gateway proxy responses.
+
+JSON bodies go through a pluggable serializer: orjson when it is installed
+(optional, `pip install orjson`), stdlib json otherwise; JSON_SERIALIZER=stdlib
+forces the fallback and set_serializer() accepts any callable. DynamoDB
+numbers already arrive as int/float (see common.ddb_codec), so the default=
+hook only runs for the odd set or Decimal.
+
+Bodies of at least RESPONSE_COMPRESSION_MIN_BYTES are gzip- (or, with the
+optional brotli package, br-) compressed when the request's Accept-Encoding
+allows it. The proxy response is then base64 with isBase64Encoded=true, so
+the API needs binaryMediaTypes */* (scripts/deploy.sh sets it).
+"""
+import os
+import gzip
 import json
+import base64
+import hashlib
 from decimal import Decimal
+from typing import Callable, Dict, Optional, Union
+
+from common import metrics
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+DEFAULT_COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
 
 def _json_default(o):
     # Convert Decimal to int (if integral) otherwise float
     if isinstance(o, Decimal):
         return int(o) if (o % 1) == 0 else float(o)
+    # DynamoDB string/number sets (e.g. `variants`)
+    if isinstance(o, (set, frozenset)):
+        return sorted(o)
     # add other non-serializable types here if needed
     raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
 
-def json_response(status_code: int, body: dict, headers: dict = None):
+def _stdlib_dumps(body) -> str:
+    return json.dumps(body, default=_json_default, separators=(",", ":"))
+
+def _orjson_dumps(body) -> str:
+    return orjson.dumps(body, default=_json_default).decode()
+
+SERIALIZERS: Dict[str, Callable] = {"stdlib": _stdlib_dumps}
+if orjson is not None:
+    SERIALIZERS["orjson"] = _orjson_dumps
+
+_dumps: Optional[Callable] = None
+
+def set_serializer(serializer: Union[str, Callable, None] = None) -> Callable:
+    """Select the JSON serializer by name (see SERIALIZERS) or as a callable; None = JSON_SERIALIZER / best available."""
+    global _dumps
+    if serializer is None:
+        serializer = os.getenv("JSON_SERIALIZER") or ("orjson" if "orjson" in SERIALIZERS else "stdlib")
+    if isinstance(serializer, str):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown JSON serializer {serializer!r}; available: {', '.join(SERIALIZERS)}")
+        serializer = SERIALIZERS[serializer]
+    _dumps = serializer
+    return serializer
+
+def dumps(body) -> str:
+    return (_dumps or set_serializer())(body)
+
+def _accepted_encoding(event: dict) -> Optional[str]:
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    weights = {}
+    for part in (headers.get("accept-encoding") or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.lower()] = q
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [(weights.get(enc, weights.get("*", 0.0)), -i, enc) for i, enc in enumerate(offered)]
+    q, _, enc = max(candidates)
+    return enc if q > 0 else None
+
+def compress(event: dict, response: dict) -> dict:
+    """Compress the body of a proxy response if the client accepts it and it is large enough."""
+    min_bytes = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", DEFAULT_COMPRESSION_MIN_BYTES))
+    body = response.get("body")
+    if (os.getenv("RESPONSE_COMPRESSION", "1") != "1" or not body or response.get("isBase64Encoded")
+            or len(body) < min_bytes):
+        return response
+    headers = dict(response["headers"], Vary="Accept-Encoding")
+    encoding = _accepted_encoding(event)
+    if encoding is None:
+        return dict(response, headers=headers)
+    raw = body.encode()
+    data = brotli.compress(raw, quality=BROTLI_QUALITY) if encoding == "br" else gzip.compress(raw, GZIP_LEVEL)
+    headers["Content-Encoding"] = encoding
+    return dict(response, headers=headers, body=base64.b64encode(data).decode(), isBase64Encoded=True)
+
+def json_response(status_code: int, body: dict, headers: dict = None, event: dict = None):
     h = {
         "Content-Type": "application/json",
         "Access-Control-Allow-Origin": "*",
@@ -18,12 +117,15 @@ def json_response(status_code: int, body: dict, headers: dict = None):
     }
     if headers:
         h.update(headers)
-    return {
-        "statusCode": status_code,
-        "headers": h,
-        "body": json.dumps(body, default=_json_default),  # <-- use custom default
-        "isBase64Encoded": False,
-    }
+    with metrics.phase("serialize"):
+        response = {
+            "statusCode": status_code,
+            "headers": h,
+            "body": dumps(body),
+            "isBase64Encoded": False,
+        }
+        # pass the request event to allow Accept-Encoding based compression
+        return compress(event, response) if event is not None else response
 
 def no_content():
     return {
@@ -34,3 +136,48 @@ def no_content():
         "body": "",
         "isBase64Encoded": False,
     }
+
+def redirect(location: str, headers: dict = None):
+    h = {
+        "Location": location,
+        "Access-Control-Allow-Origin": "*",
+    }
+    if headers:
+        h.update(headers)
+    return {
+        "statusCode": 302,
+        "headers": h,
+        "body": "",
+        "isBase64Encoded": False,
+    }
+
+def not_modified(headers: dict = None):
+    h = {"Access-Control-Allow-Origin": "*"}
+    if headers:
+        h.update(headers)
+    return {
+        "statusCode": 304,
+        "headers": h,
+        "body": "",
+        "isBase64Encoded": False,
+    }
+
+def etag(checksum: str, body: dict = None) -> str:
+    # image bytes are identified by their sha256; metadata adds a digest of the
+    # serialized item since it can change while the bytes do not (e.g. variants)
+    tag = (checksum or "")[:32]
+    if body is not None:
+        digest = hashlib.sha256(json.dumps(body, default=_json_default, sort_keys=True).encode()).hexdigest()
+        tag = f"{tag}-{digest[:16]}" if tag else digest[:32]
+    return f'"{tag}"'
+
+def if_none_match(event: dict, current_etag: str) -> bool:
+    """True if the request's If-None-Match matches `current_etag` (weak comparison)."""
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    raw = headers.get("if-none-match")
+    if not raw:
+        return False
+    if raw.strip() == "*":
+        return True
+    strip = lambda t: t.strip()[2:] if t.strip().startswith("W/") else t.strip()
+    return strip(current_etag) in {strip(t) for t in raw.split(",")}
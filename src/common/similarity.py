@@ -0,0 +1,151 @@
+# src/common/similarity.py
+"""
+Near-duplicate index over perceptual hashes (common.phash), behind
+GET /images/{image_id}/similar (opt-in, SIMILARITY_INDEX=1).
+
+Multi-index hashing: the 64-bit phash is cut into BANDS bands of 16 bits and
+an indexed image gets one row per band in image_phash_bands:
+
+  band (PK) "<band>:<4 hex digits>" | image_id (SK) | phash | dhash | user_id
+
+Two hashes at Hamming distance d differ in at most d bits, so at least one
+of the 4 bands differs in at most d // 4 of them. A lookup queries, per band,
+the partition of the exact band value and, for distances of 4 and more, the
+16 partitions one bit away: 68 single-partition Queries at most, run in
+parallel. That finds every image within distance 7, and most at 8 or more
+(scripts/bench_similar.py measures recall). Candidates are re-ranked exactly
+in memory by popcount(phash XOR query), ties broken by dhash distance.
+
+A partition holds about 1/65536 of the index, so a lookup reads about
+68/65536 of it (some 1000 rows at a million images). Images that all hash
+alike (blank, single-colour) make hot partitions; each Query stops after
+MAX_CANDIDATES_PER_BAND rows.
+
+Images are indexed where the original is decoded anyway, in the asynchronous
+rendition stage (handlers.rendition_handler); scripts/backfill_phash.py
+indexes images stored before. index() sets phash/dhash on the images item
+first, then writes the band rows, and the delete paths remove band rows with
+the image (band_keys()). Rows left behind by a delete that raced indexing
+drop out when results are hydrated from `images`.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from common.aws_clients import ddb_table
+from common.cache import invalidate
+from common.dynamo import batch_write, query_page
+
+DEFAULT_TABLE = "image_phash_bands"
+BANDS = 4
+BAND_HEX = 4  # hex digits (16 bits) per band
+DEFAULT_MAX_DISTANCE = 8
+MAX_DISTANCE = 16
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+DEFAULT_CONCURRENCY = 16
+MAX_CANDIDATES_PER_BAND = 500
+
+
+def enabled() -> bool:
+    return os.getenv("SIMILARITY_INDEX", "0") == "1"
+
+
+def table_name() -> str:
+    return os.getenv("PHASH_BANDS_TABLE_NAME", DEFAULT_TABLE)
+
+
+def distance(a: str, b: str) -> int:
+    """Hamming distance of two hex hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def band_values(phash: str) -> List[str]:
+    return [f"{i}:{phash[i * BAND_HEX:(i + 1) * BAND_HEX]}" for i in range(BANDS)]
+
+
+def band_keys(item: Dict) -> List[Dict]:
+    """Keys of an image's band rows (none if it was never indexed)."""
+    if not item.get("phash"):
+        return []
+    return [{"band": b, "image_id": item["image_id"]} for b in band_values(item["phash"])]
+
+
+def delete_requests(item: Dict) -> List[Tuple[str, Dict]]:
+    """BatchWriteItem requests removing an image's band rows."""
+    return [(table_name(), {"DeleteRequest": {"Key": k}}) for k in band_keys(item)]
+
+
+def index(item: Dict, hashes: Dict[str, str]) -> bool:
+    """
+    Record an image's hashes on its images item and write its band rows.
+    False if the image no longer exists.
+    """
+    image_id = item["image_id"]
+    try:
+        ddb_table(os.getenv("IMAGES_TABLE_NAME", "images")).update_item(
+            Key={"image_id": image_id},
+            UpdateExpression="SET phash = :p, dhash = :d",
+            ConditionExpression="attribute_exists(image_id)",
+            ExpressionAttributeValues={":p": hashes["phash"], ":d": hashes["dhash"]},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    invalidate(image_id)
+    table = table_name()
+    rows = [dict(k, phash=hashes["phash"], dhash=hashes["dhash"], user_id=item["user_id"])
+            for k in band_keys(dict(item, phash=hashes["phash"]))]
+    left = batch_write([(table, {"PutRequest": {"Item": row}}) for row in rows])
+    if left:
+        raise RuntimeError(f"{len(left)} band rows of {image_id} were not written")
+    return True
+
+
+def probe_values(phash: str, max_distance: int) -> List[str]:
+    """Band partitions to query for hashes within `max_distance` of `phash`."""
+    radius = 1 if max_distance >= BANDS else 0
+    out = []
+    for b in band_values(phash):
+        out.append(b)
+        if radius:
+            band, value = b.split(":")
+            v = int(value, 16)
+            out.extend(f"{band}:{v ^ (1 << bit):0{BAND_HEX}x}" for bit in range(BAND_HEX * 4))
+    return out
+
+
+def _candidates(band: str) -> List[Dict]:
+    rows, start = [], None
+    while len(rows) < MAX_CANDIDATES_PER_BAND:
+        page, start = query_page(table_name(), "band", band, limit=MAX_CANDIDATES_PER_BAND - len(rows),
+                                 start=start, fields=["image_id", "phash", "dhash", "user_id"])
+        rows.extend(page)
+        if not start:
+            break
+    return rows
+
+
+def similar(item: Dict, max_distance: int = DEFAULT_MAX_DISTANCE, limit: int = DEFAULT_LIMIT,
+            user_id: Optional[str] = None, max_workers: Optional[int] = None) -> List[Tuple[str, int]]:
+    """
+    (image_id, distance) of the images nearest to an indexed image, closest
+    first, at most `max_distance` apart. `user_id` keeps only that user's.
+    """
+    probes = probe_values(item["phash"], max_distance)
+    workers = max_workers or int(os.getenv("SIMILARITY_CONCURRENCY", DEFAULT_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=min(workers, len(probes))) as pool:
+        parts = list(pool.map(_candidates, probes))
+    ranked = {}
+    for row in (r for part in parts for r in part):
+        if row["image_id"] == item["image_id"] or row["image_id"] in ranked:
+            continue
+        if user_id and row.get("user_id") != user_id:
+            continue
+        d = distance(item["phash"], row["phash"])
+        if d <= max_distance:
+            ranked[row["image_id"]] = (d, distance(item["dhash"], row["dhash"]), row["image_id"])
+    return [(image_id, d) for d, _, image_id in sorted(ranked.values())[:limit]]
@@ -0,0 +1,127 @@
+# src/common/streaming.py
+"""
+Streaming upload of a base64 payload to S3 via multipart upload.
+
+The payload is decoded one part at a time; each part feeds an incremental
+SHA-256 and is handed to a small thread pool running `upload_part`. At most
+`concurrency` parts are in flight, so the decoded bytes held in memory are
+bounded by part_size x concurrency instead of the whole image.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+from common.utils import B64_WHITESPACE
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+
+
+def multipart_settings() -> Tuple[int, int, int]:
+    """(threshold, part_size, concurrency) from env."""
+    threshold = int(os.getenv("MULTIPART_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+    part_size = max(MIN_PART_SIZE, int(os.getenv("MULTIPART_PART_SIZE_BYTES", str(8 * 1024 * 1024))))
+    concurrency = max(1, int(os.getenv("MULTIPART_CONCURRENCY", "4")))
+    return threshold, part_size, concurrency
+
+
+def decoded_size_estimate(data: str) -> int:
+    return len(data) * 3 // 4
+
+
+def _b64_slices(data: str, step: int) -> Iterator[str]:
+    """
+    `data` without whitespace, in slices of `step` characters (a multiple
+    of 4) and a shorter last one. Whitespace is dropped slice by slice, so
+    MIME or line-wrapped payloads are never copied whole.
+    """
+    held = ""
+    for i in range(0, len(data), step):
+        held += data[i:i + step].translate(B64_WHITESPACE)
+        if len(held) >= step:
+            yield held[:step]
+            held = held[step:]
+    if held:
+        yield held
+
+
+def iter_b64_decode(data: str, chunk_size: int) -> Iterator[bytes]:
+    """
+    Decode `data` in slices of ~chunk_size decoded bytes.
+    Slices are aligned to 4 encoded characters, so each one decodes on its own.
+    Whitespace (line-wrapped base64) is skipped; anything else outside the
+    base64 alphabet is an error.
+    """
+    step = max(4, (chunk_size // 3) * 4)
+    for piece in _b64_slices(data, step):
+        try:
+            yield base64.b64decode(piece, validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"Invalid base64: {e}")
+
+
+def b64_prefix(data: str, n: int) -> bytes:
+    """The first n decoded bytes of a base64 payload (fewer if it is shorter)."""
+    try:
+        return base64.b64decode(next(_b64_slices(data, max(4, -(-n // 3) * 4)), ""), validate=True)[:n]
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64: {e}")
+
+
+def sha256_b64(data: str, chunk_size: int) -> Tuple[int, str]:
+    """(decoded size, sha256 hex) of a base64 payload without materializing it."""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter_b64_decode(data, chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def stream_b64_to_s3(s3, bucket: str, key: str, data: str, content_type: str,
+                     metadata: Optional[dict] = None, part_size: int = MIN_PART_SIZE,
+                     concurrency: int = 4) -> Tuple[int, str]:
+    """
+    Multipart-upload the decoded `data`. Returns (size, sha256 hex).
+    The multipart upload is aborted if decoding or any part fails.
+    """
+    mpu = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type,
+                                     Metadata=metadata or {})
+    upload_id = mpu["UploadId"]
+    digest = hashlib.sha256()
+    size = 0
+    slots = threading.BoundedSemaphore(concurrency)
+    futures = []
+
+    def _put(part_no: int, body: bytes):
+        try:
+            r = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_no, Body=body)
+            return {"PartNumber": part_no, "ETag": r["ETag"]}
+        finally:
+            slots.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for part_no, chunk in enumerate(iter_b64_decode(data, part_size), start=1):
+                digest.update(chunk)
+                size += len(chunk)
+                slots.acquire()
+                failed = next((f for f in futures if f.done() and f.exception()), None)
+                if failed is not None:
+                    slots.release()
+                    failed.result()  # stop decoding as soon as a part has failed
+                futures.append(pool.submit(_put, part_no, chunk))
+            parts = [f.result() for f in futures]
+        if not parts:
+            raise ValueError("Empty image payload")
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                     MultipartUpload={"Parts": parts})
+    except BaseException:
+        for f in futures:
+            f.cancel()
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return size, digest.hexdigest()
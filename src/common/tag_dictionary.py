@@ -0,0 +1,201 @@
+# src/common/tag_dictionary.py
+"""
+Tag dictionary: per-tag rows with the number of images carrying the tag,
+for prefix autocomplete (GET /tags?prefix=).
+
+  bucket (PK) | tag (SK) | image_count | shards
+
+`shards` is the tag's write-shard count in image_tags (common.tag_shards).
+
+A tag's count is split over TAG_COUNT_SHARDS counter rows, so the tags that
+every upload touches do not all hit one item: bucket "<first char>" (the
+main row, which also holds `shards`) and "<first char>#<n>" for n >= 1.
+Each update goes to a random one and reads sum them. A prefix lookup is one
+Query per counter bucket (bucket AND begins_with(tag, prefix)), in parallel.
+
+Counts are maintained incrementally: every path that commits an image's tag
+rows calls adjust() with +1 per tag, and every delete with -1. The update
+runs after the rows are committed and is best-effort (a failure is logged
+and counted in the TagCountFailures metric, never surfaced), so a count can
+drift slightly after a crash; they only rank suggestions and size shards. rebuild() (scripts/backfill_tag_dictionary.py)
+recounts from image_tags. Rows at zero are kept and filtered out of suggestions, which
+keeps a concurrent +1/-1 pair free of delete races.
+"""
+import logging
+import os
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from common import metrics, tag_shards
+from common.aws_clients import ddb_table
+from common.tags import normalize_tag, split_shard_key
+
+DEFAULT_TABLE = "image_tag_dictionary"
+DEFAULT_CONCURRENCY = 4
+DEFAULT_COUNT_SHARDS = 4
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+# matching rows read per lookup before ranking by count
+DEFAULT_SCAN_LIMIT = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def table_name() -> str:
+    return os.getenv("TAG_DICTIONARY_TABLE_NAME", DEFAULT_TABLE)
+
+
+def count_shards() -> int:
+    return max(1, int(os.getenv("TAG_COUNT_SHARDS", DEFAULT_COUNT_SHARDS)))
+
+
+def counter_bucket(first: str, shard: int) -> str:
+    # buckets of counter shards are longer than one character, so never a main row's
+    return f"{first}#{shard}" if shard else first
+
+
+def key(tag: str, shard: int = 0) -> Dict:
+    """Key of a tag's main row (or of one of its counter shards)."""
+    return {"bucket": counter_bucket(tag[:1], shard), "tag": tag}
+
+
+def _add(tag: str, delta: int):
+    grow = delta > 0 and tag_shards.enabled()
+    shards = count_shards()
+    resp = ddb_table(table_name()).update_item(
+        Key=key(tag, random.randrange(shards)),
+        UpdateExpression="ADD image_count :d",
+        ExpressionAttributeValues={":d": delta},
+        **({"ReturnValues": "UPDATED_NEW"} if grow else {}),
+    )
+    if grow:
+        # updates spread evenly over the counter rows: one of them, times
+        # their number, estimates the total
+        estimate = int(resp["Attributes"]["image_count"]) * shards
+        tag_shards.grow(tag, {"image_count": estimate, "shards": tag_shards.counts([tag])[tag]})
+
+
+def _set(row_key: Dict, count: int):
+    # leaves `shards` alone: dropping a shard count would hide rows
+    ddb_table(table_name()).update_item(
+        Key=row_key,
+        UpdateExpression="SET image_count = :n",
+        ExpressionAttributeValues={":n": count},
+    )
+
+
+def adjust(deltas: Dict[str, int], max_workers: Optional[int] = None) -> List[str]:
+    """
+    Add `delta` to each tag's image_count (creating rows as needed), in
+    parallel. Never raises: returns the tags whose update failed.
+    """
+    todo = [(t, d) for t, d in deltas.items() if t and d]
+    if not todo:
+        return []
+
+    def one(pair):
+        try:
+            _add(*pair)
+            return None
+        except Exception:
+            logger.warning("tag count update failed for %r", pair[0], exc_info=True)
+            metrics.count("TagCountFailures")
+            return pair[0]
+
+    if len(todo) == 1:
+        failed = [one(todo[0])]
+    else:
+        workers = max_workers or int(os.getenv("TAG_DICTIONARY_CONCURRENCY", DEFAULT_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            failed = list(pool.map(one, todo))
+    return [t for t in failed if t]
+
+
+def count_tags(items: Iterable[Dict], delta: int = 1) -> Dict[str, int]:
+    """Per-tag deltas for a group of image items (same tag on several images is one update)."""
+    counts: Counter = Counter()
+    for item in items:
+        for t in item.get("tags") or ():
+            counts[t] += delta
+    return dict(counts)
+
+
+def record(items: Iterable[Dict], delta: int = 1) -> List[str]:
+    """adjust() for images that were just committed (+1) or deleted (-1)."""
+    return adjust(count_tags(items, delta))
+
+
+def _matching(bucket: str, prefix: str, scan_limit: int) -> List[Dict]:
+    kwargs = {
+        "KeyConditionExpression": "#b = :b AND begins_with(#t, :p)",
+        "ExpressionAttributeNames": {"#b": "bucket", "#t": "tag", "#c": "image_count"},
+        "ExpressionAttributeValues": {":b": bucket, ":p": prefix},
+        "ProjectionExpression": "#t, #c",
+    }
+    tbl = ddb_table(table_name())
+    rows: List[Dict] = []
+    while len(rows) < scan_limit:
+        resp = tbl.query(Limit=scan_limit - len(rows), **kwargs)
+        rows.extend(resp.get("Items", []))
+        if not resp.get("LastEvaluatedKey"):
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    return rows
+
+
+def suggest(prefix: str, limit: int = DEFAULT_SUGGESTIONS, scan_limit: Optional[int] = None) -> List[Dict]:
+    """Tags starting with `prefix`, most used first (ties alphabetical), as [{"tag", "count"}]."""
+    prefix = normalize_tag(prefix or "")
+    if not prefix:
+        raise ValueError("prefix is required")
+    scan_limit = scan_limit or int(os.getenv("TAG_AUTOCOMPLETE_SCAN_LIMIT", DEFAULT_SCAN_LIMIT))
+    buckets = [counter_bucket(prefix[:1], n) for n in range(count_shards())]
+    with ThreadPoolExecutor(max_workers=len(buckets)) as pool:
+        parts = list(pool.map(lambda b: _matching(b, prefix, scan_limit), buckets))
+    counts: Counter = Counter()
+    for row in (r for part in parts for r in part):
+        counts[row["tag"]] += int(row.get("image_count", 0))
+    ranked = sorted(counts.items(), key=lambda c: (-c[1], c[0]))
+    return [{"tag": t, "count": n} for t, n in ranked if n > 0][:limit]
+
+
+def rebuild(tags_table: str, segments: int = 4, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Recount every tag from image_tags (parallel segmented Scan, shards
+    folded into their tag) and overwrite the dictionary's counts: the main
+    row gets the count and every counter shard row 0; rows of tags that no
+    longer occur are set to 0. Uploads and deletes running meanwhile can
+    skew a count by their own delta.
+    """
+    def scan(segment: int) -> Counter:
+        tbl = ddb_table(tags_table)
+        kwargs = {"Segment": segment, "TotalSegments": segments, "ProjectionExpression": "#t",
+                  "ExpressionAttributeNames": {"#t": "tag"}}
+        counts: Counter = Counter()
+        while True:
+            resp = tbl.scan(**kwargs)
+            counts.update(split_shard_key(r["tag"])[0] for r in resp.get("Items", []))
+            if not resp.get("LastEvaluatedKey"):
+                return counts
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        counts = sum(pool.map(scan, range(segments)), Counter())
+    if dry_run:
+        return dict(counts)
+
+    dictionary = ddb_table(table_name())
+    updates = {(t[:1], t): n for t, n in counts.items() if t}
+    kwargs = {"ProjectionExpression": "#b, #t", "ExpressionAttributeNames": {"#b": "bucket", "#t": "tag"}}
+    while True:
+        resp = dictionary.scan(**kwargs)
+        for r in resp.get("Items", []):
+            updates.setdefault((r["bucket"], r["tag"]), 0)
+        if not resp.get("LastEvaluatedKey"):
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    with ThreadPoolExecutor(max_workers=int(os.getenv("TAG_DICTIONARY_CONCURRENCY", DEFAULT_CONCURRENCY))) as pool:
+        list(pool.map(lambda u: _set({"bucket": u[0][0], "tag": u[0][1]}, u[1]), updates.items()))
+    return dict(counts)
@@ -0,0 +1,340 @@
+# src/common/tag_search.py
+"""
+Multi-tag listing: `tag=a,b&match=all|any`.
+
+image_tags rows are keyed (tag, image_id), so every tag's rows come back
+ordered by image_id. Each tag is read as a lazily paged, sorted stream of ids
+(TagStream) and the streams are merged on that shared order:
+
+  - any: k-way sorted merge, duplicates collapsed (union);
+  - all: leapfrog intersection. Every stream seeks to the largest id any of
+    them is at (a Query on `image_id >= x`, so long runs of non-matching ids
+    are skipped, not read); when all streams agree, that id matches.
+
+Streams that need another page fetch it in parallel. The position in the
+merged order is a single image_id, so a page ends with a cursor holding
+"resume after <id>" (or "at <id>" when the query budget ran out mid-search),
+and every stream restarts from there with a key condition on image_id.
+
+A user_id narrows each stream with a FilterExpression on the tag rows'
+user_id (rows predating that attribute need scripts/backfill_user_tag.py).
+
+The same merges run in descending order (newest first: gen_id() ids are
+time-ordered) with every comparison flipped. A time range restricts the
+streams to the ids common.utils.time_id_bound() gives for it: the first
+Query starts at one end and each stream stops at the other, and rows still
+keyed by a bare random (pre-UUIDv7) id, which carries no time, are dropped.
+Streams hold tag row sort keys (common.tags.sort_id), which the caller maps
+back to image ids.
+
+A write-sharded tag (common.tag_shards) is one TagStream per shard behind a
+ShardedStream, which k-way merges them into the same order. Shards
+are fetched in parallel with the other streams, and every shard counts
+against the Query budget. With a single tag this is the scatter-gather
+listing of a sharded tag.
+"""
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from common.dynamo import query_page
+from common.images import normalize_tags
+from common.tags import TAG_LIST_SEPARATOR, shard_key, time_ordered_key
+
+MATCH_ALL = "all"
+MATCH_ANY = "any"
+MATCH_OPTIONS = (MATCH_ALL, MATCH_ANY)
+DEFAULT_MAX_TAGS = 10
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_QUERIES = 50
+
+# (image_id, inclusive): where a search resumes
+Position = Tuple[str, bool]
+
+
+def _order(position: Position):
+    # at the same image_id, "at" comes before "after"
+    return position[0], not position[1]
+
+
+def _before(a: str, b: str, forward: bool) -> bool:
+    return a < b if forward else a > b
+
+
+def _first(ids, forward: bool) -> str:
+    return min(ids) if forward else max(ids)
+
+
+def _last(ids, forward: bool) -> str:
+    return max(ids) if forward else min(ids)
+
+
+def _earliest(positions, forward: bool) -> Position:
+    return min(positions, key=_order) if forward else max(positions, key=tuple)
+
+
+def _latest(positions, forward: bool) -> Position:
+    return max(positions, key=_order) if forward else min(positions, key=tuple)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class _Budget:
+    def __init__(self, max_queries: int):
+        self.left = max_queries
+
+    def take(self):
+        # called from the pool's threads; an off-by-one overshoot is harmless
+        if self.left <= 0:
+            raise QueryBudgetExceeded()
+        self.left -= 1
+
+
+class TagStream:
+    """
+    Sorted image_ids of one tag (or one shard of it: `tag` is the partition
+    key), one Query page at a time: ascending, or descending without
+    `forward`. Ids past `stop` are not read; with `time_ordered`, ids
+    without a timestamp are skipped.
+    """
+
+    def __init__(self, tags_table: str, tag: str, page_size: int, budget: _Budget,
+                 user_id: Optional[str] = None, start: Optional[Position] = None, fast: bool = False,
+                 forward: bool = True, stop: Optional[str] = None, time_ordered: bool = False):
+        self.tags_table = tags_table
+        self.tag = tag
+        self.page_size = page_size
+        self.budget = budget
+        self.user_id = user_id
+        self.fast = fast
+        self.forward = forward
+        self.stop = stop
+        self.time_ordered = time_ordered
+        self.ids = deque()
+        self._lower = start
+        self._start_key = None
+        self._done = False
+
+    @property
+    def needs_fetch(self) -> bool:
+        return not self.ids and not self._done
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.ids and self._done
+
+    def leaves(self) -> List["TagStream"]:
+        return [self]
+
+    def frontier(self) -> Optional[Position]:
+        """Where the ids this stream has not ruled out start (None: exhausted). Valid once fetched."""
+        if self.ids:
+            return (self.ids[0], True)
+        if self._done:
+            return None
+        if self._start_key:
+            return (self._start_key["image_id"], False)
+        return self._lower
+
+    def fetch(self):
+        if not self.needs_fetch:
+            return
+        self.budget.take()
+        range_key, exclude = None, None
+        if self._lower and self.stop is not None:
+            # BETWEEN is inclusive: an "after" position drops its own id below
+            bounds = (self._lower[0], self.stop) if self.forward else (self.stop, self._lower[0])
+            range_key = ("image_id", "between", bounds)
+            exclude = None if self._lower[1] else self._lower[0]
+        elif self._lower:
+            op = ">" if self.forward else "<"
+            range_key = ("image_id", op + "=" if self._lower[1] else op, self._lower[0])
+        elif self.stop is not None:
+            range_key = ("image_id", "<=" if self.forward else ">=", self.stop)
+        rows, last = query_page(self.tags_table, "tag", self.tag, forward=self.forward, limit=self.page_size,
+                                start=self._start_key, fields=["image_id"], range_key=range_key,
+                                filter_eq={"user_id": self.user_id} if self.user_id else None, fast=self.fast)
+        self.ids.extend(r["image_id"] for r in rows
+                        if r["image_id"] != exclude and (time_ordered_key(r["image_id"]) or not self.time_ordered))
+        self._start_key = last
+        self._done = last is None
+
+    def peek(self) -> Optional[str]:
+        return self.ids[0] if self.ids else None
+
+    def seek(self, target: str):
+        """Drop ids before `target`; restart the Query at `target` if the buffer runs out."""
+        while self.ids and _before(self.ids[0], target, self.forward):
+            self.ids.popleft()
+        if not self.ids and not self._done:
+            self._lower, self._start_key = (target, True), None
+
+    def pop(self) -> str:
+        return self.ids.popleft()
+
+
+class ShardedStream:
+    """
+    Sorted image_ids of a write-sharded tag: a k-way merge of one
+    TagStream per shard, all in the same direction. An image lives in
+    exactly one shard, so ids never repeat. peek()/pop() need a fetched page
+    from every live shard.
+    """
+
+    def __init__(self, shards: List[TagStream]):
+        self.shards = shards
+
+    @property
+    def needs_fetch(self) -> bool:
+        return any(s.needs_fetch for s in self.shards)
+
+    @property
+    def exhausted(self) -> bool:
+        return all(s.exhausted for s in self.shards)
+
+    def leaves(self) -> List[TagStream]:
+        return self.shards
+
+    def frontier(self) -> Optional[Position]:
+        fronts = [f for f in (s.frontier() for s in self.shards) if f]
+        return _earliest(fronts, self.shards[0].forward) if fronts else None
+
+    def fetch(self):
+        for s in self.shards:
+            s.fetch()
+
+    def _head(self) -> Optional[TagStream]:
+        live = [s for s in self.shards if s.ids]
+        if not live:
+            return None
+        return (min if self.shards[0].forward else max)(live, key=TagStream.peek)
+
+    def peek(self) -> Optional[str]:
+        head = self._head()
+        return head.peek() if head else None
+
+    def seek(self, target: str):
+        for s in self.shards:
+            s.seek(target)
+
+    def pop(self) -> str:
+        return self._head().pop()
+
+
+def _stream(tags_table: str, tag: str, shards: int, page_size: int, budget: _Budget,
+            user_id: Optional[str], start: Optional[Position], fast: bool, **order):
+    if shards <= 1:
+        return TagStream(tags_table, shard_key(tag), page_size, budget, user_id, start, fast, **order)
+    # each shard holds about 1/shards of the ids; a shard that runs dry is refilled
+    per_shard = -(-page_size // shards) + 1
+    return ShardedStream([TagStream(tags_table, shard_key(tag, n), per_shard, budget, user_id, start, fast, **order)
+                          for n in range(shards)])
+
+
+def parse_tags(raw: str, max_tags: Optional[int] = None) -> List[str]:
+    """`tag=` value: comma-separated, normalized, duplicates dropped."""
+    tags = [t for t in normalize_tags(raw.split(TAG_LIST_SEPARATOR)) if t]
+    if not tags:
+        raise ValueError("tag must not be empty")
+    max_tags = max_tags or int(os.getenv("TAG_SEARCH_MAX_TAGS", DEFAULT_MAX_TAGS))
+    if len(tags) > max_tags:
+        raise ValueError(f"At most {max_tags} tags per search")
+    return tags
+
+
+def parse_match(raw: Optional[str]) -> str:
+    if not raw:
+        return MATCH_ALL
+    if raw not in MATCH_OPTIONS:
+        raise ValueError(f"match must be one of: {', '.join(MATCH_OPTIONS)}")
+    return raw
+
+
+def _fill(pool, streams: List[TagStream]):
+    # a filtered page can come back empty with more to read, hence the loop;
+    # shards of every stream are fetched together
+    todo = [leaf for s in streams for leaf in s.leaves() if leaf.needs_fetch]
+    while todo:
+        if len(todo) == 1:
+            todo[0].fetch()
+        else:
+            list(pool.map(TagStream.fetch, todo))
+        todo = [s for s in todo if s.needs_fetch]
+
+
+def _any(pool, streams: List[TagStream], limit: int, out: List[str], forward: bool) -> Optional[Position]:
+    last = None
+    while True:
+        _fill(pool, streams)
+        live = [s for s in streams if not s.exhausted]
+        if not live:
+            return None
+        if len(out) == limit:
+            return (last, False)
+        last = _first([s.peek() for s in live], forward)
+        out.append(last)
+        for s in live:
+            if s.peek() == last:
+                s.pop()
+
+
+def _all(pool, streams: List[TagStream], limit: int, out: List[str], forward: bool) -> Optional[Position]:
+    while True:
+        _fill(pool, streams)
+        if any(s.exhausted for s in streams):
+            return None
+        if len(out) == limit:
+            return (out[-1], False)
+        target = _last([s.peek() for s in streams], forward)
+        if all(s.peek() == target for s in streams):
+            out.append(target)
+            for s in streams:
+                s.pop()
+        else:
+            for s in streams:
+                s.seek(target)
+
+
+def search(tags_table: str, tags: List[str], match: str, limit: int, start: Optional[Position] = None,
+           user_id: Optional[str] = None, max_queries: Optional[int] = None,
+           fast: bool = False, shards: Optional[Dict[str, int]] = None, forward: bool = True,
+           time_range: Optional[Tuple[str, str]] = None) -> Tuple[List[str], Optional[Position]]:
+    """
+    Up to `limit` image_ids (ascending, or descending without `forward`)
+    tagged with all/any of `tags`, from `start` on. Returns them with the
+    position to resume from (None: done). When the Query budget runs out the
+    page may be short, but the position still moves forward, so paging
+    always terminates. `shards` gives the shard count of write-sharded tags
+    (common.tag_shards.counts). `time_range` is an inclusive (low, high)
+    pair of common.utils.time_id_bound() ids; only time-ordered ids in it
+    are returned.
+    """
+    page_size = limit + 1 if match == MATCH_ANY else max(limit + 1, DEFAULT_PAGE_SIZE)
+    max_queries = max_queries or int(os.getenv("TAG_SEARCH_MAX_QUERIES", DEFAULT_MAX_QUERIES))
+    shards = {t: max(1, (shards or {}).get(t, 1)) for t in tags}
+    # enough for every stream's (shard's) first page plus one more, so each call makes progress
+    budget = _Budget(max(max_queries, sum(shards.values()) + 1))
+    order = {"forward": forward}
+    if time_range:
+        low, high = time_range
+        start = start or ((low if forward else high), True)
+        order.update(stop=high if forward else low, time_ordered=True)
+    streams = [_stream(tags_table, t, shards[t], page_size, budget, user_id, start, fast, **order) for t in tags]
+    out: List[str] = []
+    merge = _any if match == MATCH_ANY else _all
+    with ThreadPoolExecutor(max_workers=sum(shards.values())) as pool:
+        try:
+            return out, merge(pool, streams, limit, out, forward)
+        except QueryBudgetExceeded:
+            pass
+    if out:
+        return out, (out[-1], False)
+    # nothing matched yet: resume where the next match can start at the earliest
+    fronts = [s.frontier() for s in streams]
+    if match == MATCH_ANY:
+        live = [f for f in fronts if f]
+        return out, _earliest(live, forward) if live else None
+    return out, None if None in fronts else _latest(fronts, forward)
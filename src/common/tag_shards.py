@@ -0,0 +1,230 @@
+# src/common/tag_shards.py
+"""
+Write sharding of hot tags in image_tags (opt-in, TAG_SHARDING=1).
+
+`tag` is image_tags' partition key, so every upload and every listing of a
+popular tag lands on one DynamoDB partition, which throttles at about 1000
+WCU / 3000 RCU per second. A sharded tag spreads its rows over `shards`
+partitions (common.tags.shard_key): image `i` goes to shard
+crc32(i) % shards, which is recorded on the image row as tag_shards[tag].
+Listings scatter-gather every shard and merge them on image_id
+(common.tag_search), so pages come back in the same order as before.
+
+Shard counts live on the tag's image_tag_dictionary row (`shards`; absent
+means 1). While sharding is on they only ever grow:
+  - set_shards() raises one explicitly (scripts/tag_shards.py set);
+  - grow() raises it automatically once a tag's image count passes
+    TAG_SHARD_ROWS images per shard (powers of two, up to TAG_SHARD_MAX).
+    It runs on the dictionary's count update after each upload.
+Counts are cached per process for TAG_SHARD_CACHE_TTL_SECONDS. For that
+long, a listing in another process can miss rows written to a new shard.
+
+Migration: rows written before sharding are shard 0 and stay readable, so
+switching it on moves no data. reshard() moves a tag's existing rows to the
+shards a given count assigns them. Use it to spread an already hot tag, or
+to fold every row back into shard 0 (count 1) before switching sharding off.
+"""
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from common import tag_dictionary
+from common.aws_clients import ddb_resource, ddb_table
+from common.cache import LRUCache
+from common.dynamo import TransactionConflict, query_page, transact_write
+from common.tags import row_image_id, shard_key
+
+DEFAULT_ROWS_PER_SHARD = 10000
+DEFAULT_MAX_SHARDS = 16
+DEFAULT_CACHE_TTL_SECONDS = 60.0
+CACHE_MAX_ENTRIES = 4096
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+_cache: Optional[LRUCache] = None
+_cache_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.getenv("TAG_SHARDING", "0") == "1"
+
+
+def max_shards() -> int:
+    return int(os.getenv("TAG_SHARD_MAX", DEFAULT_MAX_SHARDS))
+
+
+def shard_for(image_id: str, shards: int) -> int:
+    return zlib.crc32(image_id.encode()) % shards if shards > 1 else 0
+
+
+def shards_for_count(image_count: int) -> int:
+    """Shard count a tag with `image_count` images should have."""
+    per_shard = int(os.getenv("TAG_SHARD_ROWS", DEFAULT_ROWS_PER_SHARD))
+    n, cap = 1, max_shards()
+    while n * per_shard < image_count and n * 2 <= cap:
+        n *= 2
+    return n
+
+
+def _shard_cache() -> LRUCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            ttl = float(os.getenv("TAG_SHARD_CACHE_TTL_SECONDS", DEFAULT_CACHE_TTL_SECONDS))
+            _cache = LRUCache(CACHE_MAX_ENTRIES, ttl)
+        return _cache
+
+
+def reset_shard_cache():
+    """Drop cached shard counts (tests, config changes)."""
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def _read_counts(tags: List[str]) -> Dict[str, int]:
+    client = ddb_resource().meta.client
+    table = tag_dictionary.table_name()
+    found: Dict[str, int] = {}
+    for i in range(0, len(tags), BATCH_GET_MAX_KEYS):
+        request = {table: {"Keys": [tag_dictionary.key(t) for t in tags[i:i + BATCH_GET_MAX_KEYS]],
+                           "ProjectionExpression": "#t, #s",
+                           "ExpressionAttributeNames": {"#t": "tag", "#s": "shards"}}}
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            resp = client.batch_get_item(RequestItems=request)
+            for row in resp.get("Responses", {}).get(table, []):
+                found[row["tag"]] = int(row.get("shards", 1))
+            request = resp.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(0.05 * (2 ** attempt))
+        else:
+            raise RuntimeError("batch_get_item left shard counts unread")
+    return found
+
+
+def counts(tags: Iterable[str]) -> Dict[str, int]:
+    """Current shard count of each tag (1 = unsharded), cached per process."""
+    cache = _shard_cache()
+    out: Dict[str, int] = {}
+    missing = []
+    for t in dict.fromkeys(tags):
+        hit, n = cache.get(t)
+        if hit:
+            out[t] = n
+        else:
+            missing.append(t)
+    if missing:
+        read = _read_counts(missing)
+        for t in missing:
+            out[t] = read.get(t, 1)
+            cache.set(t, out[t])
+    return out
+
+
+def assign(image_id: str, tags: Iterable[str]) -> Dict[str, int]:
+    """Shard of each of a new image's sharded tags (shard 0 is left out); {} when sharding is off."""
+    if not enabled():
+        return {}
+    tags = list(tags)
+    shards = counts(tags)
+    placed = {t: shard_for(image_id, shards[t]) for t in tags}
+    return {t: s for t, s in placed.items() if s}
+
+
+def set_shards(tag: str, shards: int, lower: bool = False) -> bool:
+    """
+    Set `tag`'s shard count. Without `lower` the count only grows: returns
+    False when it already has that many shards or more. reshard() is the
+    only caller that lowers it, after moving the rows out of the dropped shards.
+    """
+    if not 1 <= shards <= max_shards():
+        raise ValueError(f"shards must be between 1 and {max_shards()}")
+    kwargs = {} if lower else {"ConditionExpression": "attribute_not_exists(#s) OR #s < :n"}
+    tbl = ddb_table(tag_dictionary.table_name())
+    try:
+        tbl.update_item(Key=tag_dictionary.key(tag), UpdateExpression="SET #s = :n",
+                        ExpressionAttributeNames={"#s": "shards"}, ExpressionAttributeValues={":n": shards}, **kwargs)
+    except tbl.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    _shard_cache().set(tag, shards)
+    return True
+
+
+def grow(tag: str, row: Dict):
+    """Raise `tag`'s shard count to what its image count calls for (`row`: its dictionary row)."""
+    current = int(row.get("shards", 1))
+    wanted = shards_for_count(int(row.get("image_count", 0)))
+    if wanted > current and set_shards(tag, wanted):
+        logger.info("tag %r now has %d shards", tag, wanted)
+
+
+def _move(tags_table: str, images_table: str, tag: str, row: Dict, src: int, dst: int) -> bool:
+    image_id = row_image_id(row["image_id"])
+    image = ddb_table(images_table).get_item(Key={"image_id": image_id}, ConsistentRead=True,
+                                             ProjectionExpression="image_id, tag_shards").get("Item")
+    if not image:
+        return False  # orphaned row; common.reconcile removes those
+    names, values = {"#m": "tag_shards"}, {}
+    if "tag_shards" in image:
+        names["#t"] = tag
+        if dst:
+            update, values[":s"] = "SET #m.#t = :s", dst
+        else:
+            update = "REMOVE #m.#t"
+        condition = "attribute_exists(#m)"
+    else:
+        update, values[":m"] = "SET #m = :m", {tag: dst}
+        condition = "attribute_exists(image_id) AND attribute_not_exists(#m)"
+    image_update = {"TableName": images_table, "Key": {"image_id": image_id}, "UpdateExpression": update,
+                    "ConditionExpression": condition, "ExpressionAttributeNames": names}
+    if values:
+        image_update["ExpressionAttributeValues"] = values
+    try:
+        transact_write([
+            {"Put": {"TableName": tags_table, "Item": dict(row, tag=shard_key(tag, dst))}},
+            {"Delete": {"TableName": tags_table, "Key": {"tag": shard_key(tag, src), "image_id": row["image_id"]}}},
+            {"Update": image_update},
+        ])
+    except TransactionConflict:
+        return False  # deleted (or re-sharded) meanwhile
+    return True
+
+
+def reshard(tags_table: str, images_table: str, tag: str, shards: int) -> Dict:
+    """
+    Move every row of `tag` to the shard `shards` assigns it (image row
+    updated in the same transaction) and leave the tag with that many
+    shards. Raising takes effect before the move and lowering after it, so
+    listings see every row throughout. Every possible shard is swept, so a
+    re-run also picks up rows that processes with a stale cached count
+    wrote meanwhile. Safe to interrupt and re-run.
+    """
+    if not 1 <= shards <= max_shards():
+        raise ValueError(f"shards must be between 1 and {max_shards()}")
+    current = _read_counts([tag]).get(tag, 1)
+    if shards > current:
+        set_shards(tag, shards)
+    moved = skipped = 0
+    for src in range(max(current, max_shards())):
+        start = None
+        while True:
+            rows, start = query_page(tags_table, "tag", shard_key(tag, src), start=start)
+            for row in rows:
+                dst = shard_for(row["image_id"], shards)
+                if dst == src:
+                    continue
+                if _move(tags_table, images_table, tag, row, src, dst):
+                    moved += 1
+                else:
+                    skipped += 1
+            if not start:
+                break
+    if shards < current:
+        set_shards(tag, shards, lower=True)
+    return {"tag": tag, "shards": shards, "moved": moved, "skipped": skipped}
@@ -0,0 +1,122 @@
+# src/common/tags.py
+"""
+Row layout of the `image_tags` index table.
+
+  tag (PK) | image_id (SK) | user_id | created_at | user_tag
+
+The sort key is the image id (sort_id()), time-ordered for gen_id() ids.
+Images with an older random (v4) id are keyed "<time id>#<image id>", the
+time id being the first common.utils.time_id_bound() id of their
+created_at, so every row sorts by upload time and newest-first or time-range
+listings return the same images as ascending ones. row_image_id() maps a key
+back to the image. Rows stored under the bare random id before that are moved
+by scripts/migrate_legacy_tag_rows.py; until then deletes remove both keys.
+
+`user_tag` ("<user_id>#<tag>") feeds the `user_tag-index` GSI
+(user_tag -> created_at) used for combined user_id + tag listings. "#" is
+not allowed in user ids (check_user_id), so the first "#" always ends the
+user id and no two (user_id, tag) pairs share a key.
+
+With write sharding (common.tag_shards) a tag's rows are spread over the
+partitions "<tag>" (shard 0, the unsharded layout) and "<tag>#<n>". The
+image row records the shard of every sharded tag (`tag_shards`, absent
+shards are 0), so its tag rows can always be found again. A "#" inside a tag
+is stored doubled ("a#b" -> "a##b", shard 1 "a##b#1"), so a single "#" only
+ever starts a shard suffix and no tag's partition is another's shard.
+"""
+from typing import Dict, List, Tuple
+
+from common.utils import EPOCH, is_time_id, parse_time, time_id_bound
+
+USER_TAG_INDEX = "user_tag-index"
+SHARD_SEPARATOR = "#"
+USER_TAG_SEPARATOR = "#"
+SORT_ID_SEPARATOR = "#"
+TAG_LIST_SEPARATOR = ","  # tag=a,b searches (common.tag_search)
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lower()
+
+
+def check_user_id(user_id) -> None:
+    if not isinstance(user_id, str) or not user_id:
+        raise ValueError("'user_id' must be a non-empty string")
+    if USER_TAG_SEPARATOR in user_id:
+        raise ValueError(f"user_id must not contain '{USER_TAG_SEPARATOR}'")
+
+
+def check_tags(tags) -> None:
+    for tag in tags:
+        if isinstance(tag, str) and TAG_LIST_SEPARATOR in tag:
+            raise ValueError(f"tags must not contain '{TAG_LIST_SEPARATOR}': {tag!r}")
+
+
+def user_tag_key(user_id: str, tag: str) -> str:
+    return f"{user_id}{USER_TAG_SEPARATOR}{normalize_tag(tag)}"
+
+
+def shard_key(tag: str, shard: int = 0) -> str:
+    """Partition key of one shard of a tag."""
+    key = tag.replace(SHARD_SEPARATOR, SHARD_SEPARATOR * 2)
+    return f"{key}{SHARD_SEPARATOR}{shard}" if shard else key
+
+
+def split_shard_key(key: str) -> Tuple[str, int]:
+    """(tag, shard) of a stored `tag` value."""
+    tag, i = [], 0
+    while i < len(key):
+        if key[i] != SHARD_SEPARATOR:
+            tag.append(key[i])
+        elif key[i + 1:i + 2] == SHARD_SEPARATOR:
+            tag.append(SHARD_SEPARATOR)
+            i += 1
+        elif key[i + 1:].isdigit():
+            return "".join(tag), int(key[i + 1:])
+        else:
+            return key, 0
+        i += 1
+    return "".join(tag), 0
+
+
+def sort_id(image_id: str, created_at) -> str:
+    """Sort key of an image's tag rows: its id, prefixed with its upload time unless the id is time-ordered."""
+    if is_time_id(image_id):
+        return image_id
+    when = parse_time(created_at) if created_at else EPOCH
+    return f"{time_id_bound(when)}{SORT_ID_SEPARATOR}{image_id}"
+
+
+def row_image_id(key: str) -> str:
+    """Image id of a tag row's sort key."""
+    return key.rpartition(SORT_ID_SEPARATOR)[2]
+
+
+def time_ordered_key(key: str) -> bool:
+    """Whether a tag row's sort key carries its upload time (not a bare random id)."""
+    return is_time_id(key.partition(SORT_ID_SEPARATOR)[0])
+
+
+def tag_row(tag: str, image_id: str, user_id: str, created_at: str, shard: int = 0) -> Dict:
+    return {
+        "tag": shard_key(tag, shard),
+        "image_id": sort_id(image_id, created_at),
+        "user_id": user_id,
+        "created_at": created_at,
+        "user_tag": user_tag_key(user_id, tag),
+    }
+
+
+def tag_rows(item: Dict) -> List[Dict]:
+    """The image_tags rows of an image item, each in its recorded shard."""
+    shards = item.get("tag_shards") or {}
+    return [tag_row(t, item["image_id"], item["user_id"], item["created_at"], int(shards.get(t, 0)))
+            for t in item["tags"]]
+
+
+def tag_keys(item: Dict) -> List[Dict]:
+    """Primary keys of tag_rows(item), plus the bare-id keys of rows not migrated yet."""
+    shards = item.get("tag_shards") or {}
+    ids = dict.fromkeys([sort_id(item["image_id"], item.get("created_at")), item["image_id"]])
+    return [{"tag": shard_key(t, int(shards.get(t, 0))), "image_id": i}
+            for t in item.get("tags") or () for i in ids]
@@ -0,0 +1,240 @@
+# src/common/uploads.py
+"""
+Storing uploaded bytes and committing image metadata, shared by the
+single-image, direct-upload and batch upload paths.
+"""
+import base64
+import hashlib
+import logging
+import os
+from collections import namedtuple
+from typing import Dict, Optional, Sequence
+
+from common import blobs, image_probe, metrics, tag_dictionary
+from common.aws_clients import ddb_table, s3_client
+from common.cache import invalidate
+from common.dynamo import TRANSACT_MAX_ITEMS, TransactionConflict, batch_write, transact_write
+from common.renditions import schedule as schedule_renditions
+from common.streaming import b64_prefix, decoded_size_estimate, multipart_settings, sha256_b64, stream_b64_to_s3
+from common.tags import tag_rows
+from common.utils import decode_b64, sha256_hex
+
+PENDING = "pending"
+HASH_CHUNK = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# blob_checksum is set when the bytes are a shared, reference-counted blob;
+# info holds what common.image_probe read from the header ({} when it is off)
+StoredImage = namedtuple("StoredImage", ["s3_key", "size", "checksum", "blob_checksum", "info"])
+
+
+class UploadMismatch(Exception):
+    pass
+
+
+def store_b64(s3, bucket: str, s3_key: str, data: str, content_type: str,
+              s3_meta: Optional[Dict] = None) -> StoredImage:
+    """
+    Decode and store base64 image bytes at `s3_key` (or under their content
+    address in dedup mode). Large payloads are streamed into a multipart upload.
+    With IMAGE_VALIDATION=1 the bytes are checked (common.image_probe) before
+    anything is stored. A blob reference taken here is released again if
+    storing fails.
+    """
+    threshold, part_size, concurrency = multipart_settings()
+    streaming = decoded_size_estimate(data) > threshold
+    validate = image_probe.enabled()
+    image_bytes = None
+    info = {}
+    if streaming:
+        size = checksum = None
+        if validate:
+            image_probe.check_size(decoded_size_estimate(data))
+            info = image_probe.probe(lambda n: b64_prefix(data, n), content_type)
+    else:
+        image_bytes = decode_b64(data)
+        checksum = sha256_hex(image_bytes)
+        size = len(image_bytes)
+        if validate:
+            info = image_probe.probe_bytes(image_bytes, content_type)
+
+    needs_upload = True
+    blob_checksum = None
+    if blobs.dedup_enabled():
+        if streaming:
+            # hash first (bounded memory) so a duplicate never reaches S3
+            size, checksum = sha256_b64(data, part_size)
+        s3_key, needs_upload = blobs.acquire(checksum, size)
+        blob_checksum = checksum
+        s3_meta = {}
+
+    try:
+        if needs_upload:
+            if streaming:
+                # large image: decode part by part straight into a multipart upload
+                size, checksum = stream_b64_to_s3(s3, bucket, s3_key, data, content_type, metadata=s3_meta or {},
+                                                  part_size=part_size, concurrency=concurrency)
+            else:
+                s3.put_object(Bucket=bucket, Key=s3_key, Body=image_bytes, ContentType=content_type,
+                              Metadata=s3_meta or {})
+            if blob_checksum:
+                blobs.mark_stored(blob_checksum)
+    except Exception:
+        if blob_checksum:
+            blobs.release(blob_checksum, bucket)
+        raise
+    return StoredImage(s3_key, size, checksum, blob_checksum, info)
+
+
+def discard(stored: StoredImage, bucket: str):
+    """Undo store_b64 for an image whose metadata never got committed."""
+    if stored.blob_checksum:
+        blobs.release(stored.blob_checksum, bucket)
+    else:
+        s3_client().delete_object(Bucket=bucket, Key=stored.s3_key)
+
+
+def commit_item(images_table: str, tags_table: str, item: Dict, extra: Sequence[Dict] = ()):
+    """
+    Write a new image row and all of its tag rows in one TransactWriteItems,
+    together with any `extra` actions. The image row is conditional on not
+    existing yet; a failed condition raises common.dynamo.TransactionConflict.
+
+    Tag rows that do not fit next to the image row in one transaction are
+    written once it has committed, so a failed commit leaves no tag rows
+    behind. Until then the image is missing from those tags' listings only.
+    Rows still unwritten after batch_write's retries are logged and counted
+    (TagRowWriteFailures), not raised: the image is committed by then. The
+    tag dictionary's counts follow the commit.
+    """
+    image_put = {"Put": {"TableName": images_table, "Item": item,
+                         "ConditionExpression": "attribute_not_exists(image_id)"}}
+    _transact_with_tags(tags_table, item, [image_put] + list(extra))
+    tag_dictionary.record([item])
+
+
+def _transact_with_tags(tags_table: str, item: Dict, actions: Sequence[Dict]):
+    """Run `actions` and the Puts of `item`'s tag rows in one TransactWriteItems (overflow: see commit_item)."""
+    rows = tag_rows(item)
+    room = TRANSACT_MAX_ITEMS - len(actions)
+    transact_write(list(actions) + [{"Put": {"TableName": tags_table, "Item": r}} for r in rows[:room]])
+    left = batch_write([(tags_table, {"PutRequest": {"Item": r}}) for r in rows[room:]])
+    if left:
+        logger.error("%d tag rows of committed image %s were not written: %s", len(left), item["image_id"],
+                     sorted(req["PutRequest"]["Item"]["tag"] for _, req in left))
+        metrics.count("TagRowWriteFailures", len(left))
+
+
+def hash_fallback_enabled() -> bool:
+    return os.getenv("UPLOAD_HASH_FALLBACK", "0") == "1"
+
+
+def _object_sha256(s3, bucket: str, key: str, head: dict) -> str:
+    """
+    SHA-256 of a direct upload, from the checksum S3 verified and stored with
+    the object (the presigned POST requires it). Objects without a full-object
+    checksum (multipart uploads report a checksum-of-checksums, "...-<parts>")
+    are only read back and hashed with UPLOAD_HASH_FALLBACK=1.
+    """
+    stored = head.get("ChecksumSHA256")
+    if stored and "-" not in stored:
+        return base64.b64decode(stored).hex()
+    if not hash_fallback_enabled():
+        raise UploadMismatch("Uploaded object carries no SHA-256 checksum")
+    logger.warning("hashing s3://%s/%s with GetObject: no ChecksumSHA256 on the object", bucket, key)
+    h = hashlib.sha256()
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    for chunk in iter(lambda: body.read(HASH_CHUNK), b""):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def finalize(image_id: str, images_table: str, tags_table: str) -> dict:
+    """
+    Verify a direct upload against its pending record and commit it. Idempotent.
+    The status flip and the tag rows go in one transaction (as in
+    commit_item), so a finalized image always has its tag rows.
+    """
+    images_tbl = ddb_table(images_table)
+    item = images_tbl.get_item(Key={"image_id": image_id}, ConsistentRead=True).get("Item")
+    if not item:
+        raise LookupError("Not found")
+    if item.get("status") != PENDING:
+        return item
+
+    s3 = s3_client()
+    try:
+        head = s3.head_object(Bucket=item["s3_bucket"], Key=item["s3_key"], ChecksumMode="ENABLED")
+    except s3.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise UploadMismatch("Object has not been uploaded yet")
+        raise
+    if head["ContentLength"] != item["size"]:
+        raise UploadMismatch(f"Uploaded size {head['ContentLength']} does not match declared size {item['size']}")
+    if head.get("ContentType") and head["ContentType"] != item["content_type"]:
+        raise UploadMismatch("Uploaded content type does not match declared content_type")
+    info = {}
+    if image_probe.enabled():
+        def read(n: int) -> bytes:
+            return s3.get_object(Bucket=item["s3_bucket"], Key=item["s3_key"], Range=f"bytes=0-{n - 1}")["Body"].read()
+        try:
+            info = image_probe.probe(read, item["content_type"])
+        except image_probe.InvalidImage as e:
+            raise UploadMismatch(str(e))
+    checksum = _object_sha256(s3, item["s3_bucket"], item["s3_key"], head)
+    if item.get("checksum") and checksum != item["checksum"]:
+        raise UploadMismatch("Uploaded bytes do not match declared checksum")
+
+    s3_key = item["s3_key"]
+    blob_ref = None
+    if blobs.dedup_enabled():
+        # move the bytes under their content address (server-side copy, or
+        # nothing at all when the blob already exists)
+        s3_key, needs_copy = blobs.acquire(checksum, int(item["size"]))
+        blob_ref = checksum
+        try:
+            if needs_copy:
+                s3.copy_object(Bucket=item["s3_bucket"], Key=s3_key, ContentType=item["content_type"],
+                               CopySource={"Bucket": item["s3_bucket"], "Key": item["s3_key"]},
+                               MetadataDirective="REPLACE")
+                blobs.mark_stored(checksum)
+        except Exception:
+            blobs.release(checksum, item["s3_bucket"])
+            raise
+
+    names = {"#s": "status"}
+    values = {":c": checksum, ":k": s3_key, ":pending": PENDING}
+    probed = ""
+    for i, (attr, value) in enumerate(info.items()):
+        names[f"#p{i}"], values[f":p{i}"] = attr, value
+        probed += f", #p{i} = :p{i}"
+    update = {"Update": {
+        "TableName": images_table,
+        "Key": {"image_id": image_id},
+        "UpdateExpression": f"SET user_id = pending_user_id, checksum = :c, s3_key = :k{probed} "
+                            "REMOVE pending_user_id, #s, expires_at",
+        "ConditionExpression": "#s = :pending",
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }}
+    committed = dict(item, user_id=item["pending_user_id"], checksum=checksum, s3_key=s3_key, **info)
+    for attr in ("pending_user_id", "status", "expires_at"):
+        committed.pop(attr, None)
+    try:
+        _transact_with_tags(tags_table, committed, [update])
+    except TransactionConflict:
+        # finalized concurrently (client call racing the S3 event)
+        if blob_ref:
+            blobs.release(blob_ref, item["s3_bucket"])
+        return images_tbl.get_item(Key={"image_id": image_id}, ConsistentRead=True)["Item"]
+    except Exception:
+        if blob_ref:
+            blobs.release(blob_ref, item["s3_bucket"])
+        raise
+    if blob_ref:
+        s3.delete_object(Bucket=item["s3_bucket"], Key=item["s3_key"])
+    invalidate(image_id)
+    tag_dictionary.record([committed])
+    schedule_renditions(image_id)
+    return committed
@@ -1,8 +1,19 @@
-
 import base64
+import binascii
 import hashlib
+import json
+import secrets
+import threading
+import time
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_id_lock = threading.Lock()
+_id_ms = 0
+_id_seq = 0
 
 
 def now_iso() -> str:
@@ -10,15 +21,84 @@ def now_iso() -> str:
 
 
 def gen_id() -> str:
-    return str(uuid.uuid4())
+    """
+    Time-ordered id: a UUIDv7 (RFC 9562) string. The first 48 bits are the
+    Unix time in milliseconds, so ids sort by creation time as plain strings.
+    Within a process they strictly increase: ids in the same millisecond
+    take the next value of a 12-bit counter (started at a random point), and
+    a clock that steps back keeps the last timestamp. The remaining 62 bits
+    are random.
+    """
+    global _id_ms, _id_seq
+    with _id_lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _id_ms:
+            _id_ms, _id_seq = ms, secrets.randbits(11)  # leave half the counter for a burst
+        elif _id_seq < 0xFFF:
+            _id_seq += 1
+        else:
+            _id_ms, _id_seq = _id_ms + 1, 0  # counter exhausted: borrow the next millisecond
+        ms, seq = _id_ms, _id_seq
+    return str(uuid.UUID(int=(ms << 80) | (0x7 << 76) | (seq << 64) | (0b10 << 62) | secrets.randbits(62)))
+
+
+def is_time_id(image_id: str) -> bool:
+    """True for gen_id() ids; older random (v4) ids carry no time."""
+    return len(image_id) == 36 and image_id[14] == "7"
+
+
+def id_time(image_id: str) -> Optional[datetime]:
+    """Creation time encoded in a gen_id() id (millisecond precision), None for other ids."""
+    if not is_time_id(image_id):
+        return None
+    return datetime.fromtimestamp(int(image_id[:8] + image_id[9:13], 16) / 1000, timezone.utc)
+
+
+def time_id_bound(when: datetime, upper: bool = False) -> str:
+    """Smallest (or with `upper`, largest) gen_id() id of the millisecond `when` falls in."""
+    ms = min(max((when - EPOCH) // timedelta(milliseconds=1), 0), (1 << 48) - 1)
+    head = f"{ms:012x}"
+    tail = "7fff-bfff-ffffffffffff" if upper else "7000-8000-000000000000"
+    return f"{head[:8]}-{head[8:]}-{tail}"
+
+
+def parse_time(raw: str) -> datetime:
+    """ISO 8601 timestamp (UTC unless it carries an offset) or Unix seconds, as an aware UTC datetime."""
+    try:
+        when = datetime.fromtimestamp(float(raw), timezone.utc)
+    except ValueError:
+        try:
+            when = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Invalid timestamp: {raw!r}")
+    except (OverflowError, OSError):
+        raise ValueError(f"Invalid timestamp: {raw!r}")
+    return when.astimezone(timezone.utc) if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+
+# skipped in base64 payloads (MIME / line-wrapped); anything else outside the alphabet is an error
+B64_WHITESPACE = str.maketrans("", "", " \t\r\n\v\f")
 
 
 def decode_b64(data: str) -> bytes:
+    """Decode base64 as strictly as the streaming path (common.streaming.iter_b64_decode)."""
     try:
-        return base64.b64decode(data)
-    except Exception as e:
+        return base64.b64decode(data.translate(B64_WHITESPACE), validate=True)
+    except (binascii.Error, ValueError) as e:
         raise ValueError(f"Invalid base64: {e}")
 
 
+def json_body(event) -> dict:
+    """
+    JSON request body of an API Gateway proxy event. The REST API lists
+    binaryMediaTypes */* (for compressed responses), so it base64-encodes
+    every request body and sets isBase64Encoded.
+    """
+    body = event.get("body") or "{}"
+    if event.get("isBase64Encoded"):
+        body = decode_b64(body)
+    return json.loads(body)
+
+
 def sha256_hex(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
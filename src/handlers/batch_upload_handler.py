@@ -0,0 +1,124 @@
+# src/handlers/batch_upload_handler.py
+"""
+POST /images:batch
+
+Body: {"items": [...]} where each entry is either
+  - an inline upload (same fields as POST /images, including image_base64), or
+  - {"image_id": "..."} to complete a direct upload started with POST /images/uploads.
+
+Bytes are stored (and direct uploads verified) concurrently on a bounded
+thread pool; the `images` and `image_tags` rows of every inline entry then
+go out through one shared BatchWriteItem pipeline (a direct upload commits
+with its tag rows in one transaction, common.uploads.finalize). Each entry gets its own result
+({"index", "status", "item" | "error"}); one bad entry never fails the others.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from common import tag_dictionary
+from common.aws_clients import prewarm, s3_client
+from common.dynamo import batch_write
+from common.images import delete_requests, image_item, validate_metadata, write_requests
+from common.metrics import instrument
+from common.renditions import schedule_many as schedule_renditions
+from common.response import json_response
+from common.uploads import UploadMismatch, discard, finalize, store_b64
+from common.utils import gen_id, json_body, now_iso
+
+prewarm("s3", tables=[
+    os.getenv("IMAGES_TABLE_NAME", "images"), os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")])
+
+DEFAULT_MAX_ITEMS = 100
+DEFAULT_CONCURRENCY = 8
+
+
+def _error(index: int, e: Exception) -> Dict:
+    if isinstance(e, ValueError):
+        status = 400
+    elif isinstance(e, LookupError):
+        status = 404
+    elif isinstance(e, UploadMismatch):
+        status = 409
+    else:
+        status = 500
+    return {"index": index, "status": status, "error": str(e) if status != 500 else f"Upload failed: {e}"}
+
+
+def _image_id(request: Dict) -> str:
+    return request["PutRequest"]["Item"]["image_id"]
+
+
+def _store(entry: Dict, bucket: str):
+    validate_metadata(entry, extra_required=["image_base64"])
+    image_id = gen_id()
+    stored = store_b64(s3_client(), bucket, f"images/{image_id}", entry.pop("image_base64"),
+                       entry["content_type"], {"user_id": entry["user_id"], "title": entry["title"]})
+    item = image_item(image_id, entry, bucket, stored.s3_key, stored.size, stored.checksum, now_iso(), stored.info)
+    return item, stored
+
+
+@instrument
+def handler(event, context):
+    BUCKET = os.getenv("S3_BUCKET_NAME", "image-service-bucket")
+    IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
+    TAGS_TABLE = os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")
+    max_items = int(os.getenv("BATCH_UPLOAD_MAX_ITEMS", DEFAULT_MAX_ITEMS))
+    workers = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", DEFAULT_CONCURRENCY))
+    try:
+        payload = json_body(event)
+        entries = payload.get("items")
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("'items' must be a non-empty list")
+        if len(entries) > max_items:
+            raise ValueError(f"At most {max_items} items per batch")
+
+        results: List[Dict] = [None] * len(entries)
+        staged = {}        # index -> (item, stored) for inline uploads
+
+        def stage(index: int):
+            entry = entries[index]
+            try:
+                if not isinstance(entry, dict):
+                    raise ValueError("Each item must be an object")
+                if "image_base64" not in entry and entry.get("image_id"):
+                    committed = finalize(entry["image_id"], IMAGES_TABLE, TAGS_TABLE)
+                    results[index] = {"index": index, "status": 200, "item": committed}
+                else:
+                    staged[index] = _store(entry, BUCKET)
+            except Exception as e:
+                results[index] = _error(index, e)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(entries)))) as pool:
+            list(pool.map(stage, range(len(entries))))
+
+        # one pipeline for every row of the batch
+        requests = [req for item, _ in staged.values() for req in write_requests(IMAGES_TABLE, TAGS_TABLE, item)]
+        failed_ids = {_image_id(req) for _, req in batch_write(requests)}
+
+        cleanup = []
+        new_ids = []
+        for index, (item, stored) in staged.items():
+            if item["image_id"] in failed_ids:
+                # roll back whatever part of this entry did get written
+                cleanup += delete_requests(IMAGES_TABLE, TAGS_TABLE, item)
+                try:
+                    discard(stored, BUCKET)
+                except Exception:
+                    pass  # an orphaned object is harmless; never fail the other entries over it
+                results[index] = _error(index, RuntimeError("metadata commit failed; retry this item"))
+            else:
+                results[index] = {"index": index, "status": 201, "item": item}
+                new_ids.append(item["image_id"])
+        batch_write(cleanup)
+        tag_dictionary.record(item for item, _ in staged.values() if item["image_id"] in new_ids)
+
+        schedule_renditions(new_ids)
+        succeeded = sum(1 for r in results if r["status"] < 300)
+        return json_response(200, {"results": results, "succeeded": succeeded,
+                                   "failed": len(results) - succeeded}, event=event)
+
+    except ValueError as ve:
+        return json_response(400, {"error": str(ve)})
+    except Exception as e:
+        return json_response(500, {"error": f"Batch upload failed: {e}"})
@@ -0,0 +1,166 @@
+# src/handlers/bulk_delete_handler.py
+"""
+POST /images:bulk-delete
+
+Body: {"image_ids": [...]} (up to BULK_DELETE_MAX_IDS), or {"user_id": "..."}
+to purge a user's images BULK_DELETE_MAX_IDS at a time ("more": true means
+call again).
+
+Items are fetched with BatchGetItem. The `image_tags` rows are removed
+through the shared BatchWriteItem pipeline, then the `images` rows one by one
+(in parallel) with ReturnValues=ALL_OLD: only the call that actually removed a
+row counts the image as deleted and takes its tags off the tag dictionary, so
+racing deletes never decrement twice. Images backed by a shared dedup blob use
+the conditional per-image transaction instead, so a racing delete can never
+release the blob reference twice. Only then do the S3 keys (originals +
+renditions) of the images actually deleted go out in 1000-key DeleteObjects
+calls, so an image whose metadata delete failed keeps its bytes. Each id gets
+its own result ({"image_id", "status", "error"?}).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from boto3.dynamodb.conditions import Key
+
+from common import blobs, tag_dictionary
+from common.aws_clients import ddb_table, prewarm, s3_client
+from common.cache import invalidate
+from common.deletes import delete_objects, object_keys, transact_delete
+from common.dynamo import batch_get_items, batch_write
+from common.images import index_delete_requests
+from common.metrics import instrument
+from common.response import json_response
+from common.utils import json_body
+
+prewarm("s3", tables=[
+    os.getenv("IMAGES_TABLE_NAME", "images"), os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")])
+
+DEFAULT_MAX_IDS = 500
+DEFAULT_CONCURRENCY = 8
+
+
+def _user_items(images_table: str, user_id: str, limit: int):
+    """Up to `limit` of the user's images (full items from the ALL-projected GSI) and whether more remain."""
+    tbl = ddb_table(images_table)
+    kwargs = {"IndexName": "user_id-index", "KeyConditionExpression": Key("user_id").eq(user_id),
+              "Limit": limit + 1}
+    items: List[Dict] = []
+    while len(items) <= limit:
+        resp = tbl.query(**kwargs)
+        items.extend(resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+        kwargs["Limit"] = limit + 1 - len(items)
+    return items[:limit], len(items) > limit
+
+
+@instrument
+def handler(event, context):
+    IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
+    TAGS_TABLE = os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")
+    max_ids = int(os.getenv("BULK_DELETE_MAX_IDS", DEFAULT_MAX_IDS))
+    workers = int(os.getenv("BULK_DELETE_CONCURRENCY", DEFAULT_CONCURRENCY))
+    try:
+        payload = json_body(event)
+        more = None
+        if payload.get("user_id"):
+            items, more = _user_items(IMAGES_TABLE, payload["user_id"], max_ids)
+            ids = [it["image_id"] for it in items]
+        else:
+            ids = payload.get("image_ids")
+            if not isinstance(ids, list) or not ids or not all(isinstance(i, str) and i for i in ids):
+                raise ValueError("'image_ids' must be a non-empty list of ids (or pass 'user_id')")
+            ids = list(dict.fromkeys(ids))
+            if len(ids) > max_ids:
+                raise ValueError(f"At most {max_ids} ids per request")
+            items = batch_get_items(IMAGES_TABLE, "image_id", ids)
+
+        status = {i: 404 for i in ids}
+        errors: Dict[str, str] = {}
+        owner = {k: it["image_id"] for it in items for k in object_keys(it)}
+        shared = [it for it in items if blobs.is_blob_key(it["s3_key"])]
+        plain = [it for it in items if not blobs.is_blob_key(it["s3_key"])]
+
+        def remove_shared(item):
+            iid = item["image_id"]
+            try:
+                transact_delete(IMAGES_TABLE, TAGS_TABLE, item)
+            except LookupError:
+                return  # deleted concurrently; that request releases the blob
+            except Exception as e:
+                errors[iid] = f"metadata delete failed: {e}"
+                return
+            status[iid] = 204
+            try:
+                blobs.release(item["checksum"], item["s3_bucket"])
+            except Exception as e:
+                # the row is gone; the dangling reference is left for reconciliation
+                errors[iid] = f"blob release failed: {e}"
+
+        images_tbl = ddb_table(IMAGES_TABLE)
+
+        def remove_plain(item):
+            try:
+                return images_tbl.delete_item(Key={"image_id": item["image_id"]},
+                                              ReturnValues="ALL_OLD").get("Attributes")
+            except Exception as e:
+                errors[item["image_id"]] = f"metadata delete failed: {e}"
+                return None
+
+        s3 = s3_client()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            shared_done = [pool.submit(remove_shared, it) for it in shared]
+            # index rows first: an image whose rows were not all removed keeps its
+            # images row, so retrying the id finishes the job
+            left = batch_write([req for it in plain for req in index_delete_requests(TAGS_TABLE, it)])
+            failed_rows = {req["DeleteRequest"]["Key"]["image_id"] for _, req in left}
+            for iid in failed_rows:
+                errors[iid] = "metadata delete failed; retry this id"
+            # a row another request removed first stays 404 here and is not counted twice
+            removed = [old for old in pool.map(remove_plain, [it for it in plain if it["image_id"] not in failed_rows])
+                       if old]
+            for old in removed:
+                status[old["image_id"]] = 204
+            tag_dictionary.record(removed, -1)
+            for f in shared_done:
+                f.result()
+            # objects only of images whose rows are gone: a failed metadata
+            # delete never leaves a visible image without its bytes
+            by_bucket: Dict[str, List[str]] = {}
+            for it in items:
+                if status[it["image_id"]] == 204:
+                    by_bucket.setdefault(it["s3_bucket"], []).extend(object_keys(it))
+            s3_parts = {pool.submit(delete_objects, s3, bucket, keys): keys for bucket, keys in by_bucket.items()}
+            for f, keys in s3_parts.items():
+                try:
+                    failed_keys = f.result()
+                except Exception as e:
+                    failed_keys, reason = keys, str(e)
+                else:
+                    reason = None
+                for k in failed_keys:
+                    errors.setdefault(owner[k], reason or f"could not delete {k}")
+
+        for i, s in status.items():
+            if s == 204:
+                invalidate(i)
+        results = []
+        for i in ids:
+            if i in errors:
+                results.append({"image_id": i, "status": 500, "error": errors[i]})
+            elif status[i] == 404:
+                results.append({"image_id": i, "status": 404, "error": "Not found"})
+            else:
+                results.append({"image_id": i, "status": 204})
+        deleted = sum(1 for r in results if r["status"] == 204)
+        body = {"results": results, "deleted": deleted, "failed": len(results) - deleted}
+        if more is not None:
+            body["more"] = more
+        return json_response(200, body, event=event)
+
+    except ValueError as ve:
+        return json_response(400, {"error": str(ve)})
+    except Exception as e:
+        return json_response(500, {"error": f"Bulk delete failed: {e}"})
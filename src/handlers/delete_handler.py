@@ -1,10 +1,32 @@
 
 import os
-from common.aws_clients import s3_client, ddb_resource
+
+from common import aio, blobs
+from common.aws_clients import ddb_table, prewarm, s3_client
+from common.cache import invalidate
+from common.deletes import delete_objects, object_keys, transact_delete
+from common.metrics import instrument
 from common.response import json_response, no_content
 
 
+prewarm("s3", tables=[
+    os.getenv("IMAGES_TABLE_NAME", "images"), os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")])
+
+
+def _transact(images_table: str, tags_table: str, item) -> bool:
+    try:
+        transact_delete(images_table, tags_table, item)
+        return True
+    except LookupError:
+        return False
+
+
+@instrument
 def handler(event, context):
+    return aio.run(handle(event, context))
+
+
+async def handle(event, context):
     BUCKET = os.getenv("S3_BUCKET_NAME", "image-service-bucket")
     IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
     TAGS_TABLE = os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")
@@ -20,23 +42,27 @@ def handler(event, context):
         if not image_id:
             return json_response(400, {"error": "image_id required"})
 
-        ddb = ddb_resource()
-        images_tbl = ddb.Table(IMAGES_TABLE)
-        tags_tbl = ddb.Table(TAGS_TABLE)
-        r = images_tbl.get_item(Key={"image_id": image_id})
+        r = await aio.wrap(ddb_table(IMAGES_TABLE)).get_item(Key={"image_id": image_id})
         item = r.get("Item")
         if not item:
             return json_response(404, {"error": "Not found"})
 
-        s3 = s3_client()
-        s3.delete_object(Bucket=item['s3_bucket'], Key=item['s3_key'])
-
-        images_tbl.delete_item(Key={"image_id": image_id})
-
-        tags = item.get("tags", [])
-        with tags_tbl.batch_writer() as batch:
-            for t in tags:
-                batch.delete_item(Key={"tag": t, "image_id": image_id})
+        # S3 objects (original + renditions) only go once the metadata
+        # transaction committed, so a failed transaction never leaves a visible
+        # image without its bytes; a shared dedup blob is only released by the
+        # request whose conditional transaction actually removed the row
+        if not await aio.call(_transact, IMAGES_TABLE, TAGS_TABLE, item):
+            return json_response(404, {"error": "Not found"})
+        keys = object_keys(item)
+        cleanup = [aio.call(invalidate, image_id)]
+        if keys:
+            cleanup.append(aio.call(delete_objects, s3_client(), item["s3_bucket"], keys))
+        if blobs.is_blob_key(item["s3_key"]):
+            cleanup.append(aio.call(blobs.release, item["checksum"], item["s3_bucket"]))
+        _, *removed = await aio.gather(*cleanup)
+        failed_keys = removed[0] if keys else []
+        if failed_keys:
+            raise RuntimeError(f"could not delete {', '.join(failed_keys)}")
 
         return no_content()
     except Exception as e:
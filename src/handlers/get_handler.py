@@ -1,9 +1,33 @@
 
 import os
-from common.aws_clients import s3_client, ddb_resource
-from common.response import json_response
+from common.aws_clients import s3_client
+from common.cache import metadata_cache
+from common.dynamo import fast_path_enabled, get_item, prewarm_reads
+from common.metrics import instrument
+from common.response import etag, if_none_match, json_response, not_modified, redirect
 
+# originals, blobs and renditions are never rewritten in place
+DEFAULT_IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
+# metadata reads only need DynamoDB; the S3 client is built on the first download
+prewarm_reads(os.getenv("IMAGES_TABLE_NAME", "images"))
+
+
+def _bypass_cache(event) -> bool:
+    # per-request opt-out: `Cache-Control: no-cache` or `?cache=bypass`
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    query = event.get("queryStringParameters") or {}
+    return "no-cache" in (headers.get("cache-control") or "") or query.get("cache") == "bypass"
+
+
+def _redirect_mode(query) -> bool:
+    raw = query.get("redirect")
+    if raw is None:
+        return os.getenv("DOWNLOAD_REDIRECT", "0") == "1"
+    return raw.lower() in ("1", "true", "yes")
+
+
+@instrument
 def handler(event, context):
     BUCKET = os.getenv("S3_BUCKET_NAME", "image-service-bucket")
     IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
@@ -19,22 +43,45 @@ def handler(event, context):
         if not image_id:
             return json_response(400, {"error": "image_id required"})
 
-        ddb = ddb_resource()
-        images_tbl = ddb.Table(IMAGES_TABLE)
-        r = images_tbl.get_item(Key={"image_id": image_id})
-        item = r.get("Item")
-        if not item:
-            return json_response(404, {"error": "Not found"})
+        fast = fast_path_enabled()
+        item, cache_status = metadata_cache().get(
+            image_id, lambda iid: get_item(IMAGES_TABLE, {"image_id": iid}, fast=fast),
+            bypass=_bypass_cache(event))
+        cache_headers = {"X-Cache": cache_status}
+        if not item or item.get("status") == "pending":
+            return json_response(404, {"error": "Not found"}, cache_headers)
 
         if raw_path.rstrip("/").endswith("download"):
+            from common.presign import presigned_get
+            from common.renditions import generate, rendition_key, variant_specs
+            query = event.get("queryStringParameters") or {}
+            variant = query.get("variant")
             s3 = s3_client()
-            url = s3.generate_presigned_url(
-                ClientMethod='get_object',
-                Params={'Bucket': item['s3_bucket'], 'Key': item['s3_key']},
-                ExpiresIn=3600
-            )
-            return json_response(200, {"url": url})
-
-        return json_response(200, item)
+            params = {'Bucket': item['s3_bucket'], 'Key': item['s3_key']}
+            if variant:
+                if variant not in variant_specs():
+                    return json_response(400, {"error": f"Unknown variant: {variant}"})
+                if variant not in item.get("variants", set()):
+                    if os.getenv("RENDITION_LAZY", "1") != "1":
+                        return json_response(404, {"error": "Variant not available yet"})
+                    # first request for this variant: render it now
+                    generate(item, [variant])
+                params['Key'] = rendition_key(image_id, variant)
+            elif item['s3_key'].startswith("blobs/"):
+                # shared blob: serve with this image's declared type
+                params['ResponseContentType'] = item['content_type']
+            params['ResponseCacheControl'] = os.getenv("IMAGE_CACHE_CONTROL", DEFAULT_IMAGE_CACHE_CONTROL)
+            # same URL for every request in the current time bucket, so the
+            # response (and the bytes behind it) can be cached until it rolls over
+            url, max_age = presigned_get(s3, params)
+            headers = dict(cache_headers, **{"Cache-Control": f"private, max-age={max_age}"})
+            if _redirect_mode(query):
+                return redirect(url, headers)
+            return json_response(200, {"url": url}, headers)
+
+        headers = dict(cache_headers, **{"ETag": etag(item.get("checksum"), item), "Cache-Control": "private, no-cache"})
+        if if_none_match(event, headers["ETag"]):
+            return not_modified(headers)
+        return json_response(200, item, headers)
     except Exception as e:
         return json_response(500, {"error": f"Get failed: {e}"})
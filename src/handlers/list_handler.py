@@ -2,90 +2,138 @@
 # src/handlers/list_handler.py
 
 import os
-import json
-from typing import Dict, List, Set
-
-from common.aws_clients import ddb_resource
+import hashlib
+from typing import Dict, List
+
+from common import aio, tag_shards
+from common.dynamo import batch_get_items_async, fast_path_enabled, parse_fields, prewarm_reads, query_page
+from common.metrics import instrument
+from common.pagination import (SORT_DESC, QuerySpec, decode_cursor, encode_cursor, parse_sort, parse_time_range,
+                               scan_forward)
 from common.response import json_response
+from common.tag_search import MATCH_ALL, MATCH_ANY, parse_match, parse_tags, search
+from common.tags import USER_TAG_INDEX, check_user_id, row_image_id, shard_key, time_ordered_key, user_tag_key
+from common.utils import time_id_bound
+
+TAG_QUERY = QuerySpec("tag", None, ("tag", "image_id"))
+USER_QUERY = QuerySpec("user", "user_id-index", ("image_id", "user_id", "created_at"))
+USER_TAG_QUERY = QuerySpec("user_tag", USER_TAG_INDEX, ("tag", "image_id", "user_tag", "created_at"))
+# multi-tag cursors: a digest of the tag set + user_id, and the merge position
+MULTI_TAG_QUERIES = {m: QuerySpec(f"tags_{m}", None, ("filter", "image_id", "inclusive"))
+                     for m in (MATCH_ALL, MATCH_ANY)}
+
+prewarm_reads(os.getenv("IMAGES_TABLE_NAME", "images"), os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags"))
+
+
+def _filter_digest(tags: List[str], user_id, scope: str = "") -> str:
+    return hashlib.sha256("\0".join(sorted(tags) + [user_id or "", scope]).encode()).hexdigest()[:16]
+
 
+def _check_start(start, attr: str, bounds):
+    # DynamoDB rejects a start key outside the key condition
+    if start and not bounds[0] <= start[attr] <= bounds[1]:
+        raise ValueError("Pagination token does not match this query")
 
+
+@instrument
 def handler(event, context):
+    return aio.run(handle(event, context))
+
+
+async def handle(event, context):
     IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
     TAGS_TABLE = os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")
     try:
         params = event.get("queryStringParameters") or {}
         user_id = params.get("user_id") if params else None
         tag = params.get("tag") if params else None
+        if user_id is not None:
+            check_user_id(user_id)
         limit = int(params.get("limit", 20))
-        next_token = params.get("last_evaluated_key")
-
-        ddb = ddb_resource()
-        images_tbl = ddb.Table(IMAGES_TABLE)
-        tags_tbl = ddb.Table(TAGS_TABLE)
-
+        next_token = params.get("next_token") or params.get("last_evaluated_key")
+        sort = parse_sort(params.get("sort"))
+        fields = parse_fields(params.get("fields"))
+        since, until = params.get("since"), params.get("until")
+        low, high = parse_time_range(since, until)
+        created = (low.isoformat(), high.isoformat())
+        # tag rows are sorted by upload time (common.tags.sort_id); only rows still
+        # keyed by a bare random id (scripts/migrate_legacy_tag_rows.py) carry none
+        ranged = bool(since or until)
+        timed = sort == SORT_DESC or ranged
+        id_bounds = (time_id_bound(low), time_id_bound(high, upper=True))
+
+        fast = fast_path_enabled()
         items: List[Dict] = []
         token_out = None
-
-        if tag and not user_id:
-            from boto3.dynamodb.conditions import Key
-            query_kwargs = {
-                "KeyConditionExpression": Key("tag").eq(tag.lower()),
-                "Limit": limit,
-            }
-            if next_token:
-                query_kwargs["ExclusiveStartKey"] = json.loads(next_token)
-
-            resp = tags_tbl.query(**query_kwargs)
-            image_ids = [r["image_id"] for r in resp.get("Items", [])]
-            token_out = json.dumps(resp.get("LastEvaluatedKey")) if resp.get("LastEvaluatedKey") else None
-
-            if image_ids:
-                got = []
-                for iid in image_ids:
-                    r = images_tbl.get_item(Key={"image_id": iid})
-                    if "Item" in r:
-                        got.append(r["Item"])
-                items = got
+        tags = parse_tags(tag) if tag else []
+        # with write sharding a single tag is listed by merging its shards
+        sharded = tag_shards.enabled() and bool(tags) and not user_id
+
+        if len(tags) > 1 or sharded:
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            match = parse_match(params.get("match")) if len(tags) > 1 else MATCH_ANY
+            spec = MULTI_TAG_QUERIES[match]
+            scope = f"{since and created[0]}:{until and created[1]}" if timed else ""
+            digest = _filter_digest(tags, user_id, scope)
+            start = decode_cursor(next_token, spec, sort, expect={"filter": digest})
+            position = (start["image_id"], bool(start["inclusive"])) if start else None
+            if timed:
+                _check_start(start, "image_id", id_bounds)
+            shards = await aio.call(tag_shards.counts, tags) if tag_shards.enabled() else None
+            keys, position = await aio.call(search, TAGS_TABLE, tags, match, limit, position,
+                                                 user_id=user_id, fast=fast, shards=shards,
+                                                 forward=scan_forward(sort), time_range=id_bounds if timed else None)
+            if position:
+                token_out = encode_cursor(spec, {"filter": digest, "image_id": position[0],
+                                                 "inclusive": int(position[1])}, sort)
+
+            image_ids = [row_image_id(k) for k in keys]
+            items = await batch_get_items_async(IMAGES_TABLE, "image_id", image_ids, fields=fields, fast=fast)
+
+        elif tag and not user_id:
+            start = decode_cursor(next_token, TAG_QUERY, sort, expect={"tag": shard_key(tags[0])})
+            if timed:
+                _check_start(start, "image_id", id_bounds)
+            rows, last = await aio.call(query_page, TAGS_TABLE, "tag", shard_key(tags[0]), forward=scan_forward(sort),
+                                        limit=limit, start=start, fast=fast,
+                                        range_key=("image_id", "between", id_bounds) if timed else None)
+            image_ids = [row_image_id(r["image_id"]) for r in rows if not timed or time_ordered_key(r["image_id"])]
+            token_out = encode_cursor(TAG_QUERY, last, sort)
+
+            items = await batch_get_items_async(IMAGES_TABLE, "image_id", image_ids, fields=fields, fast=fast)
 
         elif user_id and not tag:
-            from boto3.dynamodb.conditions import Key
-            query_kwargs = {
-                "IndexName": "user_id-index",
-                "KeyConditionExpression": Key("user_id").eq(user_id),
-                "Limit": limit,
-            }
-            if next_token:
-                query_kwargs["ExclusiveStartKey"] = json.loads(next_token)
-
-            q = images_tbl.query(**query_kwargs)
-            items = q.get("Items", [])
-            token_out = json.dumps(q.get("LastEvaluatedKey")) if q.get("LastEvaluatedKey") else None
+            start = decode_cursor(next_token, USER_QUERY, sort, expect={"user_id": user_id})
+            if ranged:
+                _check_start(start, "created_at", created)
+            items, last = await aio.call(query_page, IMAGES_TABLE, "user_id", user_id, index="user_id-index",
+                                         forward=scan_forward(sort), limit=limit, start=start,
+                                         fields=fields, required=["image_id"], fast=fast,
+                                         range_key=("created_at", "between", created) if ranged else None)
+            token_out = encode_cursor(USER_QUERY, last, sort)
 
         elif user_id and tag:
-            from boto3.dynamodb.conditions import Key
-            tag_q_kwargs = {
-                "KeyConditionExpression": Key("tag").eq(tag.lower()),
-                "Limit": limit,
-            }
-            if next_token:
-                tag_q_kwargs["ExclusiveStartKey"] = json.loads(next_token)
-
-            resp = tags_tbl.query(**tag_q_kwargs)
-            tag_ids: Set[str] = set([r["image_id"] for r in resp.get("Items", [])])
-
-            user_q = images_tbl.query(
-                IndexName="user_id-index",
-                KeyConditionExpression=Key("user_id").eq(user_id),
-                Limit=limit,
-            )
-            items = [it for it in user_q.get("Items", []) if it.get("image_id") in tag_ids]
-            token_out = json.dumps(resp.get("LastEvaluatedKey")) if resp.get("LastEvaluatedKey") else None
+            start = decode_cursor(next_token, USER_TAG_QUERY, sort,
+                                  expect={"user_tag": user_tag_key(user_id, tags[0])})
+            if ranged:
+                _check_start(start, "created_at", created)
+            rows, last = await aio.call(query_page, TAGS_TABLE, "user_tag", user_tag_key(user_id, tags[0]),
+                                        index=USER_TAG_INDEX, forward=scan_forward(sort), limit=limit,
+                                        start=start, fast=fast,
+                                        range_key=("created_at", "between", created) if ranged else None)
+            image_ids = [row_image_id(r["image_id"]) for r in rows]
+            token_out = encode_cursor(USER_TAG_QUERY, last, sort)
+
+            items = await batch_get_items_async(IMAGES_TABLE, "image_id", image_ids, fields=fields, fast=fast)
 
         else:
             return json_response(400, {"error": "Provide at least one filter: user_id or tag"})
 
-        return json_response(200, {"items": items, "next_token": token_out})
+        return json_response(200, {"items": items, "next_token": token_out}, event=event)
 
+    except ValueError as ve:
+        return json_response(400, {"error": str(ve)})
     except Exception as e:
         return json_response(500, {"error": f"List failed: {e}"})
 
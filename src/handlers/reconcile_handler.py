@@ -0,0 +1,43 @@
+# src/handlers/reconcile_handler.py
+"""
+Scheduled orphan reconciliation (EventBridge rule, see scripts/deploy.sh).
+
+Runs common.reconcile.reconcile() and returns its report. Deletes only when
+RECONCILE_DELETE=1 (or the event says {"dry_run": false}). The run stops
+RECONCILE_TIME_MARGIN_MS before the Lambda timeout and saves its position to
+RECONCILE_CHECKPOINT (default s3://<bucket>/_reconcile/checkpoint.json), so
+the next invocation resumes a sweep that did not finish.
+"""
+import logging
+import os
+
+from common.metrics import instrument
+from common.reconcile import DEFAULT_MIN_AGE_SECONDS, Checkpoint, reconcile
+
+logger = logging.getLogger(__name__)
+
+
+@instrument
+def handler(event, context):
+    BUCKET = os.getenv("S3_BUCKET_NAME", "image-service-bucket")
+    IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
+    TAGS_TABLE = os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")
+    event = event or {}
+    dry_run = event.get("dry_run", os.getenv("RECONCILE_DELETE", "0") != "1")
+    margin_ms = int(os.getenv("RECONCILE_TIME_MARGIN_MS", "60000"))
+    deadline = (lambda: context.get_remaining_time_in_millis() < margin_ms) if context else None
+    try:
+        report = reconcile(
+            IMAGES_TABLE, TAGS_TABLE, BUCKET,
+            segments=int(os.getenv("RECONCILE_SEGMENTS", "4")),
+            workers=int(os.getenv("RECONCILE_CONCURRENCY", "8")),
+            dry_run=bool(dry_run),
+            min_age_seconds=int(os.getenv("RECONCILE_MIN_AGE_SECONDS", DEFAULT_MIN_AGE_SECONDS)),
+            checkpoint=Checkpoint(os.getenv("RECONCILE_CHECKPOINT") or f"s3://{BUCKET}/_reconcile/checkpoint.json"),
+            deadline=deadline,
+        )
+        logger.info("reconcile: %s complete=%s dry_run=%s", report["stats"], report["complete"], report["dry_run"])
+        return report
+    except Exception as e:
+        logger.exception("reconcile failed")
+        return {"error": f"Reconcile failed: {e}"}
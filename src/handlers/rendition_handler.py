@@ -0,0 +1,58 @@
+# src/handlers/rendition_handler.py
+"""
+Asynchronous rendition stage.
+
+Invoked with {"image_ids": [...], "variants": [...]} (async Lambda invoke from
+the upload path, or manually) or with S3 ObjectCreated events for images/ keys.
+Renders every configured variant (or the requested subset) per image. With
+SIMILARITY_INDEX=1 the same decoded original is also hashed into the
+near-duplicate index (common.similarity), once per image.
+"""
+import os
+from urllib.parse import unquote_plus
+
+from common import similarity
+from common.aws_clients import ddb_table, prewarm
+from common.metrics import instrument
+from common.renditions import generate, read_original
+
+
+prewarm("s3", tables=[os.getenv("IMAGES_TABLE_NAME", "images")])
+
+
+def _image_ids(event):
+    if "Records" in event:
+        ids = []
+        for rec in event["Records"]:
+            key = unquote_plus(rec.get("s3", {}).get("object", {}).get("key", ""))
+            if key.startswith("images/"):
+                ids.append(key.split("/", 1)[1])
+        return ids
+    return list(event.get("image_ids") or [])
+
+
+@instrument
+def handler(event, context):
+    IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
+    images_tbl = ddb_table(IMAGES_TABLE)
+    variants = event.get("variants")
+    results = []
+    for image_id in _image_ids(event):
+        try:
+            item = images_tbl.get_item(Key={"image_id": image_id}).get("Item")
+            if not item or item.get("status") == "pending":
+                results.append({"image_id": image_id, "status": "skipped"})
+                continue
+            original = read_original(item)
+            done = generate(item, variants, original)
+            result = {"image_id": image_id, "status": "rendered", "variants": done}
+            if similarity.enabled() and not item.get("phash"):
+                from common import phash
+                try:
+                    result["indexed"] = similarity.index(item, phash.compute(original))
+                except Exception as e:
+                    result["index_error"] = str(e)
+            results.append(result)
+        except Exception as e:
+            results.append({"image_id": image_id, "status": "failed", "error": str(e)})
+    return {"results": results}
@@ -0,0 +1,64 @@
+# src/handlers/similar_handler.py
+"""
+GET /images/{image_id}/similar
+
+Near-duplicates of an image (re-encoded, resized, lightly edited copies) from
+the perceptual-hash index (common.similarity), closest first. Each item is
+the stored image plus its `distance` (phash bits that differ, 0-64).
+
+Query: max_distance (default 8, at most 16), limit (default 20, at most 100),
+user_id (only that user's images). 409 while the image is not indexed yet.
+"""
+import os
+
+from common import similarity
+from common.dynamo import batch_get_items, get_item, prewarm_reads
+from common.metrics import instrument
+from common.response import json_response
+
+prewarm_reads(os.getenv("IMAGES_TABLE_NAME", "images"), similarity.table_name())
+
+
+def _int_param(query, name: str, default: int, low: int, high: int) -> int:
+    raw = query.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+
+@instrument
+def handler(event, context):
+    IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
+    try:
+        image_id = (event.get("pathParameters") or {}).get("image_id")
+        if not image_id:
+            parts = (event.get("rawPath") or event.get("path") or "").strip("/").split("/")
+            if len(parts) == 3 and parts[0] == "images" and parts[2] == "similar":
+                image_id = parts[1]
+        if not image_id:
+            return json_response(400, {"error": "image_id required"})
+        query = event.get("queryStringParameters") or {}
+        max_distance = _int_param(query, "max_distance", similarity.DEFAULT_MAX_DISTANCE, 0, similarity.MAX_DISTANCE)
+        limit = _int_param(query, "limit", similarity.DEFAULT_LIMIT, 1, similarity.MAX_LIMIT)
+
+        item = get_item(IMAGES_TABLE, {"image_id": image_id})
+        if not item or item.get("status") == "pending":
+            return json_response(404, {"error": "Not found"})
+        if not item.get("phash"):
+            return json_response(409, {"error": "Image is not indexed for similarity yet"})
+
+        nearest = similarity.similar(item, max_distance, limit, user_id=query.get("user_id"))
+        found = {it["image_id"]: it for it in batch_get_items(IMAGES_TABLE, "image_id", [i for i, _ in nearest])}
+        items = [dict(found[i], distance=d) for i, d in nearest
+                 if i in found and found[i].get("status") != "pending"]
+        return json_response(200, {"image_id": image_id, "max_distance": max_distance, "items": items}, event=event)
+    except ValueError as e:
+        return json_response(400, {"error": str(e)})
+    except Exception as e:
+        return json_response(500, {"error": f"Similar lookup failed: {e}"})
@@ -0,0 +1,29 @@
+# src/handlers/tags_handler.py
+"""
+GET /tags?prefix=<p>&limit=<n>: tag autocomplete from the tag dictionary,
+most used tags first, with their image counts.
+"""
+from common import tag_dictionary
+from common.aws_clients import prewarm
+from common.metrics import instrument
+from common.response import json_response
+
+# suggestions change slowly; let browsers reuse them while the user types
+CACHE_CONTROL = "private, max-age=30"
+
+prewarm(tables=[tag_dictionary.table_name()])
+
+
+@instrument
+def handler(event, context):
+    try:
+        params = event.get("queryStringParameters") or {}
+        limit = int(params.get("limit", tag_dictionary.DEFAULT_SUGGESTIONS))
+        if not 1 <= limit <= tag_dictionary.MAX_SUGGESTIONS:
+            raise ValueError(f"limit must be between 1 and {tag_dictionary.MAX_SUGGESTIONS}")
+        tags = tag_dictionary.suggest(params.get("prefix") or "", limit)
+        return json_response(200, {"tags": tags}, {"Cache-Control": CACHE_CONTROL}, event=event)
+    except ValueError as ve:
+        return json_response(400, {"error": str(ve)})
+    except Exception as e:
+        return json_response(500, {"error": f"Tag lookup failed: {e}"})
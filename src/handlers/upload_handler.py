@@ -1,71 +1,89 @@
-
 import os
-import json
-from typing import List
 
-from common.aws_clients import s3_client, ddb_resource
-from common.response import json_response
-from common.utils import decode_b64, sha256_hex, gen_id, now_iso
+from common import aio, idempotency
+from common.aws_clients import prewarm, s3_client
+from common.cache import invalidate
+from common.dynamo import TransactionConflict
+from common.images import image_item, validate_metadata
+from common.metrics import instrument
+from common.renditions import schedule as schedule_renditions
+from common.response import dumps, json_response
+from common.uploads import commit_item, discard, store_b64
+from common.utils import gen_id, json_body, now_iso
+
+prewarm("s3", tables=[os.getenv("IMAGES_TABLE_NAME", "images"), os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags"),
+                      os.getenv("IDEMPOTENCY_TABLE_NAME", "image_idempotency")])
+
+REPLAYED = {"Idempotent-Replayed": "true"}
 
 
 def _validate(payload: dict):
-    required = ["user_id", "title", "tags", "content_type", "image_base64"]
-    missing = [k for k in required if k not in payload]
-    if missing:
-        raise ValueError(f"Missing fields: {', '.join(missing)}")
-    if not isinstance(payload.get("tags"), list) or not payload["tags"]:
-        raise ValueError("'tags' must be a non-empty list")
+    validate_metadata(payload, extra_required=["image_base64"])
 
 
+@instrument
 def handler(event, context):
+    return aio.run(handle(event, context))
+
+
+async def handle(event, context):
     BUCKET = os.getenv("S3_BUCKET_NAME", "image-service-bucket")
     IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
     TAGS_TABLE = os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")
+    stored = None
+    reservation = None
+    committed = False
     try:
-        payload = json.loads(event.get("body") or "{}")
+        payload = json_body(event)
         _validate(payload)
         user_id = payload["user_id"]
         title = payload["title"]
-        description = payload.get("description", "")
-        tags: List[str] = [t.strip().lower() for t in payload["tags"] if t and isinstance(t, str)]
         content_type = payload["content_type"]
-        image_bytes = decode_b64(payload["image_base64"])
-        checksum = sha256_hex(image_bytes)
-        size = len(image_bytes)
-        image_id = gen_id()
+
+        key = idempotency.request_key(event)
+        if key:
+            reservation = await aio.call(idempotency.reserve, key, user_id, idempotency.fingerprint(payload))
+            if reservation.response is not None:
+                return json_response(201, reservation.response, REPLAYED)
+        image_id = reservation.image_id if reservation else gen_id()
         s3_key = f"images/{image_id}"
         created_at = now_iso()
+        s3_meta = {"user_id": user_id, "title": title}
 
-        s3 = s3_client()
-        s3.put_object(Bucket=BUCKET, Key=s3_key, Body=image_bytes, ContentType=content_type,
-                      Metadata={"user_id": user_id, "title": title})
-
-        ddb = ddb_resource()
-        images_tbl = ddb.Table(IMAGES_TABLE)
-        tags_tbl = ddb.Table(TAGS_TABLE)
-
-        item = {
-            "image_id": image_id,
-            "user_id": user_id,
-            "title": title,
-            "description": description,
-            "tags": tags,
-            "content_type": content_type,
-            "s3_bucket": BUCKET,
-            "s3_key": s3_key,
-            "size": size,
-            "checksum": checksum,
-            "created_at": created_at,
-        }
-        images_tbl.put_item(Item=item)
+        stored = await aio.call(store_b64, s3_client(), BUCKET, s3_key, payload.pop("image_base64"),
+                                content_type, s3_meta)
+        item = image_item(image_id, payload, BUCKET, stored.s3_key, stored.size, stored.checksum, created_at,
+                          stored.info)
 
-        with tags_tbl.batch_writer() as batch:
-            for t in tags:
-                batch.put_item(Item={"tag": t, "image_id": image_id, "user_id": user_id, "created_at": created_at})
+        # image row + tag rows (+ the idempotency record) commit or fail together
+        extra = [idempotency.commit_action(reservation, dumps(item))] if reservation else []
+        try:
+            await aio.call(commit_item, IMAGES_TABLE, TAGS_TABLE, item, extra)
+        except TransactionConflict:
+            if not reservation:
+                raise
+            # an identical retry committed first; hand back its result
+            original = await aio.call(idempotency.replay, reservation)
+            if original is None:
+                raise
+            return json_response(201, original, REPLAYED)
+        committed = True  # the image row now owns the blob reference
+        await aio.gather(aio.call(invalidate, image_id), aio.call(schedule_renditions, image_id))
 
         return json_response(201, item)
 
     except ValueError as ve:
         return json_response(400, {"error": str(ve)})
+    except idempotency.IdempotencyMismatch as e:
+        return json_response(422, {"error": str(e)})
     except Exception as e:
         return json_response(500, {"error": f"Upload failed: {e}"})
+    finally:
+        if stored and not committed:
+            # a retry under the same Idempotency-Key reuses the same S3 key,
+            # so only a blob reference is given back in that case
+            try:
+                if stored.blob_checksum or not reservation:
+                    await aio.call(discard, stored, BUCKET)
+            except Exception:
+                pass  # leaves an over-counted blob or an orphaned object, never a dangling reference
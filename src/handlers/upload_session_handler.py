@@ -0,0 +1,134 @@
+# src/handlers/upload_session_handler.py
+"""
+Two-phase direct-to-S3 upload.
+
+  POST /images/uploads                        -> pending record + presigned POST
+  POST /images/uploads/{image_id}/complete    -> verify the S3 object, commit metadata
+  S3 ObjectCreated events under images/       -> same as /complete
+
+The image bytes go straight from the client to S3; Lambda only sees metadata.
+Pending records live in the `images` table without `user_id` (so the sparse
+user_id-index GSI never lists them) and expire through the `expires_at` TTL.
+"""
+import os
+import time
+import base64
+from urllib.parse import unquote_plus
+
+from common import image_probe
+from common.aws_clients import ddb_table, prewarm, s3_client
+from common.images import image_item, validate_metadata
+from common.metrics import instrument
+from common.response import json_response
+from common.uploads import PENDING, UploadMismatch, finalize
+from common.utils import gen_id, json_body, now_iso
+
+prewarm("s3", tables=[
+    os.getenv("IMAGES_TABLE_NAME", "images"), os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")])
+
+
+def _validate(payload: dict, max_bytes: int):
+    validate_metadata(payload, extra_required=["size", "checksum"])
+    size = payload["size"]
+    if not isinstance(size, int) or size <= 0:
+        raise ValueError("'size' must be a positive integer")
+    if size > max_bytes:
+        raise ValueError(f"'size' exceeds the maximum of {max_bytes} bytes")
+    if image_probe.enabled():
+        # the bytes themselves are checked when the upload completes
+        image_probe.format_for(payload["content_type"])
+        image_probe.check_size(size)
+    try:
+        if len(bytes.fromhex(payload["checksum"])) != 32:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError("'checksum' must be a hex-encoded SHA-256 digest")
+
+
+def _create(event, bucket, images_table):
+    max_bytes = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+    ttl = int(os.getenv("UPLOAD_URL_TTL_SECONDS", "900"))
+    payload = json_body(event)
+    _validate(payload, max_bytes)
+
+    image_id = gen_id()
+    s3_key = f"images/{image_id}"
+    item = image_item(image_id, payload, bucket, s3_key, payload["size"], payload["checksum"].lower(), now_iso())
+    item["pending_user_id"] = item.pop("user_id")
+    item["status"] = PENDING
+    item["expires_at"] = int(time.time()) + ttl
+    ddb_table(images_table).put_item(Item=item)
+
+    # S3 rejects a POST whose bytes do not hash to the declared checksum and
+    # keeps it on the object, so /complete verifies it with head_object alone
+    fields = {
+        "Content-Type": payload["content_type"],
+        "x-amz-checksum-algorithm": "SHA256",
+        "x-amz-checksum-sha256": base64.b64encode(bytes.fromhex(payload["checksum"])).decode(),
+    }
+    post = s3_client().generate_presigned_post(
+        Bucket=bucket,
+        Key=s3_key,
+        Fields=fields,
+        Conditions=[{k: v} for k, v in fields.items()] + [
+            ["content-length-range", payload["size"], payload["size"]],
+        ],
+        ExpiresIn=ttl,
+    )
+    return json_response(201, {
+        "image_id": image_id,
+        "upload": post,
+        "expires_in": ttl,
+        "complete_path": f"/images/uploads/{image_id}/complete",
+    })
+
+
+def _image_id_from_event(event):
+    path_params = event.get("pathParameters") or {}
+    if path_params.get("image_id"):
+        return path_params["image_id"]
+    parts = (event.get("rawPath") or event.get("path") or "").strip("/").split("/")
+    if len(parts) >= 4 and parts[:2] == ["images", "uploads"]:
+        return parts[2]
+    return None
+
+
+def _handle_s3_event(event, images_table, tags_table):
+    results = []
+    for rec in event.get("Records", []):
+        key = unquote_plus(rec.get("s3", {}).get("object", {}).get("key", ""))
+        if not key.startswith("images/"):
+            continue
+        image_id = key.split("/", 1)[1]
+        try:
+            finalize(image_id, images_table, tags_table)
+            results.append({"image_id": image_id, "status": "committed"})
+        except (LookupError, UploadMismatch) as e:
+            results.append({"image_id": image_id, "status": "skipped", "reason": str(e)})
+    return {"results": results}
+
+
+@instrument
+def handler(event, context):
+    BUCKET = os.getenv("S3_BUCKET_NAME", "image-service-bucket")
+    IMAGES_TABLE = os.getenv("IMAGES_TABLE_NAME", "images")
+    TAGS_TABLE = os.getenv("IMAGE_TAGS_TABLE_NAME", "image_tags")
+    if "Records" in event:
+        return _handle_s3_event(event, IMAGES_TABLE, TAGS_TABLE)
+    try:
+        raw_path = (event.get("rawPath") or event.get("path") or "").rstrip("/")
+        if raw_path.endswith("/complete"):
+            image_id = _image_id_from_event(event)
+            if not image_id:
+                return json_response(400, {"error": "image_id required"})
+            return json_response(200, finalize(image_id, IMAGES_TABLE, TAGS_TABLE))
+        return _create(event, BUCKET, IMAGES_TABLE)
+
+    except ValueError as ve:
+        return json_response(400, {"error": str(ve)})
+    except LookupError:
+        return json_response(404, {"error": "Not found"})
+    except UploadMismatch as um:
+        return json_response(409, {"error": str(um)})
+    except Exception as e:
+        return json_response(500, {"error": f"Upload failed: {e}"})
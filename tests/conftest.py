@@ -9,6 +9,10 @@ import pytest
 import boto3
 from moto import mock_aws
 
+from common.aws_clients import reset_clients
+from common.cache import reset_metadata_cache
+from common.tag_shards import reset_shard_cache
+
 # Ensure "src/" is on module path
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
@@ -19,11 +23,19 @@ os.environ.pop("AWS_ENDPOINT_URL", None)
 os.environ.setdefault("AWS_REGION", "us-east-1")
 os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
 os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+# handlers build their clients on import; under moto they are rebuilt per test anyway
+os.environ.setdefault("PREWARM_CLIENTS", "0")
+# list cursors are only signed with a configured key (common.pagination)
+os.environ.setdefault("PAGINATION_SECRET", "test-pagination-secret")
 
 # Constants used across tests
 BUCKET_NAME = "test-bucket"
 IMAGES_TABLE = "images"
 TAGS_TABLE = "image_tags"
+BLOBS_TABLE = "image_blobs"
+IDEMPOTENCY_TABLE = "image_idempotency"
+TAG_DICTIONARY_TABLE = "image_tag_dictionary"
+PHASH_BANDS_TABLE = "image_phash_bands"
 
 def _create_s3_bucket():
     s3 = boto3.client("s3", region_name=os.environ["AWS_REGION"])
@@ -50,18 +62,68 @@ def _create_tables():
             "Projection": {"ProjectionType": "ALL"},
         }],
     )
-    # image_tags table for tag queries
+    # image_tags table for tag queries, GSI user_tag-index for user_id + tag
     ddb.create_table(
         TableName=TAGS_TABLE,
         AttributeDefinitions=[
             {"AttributeName": "tag", "AttributeType": "S"},
             {"AttributeName": "image_id", "AttributeType": "S"},
+            {"AttributeName": "user_tag", "AttributeType": "S"},
+            {"AttributeName": "created_at", "AttributeType": "S"},
         ],
         KeySchema=[
             {"AttributeName": "tag", "KeyType": "HASH"},
             {"AttributeName": "image_id", "KeyType": "RANGE"},
         ],
         BillingMode="PAY_PER_REQUEST",
+        GlobalSecondaryIndexes=[{
+            "IndexName": "user_tag-index",
+            "KeySchema": [
+                {"AttributeName": "user_tag", "KeyType": "HASH"},
+                {"AttributeName": "created_at", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "KEYS_ONLY"},
+        }],
+    )
+    # image_blobs: reference counts of content-addressed blobs (dedup mode)
+    ddb.create_table(
+        TableName=BLOBS_TABLE,
+        AttributeDefinitions=[{"AttributeName": "checksum", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "checksum", "KeyType": "HASH"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    # image_idempotency: Idempotency-Key records of POST /images
+    ddb.create_table(
+        TableName=IDEMPOTENCY_TABLE,
+        AttributeDefinitions=[{"AttributeName": "idempotency_key", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "idempotency_key", "KeyType": "HASH"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    # image_tag_dictionary: per-tag image counts for autocomplete
+    ddb.create_table(
+        TableName=TAG_DICTIONARY_TABLE,
+        AttributeDefinitions=[
+            {"AttributeName": "bucket", "AttributeType": "S"},
+            {"AttributeName": "tag", "AttributeType": "S"},
+        ],
+        KeySchema=[
+            {"AttributeName": "bucket", "KeyType": "HASH"},
+            {"AttributeName": "tag", "KeyType": "RANGE"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    # image_phash_bands: perceptual-hash bands for near-duplicate lookup
+    ddb.create_table(
+        TableName=PHASH_BANDS_TABLE,
+        AttributeDefinitions=[
+            {"AttributeName": "band", "AttributeType": "S"},
+            {"AttributeName": "image_id", "AttributeType": "S"},
+        ],
+        KeySchema=[
+            {"AttributeName": "band", "KeyType": "HASH"},
+            {"AttributeName": "image_id", "KeyType": "RANGE"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
     )
 
 @pytest.fixture(autouse=True)
@@ -73,15 +135,25 @@ def moto_env():
     os.environ["S3_BUCKET_NAME"] = BUCKET_NAME
     os.environ["IMAGES_TABLE_NAME"] = IMAGES_TABLE
     os.environ["IMAGE_TAGS_TABLE_NAME"] = TAGS_TABLE
+    os.environ["IMAGE_BLOBS_TABLE_NAME"] = BLOBS_TABLE
+    os.environ["IDEMPOTENCY_TABLE_NAME"] = IDEMPOTENCY_TABLE
+    os.environ["TAG_DICTIONARY_TABLE_NAME"] = TAG_DICTIONARY_TABLE
+    os.environ["PHASH_BANDS_TABLE_NAME"] = PHASH_BANDS_TABLE
 
     m = mock_aws()
     m.start()
+    reset_clients()
+    reset_metadata_cache()
+    reset_shard_cache()
     try:
         _create_s3_bucket()
         _create_tables()
         yield
     finally:
         m.stop()
+        reset_clients()
+        reset_metadata_cache()
+        reset_shard_cache()
 
 @pytest.fixture
 def upload_req():
@@ -0,0 +1,100 @@
+# tests/test_async_mode.py
+import json
+import base64
+import asyncio
+import threading
+import time
+
+import pytest
+
+from common import aio
+from common.dynamo import batch_get_items
+from src.handlers import upload_handler, list_handler, delete_handler
+
+@pytest.fixture(params=["sync", "async"])
+def mode(request, monkeypatch):
+    monkeypatch.setenv("ASYNC_HANDLERS", "1" if request.param == "async" else "0")
+    return request.param
+
+def _upload(tags=("c",), user="u1"):
+    ev = {"body": json.dumps({"user_id": user, "title": "t", "tags": list(tags), "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"\x89PNG").decode()})}
+    resp = upload_handler.handler(ev, None)
+    assert resp["statusCode"] == 201, resp
+    return json.loads(resp["body"])["image_id"]
+
+def test_handlers_round_trip(mode):
+    ids = sorted(_upload() for _ in range(3))
+    resp = list_handler.handler({"queryStringParameters": {"tag": "c"}}, None)
+    assert [it["image_id"] for it in json.loads(resp["body"])["items"]] == ids
+    assert delete_handler.handler({"pathParameters": {"image_id": ids[0]}}, None)["statusCode"] == 204
+    assert delete_handler.handler({"pathParameters": {"image_id": ids[0]}}, None)["statusCode"] == 404
+    resp = list_handler.handler({"queryStringParameters": {"user_id": "u1", "limit": "1"}}, None)
+    assert json.loads(resp["body"])["next_token"]
+
+def test_modes_return_the_same_page(monkeypatch):
+    for _ in range(5):
+        _upload(tags=("a", "b"))
+    bodies = []
+    for flag in ("0", "1"):
+        monkeypatch.setenv("ASYNC_HANDLERS", flag)
+        bodies.append(list_handler.handler({"queryStringParameters": {"tag": "a,b", "limit": "3"}}, None)["body"])
+    assert bodies[0] == bodies[1]
+
+def test_gather_runs_calls_concurrently(mode):
+    barrier = threading.Barrier(3, timeout=5)  # breaks unless all three calls overlap
+    def meet(i):
+        barrier.wait()
+        return i
+    async def main():
+        return await aio.gather(*(aio.call(meet, i) for i in range(3)))
+    assert aio.run(main()) == [0, 1, 2]
+
+def test_gather_honours_the_limit(mode):
+    active, peak, lock = [0], [0], threading.Lock()
+    def work(i):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return i
+    async def main():
+        return await aio.map(work, range(8), limit=2)
+    assert aio.run(main()) == list(range(8))
+    assert peak[0] == 2
+
+def test_errors_propagate(mode):
+    def boom():
+        raise KeyError("x")
+    async def main():
+        await aio.gather(aio.call(boom), aio.call(lambda: 1))
+    with pytest.raises(KeyError):
+        aio.run(main())
+
+def test_sync_mode_needs_no_event_loop(monkeypatch):
+    monkeypatch.setenv("ASYNC_HANDLERS", "0")
+    seen = []
+    async def main():
+        await aio.call(lambda: seen.append(threading.current_thread()))
+        return "done"
+    assert aio.run(main()) == "done" and seen == [threading.current_thread()]
+    with pytest.raises(RuntimeError):
+        aio.run(asyncio.sleep(0))
+
+def test_async_mode_reuses_the_loop_and_offloads(monkeypatch):
+    monkeypatch.setenv("ASYNC_HANDLERS", "1")
+    async def main():
+        worker = await aio.call(threading.current_thread)
+        return asyncio.get_running_loop(), worker
+    loop1, worker = aio.run(main())
+    loop2, _ = aio.run(main())
+    assert loop1 is loop2 and worker is not threading.current_thread()
+
+def test_sync_helpers_inside_a_coroutine(mode):
+    iid = _upload()
+    async def main():
+        # a sync wrapper called straight on the loop's thread runs inline
+        return batch_get_items("images", "image_id", [iid])
+    assert [it["image_id"] for it in aio.run(main())] == [iid]
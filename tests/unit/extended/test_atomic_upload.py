@@ -0,0 +1,160 @@
+# tests/test_atomic_upload.py
+import json
+import base64
+
+import boto3
+import pytest
+
+from common import dynamo, idempotency, uploads
+from src.handlers import upload_handler, list_handler
+
+class Killed(BaseException):
+    """The Lambda process dies here: nothing after this point runs, not even cleanup."""
+
+def _event(key=None, data=b"\x89PNG atomic", tags=("atomic",), user="u1"):
+    ev = {"body": json.dumps({"user_id": user, "title": "t", "tags": list(tags), "content_type": "image/png",
+                              "image_base64": base64.b64encode(data).decode()})}
+    if key:
+        ev["headers"] = {"Idempotency-Key": key}
+    return ev
+
+def _upload(ev):
+    resp = upload_handler.handler(ev, None)
+    return resp["statusCode"], json.loads(resp["body"]), resp["headers"]
+
+def _kill_at(monkeypatch, name):
+    def die(*a, **kw):
+        raise Killed(name)
+    monkeypatch.setattr(upload_handler, name, die)
+    # a dead process runs no cleanup
+    monkeypatch.setattr(upload_handler, "discard", lambda *a, **kw: None)
+
+def _keys():
+    return [o["Key"] for o in boto3.client("s3", region_name="us-east-1").list_objects_v2(
+        Bucket="test-bucket", Prefix="images/").get("Contents", [])]
+
+def _rows(table):
+    return boto3.resource("dynamodb", region_name="us-east-1").Table(table).scan()["Items"]
+
+def _tagged(tag):
+    body = json.loads(list_handler.handler({"queryStringParameters": {"tag": tag}}, None)["body"])
+    return [it["image_id"] for it in body["items"]]
+
+def test_image_and_tag_rows_commit_in_one_transaction(monkeypatch):
+    calls = []
+    real = dynamo.transact_write
+    monkeypatch.setattr(uploads, "transact_write", lambda actions: calls.append(actions) or real(actions))
+    status, item, _ = _upload(_event(tags=["a", "b", "c"]))
+    assert status == 201
+    assert len(calls) == 1 and len(calls[0]) == 4
+    assert len(_rows("image_tags")) == 3
+
+def test_failed_commit_leaves_nothing_behind(monkeypatch):
+    def fail(actions):
+        raise RuntimeError("TransactionCanceled")
+    monkeypatch.setattr(uploads, "transact_write", fail)
+    status, _, _ = _upload(_event())
+    assert status == 500
+    assert _rows("images") == [] and _rows("image_tags") == []
+    assert _keys() == []
+
+def test_tags_beyond_transaction_limit_are_written_after_commit(monkeypatch):
+    monkeypatch.setattr(uploads, "TRANSACT_MAX_ITEMS", 3)
+    def fail(actions):
+        raise RuntimeError("TransactionCanceled")
+    monkeypatch.setattr(uploads, "transact_write", fail)
+    tags = [f"t{i}" for i in range(5)]
+    status, _, _ = _upload(_event(tags=tags))
+    # a failed commit leaves no overflow tag rows behind
+    assert status == 500 and _rows("images") == [] and _rows("image_tags") == []
+    monkeypatch.undo()
+    monkeypatch.setattr(uploads, "TRANSACT_MAX_ITEMS", 3)
+    status, item, _ = _upload(_event(tags=tags))
+    assert status == 201
+    assert all(_tagged(t) == [item["image_id"]] for t in tags)
+
+def test_killed_after_s3_put_retry_reuses_image_id(monkeypatch):
+    _kill_at(monkeypatch, "commit_item")
+    with pytest.raises(Killed):
+        _upload(_event(key="k1"))
+    assert len(_keys()) == 1 and _rows("images") == []
+    monkeypatch.undo()
+
+    status, item, headers = _upload(_event(key="k1"))
+    assert status == 201 and "Idempotent-Replayed" not in headers
+    assert _keys() == [f"images/{item['image_id']}"]  # overwritten, not duplicated
+    assert [r["image_id"] for r in _rows("images")] == [item["image_id"]]
+    assert _tagged("atomic") == [item["image_id"]]
+
+def test_killed_after_commit_retry_replays_result(monkeypatch):
+    _kill_at(monkeypatch, "invalidate")
+    with pytest.raises(Killed):
+        _upload(_event(key="k2"))
+    monkeypatch.undo()
+    first_id = _rows("images")[0]["image_id"]
+
+    status, item, headers = _upload(_event(key="k2"))
+    assert status == 201 and headers["Idempotent-Replayed"] == "true"
+    assert item["image_id"] == first_id
+    assert len(_rows("images")) == 1 and len(_keys()) == 1
+
+def test_completed_request_replays_identically():
+    s1, first, _ = _upload(_event(key="k3"))
+    s2, second, headers = _upload(_event(key="k3"))
+    assert (s1, s2) == (201, 201)
+    assert second == first and headers["Idempotent-Replayed"] == "true"
+    assert len(_rows("images")) == 1
+
+def test_key_reused_for_different_request_is_422():
+    _upload(_event(key="k4"))
+    status, body, _ = _upload(_event(key="k4", data=b"\x89PNG other bytes"))
+    assert status == 422 and "different request" in body["error"]
+    assert len(_rows("images")) == 1
+
+def test_fingerprint_hashes_image_without_serializing_it(monkeypatch):
+    payload = json.loads(_event()["body"])
+    dumped = []
+    real_dumps = json.dumps
+    monkeypatch.setattr(idempotency.json, "dumps", lambda obj, **kw: dumped.append(obj) or real_dumps(obj, **kw))
+    fp = idempotency.fingerprint(payload)
+    assert dumped and all("image_base64" not in d for d in dumped)
+    assert fp == idempotency.fingerprint(dict(reversed(list(payload.items()))))
+    assert fp != idempotency.fingerprint(dict(payload, image_base64=base64.b64encode(b"other").decode()))
+    assert fp != idempotency.fingerprint(dict(payload, title="other"))
+
+def test_keys_are_scoped_per_user():
+    _, a, _ = _upload(_event(key="same", user="alice"))
+    _, b, headers = _upload(_event(key="same", user="bob"))
+    assert a["image_id"] != b["image_id"] and "Idempotent-Replayed" not in headers
+
+def test_racing_identical_retries_commit_once(monkeypatch):
+    real = upload_handler.commit_item
+    state = {"nested": False}
+    def commit_after_twin(*args, **kwargs):
+        if not state["nested"]:
+            # the client's retry runs to completion while this attempt is between S3 and commit
+            state["nested"] = True
+            assert upload_handler.handler(_event(key="k5"), None)["statusCode"] == 201
+        return real(*args, **kwargs)
+    monkeypatch.setattr(upload_handler, "commit_item", commit_after_twin)
+    status, item, headers = _upload(_event(key="k5"))
+    assert status == 201 and headers["Idempotent-Replayed"] == "true"
+    assert [r["image_id"] for r in _rows("images")] == [item["image_id"]]
+    assert _keys() == [f"images/{item['image_id']}"]
+
+def test_racing_retries_keep_one_blob_reference(monkeypatch):
+    monkeypatch.setenv("DEDUP_ENABLED", "1")
+    real = upload_handler.commit_item
+    state = {"nested": False}
+    def commit_after_twin(*args, **kwargs):
+        if not state["nested"]:
+            state["nested"] = True
+            upload_handler.handler(_event(key="k6"), None)
+        return real(*args, **kwargs)
+    monkeypatch.setattr(upload_handler, "commit_item", commit_after_twin)
+    _upload(_event(key="k6"))
+    assert _rows("image_blobs")[0]["ref_count"] == 1
+
+def test_overlong_key_is_rejected():
+    status, _, _ = _upload(_event(key="x" * 300))
+    assert status == 400
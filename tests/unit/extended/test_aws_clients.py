@@ -0,0 +1,44 @@
+# tests/test_aws_clients.py
+from common.aws_clients import s3_client, ddb_client, ddb_resource, ddb_table, reset_clients, client_config
+
+def test_clients_are_reused_across_calls():
+    assert s3_client() is s3_client()
+    assert ddb_client() is ddb_client()
+    assert ddb_resource() is ddb_resource()
+
+def test_tables_cached_per_name():
+    t1 = ddb_table("images")
+    assert ddb_table("images") is t1
+    assert ddb_table("image_tags") is not t1
+    assert t1.name == "images"
+
+def test_reset_clients_drops_cache():
+    c = s3_client()
+    t = ddb_table("images")
+    reset_clients()
+    assert s3_client() is not c
+    assert ddb_table("images") is not t
+
+def test_cache_keyed_by_region(monkeypatch):
+    c = ddb_client()
+    monkeypatch.setenv("AWS_REGION", "eu-west-1")
+    other = ddb_client()
+    assert other is not c
+    assert other.meta.region_name == "eu-west-1"
+
+def test_client_config_from_env(monkeypatch):
+    monkeypatch.setenv("AWS_MAX_POOL_CONNECTIONS", "64")
+    monkeypatch.setenv("AWS_CONNECT_TIMEOUT", "1.5")
+    monkeypatch.setenv("AWS_RETRY_MODE", "standard")
+    monkeypatch.setenv("AWS_MAX_ATTEMPTS", "bogus")
+    cfg = client_config()
+    assert cfg.max_pool_connections == 64
+    assert cfg.connect_timeout == 1.5
+    assert cfg.retries == {"mode": "standard", "total_max_attempts": 3}
+    assert cfg.tcp_keepalive is True
+
+def test_custom_endpoint_uses_path_style(monkeypatch):
+    monkeypatch.setenv("AWS_ENDPOINT_URL", "http://localhost:4566")
+    c = s3_client()
+    assert c.meta.endpoint_url == "http://localhost:4566"
+    assert c.meta.config.s3 == {"addressing_style": "path"}
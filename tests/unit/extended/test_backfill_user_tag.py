@@ -0,0 +1,47 @@
+# tests/test_backfill_user_tag.py
+import os
+import json
+import importlib.util
+
+import boto3
+
+from src.handlers import list_handler
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts", "backfill_user_tag.py")
+_spec = importlib.util.spec_from_file_location("backfill_user_tag", _SCRIPT)
+backfill_user_tag = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(backfill_user_tag)
+
+def _seed_legacy():
+    ddb = boto3.resource("dynamodb", region_name="us-east-1")
+    images, tags = ddb.Table("images"), ddb.Table("image_tags")
+    images.put_item(Item={"image_id": "i1", "user_id": "u1", "title": "a", "created_at": "2024-01-01T00:00:00+00:00"})
+    images.put_item(Item={"image_id": "i2", "user_id": "u1", "title": "b", "created_at": "2024-01-02T00:00:00+00:00"})
+    # legacy rows: one with user_id/created_at, one bare, one pointing at a deleted image
+    tags.put_item(Item={"tag": "old", "image_id": "i1", "user_id": "u1", "created_at": "2024-01-01T00:00:00+00:00"})
+    tags.put_item(Item={"tag": "old", "image_id": "i2"})
+    tags.put_item(Item={"tag": "old", "image_id": "gone"})
+    return tags
+
+def _combined():
+    resp = list_handler.handler({"queryStringParameters": {"user_id": "u1", "tag": "old"}}, None)
+    return sorted(it["image_id"] for it in json.loads(resp["body"])["items"])
+
+def test_backfill_dry_run_changes_nothing():
+    _seed_legacy()
+    stats = backfill_user_tag.backfill("images", "image_tags", segments=2, dry_run=True)
+    assert stats == {"scanned_missing": 3, "updated": 2, "orphaned": 1}
+    assert _combined() == []
+
+def test_backfill_makes_legacy_rows_visible():
+    tags = _seed_legacy()
+    backfill_user_tag.backfill("images", "image_tags", segments=2)
+    assert _combined() == ["i1", "i2"]
+    row = tags.get_item(Key={"tag": "old", "image_id": "i2"})["Item"]
+    assert row["user_tag"] == "u1#old"
+    assert row["created_at"] == "2024-01-02T00:00:00+00:00"
+    # second run is a no-op
+    assert backfill_user_tag.backfill("images", "image_tags")["updated"] == 0
+
+def test_ensure_index_is_idempotent():
+    assert backfill_user_tag.ensure_index("image_tags") is False
@@ -0,0 +1,142 @@
+# tests/test_batch_upload.py
+import json
+import base64
+import hashlib
+
+import boto3
+import pytest
+
+from common import dynamo
+from common.aws_clients import ddb_resource
+from src.handlers import batch_upload_handler, upload_session_handler, list_handler
+
+def _entry(i, tags=("batch",), data=None, **over):
+    e = {"user_id": "u1", "title": f"t{i}", "tags": list(tags), "content_type": "image/png",
+         "image_base64": base64.b64encode(data or b"\x89PNG" + str(i).encode()).decode()}
+    e.update(over)
+    return e
+
+def _batch(items):
+    resp = batch_upload_handler.handler({"body": json.dumps({"items": items})}, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+def _tagged(tag):
+    body = json.loads(list_handler.handler({"queryStringParameters": {"tag": tag, "limit": "100"}}, None)["body"])
+    return sorted(it["image_id"] for it in body["items"])
+
+def _keys(prefix="images/"):
+    return [o["Key"] for o in boto3.client("s3", region_name="us-east-1").list_objects_v2(
+        Bucket="test-bucket", Prefix=prefix).get("Contents", [])]
+
+def _images_row(iid):
+    return boto3.resource("dynamodb", region_name="us-east-1").Table("images").get_item(
+        Key={"image_id": iid}).get("Item")
+
+def test_partial_failure_is_per_item():
+    bad = _entry(2)
+    del bad["title"]
+    status, body = _batch([_entry(0), _entry(1, tags=["batch", "Other", "other"]), bad, _entry(3)])
+    assert status == 200
+    assert [r["status"] for r in body["results"]] == [201, 201, 400, 201]
+    assert [r["index"] for r in body["results"]] == [0, 1, 2, 3]
+    assert "title" in body["results"][2]["error"]
+    assert (body["succeeded"], body["failed"]) == (3, 1)
+    ids = sorted(r["item"]["image_id"] for r in body["results"] if r["status"] == 201)
+    assert _tagged("batch") == ids
+    assert body["results"][1]["item"]["tags"] == ["batch", "other"]
+    assert len(_keys()) == 3
+
+def test_rows_span_several_write_chunks():
+    status, body = _batch([_entry(i, tags=["a", "b", "c"]) for i in range(30)])  # 120 write requests
+    assert body["succeeded"] == 30
+    assert len(_tagged("c")) == 30
+
+def test_unprocessed_items_are_retried(monkeypatch):
+    monkeypatch.setattr(dynamo, "BATCH_WRITE_BASE_DELAY", 0)
+    client = ddb_resource().meta.client
+    real = client.batch_write_item
+    calls = []
+    def flaky(RequestItems):
+        calls.append(1)
+        if len(calls) == 1:
+            # throttle the tag table on the first call
+            tags = RequestItems.pop("image_tags")
+            resp = real(RequestItems=RequestItems)
+            resp["UnprocessedItems"] = {"image_tags": tags}
+            return resp
+        return real(RequestItems=RequestItems)
+    monkeypatch.setattr(client, "batch_write_item", flaky)
+    _, body = _batch([_entry(0), _entry(1)])
+    assert body["succeeded"] == 2
+    assert len(calls) == 2
+    assert len(_tagged("batch")) == 2
+
+def test_retry_delays_are_jittered():
+    delays = [dynamo.backoff_delay(0.05, 3) for _ in range(200)]
+    assert all(0 <= d <= 0.4 for d in delays)
+    assert len(set(delays)) > 100
+
+def test_item_left_unprocessed_is_rolled_back(monkeypatch):
+    monkeypatch.setattr(dynamo, "BATCH_WRITE_BASE_DELAY", 0)
+    monkeypatch.setattr(dynamo, "BATCH_WRITE_MAX_ATTEMPTS", 2)
+    client = ddb_resource().meta.client
+    real = client.batch_write_item
+    def stuck(RequestItems):
+        # tag rows of title "t1" never get through
+        held = [r for r in RequestItems.get("image_tags", []) if "PutRequest" in r
+                and r["PutRequest"]["Item"]["image_id"] == state["victim"]]
+        RequestItems["image_tags"] = [r for r in RequestItems.get("image_tags", []) if r not in held]
+        RequestItems = {t: rs for t, rs in RequestItems.items() if rs}
+        resp = real(RequestItems=RequestItems) if RequestItems else {"UnprocessedItems": {}}
+        if held:
+            resp["UnprocessedItems"] = {"image_tags": held}
+        return resp
+    state = {}
+    real_store = batch_upload_handler._store
+    def store(entry, bucket):
+        item, stored = real_store(entry, bucket)
+        if entry["title"] == "t1":
+            state["victim"] = item["image_id"]
+        return item, stored
+    monkeypatch.setattr(batch_upload_handler, "_store", store)
+    monkeypatch.setattr(client, "batch_write_item", stuck)
+
+    _, body = _batch([_entry(0), _entry(1), _entry(2)])
+    assert [r["status"] for r in body["results"]] == [201, 500, 201]
+    assert _images_row(state["victim"]) is None
+    assert f"images/{state['victim']}" not in _keys()
+    assert len(_tagged("batch")) == 2
+
+def test_batch_completes_direct_uploads():
+    png = b"\x89PNG direct"
+    created = json.loads(upload_session_handler.handler({"rawPath": "/images/uploads", "body": json.dumps(
+        {"user_id": "u1", "title": "d", "tags": ["batch"], "content_type": "image/png", "size": len(png),
+         "checksum": hashlib.sha256(png).hexdigest()})},
+        None)["body"])
+    iid = created["image_id"]
+    boto3.client("s3", region_name="us-east-1").put_object(Bucket="test-bucket", Key=f"images/{iid}",
+                                                           Body=png, ContentType="image/png", ChecksumAlgorithm="SHA256")
+    _, body = _batch([{"image_id": iid}, {"image_id": "missing"}, _entry(0)])
+    assert [r["status"] for r in body["results"]] == [200, 404, 201]
+    assert iid in _tagged("batch")
+
+def test_batch_dedups_identical_bytes(monkeypatch):
+    monkeypatch.setenv("DEDUP_ENABLED", "1")
+    # moto applies ADD non-atomically across threads; store one entry at a time
+    monkeypatch.setenv("BATCH_UPLOAD_CONCURRENCY", "1")
+    same = b"\x89PNG identical"
+    _, body = _batch([_entry(0, data=same), _entry(1, data=same)])
+    keys = {r["item"]["s3_key"] for r in body["results"]}
+    assert len(keys) == 1 and keys.pop().startswith("blobs/sha256/")
+    row = boto3.resource("dynamodb", region_name="us-east-1").Table("image_blobs").scan()["Items"][0]
+    assert row["ref_count"] == 2
+
+@pytest.mark.parametrize("body", [{}, {"items": []}, {"items": "x"}])
+def test_request_level_validation(body):
+    resp = batch_upload_handler.handler({"body": json.dumps(body)}, None)
+    assert resp["statusCode"] == 400
+
+def test_batch_size_limit(monkeypatch):
+    monkeypatch.setenv("BATCH_UPLOAD_MAX_ITEMS", "2")
+    status, body = _batch([_entry(i) for i in range(3)])
+    assert status == 400 and "At most 2" in body["error"]
@@ -0,0 +1,179 @@
+# tests/test_bulk_delete.py
+import json
+import base64
+
+import boto3
+import pytest
+
+from common import deletes, tag_dictionary
+from common.aws_clients import ddb_resource
+from src.handlers import bulk_delete_handler, delete_handler, upload_handler, list_handler
+
+def _upload(user="u1", data=None, tags=("bulk",)):
+    ev = {"body": json.dumps({"user_id": user, "title": "t", "tags": list(tags), "content_type": "image/png",
+                              "image_base64": base64.b64encode(data or b"\x89PNG" + user.encode()).decode()})}
+    resp = upload_handler.handler(ev, None)
+    assert resp["statusCode"] == 201
+    return json.loads(resp["body"])
+
+def _bulk(body):
+    resp = bulk_delete_handler.handler({"body": json.dumps(body)}, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+def _delete(iid):
+    return delete_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}, None)
+
+def _keys(prefix=""):
+    return [o["Key"] for o in boto3.client("s3", region_name="us-east-1").list_objects_v2(
+        Bucket="test-bucket", Prefix=prefix).get("Contents", [])]
+
+def _rows(table):
+    return boto3.resource("dynamodb", region_name="us-east-1").Table(table).scan()["Items"]
+
+def _tagged(tag):
+    body = json.loads(list_handler.handler({"queryStringParameters": {"tag": tag}}, None)["body"])
+    return [it["image_id"] for it in body["items"]]
+
+def _add_rendition(iid, variant="thumb_128"):
+    boto3.client("s3", region_name="us-east-1").put_object(Bucket="test-bucket", Key=f"renditions/{iid}/{variant}",
+                                                           Body=b"r")
+    boto3.resource("dynamodb", region_name="us-east-1").Table("images").update_item(
+        Key={"image_id": iid}, UpdateExpression="ADD variants :v", ExpressionAttributeValues={":v": {variant}})
+
+def test_single_delete_is_one_transaction(monkeypatch):
+    up = _upload(tags=["a", "b"])
+    _add_rendition(up["image_id"])
+    client = ddb_resource().meta.client
+    calls = []
+    real = client.transact_write_items
+    monkeypatch.setattr(client, "transact_write_items", lambda **kw: calls.append(kw) or real(**kw))
+    assert _delete(up["image_id"])["statusCode"] == 204
+    assert len(calls) == 1 and len(calls[0]["TransactItems"]) == 3
+    assert _rows("images") == [] and _rows("image_tags") == []
+    assert _keys() == []
+
+def test_failed_transaction_leaves_no_orphans(monkeypatch):
+    up = _upload(tags=["a", "b"])
+    client = ddb_resource().meta.client
+    def boom(**kw):
+        raise RuntimeError("throttled")
+    monkeypatch.setattr(client, "transact_write_items", boom)
+    assert _delete(up["image_id"])["statusCode"] == 500
+    # nothing half-deleted: the row survives, and so do its bytes
+    assert len(_rows("images")) == 1 and len(_rows("image_tags")) == 2
+    assert _keys() == [up["s3_key"]]
+
+def test_losing_a_delete_race_is_404(monkeypatch):
+    up = _upload()
+    real_get = delete_handler.ddb_table
+    # the row is read, then removed by a concurrent request before the transaction
+    class Racy:
+        def __init__(self, tbl):
+            self.tbl = tbl
+        def get_item(self, **kw):
+            item = self.tbl.get_item(**kw)
+            self.tbl.delete_item(Key=kw["Key"])
+            return item
+    monkeypatch.setattr(delete_handler, "ddb_table", lambda name: Racy(real_get(name)))
+    assert _delete(up["image_id"])["statusCode"] == 404
+
+def test_tags_beyond_transaction_limit(monkeypatch):
+    monkeypatch.setattr(deletes, "TRANSACT_MAX_ITEMS", 3)
+    up = _upload(tags=[f"t{i}" for i in range(5)])
+    assert _delete(up["image_id"])["statusCode"] == 204
+    assert _rows("image_tags") == []
+
+def test_bulk_delete_by_ids():
+    ups = [_upload(user=f"u{i}") for i in range(4)]
+    _add_rendition(ups[0]["image_id"])
+    ids = [u["image_id"] for u in ups[:3]]
+    status, body = _bulk({"image_ids": ids + ["missing", ids[0]]})
+    assert status == 200
+    assert [(r["image_id"], r["status"]) for r in body["results"]] == [(i, 204) for i in ids] + [("missing", 404)]
+    assert (body["deleted"], body["failed"]) == (3, 1)
+    assert _tagged("bulk") == [ups[3]["image_id"]]
+    assert _keys() == [f"images/{ups[3]['image_id']}"]
+
+def test_racing_deletes_decrement_tag_counts_once(monkeypatch):
+    ups = [_upload(user=f"u{i}") for i in range(3)]
+    ids = [u["image_id"] for u in ups]
+    real_get = bulk_delete_handler.batch_get_items
+    def read_then_race(*args, **kwargs):
+        items = real_get(*args, **kwargs)
+        assert _delete(ids[0])["statusCode"] == 204  # a concurrent delete wins after the read
+        return items
+    monkeypatch.setattr(bulk_delete_handler, "batch_get_items", read_then_race)
+    _, body = _bulk({"image_ids": ids[:2]})
+    assert [r["status"] for r in body["results"]] == [404, 204]
+    assert tag_dictionary.suggest("bulk") == [{"tag": "bulk", "count": 1}]
+
+def test_bulk_delete_uses_one_s3_call_per_1000_keys(monkeypatch):
+    monkeypatch.setattr(deletes, "S3_DELETE_MAX_KEYS", 2)
+    ids = [_upload(user=f"u{i}")["image_id"] for i in range(5)]
+    s3 = bulk_delete_handler.s3_client()
+    calls = []
+    real = s3.delete_objects
+    monkeypatch.setattr(s3, "delete_objects", lambda **kw: calls.append(kw) or real(**kw))
+    _, body = _bulk({"image_ids": ids})
+    assert body["deleted"] == 5
+    assert sorted(len(c["Delete"]["Objects"]) for c in calls) == [1, 2, 2]
+    assert _keys() == []
+
+def test_bulk_delete_reports_s3_failures_per_id(monkeypatch):
+    a, b = _upload(user="a"), _upload(user="b")
+    s3 = bulk_delete_handler.s3_client()
+    real = s3.delete_objects
+    def partial(**kw):
+        resp = real(**kw)
+        resp["Errors"] = [{"Key": f"images/{b['image_id']}", "Code": "AccessDenied"}]
+        return resp
+    monkeypatch.setattr(s3, "delete_objects", partial)
+    _, body = _bulk({"image_ids": [a["image_id"], b["image_id"]]})
+    assert [r["status"] for r in body["results"]] == [204, 500]
+
+def test_bulk_delete_keeps_objects_of_rows_it_could_not_delete(monkeypatch):
+    a, b = _upload("u1"), _upload("u2")
+    real_get = bulk_delete_handler.ddb_table
+    class Failing:
+        def __init__(self, tbl):
+            self.tbl = tbl
+        def delete_item(self, **kw):
+            if kw["Key"]["image_id"] == b["image_id"]:
+                raise RuntimeError("throttled")
+            return self.tbl.delete_item(**kw)
+    monkeypatch.setattr(bulk_delete_handler, "ddb_table", lambda name: Failing(real_get(name)))
+    _, body = _bulk({"image_ids": [a["image_id"], b["image_id"]]})
+    assert [r["status"] for r in body["results"]] == [204, 500]
+    assert [r["image_id"] for r in _rows("images")] == [b["image_id"]]
+    assert _keys() == [b["s3_key"]]
+
+def test_bulk_delete_releases_shared_blob_once(monkeypatch):
+    monkeypatch.setenv("DEDUP_ENABLED", "1")
+    same = b"\x89PNG shared"
+    a, b, c = _upload(data=same), _upload(data=same), _upload(data=same)
+    _, body = _bulk({"image_ids": [a["image_id"], b["image_id"]]})
+    assert body["deleted"] == 2
+    assert _rows("image_blobs")[0]["ref_count"] == 1
+    assert _keys("blobs/") != []
+    _bulk({"image_ids": [c["image_id"]]})
+    assert _rows("image_blobs") == [] and _keys("blobs/") == []
+
+def test_purge_user_in_pages(monkeypatch):
+    monkeypatch.setenv("BULK_DELETE_MAX_IDS", "3")
+    for _ in range(5):
+        _upload(user="gone")
+    keep = _upload(user="stay")
+    _, first = _bulk({"user_id": "gone"})
+    assert (first["deleted"], first["more"]) == (3, True)
+    _, second = _bulk({"user_id": "gone"})
+    assert (second["deleted"], second["more"]) == (2, False)
+    assert [r["image_id"] for r in _rows("images")] == [keep["image_id"]]
+
+@pytest.mark.parametrize("body", [{}, {"image_ids": []}, {"image_ids": "x"}, {"image_ids": [1]}])
+def test_bulk_delete_validation(body):
+    assert _bulk(body)[0] == 400
+
+def test_bulk_delete_limit(monkeypatch):
+    monkeypatch.setenv("BULK_DELETE_MAX_IDS", "2")
+    status, body = _bulk({"image_ids": ["a", "b", "c"]})
+    assert status == 400 and "At most 2" in body["error"]
@@ -0,0 +1,84 @@
+# tests/test_cold_start.py
+import os
+import sys
+import json
+import base64
+import zipfile
+import importlib.util
+
+import pytest
+
+from common import aws_clients
+from src.handlers import upload_handler, get_handler
+
+_SCRIPTS = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts")
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(_SCRIPTS, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+build_bundles = _load("build_bundles")
+bench_import_time = _load("bench_import_time")
+
+def test_list_bundle_has_no_s3_code():
+    files = build_bundles.bundle_files("list_handler")
+    assert "handlers/list_handler.py" in files and "common/dynamo.py" in files
+    assert not {"common/presign.py", "common/renditions.py", "common/uploads.py", "handlers/get_handler.py"} & set(files)
+
+def test_lazy_imports_are_still_bundled():
+    # get_handler imports presign/renditions inside the download branch
+    assert {"common/presign.py", "common/renditions.py"} <= set(build_bundles.bundle_files("get_handler"))
+
+def test_every_handler_gets_a_bundle(tmp_path):
+    for name in build_bundles.handlers():
+        path = build_bundles.build(name, str(tmp_path))
+        with open(path, "rb") as f:
+            first = f.read()
+        with open(build_bundles.build(name, str(tmp_path)), "rb") as f:
+            assert f.read() == first  # reproducible
+    names = zipfile.ZipFile(path).namelist()
+    assert [n for n in names if n.startswith("handlers/__pycache__/")]  # precompiled
+    assert len([n for n in names if n.endswith(".pyc")]) == len([n for n in names if n.endswith(".py")])
+
+def test_build_refuses_an_interpreter_of_another_runtime(monkeypatch, tmp_path):
+    here = build_bundles.interpreter_runtime(sys.executable)
+    assert here == "python%d.%d" % sys.version_info[:2]
+    other = "python2.7"
+    monkeypatch.setattr(sys, "argv", ["build_bundles.py", "--out", str(tmp_path), "--python", sys.executable,
+                                      "--runtime", other, "list_handler"])
+    with pytest.raises(SystemExit) as exc:
+        build_bundles.main()
+    assert other in str(exc.value) and not os.listdir(tmp_path)
+
+@pytest.mark.parametrize("handler", ["list_handler", "get_handler"])
+def test_handler_import_stays_within_budget(handler):
+    _, _, _, modules = bench_import_time._probe(f"handlers.{handler}")
+    loaded = set(modules)
+    assert not [m for m in bench_import_time.BUDGETS[handler]
+                if m in loaded or any(x.startswith(m + ".") for x in loaded)]
+
+def test_prewarm_builds_clients_once(monkeypatch):
+    monkeypatch.setenv("PREWARM_CLIENTS", "1")
+    aws_clients.prewarm("s3", tables=["images"])
+    s3, table = aws_clients.s3_client(), aws_clients.ddb_table("images")
+    aws_clients.prewarm("s3", tables=["images"])
+    assert aws_clients.s3_client() is s3 and aws_clients.ddb_table("images") is table
+
+def test_prewarm_never_raises(monkeypatch):
+    monkeypatch.setenv("PREWARM_CLIENTS", "1")
+    def boom(service):
+        raise RuntimeError("no network at init")
+    monkeypatch.setattr(aws_clients, "_cached_client", boom)
+    aws_clients.prewarm("s3")
+
+def test_metadata_read_does_not_build_s3_client(monkeypatch):
+    ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": ["c"], "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"\x89PNG").decode()})}
+    iid = json.loads(upload_handler.handler(ev, None)["body"])["image_id"]
+    def no_s3():
+        raise AssertionError("metadata read built an S3 client")
+    monkeypatch.setattr(get_handler, "s3_client", no_s3)
+    resp = get_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}, None)
+    assert resp["statusCode"] == 200
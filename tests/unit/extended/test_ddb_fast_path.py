@@ -0,0 +1,81 @@
+# tests/test_ddb_fast_path.py
+import json
+import base64
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer
+
+from common import ddb_codec
+from common.ddb_codec import decode_item, encode_item
+from common.dynamo import get_item, query_page
+from src.handlers import upload_handler, list_handler, get_handler
+
+def _upload(tags=("fast",), user="u1", title="t"):
+    ev = {"body": json.dumps({"user_id": user, "title": title, "tags": list(tags), "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"\x89PNG" + title.encode()).decode()})}
+    return json.loads(upload_handler.handler(ev, None)["body"])
+
+def _list(monkeypatch, fast, **params):
+    monkeypatch.setenv("DDB_FAST_PATH", "1" if fast else "0")
+    return json.loads(list_handler.handler({"queryStringParameters": params}, None)["body"])
+
+def test_codec_matches_boto3():
+    item = {"image_id": "a", "size": 12, "ratio": 0.5, "tags": ["x", "y"], "variants": {"thumb_128"},
+            "meta": {"w": 3, "ok": True, "none": None}, "counts": {1, 2}}
+    serializer, deserializer = ddb_codec.PlainNumberSerializer(), ddb_codec.PlainNumberDeserializer()
+    raw = encode_item(item)
+    assert raw == {k: serializer.serialize(v) for k, v in item.items()}
+    assert decode_item(raw) == {k: deserializer.deserialize(v) for k, v in raw.items()} == item
+    assert decode_item(encode_item({"raw": b"\x00"})) == {"raw": b"\x00"}
+
+@pytest.mark.parametrize("text,expected", [("12", 12), ("1.50", 1.5), ("1E+3", 1000), ("-0.25", -0.25)])
+def test_numbers_are_plain(text, expected):
+    value = ddb_codec.parse_number(text)
+    assert value == expected and type(value) is type(expected)
+
+def test_unknown_schema_types_fall_back():
+    # a known name stored with an unexpected type still decodes
+    assert decode_item({"size": {"S": "big"}, "tags": {"SS": ["a"]}}) == {"size": "big", "tags": {"a"}}
+
+def test_get_item_parity():
+    iid = _upload()["image_id"]
+    slow = get_item("images", {"image_id": iid})
+    fast = get_item("images", {"image_id": iid}, fast=True)
+    assert fast == slow and type(fast["size"]) is int
+    assert get_item("images", {"image_id": "missing"}, fast=True) is None
+
+def test_query_page_parity_and_cursor():
+    for i in range(5):
+        _upload(title=f"t{i}")
+    slow, slow_last = query_page("images", "user_id", "u1", index="user_id-index", limit=3)
+    fast, fast_last = query_page("images", "user_id", "u1", index="user_id-index", limit=3, fast=True)
+    assert fast == slow and fast_last == slow_last
+    rest, last = query_page("images", "user_id", "u1", index="user_id-index", start=fast_last, fast=True)
+    assert len(rest) == 2 and last is None
+
+@pytest.mark.parametrize("params", [{"tag": "fast"}, {"user_id": "u1"}, {"user_id": "u1", "tag": "fast"},
+                                    {"user_id": "u1", "fields": "title,size", "sort": "created_at_desc"}])
+def test_list_handler_parity(monkeypatch, params):
+    for i in range(4):
+        _upload(title=f"t{i}")
+    slow = _list(monkeypatch, False, limit="3", **params)
+    fast = _list(monkeypatch, True, limit="3", **params)
+    assert fast == slow and len(fast["items"]) == 3
+    assert _list(monkeypatch, True, next_token=fast["next_token"], **params)["items"] == \
+        _list(monkeypatch, False, next_token=slow["next_token"], **params)["items"]
+
+def test_fast_path_skips_type_deserializer(monkeypatch):
+    iid = _upload()["image_id"]
+    calls = []
+    real = TypeDeserializer.deserialize
+    monkeypatch.setattr(TypeDeserializer, "deserialize", lambda self, v: calls.append(1) or real(self, v))
+    monkeypatch.setenv("DDB_FAST_PATH", "1")
+    monkeypatch.setenv("METADATA_CACHE_TTL_SECONDS", "0")
+    resp = get_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}, None)
+    assert resp["statusCode"] == 200 and json.loads(resp["body"])["size"] == 5
+    assert _list(monkeypatch, True, tag="fast")["items"][0]["image_id"] == iid
+    assert calls == []
+
+def test_decimal_keys_encode():
+    assert encode_item({"n": Decimal("1.5")}) == {"n": {"N": "1.5"}}
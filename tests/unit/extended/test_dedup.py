@@ -0,0 +1,141 @@
+# tests/test_dedup.py
+import json
+import base64
+import hashlib
+import time
+
+import boto3
+import pytest
+
+from common import blobs
+from src.handlers import upload_handler, delete_handler, upload_session_handler
+
+DATA = b"\x89PNG\r\n\x1a\n" + b"same-bytes" * 8
+CHECKSUM = hashlib.sha256(DATA).hexdigest()
+
+@pytest.fixture(autouse=True)
+def dedup_on(monkeypatch):
+    monkeypatch.setenv("DEDUP_ENABLED", "1")
+
+def _upload(user_id="u1", data=DATA):
+    ev = {"body": json.dumps({"user_id": user_id, "title": "t", "tags": ["dup"], "content_type": "image/png",
+                              "image_base64": base64.b64encode(data).decode()})}
+    resp = upload_handler.handler(ev, None)
+    assert resp["statusCode"] == 201, resp["body"]
+    return json.loads(resp["body"])
+
+def _delete(iid):
+    return delete_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}, None)["statusCode"]
+
+def _blob_row():
+    return boto3.resource("dynamodb", region_name="us-east-1").Table("image_blobs").get_item(
+        Key={"checksum": CHECKSUM}).get("Item")
+
+def _object_exists(key):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    return s3.list_objects_v2(Bucket="test-bucket", Prefix=key).get("KeyCount", 0) > 0
+
+def test_duplicate_upload_skips_put(monkeypatch):
+    first = _upload()
+    assert first["s3_key"] == f"blobs/sha256/{CHECKSUM}"
+
+    puts = []
+    s3 = upload_handler.s3_client()
+    s3.meta.events.register("before-call.s3.PutObject", lambda **kw: puts.append(1))
+    second = _upload(user_id="u2")
+    assert puts == []
+    assert second["s3_key"] == first["s3_key"]
+    assert second["image_id"] != first["image_id"]
+    assert _blob_row()["ref_count"] == 2
+
+def test_object_deleted_with_last_reference():
+    a, b = _upload(), _upload()
+    key = a["s3_key"]
+    assert _delete(a["image_id"]) == 204
+    assert _object_exists(key)
+    assert _blob_row()["ref_count"] == 1
+    assert _delete(a["image_id"]) == 404  # a second delete must not drop b's reference
+    assert _blob_row()["ref_count"] == 1
+    assert _delete(b["image_id"]) == 204
+    assert not _object_exists(key)
+    assert _blob_row() is None
+
+def test_reupload_after_full_delete_restores_blob():
+    a = _upload()
+    _delete(a["image_id"])
+    b = _upload()
+    assert _object_exists(b["s3_key"])
+    assert _blob_row()["blob_state"] == blobs.STORED
+
+def test_failed_metadata_write_releases_reference(monkeypatch):
+    def failing_commit(*args, **kwargs):
+        raise Exception("DDB transaction failed")
+    monkeypatch.setattr("src.handlers.upload_handler.commit_item", failing_commit)
+    ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": ["dup"], "content_type": "image/png",
+                              "image_base64": base64.b64encode(DATA).decode()})}
+    assert upload_handler.handler(ev, None)["statusCode"] == 500
+    assert _blob_row() is None
+    assert not _object_exists(f"blobs/sha256/{CHECKSUM}")
+
+def test_acquire_waits_out_deleting_blob(monkeypatch):
+    monkeypatch.setattr(blobs, "ACQUIRE_BASE_DELAY", 0)
+    tbl = boto3.resource("dynamodb", region_name="us-east-1").Table("image_blobs")
+    tbl.put_item(Item={"checksum": CHECKSUM, "ref_count": 0, "blob_state": blobs.DELETING,
+                       "deleting_since": int(time.time()), "s3_key": blobs.blob_key(CHECKSUM)})
+    with pytest.raises(RuntimeError):
+        blobs.acquire(CHECKSUM, len(DATA))
+    assert _blob_row()["ref_count"] == 0
+
+def test_acquire_reclaims_blob_stuck_deleting():
+    # the releaser died between flipping the row and dropping it
+    tbl = boto3.resource("dynamodb", region_name="us-east-1").Table("image_blobs")
+    tbl.put_item(Item={"checksum": CHECKSUM, "ref_count": 0, "blob_state": blobs.DELETING,
+                       "deleting_since": int(time.time()) - blobs.deleting_timeout() - 1,
+                       "s3_key": blobs.blob_key(CHECKSUM)})
+    b = _upload()
+    assert _object_exists(b["s3_key"])
+    row = _blob_row()
+    assert (row["ref_count"], row["blob_state"]) == (1, blobs.STORED) and "deleting_since" not in row
+
+def test_interleaved_first_uploads_both_upload_and_both_count():
+    # two uploaders race on brand-new bytes: both see the blob unstored
+    # (both PUT identical bytes to the same key) and both references count
+    key1, need1 = blobs.acquire(CHECKSUM, len(DATA))
+    key2, need2 = blobs.acquire(CHECKSUM, len(DATA))
+    assert key1 == key2 and need1 and need2
+    blobs.mark_stored(CHECKSUM)
+    assert blobs.acquire(CHECKSUM, len(DATA)) == (key1, False)
+    assert _blob_row()["ref_count"] == 3
+
+def test_release_loses_to_new_reference(monkeypatch):
+    a = _upload()
+    # the releaser takes the count to zero, a new upload re-references before
+    # the releaser flips the row to 'deleting': the object must survive
+    tbl = blobs.ddb_table("image_blobs")
+    real_update = tbl.update_item
+    state = {"raced": False}
+    def racing_update(**kw):
+        if kw["UpdateExpression"].startswith("SET blob_state = :deleting") and not state["raced"]:
+            state["raced"] = True
+            blobs.acquire(CHECKSUM, len(DATA))
+        return real_update(**kw)
+    monkeypatch.setattr(tbl, "update_item", racing_update)
+    assert _delete(a["image_id"]) == 204
+    assert state["raced"]
+    assert _object_exists(a["s3_key"])
+    assert _blob_row()["ref_count"] == 1
+
+def test_direct_upload_finalize_moves_to_blob():
+    existing = _upload()
+    body = {"user_id": "u3", "title": "d", "tags": ["dup"], "content_type": "image/png", "size": len(DATA),
+            "checksum": CHECKSUM}
+    created = json.loads(upload_session_handler.handler({"body": json.dumps(body), "rawPath": "/images/uploads"}, None)["body"])
+    iid = created["image_id"]
+    boto3.client("s3", region_name="us-east-1").put_object(Bucket="test-bucket", Key=f"images/{iid}",
+                                                           Body=DATA, ContentType="image/png", ChecksumAlgorithm="SHA256")
+    resp = upload_session_handler.handler({"pathParameters": {"image_id": iid},
+                                           "rawPath": f"/images/uploads/{iid}/complete"}, None)
+    item = json.loads(resp["body"])
+    assert item["s3_key"] == existing["s3_key"]
+    assert not _object_exists(f"images/{iid}")
+    assert _blob_row()["ref_count"] == 2
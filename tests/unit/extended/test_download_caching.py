@@ -0,0 +1,94 @@
+# tests/test_download_caching.py
+import json
+import base64
+import datetime
+from urllib.parse import parse_qs, urlparse
+
+import botocore.auth
+
+from common import presign
+from common.aws_clients import ddb_table, s3_client
+from src.handlers import upload_handler, get_handler
+
+def _upload():
+    ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": ["c"], "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"xyz").decode()})}
+    return json.loads(upload_handler.handler(ev, None)["body"])
+
+def _get(iid, download=False, query=None, headers=None):
+    path = f"/images/{iid}" + ("/download" if download else "")
+    return get_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": path,
+                                "queryStringParameters": query, "headers": headers}, None)
+
+def _qs(url):
+    return {k: v[0] for k, v in parse_qs(urlparse(url).query).items()}
+
+class CountingS3:
+    def __init__(self, s3):
+        self.s3, self.meta, self.calls = s3, s3.meta, 0
+    def generate_presigned_url(self, **kw):
+        self.calls += 1
+        return self.s3.generate_presigned_url(**kw)
+
+def test_url_is_stable_within_bucket_and_signed_once(monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_URL_BUCKET_SECONDS", "600")
+    monkeypatch.setenv("DOWNLOAD_URL_TTL_SECONDS", "3600")
+    s3 = CountingS3(s3_client())
+    params = {"Bucket": "test-bucket", "Key": "images/x"}
+    t0 = 1_700_000_400  # a multiple of 600
+    u1, left1 = presign.presigned_get(s3, params, now=t0 + 10)
+    u2, left2 = presign.presigned_get(s3, params, now=t0 + 500)
+    assert u1 == u2 and s3.calls == 1
+    assert (left1, left2) == (590, 100)
+    q = _qs(u1)
+    assert q["X-Amz-Date"] == "20231114T222000Z"
+    assert q["X-Amz-Expires"] == "4200"
+    u3, _ = presign.presigned_get(s3, params, now=t0 + 600)
+    assert u3 != u1 and s3.calls == 2
+
+def test_signing_clock_is_restored():
+    wall_clock = botocore.auth.get_current_datetime
+    presign.presigned_get(s3_client(), {"Bucket": "test-bucket", "Key": "images/y"}, now=0)
+    # only patched while signing
+    assert botocore.auth.get_current_datetime is wall_clock is not presign._signing_datetime
+    skew = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - botocore.auth.get_current_datetime()
+    assert abs(skew.total_seconds()) < 5
+
+def test_download_repeats_identical_url_with_cache_headers():
+    iid = _upload()["image_id"]
+    r1, r2 = _get(iid, download=True), _get(iid, download=True)
+    assert json.loads(r1["body"])["url"] == json.loads(r2["body"])["url"]
+    assert r1["headers"]["Cache-Control"].startswith("private, max-age=")
+    q = _qs(json.loads(r1["body"])["url"])
+    assert q["response-cache-control"] == get_handler.DEFAULT_IMAGE_CACHE_CONTROL
+
+def test_redirect_mode(monkeypatch):
+    iid = _upload()["image_id"]
+    resp = _get(iid, download=True, query={"redirect": "1"})
+    assert resp["statusCode"] == 302 and resp["body"] == ""
+    assert resp["headers"]["Location"] == json.loads(_get(iid, download=True)["body"])["url"]
+    monkeypatch.setenv("DOWNLOAD_REDIRECT", "1")
+    assert _get(iid, download=True)["statusCode"] == 302
+    assert _get(iid, download=True, query={"redirect": "0"})["statusCode"] == 200
+
+def test_metadata_etag_and_if_none_match():
+    up = _upload()
+    iid = up["image_id"]
+    first = _get(iid)
+    tag = first["headers"]["ETag"]
+    assert tag.startswith('"' + up["checksum"][:32])
+    assert first["headers"]["Cache-Control"] == "private, no-cache"
+    resp = _get(iid, headers={"If-None-Match": tag})
+    assert resp["statusCode"] == 304 and resp["body"] == ""
+    assert resp["headers"]["ETag"] == tag
+    assert _get(iid, headers={"if-none-match": f'"other", W/{tag}'})["statusCode"] == 304
+    assert _get(iid, headers={"If-None-Match": '"stale"'})["statusCode"] == 200
+
+def test_metadata_etag_changes_with_item():
+    iid = _upload()["image_id"]
+    tag = _get(iid)["headers"]["ETag"]
+    ddb_table("images").update_item(Key={"image_id": iid}, UpdateExpression="SET title = :t",
+                                                ExpressionAttributeValues={":t": "renamed"})
+    resp = _get(iid, headers={"If-None-Match": tag, "Cache-Control": "no-cache"})
+    assert resp["statusCode"] == 200
+    assert resp["headers"]["ETag"] != tag
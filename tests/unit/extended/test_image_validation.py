@@ -0,0 +1,118 @@
+# tests/test_image_validation.py
+import io
+import os
+import json
+import base64
+import hashlib
+
+import boto3
+import pytest
+from PIL import Image, ImageFile
+
+from common import image_probe
+from src.handlers import upload_handler, upload_session_handler, batch_upload_handler, list_handler
+
+def _image(fmt, size=(64, 48), mode="RGB", **save):
+    buf = io.BytesIO()
+    Image.new(mode, size, "red").save(buf, format=fmt, **save)
+    return buf.getvalue()
+
+def _upload(data, content_type):
+    ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": ["v"], "content_type": content_type,
+                              "image_base64": base64.b64encode(data).decode()})}
+    resp = upload_handler.handler(ev, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+@pytest.fixture(autouse=True)
+def validation(monkeypatch):
+    monkeypatch.setenv("IMAGE_VALIDATION", "1")
+
+@pytest.fixture
+def no_decode(monkeypatch):
+    def refuse(self):
+        raise AssertionError("pixels were decoded")
+    monkeypatch.setattr(ImageFile.ImageFile, "load", refuse)
+
+@pytest.mark.parametrize("fmt,content_type,mode", [
+    ("JPEG", "image/jpeg", "RGB"), ("PNG", "image/png", "RGBA"), ("GIF", "image/gif", "P"),
+    ("WEBP", "image/webp", "RGB"), ("TIFF", "image/tiff", "RGB"), ("BMP", "image/bmp", "RGB")])
+def test_header_fields_are_stored_without_decoding(no_decode, fmt, content_type, mode):
+    data = _image(fmt, mode="RGBA" if mode == "RGBA" else "RGB")
+    status, item = _upload(data, content_type)
+    assert status == 201, item
+    assert (item["width"], item["height"], item["orientation"]) == (64, 48, 1)
+    assert item["color_mode"] == mode
+    listed = json.loads(list_handler.handler({"queryStringParameters": {"user_id": "u1", "fields": "width,height"}},
+                                             None)["body"])["items"]
+    assert listed == [{"image_id": item["image_id"], "width": 64, "height": 48}]
+
+def test_exif_orientation_swaps_display_dimensions():
+    exif = Image.Exif()
+    exif[image_probe.EXIF_ORIENTATION] = 6
+    status, item = _upload(_image("JPEG", size=(80, 20), exif=exif), "image/jpeg")
+    assert status == 201, item
+    assert (item["width"], item["height"], item["orientation"]) == (20, 80, 6)
+
+@pytest.mark.parametrize("data,content_type", [
+    (b"not an image at all", "image/png"),
+    (_image("PNG"), "image/jpeg"),
+    (_image("PNG")[:40], "image/png"),
+    (_image("PNG"), "application/pdf"),
+])
+def test_junk_and_mismatched_bytes_are_rejected(data, content_type):
+    status, body = _upload(data, content_type)
+    assert status == 400, body
+    assert boto3.client("s3", region_name="us-east-1").list_objects_v2(Bucket="test-bucket").get("KeyCount", 0) == 0
+
+def test_limits(monkeypatch):
+    monkeypatch.setenv("IMAGE_MAX_DIMENSION", "50")
+    assert "exceed" in _upload(_image("PNG"), "image/png")[1]["error"]
+    monkeypatch.setenv("IMAGE_MAX_DIMENSION", "1000")
+    monkeypatch.setenv("IMAGE_MAX_PIXELS", "1000")
+    assert _upload(_image("PNG"), "image/png")[0] == 400
+    monkeypatch.setenv("IMAGE_MAX_PIXELS", "100000")
+    monkeypatch.setenv("IMAGE_MAX_BYTES", "100")
+    assert "bytes" in _upload(_image("JPEG"), "image/jpeg")[1]["error"]
+
+def test_header_beyond_the_first_read_is_found(no_decode):
+    # a big ICC profile puts the frame header past the first HEADER_BYTES
+    data = _image("JPEG", size=(30, 10), icc_profile=os.urandom(3 * image_probe.HEADER_BYTES))
+    reads = []
+    info = image_probe.probe(lambda n: reads.append(n) or data[:n], "image/jpeg")
+    assert (info["width"], info["height"]) == (30, 10) and len(reads) == 2
+
+def test_streamed_upload_is_checked_from_a_prefix(monkeypatch, no_decode):
+    monkeypatch.setenv("MULTIPART_THRESHOLD_BYTES", "1024")
+    data = _image("PNG", size=(300, 200)) + os.urandom(6 * 1024 * 1024)  # trailing bytes after IEND
+    status, item = _upload(data, "image/png")
+    assert status == 201, item
+    assert (item["width"], item["height"], item["size"]) == (300, 200, len(data))
+    assert _upload(b"GIF89a" + os.urandom(4096), "image/png")[0] == 400
+
+def test_batch_entries_are_checked_one_by_one():
+    entries = [{"user_id": "u1", "title": "t", "tags": ["v"], "content_type": ct,
+                "image_base64": base64.b64encode(data).decode()}
+               for data, ct in ((_image("JPEG"), "image/jpeg"), (b"junk", "image/jpeg"))]
+    body = json.loads(batch_upload_handler.handler({"body": json.dumps({"items": entries})}, None)["body"])
+    assert [r["status"] for r in body["results"]] == [201, 400]
+    assert body["results"][0]["item"]["width"] == 64
+
+def test_direct_upload_reads_only_a_range():
+    s3 = boto3.client("s3", region_name="us-east-1")
+    bodies = []
+    for data, expected in ((_image("WEBP", size=(33, 17)), 200), (b"RIFF0000WEBPjunk" * 4, 409)):
+        resp = upload_session_handler.handler({"rawPath": "/images/uploads", "body": json.dumps(
+            {"user_id": "u1", "title": "t", "tags": ["v"], "content_type": "image/webp", "size": len(data),
+             "checksum": hashlib.sha256(data).hexdigest()})}, None)
+        image_id = json.loads(resp["body"])["image_id"]
+        s3.put_object(Bucket="test-bucket", Key=f"images/{image_id}", Body=data, ContentType="image/webp", ChecksumAlgorithm="SHA256")
+        resp = upload_session_handler.handler({"pathParameters": {"image_id": image_id},
+                                               "rawPath": f"/images/uploads/{image_id}/complete"}, None)
+        assert resp["statusCode"] == expected, resp["body"]
+        bodies.append(json.loads(resp["body"]))
+    assert (bodies[0]["width"], bodies[0]["height"], bodies[0]["color_mode"]) == (33, 17, "RGB")
+    assert "WEBP" in bodies[1]["error"]
+    resp = upload_session_handler.handler({"rawPath": "/images/uploads", "body": json.dumps(
+        {"user_id": "u1", "title": "t", "tags": ["v"], "content_type": "image/heic", "size": 10,
+         "checksum": "0" * 64})}, None)
+    assert resp["statusCode"] == 400
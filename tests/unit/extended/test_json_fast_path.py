@@ -0,0 +1,114 @@
+# tests/test_json_fast_path.py
+import gzip
+import json
+import time
+import base64
+from decimal import Decimal
+
+import boto3
+import pytest
+
+from common import response
+from common.aws_clients import ddb_resource
+from common.response import dumps, json_response, set_serializer
+
+ITEM = {"image_id": "abc", "title": "t", "size": 1234, "ratio": 0.5, "tags": ["a", "b"],
+        "created_at": "2024-01-01T00:00:00+00:00"}
+
+@pytest.fixture(autouse=True)
+def _default_serializer():
+    yield
+    set_serializer()
+
+def _page(n=100):
+    return {"items": [dict(ITEM, image_id=f"img-{i}") for i in range(n)], "next_token": None}
+
+@pytest.mark.parametrize("name", sorted(response.SERIALIZERS))
+def test_serializers_agree(name):
+    set_serializer(name)
+    body = dict(ITEM, size=Decimal("1234"), ratio=Decimal("0.5"), variants={"thumb_128"})
+    assert json.loads(dumps(body)) == dict(ITEM, variants=["thumb_128"])
+
+def test_unknown_serializer_is_rejected():
+    with pytest.raises(ValueError):
+        set_serializer("yaml")
+
+def test_env_selects_stdlib(monkeypatch):
+    monkeypatch.setenv("JSON_SERIALIZER", "stdlib")
+    assert set_serializer() is response.SERIALIZERS["stdlib"]
+
+def test_resource_returns_plain_numbers():
+    table = ddb_resource().Table("images")
+    table.put_item(Item={"image_id": "n1", "size": 42, "ratio": 0.25})
+    item = table.get_item(Key={"image_id": "n1"})["Item"]
+    assert item == {"image_id": "n1", "size": 42, "ratio": 0.25}
+    assert type(item["size"]) is int and type(item["ratio"]) is float
+
+def test_large_body_is_gzipped_when_accepted():
+    resp = json_response(200, _page(), event={"headers": {"accept-encoding": "br;q=0, gzip, deflate"}})
+    assert resp["isBase64Encoded"] is True
+    assert resp["headers"]["Content-Encoding"] == "gzip"
+    assert resp["headers"]["Vary"] == "Accept-Encoding"
+    raw = gzip.decompress(base64.b64decode(resp["body"]))
+    assert json.loads(raw) == json.loads(json_response(200, _page())["body"])
+    assert len(resp["body"]) < len(raw) / 4
+
+@pytest.mark.parametrize("headers,body", [({}, _page()), ({"Accept-Encoding": "gzip"}, {"items": []}),
+                                          ({"Accept-Encoding": "gzip;q=0"}, _page())])
+def test_body_left_alone(headers, body):
+    resp = json_response(200, body, event={"headers": headers})
+    assert resp["isBase64Encoded"] is False and "Content-Encoding" not in resp["headers"]
+    assert json.loads(resp["body"]) == body
+
+def test_compression_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("RESPONSE_COMPRESSION", "0")
+    assert json_response(200, _page(), event={"headers": {"Accept-Encoding": "gzip"}})["isBase64Encoded"] is False
+
+def test_list_handler_compresses():
+    from src.handlers import list_handler
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("images")
+    for i in range(30):
+        table.put_item(Item={"image_id": f"i{i}", "user_id": "u1", "title": "title " * 5, "size": i,
+                             "created_at": f"2024-01-01T00:00:{i:02d}+00:00"})
+    resp = list_handler.handler({"queryStringParameters": {"user_id": "u1"},
+                                 "headers": {"Accept-Encoding": "gzip"}}, None)
+    assert resp["statusCode"] == 200 and resp["isBase64Encoded"]
+    body = json.loads(gzip.decompress(base64.b64decode(resp["body"])))
+    assert len(body["items"]) == 20 and all(type(it["size"]) is int for it in body["items"])
+
+@pytest.mark.parametrize("handler_name,body,status", [
+    ("upload_handler", {"user_id": "u1", "title": "t", "tags": ["a"], "content_type": "image/png",
+                        "image_base64": base64.b64encode(b"\x89PNG").decode()}, 201),
+    ("bulk_delete_handler", {"image_ids": ["missing"]}, 200),
+    ("batch_upload_handler", {"items": [{"user_id": "u1", "title": "t", "tags": ["a"], "content_type": "image/png",
+                                         "image_base64": base64.b64encode(b"\x89PNG").decode()}]}, 200),
+])
+def test_base64_request_bodies_are_decoded(handler_name, body, status):
+    # binaryMediaTypes */* makes API Gateway base64-encode every request body
+    import importlib
+    handler = importlib.import_module(f"src.handlers.{handler_name}").handler
+    event = {"body": base64.b64encode(json.dumps(body).encode()).decode(), "isBase64Encoded": True}
+    resp = handler(event, None)
+    assert resp["statusCode"] == status, resp["body"]
+
+def _best_of(fn, repeats=5, loops=50):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / loops
+
+def test_micro_benchmark_list_payload():
+    # what boto3 used to hand us (Decimal numbers, stdlib + default hook) vs. plain numbers on the fast path
+    decimal_page = {"items": [dict(it, size=Decimal(it["size"]), ratio=Decimal("0.5"))
+                              for it in _page()["items"]], "next_token": None}
+    set_serializer("stdlib")
+    baseline = _best_of(lambda: dumps(decimal_page))
+    plain_page = _page()
+    set_serializer()
+    fast = _best_of(lambda: dumps(plain_page))
+    print(f"\n100-item page: decimal+stdlib {baseline * 1e6:.0f}us, "
+          f"plain+{set_serializer().__name__.strip('_')} {fast * 1e6:.0f}us")
+    assert fast < baseline * 1.5  # loose: timing noise on shared runners
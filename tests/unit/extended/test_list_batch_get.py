@@ -0,0 +1,74 @@
+# tests/test_list_batch_get.py
+import json
+import base64
+
+from common import dynamo
+from common.aws_clients import ddb_resource
+from common.dynamo import batch_get_items, projection
+from src.handlers import upload_handler, list_handler
+
+def _upload(user_id, tags, title="t"):
+    ev = {"body": json.dumps({
+        "user_id": user_id,
+        "title": title,
+        "tags": tags,
+        "content_type": "image/png",
+        "image_base64": base64.b64encode(b"xyz").decode(),
+    })}
+    return json.loads(upload_handler.handler(ev, None)["body"])["image_id"]
+
+def _count_calls():
+    calls = []
+    ddb_resource().meta.client.meta.events.register(
+        "before-call.dynamodb.*", lambda model, **kw: calls.append(model.name))
+    return calls
+
+def test_tag_listing_uses_single_batch_get():
+    for i in range(5):
+        _upload("u1", ["batch"], title=f"t{i}")
+    calls = _count_calls()
+    resp = list_handler.handler({"queryStringParameters": {"tag": "batch", "limit": "5"}}, None)
+    assert resp["statusCode"] == 200
+    assert len(json.loads(resp["body"])["items"]) == 5
+    assert calls == ["Query", "BatchGetItem"]
+
+def test_batch_get_preserves_order_and_chunks(monkeypatch):
+    ids = [_upload("u1", ["many"]) for _ in range(3)]
+    order = list(reversed(ids)) + ["missing-id"]
+    monkeypatch.setattr(dynamo, "BATCH_GET_MAX_KEYS", 2)
+    calls = _count_calls()
+    got = batch_get_items("images", "image_id", order)
+    assert [it["image_id"] for it in got] == list(reversed(ids))
+    assert calls.count("BatchGetItem") == 2
+
+def test_fields_projection():
+    _upload("u1", ["proj"], title="hello")
+    resp = list_handler.handler({"queryStringParameters": {"tag": "proj", "fields": "title,size"}}, None)
+    items = json.loads(resp["body"])["items"]
+    assert items == [{"image_id": items[0]["image_id"], "title": "hello", "size": 3}]
+
+    resp2 = list_handler.handler({"queryStringParameters": {"user_id": "u1", "fields": "title"}}, None)
+    assert set(json.loads(resp2["body"])["items"][0]) == {"image_id", "title"}
+
+def test_projection_escapes_reserved_words():
+    p = projection(["size", "title"], required=["image_id"])
+    assert p["ProjectionExpression"] == "#p0, #p1, #p2"
+    assert p["ExpressionAttributeNames"] == {"#p0": "image_id", "#p1": "size", "#p2": "title"}
+    assert projection(None) == {}
+
+def test_unprocessed_keys_are_retried(monkeypatch):
+    monkeypatch.setattr(dynamo, "BATCH_GET_BASE_DELAY", 0)
+    class FakeClient:
+        def __init__(self):
+            self.requests = []
+        def batch_get_item(self, RequestItems):
+            self.requests.append(RequestItems)
+            keys = RequestItems["images"]["Keys"]
+            if len(self.requests) == 1:
+                return {"Responses": {"images": [keys[0]]},
+                        "UnprocessedKeys": {"images": {"Keys": keys[1:]}}}
+            return {"Responses": {"images": keys}}
+    fake = FakeClient()
+    got = dynamo._batch_get_chunk(fake, "images", [{"image_id": "a"}, {"image_id": "b"}], {})
+    assert [g["image_id"] for g in got] == ["a", "b"]
+    assert fake.requests[1]["images"]["Keys"] == [{"image_id": "b"}]
@@ -54,6 +54,6 @@ def test_list_by_user_and_tag_and_pagination():
     assert len(json.loads(r4["body"])["items"]) == 0
 
 def test_list_bad_pagination_token():
-    # invalid token -> should bubble up as 500 (json.loads failure)
+    # invalid (unsigned) token -> rejected as a bad request
     resp = list_handler.handler({"queryStringParameters": {"user_id": "uA", "last_evaluated_key": "not-json"}}, None)
-    assert resp["statusCode"] == 500
+    assert resp["statusCode"] == 400
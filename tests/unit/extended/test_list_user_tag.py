@@ -0,0 +1,66 @@
+# tests/test_list_user_tag.py
+import json
+import base64
+
+import boto3
+
+from src.handlers import upload_handler, list_handler
+
+def _upload(user_id, tags):
+    ev = {"body": json.dumps({
+        "user_id": user_id,
+        "title": "t",
+        "tags": tags,
+        "content_type": "image/png",
+        "image_base64": base64.b64encode(b"xyz").decode(),
+    })}
+    return json.loads(upload_handler.handler(ev, None)["body"])["image_id"]
+
+def _list(params):
+    resp = list_handler.handler({"queryStringParameters": params}, None)
+    assert resp["statusCode"] == 200
+    return json.loads(resp["body"])
+
+def test_tag_rows_carry_user_tag_key():
+    iid = _upload("u1", ["Sunset"])
+    ddb = boto3.resource("dynamodb", region_name="us-east-1")
+    row = ddb.Table("image_tags").get_item(Key={"tag": "sunset", "image_id": iid})["Item"]
+    assert row["user_tag"] == "u1#sunset"
+    assert row["user_id"] == "u1"
+
+def test_combined_filter_is_complete_for_large_library():
+    # first page of the user's library has no 'rare' images at all
+    for _ in range(6):
+        _upload("u1", ["common"])
+    wanted = {_upload("u1", ["rare"]), _upload("u1", ["rare", "common"])}
+    _upload("u2", ["rare"])
+
+    body = _list({"user_id": "u1", "tag": "rare", "limit": "3"})
+    assert {it["image_id"] for it in body["items"]} == wanted
+    assert all(it["user_id"] == "u1" for it in body["items"])
+
+def test_combined_filter_paginates():
+    ids = [_upload("u1", ["page"]) for _ in range(3)]
+    _upload("u2", ["page"])
+
+    seen, token = [], None
+    while True:
+        params = {"user_id": "u1", "tag": "PAGE", "limit": "2"}
+        if token:
+            params["last_evaluated_key"] = token
+        body = _list(params)
+        seen += [it["image_id"] for it in body["items"]]
+        token = body["next_token"]
+        if not token:
+            break
+    assert sorted(seen) == sorted(ids)
+    assert len(seen) == len(set(seen))
+
+def test_hash_in_user_id_is_rejected():
+    # "a#b" + "c" would share the user_tag key of "a" + "b#c"
+    ev = {"body": json.dumps({"user_id": "a#b", "title": "t", "tags": ["c"], "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"xyz").decode()})}
+    resp = upload_handler.handler(ev, None)
+    assert resp["statusCode"] == 400 and "user_id" in json.loads(resp["body"])["error"]
+    resp = list_handler.handler({"queryStringParameters": {"user_id": "a#b", "tag": "c"}}, None)
+    assert resp["statusCode"] == 400
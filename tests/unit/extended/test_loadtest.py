@@ -0,0 +1,69 @@
+# tests/test_loadtest.py
+import os
+import json
+import importlib.util
+
+import pytest
+
+_SCRIPTS = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts")
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(_SCRIPTS, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+loadtest = _load("loadtest")
+
+MIX = loadtest.parse_mix(loadtest.DEFAULT_MIX)
+
+def _stream(requests=60, library=10, seed=3):
+    return loadtest.synthetic(MIX, requests, library, seed)
+
+def test_report_covers_every_endpoint():
+    report = loadtest.run(loadtest.InProcess(), _stream())
+    assert report["overall"]["requests"] == 60 and report["overall"]["errors"] == 0
+    assert set(report["endpoints"]) == set(loadtest.ENDPOINTS)
+    for row in report["endpoints"].values():
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"] and row["rps"] > 0 and row["rss_peak_mb"] > 0
+    assert report["endpoints"]["upload"]["s3_calls"] == 1 and report["endpoints"]["upload"]["ddb_calls"] >= 1
+    assert report["endpoints"]["list"]["s3_calls"] == 0
+    assert report["endpoints"]["delete"]["statuses"] == {"204": report["endpoints"]["delete"]["n"]}
+
+def test_synthetic_stream_is_seeded():
+    strip = lambda lines: [(l["endpoint"], l.get("image_ref"), json.dumps(l["event"].get("queryStringParameters")))
+                           for l in lines]
+    assert strip(_stream(seed=5)) == strip(_stream(seed=5)) != strip(_stream(seed=6))
+
+def test_replay_resolves_image_refs(tmp_path):
+    path = str(tmp_path / "mix.jsonl")
+    first = loadtest.run(loadtest.InProcess(), loadtest.recording(_stream(), path))
+    again = loadtest.run(loadtest.InProcess(), loadtest.replay(path))
+    assert again["overall"]["skipped"] == 0
+    for endpoint, row in first["endpoints"].items():
+        assert again["endpoints"][endpoint]["statuses"] == row["statuses"]
+        assert again["endpoints"][endpoint]["ddb_calls"] == row["ddb_calls"]
+
+def test_concurrent_run_skips_call_counts():
+    report = loadtest.run(loadtest.InProcess(), _stream(requests=30), concurrency=4)
+    assert report["overall"]["requests"] + report["overall"]["skipped"] == 30
+    assert "ddb_calls" not in report["endpoints"]["get"]
+
+def test_bad_mix_and_replay_lines(tmp_path):
+    with pytest.raises(ValueError):
+        loadtest.parse_mix("upload=1,resize=2")
+    bad = tmp_path / "bad.jsonl"
+    bad.write_text(json.dumps({"endpoint": "get"}) + "\n")
+    with pytest.raises(ValueError):
+        list(loadtest.replay(str(bad)))
+
+def _report(p95, ddb=2.0, errors=0, rps=100.0):
+    return {"overall": {"rps": rps}, "endpoints": {"get": {"p95_ms": p95, "ddb_calls": ddb, "errors": errors}}}
+
+def test_compare_flags_regressions_only():
+    base = _report(10.0)
+    assert loadtest.compare(base, _report(11.0)) == []  # within tolerance
+    assert loadtest.compare(_report(1.0), _report(2.0)) == []  # below the noise floor
+    assert len(loadtest.compare(base, _report(20.0))) == 1
+    assert len(loadtest.compare(base, _report(10.0, ddb=3.0))) == 1
+    assert len(loadtest.compare(base, _report(10.0, errors=1, rps=50.0))) == 2
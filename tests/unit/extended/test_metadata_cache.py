@@ -0,0 +1,118 @@
+# tests/test_metadata_cache.py
+import json
+import base64
+from decimal import Decimal
+
+import boto3
+import pytest
+
+from common import cache
+from common.aws_clients import ddb_table
+from common.cache import LRUCache, MetadataCache, SQLiteBackend
+from src.handlers import upload_handler, get_handler, delete_handler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def _upload():
+    ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": ["c"], "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"xyz").decode()})}
+    return json.loads(upload_handler.handler(ev, None)["body"])["image_id"]
+
+def _get(iid, **extra):
+    return get_handler.handler(dict({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}, **extra),
+                               None)
+
+def _count_get_item():
+    calls = []
+    ddb_table("images").meta.client.meta.events.register(
+        "before-call.dynamodb.GetItem", lambda **kw: calls.append(1))
+    return calls
+
+def test_lru_ttl_and_eviction():
+    clock = FakeClock()
+    lru = LRUCache(max_entries=2, ttl_seconds=5, clock=clock)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == (True, 1)  # a is now most recent
+    lru.set("c", 3)
+    assert lru.get("b") == (False, None)
+    assert lru.stats.snapshot()["evictions"] == 1
+    clock.now += 5
+    assert lru.get("a") == (False, None)
+    assert lru.stats.snapshot()["expirations"] == 1
+
+def test_sqlite_backend_round_trips_dynamodb_types():
+    clock = FakeClock()
+    backend = SQLiteBackend(clock=clock)
+    mc = MetadataCache(shared=backend, shared_ttl_seconds=10)
+    item = {"image_id": "i", "size": Decimal("12"), "variants": {"b", "a"}, "tags": ["x"]}
+    assert mc.get("i", lambda iid: item) == (item, cache.MISS)
+    assert mc.get("i", lambda iid: pytest.fail("should be cached")) == (item, cache.SHARED_HIT)
+    clock.now += 10
+    assert backend.get("image:i") is None
+
+def test_missing_and_pending_items_are_not_cached():
+    mc = MetadataCache(local=LRUCache(10, 60))
+    assert mc.get("x", lambda iid: None) == (None, cache.MISS)
+    mc.get("p", lambda iid: {"image_id": "p", "status": "pending"})
+    assert len(mc.local) == 0
+
+def test_get_handler_serves_hot_item_from_cache():
+    iid = _upload()
+    calls = _count_get_item()
+    first, second = _get(iid), _get(iid)
+    assert first["headers"]["X-Cache"] == "miss"
+    assert second["headers"]["X-Cache"] == "hit"
+    assert json.loads(first["body"]) == json.loads(second["body"])
+    assert len(calls) == 1
+    stats = cache.metadata_cache().stats.snapshot()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+def test_bypass_per_request():
+    iid = _upload()
+    _get(iid)
+    calls = _count_get_item()
+    assert _get(iid, headers={"cache-control": "no-cache"})["headers"]["X-Cache"] == "bypass"
+    assert _get(iid, queryStringParameters={"cache": "bypass"})["headers"]["X-Cache"] == "bypass"
+    assert len(calls) == 2
+
+def test_delete_invalidates():
+    iid = _upload()
+    assert _get(iid)["statusCode"] == 200
+    delete_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}, None)
+    assert _get(iid)["statusCode"] == 404
+
+def test_writes_invalidate_shared_backend(monkeypatch):
+    monkeypatch.setenv("METADATA_CACHE_BACKEND", "sqlite:")
+    cache.reset_metadata_cache()
+    iid = _upload()
+    _get(iid)
+    shared = cache.metadata_cache().shared
+    assert shared.get(f"image:{iid}") is not None
+    # simulate another process: empty local tier, item changed behind the cache
+    cache.metadata_cache().local.clear()
+    boto3.resource("dynamodb", region_name="us-east-1").Table("images").update_item(
+        Key={"image_id": iid}, UpdateExpression="SET title = :t", ExpressionAttributeValues={":t": "new"})
+    assert _get(iid)["headers"]["X-Cache"] == "shared-hit"
+    cache.invalidate(iid)
+    resp = _get(iid)
+    assert resp["headers"]["X-Cache"] == "miss"
+    assert json.loads(resp["body"])["title"] == "new"
+
+def test_disabled_with_zero_ttl(monkeypatch):
+    monkeypatch.setenv("METADATA_CACHE_TTL_SECONDS", "0")
+    cache.reset_metadata_cache()
+    iid = _upload()
+    assert _get(iid)["headers"]["X-Cache"] == "miss"
+    assert _get(iid)["headers"]["X-Cache"] == "miss"
+
+def test_invalidate_survives_backend_errors(monkeypatch):
+    class Broken(cache.CacheBackend):
+        def delete(self, key):
+            raise ConnectionError("down")
+    cache.set_shared_backend(Broken())
+    cache.invalidate("anything")
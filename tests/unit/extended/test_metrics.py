@@ -0,0 +1,114 @@
+# tests/test_metrics.py
+import json
+import base64
+
+import pytest
+
+from common import metrics
+from common.aws_clients import ddb_resource
+from src.handlers import upload_handler, list_handler, get_handler, delete_handler
+
+@pytest.fixture
+def emitted(monkeypatch):
+    lines = []
+    metrics.set_sink(lines.append)
+    monkeypatch.setattr(metrics, "_cold", True)
+    yield lambda: [json.loads(l) for l in lines]
+    metrics.set_sink()
+
+class Ctx:
+    aws_request_id = "req-1"
+
+def _upload(tags=("c",)):
+    ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": list(tags), "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"\x89PNG").decode()})}
+    return json.loads(upload_handler.handler(ev, Ctx())["body"])["image_id"]
+
+def test_one_emf_document_per_request(emitted):
+    _upload()
+    list_handler.handler({"queryStringParameters": {"tag": "c"}}, None)
+    up, listed = emitted()
+    for doc in (up, listed):
+        spec = doc["_aws"]["CloudWatchMetrics"][0]
+        assert spec["Dimensions"] == [["Handler"]] and doc["Handler"]
+        assert all(isinstance(doc[m["Name"]], (int, float)) for m in spec["Metrics"])
+    assert (up["Handler"], up["requestId"], up["ColdStart"]) == ("upload_handler", "req-1", 1)
+    assert (listed["Handler"], listed["ColdStart"], listed["statusCode"]) == ("list_handler", 0, 200)
+
+def test_aws_calls_are_broken_down_per_operation(emitted):
+    _upload()
+    _upload()
+    list_handler.handler({"queryStringParameters": {"tag": "c"}}, None)
+    doc = emitted()[-1]
+    ops = doc["operations"]
+    assert set(ops) == {"dynamodb.Query", "dynamodb.BatchGetItem"}
+    assert ops["dynamodb.Query"]["items"] == 2 and ops["dynamodb.BatchGetItem"]["items"] == 2
+    assert doc["AwsCalls"] == 2 and doc["ItemCount"] == 4
+    assert doc["ReadCapacity"] > 0 and doc["RequestBytes"] > 0 and doc["ResponseBytes"] > 0
+    assert doc["phases"]["serialize"] > 0 and doc["AwsTime"] <= doc["Duration"]
+
+def test_upload_counts_s3_bytes_and_client_init(emitted):
+    _upload()  # PREWARM_CLIENTS=0 in tests: clients are built inside this request
+    doc = emitted()[0]
+    assert doc["operations"]["s3.PutObject"]["request_bytes"] == 4
+    assert doc["ClientInitTime"] > 0
+
+def test_calls_on_worker_threads_are_counted(emitted):
+    iid = _upload()
+    delete_handler.handler({"pathParameters": {"image_id": iid}}, None)
+    ops = emitted()[-1]["operations"]
+    assert {"dynamodb.GetItem", "dynamodb.TransactWriteItems", "s3.DeleteObjects"} <= set(ops)
+
+def test_consumed_capacity_can_be_switched_off(emitted, monkeypatch):
+    iid = _upload()
+    sent = []
+    ddb_resource().meta.client.meta.events.register(
+        "before-call.dynamodb.GetItem", lambda params, **kw: sent.append(b"ReturnConsumedCapacity" in params["body"]))
+    event = {"pathParameters": {"image_id": iid}, "queryStringParameters": {"cache": "bypass"}}
+    assert get_handler.handler(event, None)["statusCode"] == 200
+    monkeypatch.setenv("METRICS_CONSUMED_CAPACITY", "0")
+    assert get_handler.handler(event, None)["statusCode"] == 200
+    assert sent == [True, False]
+    assert emitted()[-1]["ReadCapacity"] == 0
+
+def test_switched_off(emitted, monkeypatch):
+    monkeypatch.setenv("METRICS_ENABLED", "0")
+    _upload()
+    assert emitted() == [] and metrics.current() is None
+
+def test_server_errors_carry_the_message(emitted, monkeypatch):
+    def boom(*a, **kw):
+        raise RuntimeError("disk on fire")
+    monkeypatch.setattr(upload_handler, "store_b64", boom)
+    with pytest.raises(KeyError):
+        _upload()  # the 500 body has no image_id
+    doc = emitted()[0]
+    assert doc["Errors"] == 1 and doc["statusCode"] == 500 and "disk on fire" in doc["error"]
+
+def test_metrics_never_fail_the_request(monkeypatch):
+    def broken(line):
+        raise OSError("stdout closed")
+    metrics.set_sink(broken)
+    try:
+        assert _upload()
+    finally:
+        metrics.set_sink()
+
+def test_exceptions_propagate_and_are_recorded(emitted):
+    @metrics.instrument
+    def handler(event, context):
+        raise ValueError("bad")
+    with pytest.raises(ValueError):
+        handler({}, None)
+    assert emitted()[0]["error"] == "ValueError: bad"
+
+def test_spans_nest_aws_calls_under_the_handler():
+    rec = metrics.Recorder("list_handler", "r", cold=False)
+    rec.add_call({"service": "dynamodb", "operation": "Query", "ms": 1.5, "start_ns": rec.start_ns + 1000,
+                  "items": 3, "rcu": 0.5, "wcu": 0.0, "request_bytes": 10, "response_bytes": 20, "error": None})
+    rec.finish({"statusCode": 200})
+    root, child = rec.spans()
+    assert root["parent"] is None and child["parent"] == root["name"]
+    assert root["start_ns"] <= child["start_ns"] < child["end_ns"]
+    assert child["attributes"]["rpc.method"] == "Query"
+    assert child["attributes"]["aws.dynamodb.consumed_read_capacity"] == 0.5
@@ -0,0 +1,105 @@
+# tests/test_pagination.py
+import json
+import base64
+
+import pytest
+
+from common import pagination
+from common.pagination import QuerySpec, decode_cursor, encode_cursor
+from src.handlers import upload_handler, list_handler
+
+SPEC = QuerySpec("user", "user_id-index", ("image_id", "user_id", "created_at"))
+KEY = {"image_id": "i1", "user_id": "u1", "created_at": "2024-01-01T00:00:00+00:00"}
+
+def _upload(user_id, tags):
+    ev = {"body": json.dumps({"user_id": user_id, "title": "t", "tags": tags, "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"xyz").decode()})}
+    return json.loads(upload_handler.handler(ev, None)["body"])
+
+def _list(params):
+    return list_handler.handler({"queryStringParameters": params}, None)
+
+def _walk(params, limit=2):
+    ids, token = [], None
+    while True:
+        q = dict(params, limit=str(limit))
+        if token:
+            q["next_token"] = token
+        resp = _list(q)
+        assert resp["statusCode"] == 200, resp["body"]
+        body = json.loads(resp["body"])
+        ids += [it["image_id"] for it in body["items"]]
+        token = body["next_token"]
+        if not token:
+            return ids
+
+def test_cursor_round_trip_is_opaque_and_compact():
+    token = encode_cursor(SPEC, KEY)
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("latin-1")
+    assert "user_id" not in raw and "created_at" not in raw
+    assert "=" not in token and "+" not in token and "/" not in token
+    assert len(token) < 150
+    assert decode_cursor(token, SPEC, expect={"user_id": "u1"}) == KEY
+    assert encode_cursor(SPEC, None) is None
+    assert decode_cursor(None, SPEC) is None
+
+def test_cursor_rejects_tampering_and_mismatch():
+    token = encode_cursor(SPEC, KEY)
+    raw = bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    raw[-3] ^= 1
+    forged = base64.urlsafe_b64encode(bytes(raw)).rstrip(b"=").decode()
+    for bad in (forged, "not-json", json.dumps(KEY), "A" * 600):
+        with pytest.raises(ValueError):
+            decode_cursor(bad, SPEC)
+    with pytest.raises(ValueError):
+        decode_cursor(token, SPEC, pagination.SORT_DESC)
+    with pytest.raises(ValueError):
+        decode_cursor(token, QuerySpec("tag", None, ("tag", "image_id")))
+    with pytest.raises(ValueError):
+        decode_cursor(token, SPEC, expect={"user_id": "someone-else"})
+
+def test_secret_rotation(monkeypatch):
+    monkeypatch.setenv("PAGINATION_SECRET", "old")
+    token = encode_cursor(SPEC, KEY)
+    monkeypatch.setenv("PAGINATION_SECRET", "new,old")
+    assert decode_cursor(token, SPEC) == KEY
+    monkeypatch.setenv("PAGINATION_SECRET", "new")
+    with pytest.raises(ValueError):
+        decode_cursor(token, SPEC)
+
+def test_no_secret_fails_closed(monkeypatch):
+    token = encode_cursor(SPEC, KEY)
+    for unset in ("", " , "):
+        monkeypatch.setenv("PAGINATION_SECRET", unset)
+        with pytest.raises(RuntimeError):
+            encode_cursor(SPEC, KEY)
+        with pytest.raises(RuntimeError):
+            decode_cursor(token, SPEC)
+    monkeypatch.delenv("PAGINATION_SECRET")
+    assert _list({"user_id": "u1", "next_token": token})["statusCode"] == 500
+
+def test_every_mode_pages_through_without_gaps():
+    mine = [_upload("u1", ["sea", "sky"])["image_id"] for _ in range(5)]
+    _upload("u2", ["sea"])
+    assert sorted(_walk({"user_id": "u1"})) == sorted(mine)
+    assert len(_walk({"tag": "sea"})) == 6
+    assert sorted(_walk({"user_id": "u1", "tag": "sky"})) == sorted(mine)
+
+def test_sort_orders_user_listing_by_created_at():
+    ids = [_upload("u1", ["sea"])["image_id"] for _ in range(4)]
+    asc = _walk({"user_id": "u1", "sort": "created_at_asc"})
+    desc = _walk({"user_id": "u1", "sort": "created_at_desc"})
+    assert asc == ids
+    assert desc == ids[::-1]
+    assert _walk({"user_id": "u1", "tag": "sea", "sort": "created_at_desc"}) == ids[::-1]
+
+def test_invalid_sort_and_cross_query_tokens_are_400():
+    for _ in range(3):
+        _upload("u1", ["sea"])
+    assert _list({"user_id": "u1", "sort": "title"})["statusCode"] == 400
+    assert _list({"tag": "sea", "sort": "created_at_oldest"})["statusCode"] == 400
+    assert _list({"tag": "sea", "since": "2030-01-01", "until": "2020-01-01"})["statusCode"] == 400
+    token = json.loads(_list({"user_id": "u1", "limit": "1"})["body"])["next_token"]
+    assert _list({"user_id": "u2", "next_token": token})["statusCode"] == 400
+    assert _list({"user_id": "u1", "next_token": token, "sort": "created_at_desc"})["statusCode"] == 400
+    assert _list({"tag": "sea", "next_token": token})["statusCode"] == 400
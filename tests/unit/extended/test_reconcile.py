@@ -0,0 +1,140 @@
+# tests/test_reconcile.py
+import json
+import uuid
+import base64
+
+import boto3
+import pytest
+
+from common import reconcile as rec
+from common.reconcile import BloomFilter, Checkpoint, reconcile
+from src.handlers import upload_handler, reconcile_handler
+
+def _upload(tags=("keep",)):
+    ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": list(tags), "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"\x89PNG" + uuid.uuid4().bytes).decode()})}
+    return json.loads(upload_handler.handler(ev, None)["body"])["image_id"]
+
+def _s3():
+    return boto3.client("s3", region_name="us-east-1")
+
+def _tags():
+    return boto3.resource("dynamodb", region_name="us-east-1").Table("image_tags")
+
+def _keys():
+    return sorted(o["Key"] for o in _s3().list_objects_v2(Bucket="test-bucket").get("Contents", []))
+
+def _seed():
+    kept = [_upload(), _upload()]
+    ghost = str(uuid.uuid4())
+    _s3().put_object(Bucket="test-bucket", Key=f"images/{ghost}", Body=b"x")
+    _s3().put_object(Bucket="test-bucket", Key=f"renditions/{ghost}/thumb_128", Body=b"x")
+    _s3().put_object(Bucket="test-bucket", Key=f"renditions/{kept[0]}/thumb_128", Body=b"x")
+    _tags().put_item(Item={"tag": "keep", "image_id": ghost, "created_at": "2024-01-01T00:00:00+00:00"})
+    _tags().put_item(Item={"tag": "other", "image_id": str(uuid.uuid4())})  # legacy row, no created_at
+    return kept, ghost
+
+def _run(**kw):
+    kw.setdefault("min_age_seconds", 0)
+    kw.setdefault("segments", 2)
+    kw.setdefault("capacity", 1000)
+    return reconcile("images", "image_tags", "test-bucket", **kw)
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(2000, error_rate=0.01)
+    ids = [str(uuid.uuid4()) for _ in range(2000)]
+    for i in ids:
+        bloom.add(i)
+    assert all(i in bloom for i in ids)
+    false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(5000))
+    assert false_positives < 150  # ~1% expected
+
+def test_dry_run_reports_without_deleting():
+    kept, ghost = _seed()
+    before = _keys()
+    report = _run()
+    assert report["complete"] and report["dry_run"]
+    assert report["images_indexed"] == 2
+    stats = report["stats"]
+    assert (stats["orphan_objects"], stats["orphan_tag_rows"]) == (2, 2)
+    assert stats.get("deleted_objects", 0) == 0
+    assert sorted(report["samples"]["objects"]) == [f"images/{ghost}", f"renditions/{ghost}/thumb_128"]
+    assert _keys() == before
+
+def test_delete_removes_only_orphans():
+    kept, ghost = _seed()
+    report = _run(dry_run=False)
+    assert (report["stats"]["deleted_objects"], report["stats"]["deleted_tag_rows"]) == (2, 2)
+    assert _keys() == sorted([f"images/{kept[0]}", f"images/{kept[1]}", f"renditions/{kept[0]}/thumb_128"])
+    assert sorted(r["image_id"] for r in _tags().scan()["Items"]) == sorted(kept)
+    assert _run(dry_run=False)["stats"].get("orphan_objects", 0) == 0
+
+def test_recent_objects_are_left_alone():
+    _seed()
+    report = _run(dry_run=False, min_age_seconds=3600)
+    # both ghost objects are fresh; the dated and the legacy tag rows are old
+    assert report["stats"]["orphan_objects"] == 0
+    assert report["stats"]["skipped_recent"] == 2
+    assert report["stats"]["deleted_tag_rows"] == 2
+
+def test_candidates_are_confirmed_before_deleting(monkeypatch):
+    kept, _ = _seed()
+    # rows written after the index was built are not in the filter
+    monkeypatch.setattr(rec, "build_index", lambda *a, **kw: (BloomFilter(10), 0))
+    report = _run(dry_run=False)
+    assert report["stats"]["deleted_objects"] == 2
+    assert all(f"images/{i}" in _keys() for i in kept)
+
+def test_pending_direct_upload_is_not_an_orphan():
+    iid = str(uuid.uuid4())
+    boto3.resource("dynamodb", region_name="us-east-1").Table("images").put_item(
+        Item={"image_id": iid, "status": "pending", "s3_key": f"images/{iid}"})
+    _s3().put_object(Bucket="test-bucket", Key=f"images/{iid}", Body=b"x")
+    assert _run(dry_run=False)["stats"].get("orphan_objects", 0) == 0
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(rec, "LIST_PAGE_SIZE", 1)
+    ghosts = [str(uuid.uuid4()) for _ in range(6)]
+    for g in ghosts:
+        _s3().put_object(Bucket="test-bucket", Key=f"images/{g}", Body=b"x")
+    cp = Checkpoint(str(tmp_path / "cp.json"))
+    # time runs out once half of them are gone
+    first = _run(dry_run=False, checkpoint=cp, deadline=lambda: len(_keys()) <= 3, workers=1)
+    assert not first["complete"]
+    assert (tmp_path / "cp.json").exists()
+    assert first["stats"]["deleted_objects"] == 3
+
+    second = _run(dry_run=False, checkpoint=cp)
+    assert second["complete"]
+    assert second["stats"]["deleted_objects"] == 6  # running totals carry over
+    assert not (tmp_path / "cp.json").exists()
+    assert _keys() == []
+
+def test_changed_settings_restart_the_sweep(tmp_path):
+    cp = Checkpoint(str(tmp_path / "cp.json"))
+    cp.save({"version": 1, "settings": {"segments": 2, "dry_run": True}, "objects": {}, "tags": {},
+             "stats": {"orphan_objects": 99}})
+    report = _run(dry_run=False, checkpoint=cp)
+    assert report["stats"].get("orphan_objects", 0) == 0
+
+def test_s3_checkpoint_location():
+    cp = Checkpoint("s3://test-bucket/_reconcile/cp.json")
+    assert cp.load() is None
+    cp.save({"a": 1})
+    assert cp.load() == {"a": 1}
+    cp.clear()
+    assert cp.load() is None
+
+@pytest.mark.parametrize("key,expected", [("images/abc", "abc"), ("renditions/abc/thumb_128", "abc"),
+                                          ("images/", None), ("images/a/b", None), ("blobs/sha256/x", None)])
+def test_object_image_id(key, expected):
+    assert rec.object_image_id(key) == expected
+
+def test_scheduled_handler_is_dry_run_by_default(monkeypatch):
+    monkeypatch.setenv("RECONCILE_MIN_AGE_SECONDS", "0")
+    _, ghost = _seed()
+    report = reconcile_handler.handler({}, None)
+    assert report["dry_run"] and report["complete"]
+    assert f"images/{ghost}" in _keys()
+    monkeypatch.setenv("RECONCILE_DELETE", "1")
+    assert reconcile_handler.handler({}, None)["stats"]["deleted_objects"] == 2
@@ -0,0 +1,140 @@
+# tests/test_renditions.py
+import io
+import os
+import json
+import base64
+import importlib.util
+
+import boto3
+import pytest
+from PIL import Image
+
+from common import renditions
+from common.response import json_response
+from src.handlers import upload_handler, get_handler, delete_handler, rendition_handler
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts", "backfill_renditions.py")
+_spec = importlib.util.spec_from_file_location("backfill_renditions", _SCRIPT)
+backfill_renditions = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(backfill_renditions)
+
+def _image_bytes(fmt="JPEG", size=(1600, 1200), mode="RGB"):
+    out = io.BytesIO()
+    Image.new(mode, size, color=(200, 40, 40) if mode == "RGB" else None).save(out, format=fmt)
+    return out.getvalue()
+
+def _upload(data, content_type="image/jpeg"):
+    ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": ["r"], "content_type": content_type,
+                              "image_base64": base64.b64encode(data).decode()})}
+    resp = upload_handler.handler(ev, None)
+    assert resp["statusCode"] == 201, resp["body"]
+    return json.loads(resp["body"])
+
+def _download(iid, variant=None):
+    ev = {"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}/download",
+          "queryStringParameters": {"variant": variant} if variant else None}
+    return get_handler.handler(ev, None)
+
+def _keys(prefix):
+    return [o["Key"] for o in boto3.client("s3", region_name="us-east-1").list_objects_v2(
+        Bucket="test-bucket", Prefix=prefix).get("Contents", [])]
+
+def _item(iid):
+    return boto3.resource("dynamodb", region_name="us-east-1").Table("images").get_item(
+        Key={"image_id": iid})["Item"]
+
+def test_render_sizes_and_formats():
+    out = renditions.render(_image_bytes(), renditions.variant_specs().values())
+    assert set(out) == {"thumb_128", "thumb_256", "medium_512", "large_1024"}
+    thumb = Image.open(io.BytesIO(out["thumb_128"][0]))
+    assert thumb.format == "WEBP" and max(thumb.size) == 128
+    assert thumb.size == (128, 96)
+    large = Image.open(io.BytesIO(out["large_1024"][0]))
+    assert large.format == "JPEG" and large.size == (1024, 768)
+    assert out["medium_512"][1] == "image/jpeg"
+
+def test_render_never_upscales_and_keeps_alpha():
+    data = _image_bytes("PNG", (300, 100), "RGBA")
+    out = renditions.render(data, [renditions.RenditionSpec("big", 1024, "PNG"),
+                                   renditions.RenditionSpec("small", 64, "WEBP")])
+    big = Image.open(io.BytesIO(out["big"][0]))
+    assert big.size == (300, 100) and big.mode == "RGBA"
+    assert Image.open(io.BytesIO(out["small"][0])).size == (64, 21)
+
+def test_render_applies_exif_orientation():
+    img = Image.new("RGB", (400, 200))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 CW on display
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", exif=exif)
+    out = renditions.render(buf.getvalue(), [renditions.RenditionSpec("t", 100, "JPEG")])
+    assert Image.open(io.BytesIO(out["t"][0])).size == (50, 100)
+
+def test_variants_env_override(monkeypatch):
+    monkeypatch.setenv("RENDITION_VARIANTS", "tiny:32:png")
+    assert renditions.variant_specs() == {"tiny": renditions.RenditionSpec("tiny", 32, "PNG")}
+
+def test_download_variant_renders_lazily_once():
+    up = _upload(_image_bytes())
+    resp = _download(up["image_id"], "thumb_128")
+    assert resp["statusCode"] == 200
+    assert f"renditions/{up['image_id']}/thumb_128" in json.loads(resp["body"])["url"]
+    assert _keys(f"renditions/{up['image_id']}/") == [f"renditions/{up['image_id']}/thumb_128"]
+    assert _item(up["image_id"])["variants"] == {"thumb_128"}
+
+    gets = []
+    s3 = renditions.s3_client()
+    s3.meta.events.register("before-call.s3.GetObject", lambda **kw: gets.append(1))
+    assert _download(up["image_id"], "thumb_128")["statusCode"] == 200
+    assert gets == []
+
+def test_download_variant_errors(monkeypatch):
+    up = _upload(_image_bytes())
+    assert _download(up["image_id"], "huge")["statusCode"] == 400
+    monkeypatch.setenv("RENDITION_LAZY", "0")
+    assert _download(up["image_id"], "thumb_128")["statusCode"] == 404
+
+def test_rendition_handler_and_delete_cleanup():
+    up = _upload(_image_bytes())
+    iid = up["image_id"]
+    out = rendition_handler.handler({"Records": [{"s3": {"object": {"key": f"images/{iid}"}}}]}, None)
+    assert out["results"][0]["status"] == "rendered"
+    assert len(_keys(f"renditions/{iid}/")) == 4
+    missing = rendition_handler.handler({"image_ids": ["nope"]}, None)
+    assert missing["results"] == [{"image_id": "nope", "status": "skipped"}]
+
+    body = json.loads(get_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"},
+                                          None)["body"])
+    assert body["variants"] == ["large_1024", "medium_512", "thumb_128", "thumb_256"]
+
+    assert delete_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"},
+                                  None)["statusCode"] == 204
+    assert _keys(f"renditions/{iid}/") == []
+
+def test_rendition_handler_reports_undecodable_image():
+    up = _upload(b"\x89PNG\r\n\x1a\nnot-really", content_type="image/png")
+    out = rendition_handler.handler({"image_ids": [up["image_id"]]}, None)
+    assert out["results"][0]["status"] == "failed"
+
+def test_schedule_is_noop_without_function(monkeypatch):
+    monkeypatch.delenv("RENDITION_FUNCTION_NAME", raising=False)
+    calls = []
+    monkeypatch.setattr(renditions, "lambda_client", lambda: calls.append(1))
+    renditions.schedule("x")
+    assert calls == []
+
+def test_backfill_renders_missing_variants_inline():
+    a, b = _upload(_image_bytes()), _upload(_image_bytes("PNG", (300, 300)), "image/png")
+    renditions.generate(_item(a["image_id"]), ["thumb_128"])
+    stats = backfill_renditions.backfill("images", ["thumb_128", "thumb_256"], segments=2, workers=0,
+                                         dry_run=True)
+    assert stats == {"missing": 2, "rendered": 0, "failed": 0}
+    stats = backfill_renditions.backfill("images", ["thumb_128", "thumb_256"], segments=2, workers=0)
+    assert stats == {"missing": 2, "rendered": 2, "failed": 0}
+    assert _item(a["image_id"])["variants"] == {"thumb_128", "thumb_256"}
+    assert _item(b["image_id"])["variants"] == {"thumb_128", "thumb_256"}
+    with pytest.raises(ValueError):
+        backfill_renditions.backfill("images", ["nope"], workers=0)
+
+def test_sets_serialize_as_sorted_lists():
+    assert json.loads(json_response(200, {"v": {"b", "a"}})["body"]) == {"v": ["a", "b"]}
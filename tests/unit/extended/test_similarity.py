@@ -0,0 +1,154 @@
+# tests/test_similarity.py
+import io
+import os
+import json
+import base64
+import random
+import importlib.util
+
+import boto3
+import pytest
+from PIL import Image, ImageEnhance
+
+from common import phash, similarity
+from src.handlers import upload_handler, rendition_handler, similar_handler, delete_handler, bulk_delete_handler
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts", "backfill_phash.py")
+_spec = importlib.util.spec_from_file_location("backfill_phash", _SCRIPT)
+backfill_phash = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(backfill_phash)
+
+def _picture(seed, size=(640, 480)):
+    rnd = random.Random(seed)
+    small = Image.new("RGB", (8, 6))
+    small.putdata([tuple(rnd.randrange(256) for _ in range(3)) for _ in range(48)])
+    return small.resize(size, Image.Resampling.BICUBIC)
+
+def _encode(img, fmt="JPEG", **save):
+    out = io.BytesIO()
+    img.save(out, format=fmt, **save)
+    return out.getvalue()
+
+def _upload(data, user="u1", content_type="image/jpeg"):
+    ev = {"body": json.dumps({"user_id": user, "title": "t", "tags": ["s"], "content_type": content_type,
+                              "image_base64": base64.b64encode(data).decode()})}
+    resp = upload_handler.handler(ev, None)
+    assert resp["statusCode"] == 201, resp["body"]
+    return json.loads(resp["body"])["image_id"]
+
+def _similar(iid, **query):
+    resp = similar_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}/similar",
+                                    "queryStringParameters": query or None}, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+def _band_rows():
+    return boto3.resource("dynamodb", region_name="us-east-1").Table("image_phash_bands").scan()["Items"]
+
+@pytest.fixture(autouse=True)
+def indexing(monkeypatch):
+    monkeypatch.setenv("SIMILARITY_INDEX", "1")
+    monkeypatch.setenv("RENDITION_VARIANTS", "thumb_64:64:WEBP")
+
+def _index(*ids):
+    out = rendition_handler.handler({"image_ids": list(ids)}, None)["results"]
+    assert all(r.get("indexed") for r in out), out
+
+def test_copies_hash_close_and_other_pictures_far():
+    original = _picture(1)
+    h = phash.compute(_encode(original, quality=90))
+    assert len(h["phash"]) == len(h["dhash"]) == 16
+    copies = [_encode(original.resize((200, 150)), quality=85), _encode(original, quality=30),
+              _encode(ImageEnhance.Brightness(original).enhance(1.15), "PNG"),
+              _encode(original.crop((10, 8, 630, 472)), quality=85)]
+    for data in copies:
+        assert similarity.distance(h["phash"], phash.compute(data)["phash"]) <= 8
+    assert similarity.distance(h["phash"], phash.compute(_encode(_picture(2)))["phash"]) > 16
+
+def test_exif_rotation_is_applied_before_hashing():
+    upright = _picture(3, (400, 300))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored rotated; displays rotated 90 degrees clockwise
+    stored = upright.transpose(Image.Transpose.ROTATE_90)
+    a = phash.compute(_encode(upright, quality=90))["phash"]
+    b = phash.compute(_encode(stored, quality=90, exif=exif))["phash"]
+    assert similarity.distance(a, b) <= 2
+
+def test_batch_hashing_matches_single_and_skips_junk():
+    images = [_encode(_picture(n)) for n in range(3)]
+    batch = phash.compute_many(images[:2] + [b"junk"] + images[2:])
+    assert batch[2] is None
+    assert [b for b in batch if b] == [phash.compute(d) for d in images]
+    with pytest.raises(ValueError):
+        phash.compute(b"junk")
+
+def test_probes_cover_every_hash_within_seven_bits():
+    query = "0123456789abcdef"
+    q = int(query, 16)
+    rnd = random.Random(7)
+    probes = set(similarity.probe_values(query, 8))
+    assert len(probes) == 4 * 17 and len(similarity.probe_values(query, 3)) == 4
+    for _ in range(200):
+        bits = rnd.sample(range(64), 7)
+        other = f"{q ^ sum(1 << b for b in bits):016x}"
+        assert similarity.distance(query, other) == 7
+        assert probes & set(similarity.band_values(other))
+
+def test_similar_returns_near_duplicates_closest_first():
+    original = _picture(10)
+    src = _upload(_encode(original, quality=90))
+    resized = _upload(_encode(original.resize((320, 240)), quality=70), user="u2")
+    brighter = _upload(_encode(ImageEnhance.Brightness(original).enhance(1.2), quality=90))
+    other = _upload(_encode(_picture(11), quality=90))
+    assert _similar(src)[0] == 409
+    _index(src, resized, brighter, other)
+    assert len(_band_rows()) == 16
+
+    status, body = _similar(src)
+    assert status == 200, body
+    ids = [it["image_id"] for it in body["items"]]
+    assert set(ids) == {resized, brighter} and src not in ids and other not in ids
+    distances = [it["distance"] for it in body["items"]]
+    assert distances == sorted(distances) and body["items"][0]["user_id"] in ("u1", "u2")
+    assert [it["image_id"] for it in _similar(src, user_id="u2")[1]["items"]] == [resized]
+    assert len(_similar(src, limit="1")[1]["items"]) == 1
+    assert all(it["distance"] == 0 for it in _similar(src, max_distance="0")[1]["items"])
+
+def test_similar_errors():
+    assert _similar("nope")[0] == 404
+    iid = _upload(_encode(_picture(20)))
+    _index(iid)
+    assert _similar(iid, max_distance="65")[0] == 400
+    assert _similar(iid, limit="x")[0] == 400
+
+def test_rendition_stage_indexes_once_and_only_when_enabled(monkeypatch):
+    iid = _upload(_encode(_picture(30)))
+    monkeypatch.setenv("SIMILARITY_INDEX", "0")
+    assert "indexed" not in rendition_handler.handler({"image_ids": [iid]}, None)["results"][0]
+    monkeypatch.setenv("SIMILARITY_INDEX", "1")
+    _index(iid)
+    assert "indexed" not in rendition_handler.handler({"image_ids": [iid]}, None)["results"][0]
+    junk = _upload(b"\xff\xd8\xffjunk")
+    result = rendition_handler.handler({"image_ids": [junk]}, None)["results"][0]
+    assert result["status"] == "failed"  # nothing to render, nothing to hash
+
+def test_deletes_remove_band_rows():
+    ids = [_upload(_encode(_picture(40 + n))) for n in range(3)]
+    _index(*ids)
+    assert len(_band_rows()) == 12
+    resp = delete_handler.handler({"pathParameters": {"image_id": ids[0]}, "rawPath": f"/images/{ids[0]}"}, None)
+    assert resp["statusCode"] == 204
+    assert len(_band_rows()) == 8
+    body = json.loads(bulk_delete_handler.handler({"body": json.dumps({"image_ids": ids[1:]})}, None)["body"])
+    assert body["deleted"] == 2 and _band_rows() == []
+
+def test_backfill_indexes_existing_images_inline(monkeypatch):
+    monkeypatch.setenv("SIMILARITY_INDEX", "0")
+    original = _picture(50)
+    a = _upload(_encode(original, quality=90))
+    b = _upload(_encode(original.resize((300, 225)), quality=80))
+    junk = _upload(b"not an image", content_type="image/png")
+    stats = backfill_phash.backfill("images", segments=2, workers=0, batch=2)
+    assert stats == {"unindexed": 3, "indexed": 2, "deleted": 0, "failed": 1}
+    assert [it["image_id"] for it in _similar(a)[1]["items"]] == [b]
+    assert _similar(junk)[0] == 409
+    assert backfill_phash.backfill("images", segments=2, workers=0, dry_run=True)["unindexed"] == 1
@@ -0,0 +1,103 @@
+# tests/test_streaming_upload.py
+import os
+import json
+import base64
+import hashlib
+
+import boto3
+import pytest
+
+from common import streaming
+from common.streaming import iter_b64_decode, stream_b64_to_s3
+from src.handlers import upload_handler
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    monkeypatch.setattr("moto.s3.models.S3_UPLOAD_PART_MIN_SIZE", 1)
+
+def _s3():
+    return boto3.client("s3", region_name="us-east-1")
+
+def test_iter_b64_decode_matches_one_shot():
+    data = os.urandom(10_001)
+    enc = base64.b64encode(data).decode()
+    chunks = list(iter_b64_decode(enc, 1000))
+    assert b"".join(chunks) == data
+    assert max(len(c) for c in chunks) <= 1000
+    with pytest.raises(ValueError):
+        list(iter_b64_decode("QUJD!REVG", 3))
+
+def test_line_wrapped_base64_streams_like_canonical():
+    data = os.urandom(10_001)
+    wrapped = base64.encodebytes(data).decode().replace("\n", "\r\n")  # MIME: 76 chars per line
+    chunks = list(iter_b64_decode(wrapped, 999))
+    assert b"".join(chunks) == data
+    assert all(len(c) == 999 for c in chunks[:-1])  # parts keep their size despite the line breaks
+    assert streaming.b64_prefix(wrapped, 100) == data[:100]
+
+def test_stream_upload_parts_and_checksum(small_parts):
+    data = os.urandom(50_000)
+    s3 = _s3()
+    size, checksum = stream_b64_to_s3(s3, "test-bucket", "images/mp", base64.b64encode(data).decode(),
+                                      "image/png", part_size=8192, concurrency=3)
+    assert size == len(data)
+    assert checksum == hashlib.sha256(data).hexdigest()
+    obj = s3.get_object(Bucket="test-bucket", Key="images/mp")
+    assert obj["Body"].read() == data
+    assert obj["ContentType"] == "image/png"
+
+def test_stream_upload_aborts_on_failure(small_parts):
+    s3 = _s3()
+    calls = {"aborted": False}
+    real_upload_part, real_abort = s3.upload_part, s3.abort_multipart_upload
+    def flaky_upload_part(**kw):
+        if kw["PartNumber"] == 2:
+            raise RuntimeError("part failed")
+        return real_upload_part(**kw)
+    def abort(**kw):
+        calls["aborted"] = True
+        return real_abort(**kw)
+    s3.upload_part, s3.abort_multipart_upload = flaky_upload_part, abort
+
+    with pytest.raises(RuntimeError):
+        stream_b64_to_s3(s3, "test-bucket", "images/bad", base64.b64encode(os.urandom(40_000)).decode(),
+                         "image/png", part_size=8192, concurrency=2)
+    assert calls["aborted"]
+    assert _s3().list_multipart_uploads(Bucket="test-bucket").get("Uploads", []) == []
+
+def test_stream_upload_invalid_base64_aborts(small_parts):
+    with pytest.raises(ValueError):
+        stream_b64_to_s3(_s3(), "test-bucket", "images/junk", "QUJD" * 5000 + "!!!!", "image/png",
+                         part_size=4096, concurrency=2)
+    assert _s3().list_multipart_uploads(Bucket="test-bucket").get("Uploads", []) == []
+
+@pytest.mark.parametrize("size", [3000, streaming.MIN_PART_SIZE + 4096])
+def test_both_upload_paths_decode_alike(monkeypatch, size):
+    monkeypatch.setenv("MULTIPART_THRESHOLD_BYTES", str(streaming.MIN_PART_SIZE))
+    data = os.urandom(size)
+    enc = base64.b64encode(data).decode()
+    def upload(payload):
+        ev = {"body": json.dumps({"user_id": "u1", "title": "t", "tags": ["b64"], "content_type": "image/png",
+                                  "image_base64": payload})}
+        return upload_handler.handler(ev, None)
+    # characters outside the alphabet are refused on the one-shot and the multipart path alike
+    for bad in (enc[:800] + "!" + enc[800:], enc[:800] + "-_" + enc[802:]):
+        resp = upload(bad)
+        assert resp["statusCode"] == 400 and "Invalid base64" in json.loads(resp["body"])["error"]
+    # line wrapping is accepted on both
+    resp = upload(base64.encodebytes(data).decode())
+    assert resp["statusCode"] == 201 and json.loads(resp["body"])["checksum"] == hashlib.sha256(data).hexdigest()
+
+def test_handler_uses_multipart_above_threshold(monkeypatch):
+    monkeypatch.setenv("MULTIPART_THRESHOLD_BYTES", "1024")
+    data = os.urandom(streaming.MIN_PART_SIZE + 4096)
+    ev = {"body": json.dumps({"user_id": "u1", "title": "big", "tags": ["large"], "content_type": "image/png",
+                              "image_base64": base64.b64encode(data).decode()})}
+    resp = upload_handler.handler(ev, None)
+    assert resp["statusCode"] == 201
+    body = json.loads(resp["body"])
+    assert body["size"] == len(data)
+    assert body["checksum"] == hashlib.sha256(data).hexdigest()
+    head = _s3().head_object(Bucket="test-bucket", Key=body["s3_key"])
+    assert head["ContentLength"] == len(data)
+    assert "-" in head["ETag"]  # multipart ETag
@@ -0,0 +1,152 @@
+# tests/test_tag_search.py
+import json
+import base64
+import uuid
+
+import boto3
+
+import pytest
+
+from common import metrics, tag_dictionary, tag_search
+from src.handlers import (upload_handler, list_handler, delete_handler, batch_upload_handler,
+                          bulk_delete_handler, tags_handler)
+
+def _entry(tags, user="u1"):
+    return {"user_id": user, "title": "t", "tags": list(tags), "content_type": "image/png",
+            "image_base64": base64.b64encode(b"\x89PNG" + uuid.uuid4().bytes).decode()}
+
+def _upload(tags, user="u1"):
+    return json.loads(upload_handler.handler({"body": json.dumps(_entry(tags, user))}, None)["body"])["image_id"]
+
+def _list(**params):
+    resp = list_handler.handler({"queryStringParameters": params}, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+def _all_pages(**params):
+    ids, token, pages = [], None, 0
+    while True:
+        status, body = _list(**dict(params, **({"next_token": token} if token else {})))
+        assert status == 200, body
+        ids += [it["image_id"] for it in body["items"]]
+        token, pages = body["next_token"], pages + 1
+        if not token:
+            return ids, pages
+
+def _counts():
+    return {t["tag"]: t["count"] for t in tag_dictionary.suggest("t", 50) + tag_dictionary.suggest("s", 50)}
+
+@pytest.fixture
+def library():
+    tagged = {}
+    for i in range(12):
+        tags = ["sea"] + (["sun"] if i % 2 == 0 else []) + (["tree"] if i % 3 == 0 else [])
+        tagged[_upload(tags)] = set(tags)
+    return tagged
+
+def _expected(library, tags, match):
+    test = all if match == "all" else any
+    return sorted(i for i, t in library.items() if test(x in t for x in tags))
+
+@pytest.mark.parametrize("match", ["all", "any"])
+def test_multi_tag_matches_set_semantics(library, match):
+    status, body = _list(tag="sun,tree", match=match, limit="50")
+    assert status == 200 and body["next_token"] is None
+    assert [it["image_id"] for it in body["items"]] == _expected(library, ["sun", "tree"], match)
+
+@pytest.mark.parametrize("match", ["all", "any"])
+def test_pagination_walks_the_merged_result(library, match):
+    ids, pages = _all_pages(tag="Sun, TREE,sun", match=match, limit="2")
+    assert ids == _expected(library, ["sun", "tree"], match)
+    assert pages >= len(ids) // 2
+
+def test_query_budget_keeps_pages_moving(library, monkeypatch):
+    # tiny Query pages and a budget of 3 Queries per request: pages may come back short but paging still ends
+    monkeypatch.setattr(tag_search, "DEFAULT_PAGE_SIZE", 1)
+    monkeypatch.setenv("TAG_SEARCH_MAX_QUERIES", "3")
+    calls = []
+    real = tag_search.query_page
+    monkeypatch.setattr(tag_search, "query_page", lambda *a, **kw: calls.append(a) or real(*a, **kw))
+    ids, pages = _all_pages(tag="sun,tree", match="all", limit="1")
+    assert ids == _expected(library, ["sun", "tree"], "all")
+    assert len(calls) <= 3 * pages
+
+def test_cursor_is_bound_to_tags_and_match(library):
+    _, body = _list(tag="sun,sea", match="any", limit="2")
+    token = body["next_token"]
+    assert _list(tag="sun,tree", match="any", next_token=token)[0] == 400
+    assert _list(tag="sun,sea", match="all", next_token=token)[0] == 400
+    assert _list(tag="sea,sun", match="any", next_token=token)[0] == 200  # same set
+
+def test_multi_tag_with_user_id():
+    mine = _upload(["a", "b"], user="alice")
+    _upload(["a", "b"], user="bob")
+    _, body = _list(tag="a,b", user_id="alice")
+    assert [it["image_id"] for it in body["items"]] == [mine]
+
+@pytest.mark.parametrize("params", [{"tag": ",".join(f"t{i}" for i in range(11))}, {"tag": "a,b", "match": "some"},
+                                    {"tag": "a,b", "since": "yesterday"}, {"tag": " , "}])
+def test_bad_multi_tag_requests(params):
+    assert _list(**params)[0] == 400
+
+def test_single_tag_listing_is_unchanged(library):
+    assert _all_pages(tag="tree", limit="2")[0] == _expected(library, ["tree"], "all")
+
+def test_counts_follow_uploads_and_deletes():
+    a = _upload(["sea", "sun"])
+    _upload(["sea"])
+    assert _counts() == {"sea": 2, "sun": 1}
+    assert delete_handler.handler({"pathParameters": {"image_id": a}}, None)["statusCode"] == 204
+    assert _counts() == {"sea": 1}  # sun is at zero and no longer suggested
+
+def test_counts_follow_batch_paths():
+    body = {"items": [_entry(["sea", "sun"]), _entry(["sea"]), _entry(["tree"])]}
+    results = json.loads(batch_upload_handler.handler({"body": json.dumps(body)}, None)["body"])["results"]
+    assert _counts() == {"sea": 2, "sun": 1, "tree": 1}
+    ids = [r["item"]["image_id"] for r in results[:2]]
+    bulk_delete_handler.handler({"body": json.dumps({"image_ids": ids})}, None)
+    assert _counts() == {"tree": 1}
+
+def test_count_failure_does_not_fail_the_upload(monkeypatch):
+    def boom(tag, delta):
+        raise RuntimeError("throttled")
+    monkeypatch.setattr(tag_dictionary, "_add", boom)
+    lines = []
+    metrics.set_sink(lines.append)
+    try:
+        iid = _upload(["sea", "sun"])
+    finally:
+        metrics.set_sink()
+    assert _list(tag="sea")[1]["items"][0]["image_id"] == iid
+    assert json.loads(lines[-1])["TagCountFailures"] == 2
+
+def test_counts_are_spread_over_counter_rows_and_summed():
+    for _ in range(12):
+        _upload(["sea"])
+    rows = boto3.resource("dynamodb", region_name="us-east-1").Table("image_tag_dictionary").scan()["Items"]
+    assert {r["bucket"] for r in rows} <= {"s", "s#1", "s#2", "s#3"} and len(rows) > 1
+    assert sum(int(r["image_count"]) for r in rows) == 12
+    assert _counts() == {"sea": 12}
+
+def test_autocomplete_ranks_by_count():
+    for tags in (["summer"], ["summer"], ["sunset"], ["sunset"], ["sunset"], ["sea"], ["snow"]):
+        _upload(tags)
+    resp = tags_handler.handler({"queryStringParameters": {"prefix": "Su", "limit": "5"}}, None)
+    assert resp["statusCode"] == 200 and "max-age" in resp["headers"]["Cache-Control"]
+    assert json.loads(resp["body"])["tags"] == [{"tag": "sunset", "count": 3}, {"tag": "summer", "count": 2}]
+    assert [t["tag"] for t in tag_dictionary.suggest("s", 2)] == ["sunset", "summer"]
+
+@pytest.mark.parametrize("params", [{}, {"prefix": "  "}, {"prefix": "a", "limit": "0"}, {"prefix": "a", "limit": "x"}])
+def test_autocomplete_rejects_bad_input(params):
+    assert tags_handler.handler({"queryStringParameters": params}, None)["statusCode"] == 400
+
+def test_rebuild_repairs_drift():
+    _upload(["sea", "sun"])
+    _upload(["sea"])
+    tag_dictionary.adjust({"sea": 5, "stale": 2})
+    assert tag_dictionary.rebuild("image_tags", dry_run=True) == {"sea": 2, "sun": 1}
+    assert _counts()["sea"] == 7
+    tag_dictionary.rebuild("image_tags", segments=2)
+    assert _counts() == {"sea": 2, "sun": 1}
+    main = boto3.resource("dynamodb", region_name="us-east-1").Table("image_tag_dictionary").get_item(
+        Key=tag_dictionary.key("sea"))["Item"]
+    assert main["image_count"] == 2  # the shard rows were zeroed
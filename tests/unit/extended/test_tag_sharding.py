@@ -0,0 +1,149 @@
+# tests/test_tag_sharding.py
+import os
+import json
+import base64
+import uuid
+import importlib.util
+from collections import Counter
+
+import boto3
+import pytest
+
+from common import tag_dictionary, tag_shards
+from common.tags import shard_key, split_shard_key
+from src.handlers import upload_handler, list_handler, delete_handler, batch_upload_handler, bulk_delete_handler
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts", "migrate_hash_tags.py")
+_spec = importlib.util.spec_from_file_location("migrate_hash_tags", _SCRIPT)
+migrate_hash_tags = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(migrate_hash_tags)
+
+def _entry(tags, user="u1"):
+    return {"user_id": user, "title": "t", "tags": list(tags), "content_type": "image/png",
+            "image_base64": base64.b64encode(b"\x89PNG" + uuid.uuid4().bytes).decode()}
+
+def _upload(tags, user="u1"):
+    resp = upload_handler.handler({"body": json.dumps(_entry(tags, user))}, None)
+    assert resp["statusCode"] == 201, resp["body"]
+    return json.loads(resp["body"])["image_id"]
+
+def _all_pages(**params):
+    ids, token = [], None
+    while True:
+        resp = list_handler.handler({"queryStringParameters": dict(params, **({"next_token": token} if token else {}))},
+                                    None)
+        body = json.loads(resp["body"])
+        assert resp["statusCode"] == 200, body
+        ids += [it["image_id"] for it in body["items"]]
+        token = body["next_token"]
+        if not token:
+            return ids
+
+def _partitions():
+    rows = boto3.resource("dynamodb", region_name="us-east-1").Table("image_tags").scan()["Items"]
+    return Counter(r["tag"] for r in rows)
+
+@pytest.fixture
+def sharding(monkeypatch):
+    monkeypatch.setenv("TAG_SHARDING", "1")
+    tag_shards.reset_shard_cache()
+
+def test_hot_tag_rows_spread_and_list_in_order(sharding):
+    assert tag_shards.set_shards("sunset", 4)
+    ids = [_upload(["sunset", "calm" if i % 2 else "loud"]) for i in range(16)]
+    parts = _partitions()
+    assert len([p for p in parts if split_shard_key(p)[0] == "sunset"]) > 1
+    assert parts["calm"] == 8 and parts["loud"] == 8  # unsharded tags keep one partition
+    assert _all_pages(tag="sunset", limit="5") == sorted(ids)
+    calm = sorted(i for n, i in enumerate(ids) if n % 2)
+    assert _all_pages(tag="sunset,calm", match="all", limit="3") == calm
+    assert _all_pages(tag="sunset", user_id="u1", limit="50")  # user_tag GSI path is unaffected
+
+def test_deletes_find_the_sharded_rows(sharding):
+    tag_shards.set_shards("sunset", 8)
+    ids = [_upload(["sunset", "sea"]) for _ in range(6)]
+    assert delete_handler.handler({"pathParameters": {"image_id": ids[0]}}, None)["statusCode"] == 204
+    resp = bulk_delete_handler.handler({"body": json.dumps({"image_ids": ids[1:4]})}, None)
+    assert resp["statusCode"] == 200, resp["body"]
+    assert sum(_partitions().values()) == 4
+    assert _all_pages(tag="sunset") == sorted(ids[4:])
+
+def test_batch_upload_writes_sharded_rows(sharding):
+    tag_shards.set_shards("sunset", 4)
+    resp = batch_upload_handler.handler({"body": json.dumps({"items": [_entry(["sunset"]) for _ in range(8)]})}, None)
+    body = json.loads(resp["body"])
+    ids = sorted(r["item"]["image_id"] for r in body["results"] if r["status"] == 201)
+    assert len(ids) == 8 and _all_pages(tag="sunset", limit="3") == ids
+
+def test_shard_count_grows_with_the_tag(sharding, monkeypatch):
+    monkeypatch.setenv("TAG_SHARD_ROWS", "3")
+    monkeypatch.setenv("TAG_SHARD_MAX", "4")
+    for _ in range(10):
+        _upload(["sunset"])
+    tag_shards.reset_shard_cache()
+    assert tag_shards.counts(["sunset"]) == {"sunset": 4}
+    assert not tag_shards.set_shards("sunset", 2)  # counts never shrink implicitly
+    assert len(_all_pages(tag="sunset")) == 10
+    with pytest.raises(ValueError):
+        tag_shards.set_shards("sunset", 5)
+
+def test_migration_in_and_out(monkeypatch):
+    ids = sorted(_upload(["sunset"]) for _ in range(12))  # written unsharded
+    monkeypatch.setenv("TAG_SHARDING", "1")
+    assert _all_pages(tag="sunset", limit="5") == ids  # old rows are shard 0
+    stats = tag_shards.reshard("image_tags", "images", "sunset", 4)
+    assert stats["moved"] > 0 and stats["skipped"] == 0
+    assert len(_partitions()) > 1 and _all_pages(tag="sunset", limit="5") == ids
+    assert delete_handler.handler({"pathParameters": {"image_id": ids[0]}}, None)["statusCode"] == 204
+    assert tag_shards.reshard("image_tags", "images", "sunset", 1)["moved"] == stats["moved"] - (
+        1 if tag_shards.shard_for(ids[0], 4) else 0)
+    assert _partitions() == {"sunset": 11}
+    monkeypatch.setenv("TAG_SHARDING", "0")
+    assert _all_pages(tag="sunset", limit="5") == ids[1:]
+
+def test_dictionary_counts_fold_shards(sharding):
+    tag_shards.set_shards("sunset", 4)
+    for _ in range(6):
+        _upload(["sunset"])
+    assert tag_dictionary.rebuild("image_tags", dry_run=True) == {"sunset": 6}
+    tag_dictionary.rebuild("image_tags")
+    tag_shards.reset_shard_cache()
+    assert tag_shards.counts(["sunset"]) == {"sunset": 4}  # rebuild keeps shard counts
+
+def test_hash_in_tags_never_collides_with_shards(sharding):
+    for tag in ("sunset#2", "#", "a##", "sunset#x#1"):
+        for shard in (0, 1, 12):
+            assert split_shard_key(shard_key(tag, shard)) == (tag, shard)
+    tag_shards.set_shards("sunset", 4)
+    plain = [_upload(["sunset"]) for _ in range(8)]
+    hashed = _upload(["sunset#2"])
+    assert _partitions()["sunset##2"] == 1
+    assert _all_pages(tag="sunset#2") == [hashed]
+    assert sorted(_all_pages(tag="sunset")) == sorted(plain)
+    assert tag_dictionary.rebuild("image_tags", dry_run=True) == {"sunset": 8, "sunset#2": 1}
+    resp = delete_handler.handler({"pathParameters": {"image_id": hashed}, "rawPath": f"/images/{hashed}"}, None)
+    assert resp["statusCode"] == 204 and "sunset##2" not in _partitions()
+
+def test_legacy_hash_tag_rows_are_migrated(sharding):
+    ddb = boto3.resource("dynamodb", region_name="us-east-1")
+    tag_shards.set_shards("v", 4)
+    legacy = _upload(["plain"])
+    # written before "#" was escaped: the row sits under the raw tag
+    ddb.Table("images").update_item(Key={"image_id": legacy}, UpdateExpression="SET tags = :t",
+                                    ExpressionAttributeValues={":t": ["plain", "v#2"]})
+    row = ddb.Table("image_tags").get_item(Key={"tag": "plain", "image_id": legacy})["Item"]
+    ddb.Table("image_tags").put_item(Item=dict(row, tag="v#2", user_tag="u1#v#2"))
+    uploaded = []
+    while sum(tag_shards.assign(i, ["v"]).get("v") == 2 for i in uploaded) < 2:
+        uploaded.append(_upload(["v"]))
+    sharded = [i for i in uploaded if tag_shards.assign(i, ["v"]).get("v") == 2]
+    assert _all_pages(tag="v#2") == []
+
+    assert migrate_hash_tags.migrate("images", "image_tags", segments=2, dry_run=True)["moved"] == 1
+    assert migrate_hash_tags.migrate("images", "image_tags", segments=2) == {"images": 1, "moved": 1, "missing": 0}
+    assert migrate_hash_tags.migrate("images", "image_tags", segments=2)["moved"] == 0
+    assert _all_pages(tag="v#2") == [legacy]
+    assert sorted(set(_all_pages(tag="v")) & set(sharded)) == sorted(sharded)  # shard 2 of "v" untouched
+    assert tag_dictionary.rebuild("image_tags", dry_run=True) == {"plain": 1, "v": len(uploaded), "v#2": 1}
+    resp = delete_handler.handler({"pathParameters": {"image_id": legacy}, "rawPath": f"/images/{legacy}"}, None)
+    assert resp["statusCode"] == 204 and _partitions()["v#2"] == len(sharded) and "v##2" not in _partitions()
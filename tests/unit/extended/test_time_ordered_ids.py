@@ -0,0 +1,106 @@
+# tests/test_time_ordered_ids.py
+import os
+import json
+import base64
+import uuid
+import importlib.util
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pytest
+
+from common import tag_shards
+from common.utils import gen_id, id_time, is_time_id, time_id_bound
+from src.handlers import upload_handler, list_handler, delete_handler
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts", "migrate_legacy_tag_rows.py")
+_spec = importlib.util.spec_from_file_location("migrate_legacy_tag_rows", _SCRIPT)
+migrate_legacy_tag_rows = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(migrate_legacy_tag_rows)
+
+def _upload(tags, user="u1"):
+    ev = {"body": json.dumps({"user_id": user, "title": "t", "tags": tags, "content_type": "image/png",
+                              "image_base64": base64.b64encode(b"\x89PNG" + uuid.uuid4().bytes).decode()})}
+    resp = upload_handler.handler(ev, None)
+    assert resp["statusCode"] == 201, resp["body"]
+    return json.loads(resp["body"])["image_id"]
+
+def _walk(**params):
+    ids, token = [], None
+    while True:
+        q = dict(params, **({"next_token": token} if token else {}))
+        resp = list_handler.handler({"queryStringParameters": q}, None)
+        body = json.loads(resp["body"])
+        assert resp["statusCode"] == 200, body
+        ids += [it["image_id"] for it in body["items"]]
+        token = body["next_token"]
+        if not token:
+            return ids
+
+def test_gen_id_is_a_monotonic_uuid7():
+    ids = [gen_id() for _ in range(5000)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert all(uuid.UUID(i).version == 7 and is_time_id(i) for i in ids)
+    assert abs(id_time(ids[0]) - datetime.now(timezone.utc)) < timedelta(seconds=5)
+    assert not is_time_id(str(uuid.uuid4())) and id_time(str(uuid.uuid4())) is None
+    t = id_time(ids[-1])
+    assert time_id_bound(t) <= ids[-1] <= time_id_bound(t, upper=True)
+
+def test_random_id_images_list_in_time_order_after_migration():
+    ddb = boto3.resource("dynamodb", region_name="us-east-1")
+    legacy = str(uuid.uuid4())  # image written before time-ordered ids
+    ddb.Table("images").put_item(Item={"image_id": legacy, "user_id": "u1", "title": "old", "tags": ["sea"],
+                                       "s3_bucket": "test-bucket", "s3_key": f"images/{legacy}",
+                                       "created_at": "2020-01-01T00:00:00+00:00"})
+    ddb.Table("image_tags").put_item(Item={"tag": "sea", "image_id": legacy, "user_id": "u1",
+                                           "created_at": "2020-01-01T00:00:00+00:00", "user_tag": "u1#sea"})
+    ids = [_upload(["sea"]) for _ in range(7)]
+    assert _walk(tag="sea", sort="created_at_desc", limit="3") == ids[::-1]  # not migrated yet
+
+    stats = migrate_legacy_tag_rows.migrate("images", "image_tags", segments=2)
+    assert stats == {"legacy_rows": 1, "moved": 1, "orphaned": 0}
+    assert migrate_legacy_tag_rows.migrate("images", "image_tags", segments=2)["legacy_rows"] == 0
+    # every order returns the same images, the old one by its created_at
+    assert _walk(tag="sea", limit="3") == [legacy] + ids
+    assert _walk(tag="sea", sort="created_at_desc", limit="3") == ids[::-1] + [legacy]
+    assert _walk(tag="sea", since="2019-12-31T00:00:00Z", until="2020-01-02T00:00:00Z") == [legacy]
+    assert _walk(tag="sea", user_id="u1", limit="3") == [legacy] + ids
+    assert _walk(tag="sea,land", match="any", sort="created_at_desc") == ids[::-1] + [legacy]
+
+    resp = delete_handler.handler({"pathParameters": {"image_id": legacy}, "rawPath": f"/images/{legacy}"}, None)
+    assert resp["statusCode"] == 204
+    assert [r["image_id"] for r in ddb.Table("image_tags").scan()["Items"]] == ids
+
+def test_since_until_are_key_conditions():
+    ids = [_upload(["sea"], user="u1") for _ in range(8)]
+    low, high = id_time(ids[2]), id_time(ids[5])
+    expected = [i for i in ids if low <= id_time(i) <= high]
+    window = {"since": low.isoformat(), "until": high.isoformat().replace("+00:00", "Z")}
+    assert _walk(tag="sea", limit="2", **window) == expected
+    assert _walk(tag="sea", sort="created_at_desc", limit="2", **window) == expected[::-1]
+    assert _walk(tag="sea", limit="2", since=str(high.timestamp() + 3600)) == []
+    assert 2 <= len(_walk(user_id="u1", limit="2", **window)) <= len(ids)  # created_at, a moment after the id
+    assert _walk(user_id="u1", tag="sea", since="2000-01-01", until="2001-01-01") == []
+
+def test_cursor_outside_the_window_is_rejected():
+    ids = [_upload(["sea"]) for _ in range(3)]
+    body = json.loads(list_handler.handler({"queryStringParameters": {"tag": "sea", "limit": "1"}}, None)["body"])
+    since = (id_time(ids[-1]) + timedelta(seconds=1)).isoformat()
+    resp = list_handler.handler({"queryStringParameters": {"tag": "sea", "since": since,
+                                                           "next_token": body["next_token"]}}, None)
+    assert resp["statusCode"] == 400
+
+@pytest.mark.parametrize("sharded", [False, True])
+def test_multi_tag_and_sharded_listings_run_newest_first(monkeypatch, sharded):
+    if sharded:
+        monkeypatch.setenv("TAG_SHARDING", "1")
+        tag_shards.reset_shard_cache()
+        tag_shards.set_shards("sea", 4)
+    ids = [_upload(["sea", "sky" if n % 2 else "sun"]) for n in range(10)]
+    assert _walk(tag="sea", sort="created_at_desc", limit="3") == ids[::-1]
+    assert _walk(tag="sea,sky", match="all", sort="created_at_desc", limit="2") == ids[1::2][::-1]
+    assert _walk(tag="sky,sun", match="any", sort="created_at_desc", limit="4") == ids[::-1]
+    window = {"since": id_time(ids[3]).isoformat(), "until": id_time(ids[6]).isoformat()}
+    expected = [i for i in ids if id_time(ids[3]) <= id_time(i) <= id_time(ids[6])]
+    assert _walk(tag="sky,sun", match="any", limit="2", **window) == expected
+    assert _walk(tag="sea", sort="created_at_desc", limit="2", **window) == expected[::-1]
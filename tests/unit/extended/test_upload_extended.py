@@ -42,6 +42,13 @@ def test_upload_empty_tags():
     assert resp["statusCode"] == 400
     assert "must be a non-empty list" in json.loads(resp["body"])["error"]
 
+def test_upload_rejects_comma_in_tag():
+    bad = {"user_id": "u1", "title": "x", "tags": ["a", "b,c"], "content_type": "image/png",
+           "image_base64": base64.b64encode(b"123").decode()}
+    resp = upload_handler.handler({"body": json.dumps(bad)}, None)
+    assert resp["statusCode"] == 400
+    assert "must not contain ','" in json.loads(resp["body"])["error"]
+
 def test_upload_invalid_base64():
     bad = {"user_id": "u1", "title": "x", "tags": ["a"], "content_type": "image/png", "image_base64": "!!!not-b64!!!"}
     resp = upload_handler.handler({"body": json.dumps(bad)}, None)
@@ -59,13 +66,9 @@ def test_upload_s3_failure(monkeypatch, upload_req):
     assert "Upload failed" in json.loads(resp["body"])["error"]
 
 def test_upload_ddb_failure(monkeypatch, upload_req):
-    class FakeTable:
-        def put_item(self, Item):
-            raise Exception("DDB put failed")
-    class FakeResource:
-        def Table(self, name):
-            return FakeTable()
-    monkeypatch.setattr("src.handlers.upload_handler.ddb_resource", lambda: FakeResource())
+    def failing_commit(*args, **kwargs):
+        raise Exception("DDB transaction failed")
+    monkeypatch.setattr("src.handlers.upload_handler.commit_item", failing_commit)
 
     resp = upload_handler.handler({"body": json.dumps(upload_req)}, None)
     assert resp["statusCode"] == 500
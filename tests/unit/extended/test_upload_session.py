@@ -0,0 +1,120 @@
+# tests/test_upload_session.py
+import json
+import base64
+import hashlib
+
+import boto3
+
+from src.handlers import upload_session_handler, get_handler, list_handler
+
+IMG = b"\x89PNG\r\n\x1a\n" + b"pixels" * 10
+
+def _create(**over):
+    body = {"user_id": "u1", "title": "big", "tags": ["Direct"], "content_type": "image/png", "size": len(IMG),
+            "checksum": hashlib.sha256(IMG).hexdigest()}
+    body.update(over)
+    resp = upload_session_handler.handler({"body": json.dumps(body), "rawPath": "/images/uploads"}, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+def _complete(image_id):
+    resp = upload_session_handler.handler({
+        "pathParameters": {"image_id": image_id},
+        "rawPath": f"/images/uploads/{image_id}/complete",
+    }, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+def _client_upload(key, data=IMG, content_type="image/png"):
+    # stands in for the browser POSTing to the presigned form
+    boto3.client("s3", region_name="us-east-1").put_object(
+        Bucket="test-bucket", Key=key, Body=data, ContentType=content_type, ChecksumAlgorithm="SHA256")
+
+def test_create_returns_presigned_post_with_conditions():
+    status, body = _create(checksum=hashlib.sha256(IMG).hexdigest())
+    assert status == 201
+    fields = body["upload"]["fields"]
+    assert fields["key"] == f"images/{body['image_id']}"
+    policy = json.loads(base64.b64decode(fields["policy"]))
+    assert ["content-length-range", len(IMG), len(IMG)] in policy["conditions"]
+    assert {"Content-Type": "image/png"} in policy["conditions"]
+    digest = base64.b64encode(hashlib.sha256(IMG).digest()).decode()
+    assert fields["x-amz-checksum-algorithm"] == "SHA256" and fields["x-amz-checksum-sha256"] == digest
+    assert {"x-amz-checksum-algorithm": "SHA256"} in policy["conditions"]
+    assert {"x-amz-checksum-sha256": digest} in policy["conditions"]
+
+def test_pending_upload_is_hidden_until_completed():
+    _, body = _create()
+    iid = body["image_id"]
+    r = get_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}, None)
+    assert r["statusCode"] == 404
+    lst = list_handler.handler({"queryStringParameters": {"user_id": "u1"}}, None)
+    assert json.loads(lst["body"])["items"] == []
+
+    status, err = _complete(iid)
+    assert status == 409 and "not been uploaded" in err["error"]
+
+    _client_upload(f"images/{iid}")
+    status, item = _complete(iid)
+    assert status == 200
+    assert item["user_id"] == "u1"
+    assert item["checksum"] == hashlib.sha256(IMG).hexdigest()
+    assert "status" not in item and "pending_user_id" not in item
+
+    tag_list = list_handler.handler({"queryStringParameters": {"tag": "direct"}}, None)
+    assert [it["image_id"] for it in json.loads(tag_list["body"])["items"]] == [iid]
+    # completing twice is harmless
+    assert _complete(iid)[0] == 200
+
+def test_complete_rejects_size_and_checksum_mismatch():
+    _, body = _create()
+    _client_upload(f"images/{body['image_id']}", data=IMG + b"extra")
+    status, err = _complete(body["image_id"])
+    assert status == 409 and "size" in err["error"]
+
+    _, body2 = _create(checksum=hashlib.sha256(b"other").hexdigest())
+    _client_upload(f"images/{body2['image_id']}")
+    status, err = _complete(body2["image_id"])
+    assert status == 409 and "checksum" in err["error"]
+
+def test_object_without_checksum_is_hashed_only_as_fallback(monkeypatch):
+    _, body = _create()
+    iid = body["image_id"]
+    boto3.client("s3", region_name="us-east-1").put_object(
+        Bucket="test-bucket", Key=f"images/{iid}", Body=IMG, ContentType="image/png")
+    status, err = _complete(iid)
+    assert status == 409 and "checksum" in err["error"]
+    monkeypatch.setenv("UPLOAD_HASH_FALLBACK", "1")
+    status, item = _complete(iid)
+    assert status == 200 and item["checksum"] == hashlib.sha256(IMG).hexdigest()
+
+def test_create_validation():
+    assert _create(size=0)[0] == 400
+    assert _create(checksum="zz")[0] == 400
+    assert _create(checksum=None)[0] == 400
+    assert _create(size=10 ** 12)[0] == 400
+    assert _complete("nope")[0] == 404
+
+def test_s3_event_finalizes():
+    _, body = _create()
+    iid = body["image_id"]
+    _client_upload(f"images/{iid}")
+    out = upload_session_handler.handler({"Records": [{"s3": {"object": {"key": f"images/{iid}"}}}]}, None)
+    assert out == {"results": [{"image_id": iid, "status": "committed"}]}
+    r = get_handler.handler({"pathParameters": {"image_id": iid}, "rawPath": f"/images/{iid}"}, None)
+    assert r["statusCode"] == 200
+
+def test_failed_commit_leaves_upload_pending_and_retry_writes_tags(monkeypatch):
+    from common import uploads
+    _, body = _create()
+    iid = body["image_id"]
+    _client_upload(f"images/{iid}")
+    real = uploads.transact_write
+    def boom(actions):
+        raise RuntimeError("throttled")
+    monkeypatch.setattr(uploads, "transact_write", boom)
+    assert _complete(iid)[0] == 500
+    item = boto3.resource("dynamodb", region_name="us-east-1").Table("images").get_item(Key={"image_id": iid})["Item"]
+    assert item["status"] == "pending"
+    monkeypatch.setattr(uploads, "transact_write", real)
+    assert _complete(iid)[0] == 200
+    tag_list = list_handler.handler({"queryStringParameters": {"tag": "direct"}}, None)
+    assert [it["image_id"] for it in json.loads(tag_list["body"])["items"]] == [iid]